@@ -1,4 +1,6 @@
-from flask import Flask, render_template_string
+from flask import Flask, Response, render_template_string
+
+from utils.metrics import read_snapshot
 
 app = Flask(__name__)
 
@@ -107,5 +109,10 @@ def home():
     """
     return render_template_string(html)
 
+@app.route('/metrics')
+def metrics():
+    # المقاييس يكتبها البوت في ملف دوري لأنه يعمل في عملية منفصلة عن تطبيق الويب
+    return Response(read_snapshot(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000)
\ No newline at end of file
@@ -37,6 +37,10 @@ DEFAULT_PROTECTION_SETTINGS = {
     "anti_flood": True,
     "anti_forward": True,     # حذف الرسائل المحولة
     "anti_bad_words": True,   # حذف الكلمات المسيئة
+    "anti_duplicates": True,  # حذف موجات الرسائل المنسوخة من عدة حسابات
+    "anti_banned_images": True,  # حذف الصور المحظورة والصور الشبيهة بها
+    "raid_restrict": False,   # تقييد المنضمين مؤقتًا أثناء موجات الانضمام الجماعي
+    "shadow_mode": False,     # تقييم القواعد وتسجيل قراراتها دون حذف أو تحذير
     "welcome_message": "مرحبًا {username} في المجموعة!",
     "goodbye_message": "وداعًا {username}!",
     "warn_limit": 3,  # Number of warnings before taking action
@@ -96,3 +100,165 @@ SUPPORTED_FORMATS = ["mp3", "ogg", "m4a"]
 
 # Default music format for downloads
 DEFAULT_MUSIC_FORMAT = "mp3"
+
+# عدد عمليات ffmpeg التي يمكن تشغيلها في نفس الوقت
+TRANSCODE_WORKERS = int(os.environ.get("TRANSCODE_WORKERS", 2))
+
+# نطاق معدل البت المسموح عند تحويل الملفات الصوتية (kbps)
+TRANSCODE_MIN_BITRATE = 32
+TRANSCODE_MAX_BITRATE = 192
+
+# الحد الأقصى لعدد التنزيلات المتزامنة على مستوى البوت
+DOWNLOAD_CONCURRENCY = int(os.environ.get("DOWNLOAD_CONCURRENCY", 3))
+
+# الحد الأقصى لعدد التنزيلات المتزامنة لكل مستخدم
+DOWNLOAD_PER_USER_LIMIT = 1
+
+# الحد الأدنى لمعدل البت الصوتي عند اختيار صيغة التنزيل (kbps)
+MIN_AUDIO_BITRATE = 64
+
+# الحد الأقصى لحجم الذاكرة المؤقتة للملفات الصوتية المنزلة على القرص (بالبايت)
+AUDIO_CACHE_MAX_BYTES = int(os.environ.get("AUDIO_CACHE_MAX_BYTES", 2 * 1024 * 1024 * 1024))
+
+# الحد الأقصى لعدد المقاطع في قائمة التشغيل لكل محادثة
+MAX_QUEUE_LENGTH = 20
+
+# عدد المقاطع التالية التي يتم تحميلها مسبقًا أثناء تسليم المقطع الحالي
+QUEUE_PREFETCH_DEPTH = 2
+
+# أقل نسبة تطابق لاعتماد نتيجة من المكتبة المحلية بدلاً من البحث في يوتيوب
+LOCAL_SEARCH_MIN_SCORE = 0.75
+
+# الفترة بين عمليات فحص مجلد الموسيقى بحثًا عن ملفات جديدة أو معدلة (بالثواني)
+LIBRARY_SCAN_INTERVAL = 300
+
+# الفترة بين كتابة لقطات مقاييس الأداء التي يعرضها تطبيق الويب على /metrics (بالثواني)
+METRICS_SNAPSHOT_INTERVAL = float(os.environ.get("METRICS_SNAPSHOT_INTERVAL", 15))
+
+# الفترة بين تجميع إحصائيات الدقائق في خانات الساعات (بالثواني)
+STATS_ROLLUP_INTERVAL = 60
+
+# الفترة بين حفظ إحصائيات البوت على القرص (بالثواني)
+STATS_SAVE_INTERVAL = 300
+
+# الفترة بين عينات تأخر حلقة الأحداث (بالثواني)
+LOOP_LAG_SAMPLE_INTERVAL = 0.1
+
+# المدة التي يعتبر بعدها توقف حلقة الأحداث عند استدعاء واحد بطيئًا (بالثواني)
+SLOW_CALLBACK_THRESHOLD = 0.5
+
+# تسجيل التحديثات الواردة (بعد إخفاء البيانات الشخصية) لإعادة تشغيلها عند تحليل المشاكل
+RECORD_UPDATES = os.environ.get("RECORD_UPDATES", "0") == "1"
+
+# الفترة بين كتابة التحديثات المسجلة على القرص (بالثواني)
+RECORDING_FLUSH_INTERVAL = 5
+
+# عنوان Bot API (يمكن توجيهه إلى الخادم المحلي المزيف في tools/fake_bot_api.py للاختبار)
+BOT_API_BASE_URL = os.environ.get("BOT_API_BASE_URL", "https://api.telegram.org/bot")
+BOT_API_FILE_URL = os.environ.get("BOT_API_FILE_URL", "https://api.telegram.org/file/bot")
+
+# عدد عمليات معالجة التحديثات (1 = عملية واحدة، وأكثر من ذلك يوزع المحادثات على عدة عمليات)
+BOT_SHARDS = int(os.environ.get("BOT_SHARDS", "1"))
+
+# رابط Webhook الذي تستقبل عليه العملية الأمامية التحديثات (فارغ = استخدام polling)
+SHARD_WEBHOOK_URL = os.environ.get("SHARD_WEBHOOK_URL", "")
+SHARD_WEBHOOK_LISTEN = os.environ.get("SHARD_WEBHOOK_LISTEN", "0.0.0.0")
+SHARD_WEBHOOK_PORT = int(os.environ.get("SHARD_WEBHOOK_PORT", "8443"))
+
+# الفترة بين إرسال فروقات الإحصائيات من كل عملية إلى باقي العمليات (بالثواني)
+SHARD_SYNC_INTERVAL = 2
+
+# كشف موجات النسخ واللصق: عدد المستخدمين المختلفين الذين يرسلون رسائل شبه متطابقة خلال النافذة
+DUPLICATE_THRESHOLD = 3
+DUPLICATE_WINDOW = 600  # بالثواني
+
+# أقصى عدد بتات مختلفة بين بصمتين (من 64) لاعتبار الرسالتين شبه متطابقتين
+DUPLICATE_MAX_DISTANCE = 10
+
+# عدد البصمات المحفوظة لكل مجموعة (الذاكرة ثابتة لكل مجموعة)
+DUPLICATE_INDEX_SIZE = 256
+
+# الرسائل الأقصر من هذا العدد من الحروف (بعد التوحيد) لا تُفحص، فالتحيات القصيرة تتكرر طبيعيًا
+DUPLICATE_MIN_LENGTH = 24
+
+# الرسائل الأقصر من هذا العدد من الحروف (بعد التوحيد) تُقارن بتجزئة النص كاملًا بعد توحيد الأرقام
+# بدل SimHash، فتغيير رقم واحد في نص قصير يغير بتات كثيرة من البصمة (حتى 16 من 64)
+DUPLICATE_SHORT_LENGTH = 48
+
+# كشف موجات الانضمام الجماعي: عدد المنضمين خلال النافذة (بالثواني) الذي يفعّل وضع الحماية
+RAID_JOIN_THRESHOLD = 10
+RAID_WINDOW = 10
+
+# مدة بقاء وضع الحماية بعد آخر انضمام (بالثواني)
+RAID_COOLDOWN = 60
+
+# في وضع الحماية تُجمع الترحيبات في رسالة واحدة كل هذه المدة (بالثواني)
+RAID_WELCOME_INTERVAL = 5
+
+# أقصى عدد أسماء في رسالة الترحيب المجمعة (الباقون يُذكر عددهم فقط)
+RAID_WELCOME_MAX_MENTIONS = 30
+
+# مدة تقييد المنضمين أثناء موجة الانضمام إذا فُعّل الخيار (بالثواني، يرفعه Telegram تلقائيًا)
+RAID_RESTRICT_DURATION = 600
+
+# طابور الحذف: تُجمع الرسائل المطلوب حذفها لكل مجموعة خلال هذه المدة (بالثواني) وتُحذف بطلب deleteMessages واحد
+DELETE_BATCH_WINDOW = 1.0
+
+# أقصى عدد رسائل في طلب deleteMessages واحد (حد Telegram)
+DELETE_BATCH_MAX = 100
+
+# مدة بقاء رسائل التنبيه التي يرسلها البوت قبل حذفها تلقائيًا (بالثواني)
+NOTICE_TTL = 30
+
+# منفذ إجراءات الإشراف: عدد المحاولات لكل إجراء عند أخطاء الشبكة أو تجاوز حد الطلبات
+MODERATION_MAX_ATTEMPTS = 4
+
+# مدة الانتظار قبل أول إعادة محاولة (بالثواني، تتضاعف مع كل محاولة)
+MODERATION_RETRY_BASE = 0.5
+
+# الفاصل الزمني لكتابة سجل نتائج إجراءات الإشراف على القرص (بالثواني)
+MODERATION_AUDIT_FLUSH_INTERVAL = 10
+
+# الفترة بين كتابة سجل قرارات وضع المراقبة على القرص (بالثواني)
+DECISION_LOG_FLUSH_INTERVAL = 10
+
+# أقصى عدد بتات مختلفة بين بصمتي صورتين (من 64) لاعتبار الصورة نسخة من صورة محظورة
+IMAGE_HASH_MAX_DISTANCE = 8
+
+# عدد العمليات التي تحسب بصمات الصور
+IMAGE_HASH_WORKERS = int(os.environ.get("IMAGE_HASH_WORKERS", 2))
+
+# عدد بصمات الملفات المحفوظة في الذاكرة (حسب file_unique_id)
+IMAGE_HASH_CACHE_SIZE = 5000
+
+# أقصى عدد صور محظورة في المجموعة الواحدة
+MAX_BANNED_IMAGES = 500
+
+# عدد المجموعات التي تبقى أوامرها وردودها التلقائية محملة في الذاكرة (الأقل نشاطًا تُخرج أولًا)
+CHAT_COMMANDS_CACHE_SIZE = 500
+
+# أقصى عدد أوامر وردود تلقائية خاصة بالمجموعة الواحدة
+MAX_CHAT_COMMANDS = 100
+MAX_AUTO_REPLIES = 100
+
+# أقل مدة بين ردين تلقائيين على العبارة نفسها في المجموعة (بالثواني)
+AUTO_REPLY_COOLDOWN = 10
+
+# البحث المضمن (@bot اسم الأغنية): مدة انتظار توقف المستخدم عن الكتابة قبل البحث (بالثواني)
+INLINE_DEBOUNCE = 0.4
+
+# مدة احتفاظ Telegram بنتائج الاستعلام المضمن نفسه (بالثواني)
+INLINE_CACHE_TIME = 300
+
+# أقصر استعلام مضمن يُبحث عنه (بالحروف بعد التوحيد)
+INLINE_MIN_QUERY_LENGTH = 2
+
+# مدة صلاحية نتائج البحث المحفوظة (بالثواني) وعدد الاستعلامات المحفوظة
+INLINE_SEARCH_CACHE_TTL = 900
+INLINE_SEARCH_CACHE_SIZE = 2000
+
+# أقصى عدد لمعرفات الملفات الصوتية المحفوظة للبحث المضمن (يُحذف الأقدم استخدامًا)
+AUDIO_FILE_IDS_LIMIT = 20000
+
+# الفترة بين كل حفظ لمعرفات الملفات الصوتية (بالثواني)
+AUDIO_FILE_IDS_SAVE_INTERVAL = 60
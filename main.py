@@ -7,11 +7,15 @@ import logging
 import random
 import asyncio
 from datetime import datetime
+from typing import Optional
 from telegram.ext import (
     Application,
     CommandHandler,
     MessageHandler,
     CallbackQueryHandler,
+    InlineQueryHandler,
+    TypeHandler,
+    ExtBot,
     filters,
     ContextTypes
 )
@@ -24,16 +28,79 @@ from telegram import (
 )
 from telegram.constants import ParseMode
 from telegram.error import BadRequest, TelegramError
+from telegram.request import HTTPXRequest
 
-from config import BOT_TOKEN, OWNER_ID, BOT_CHANNEL, BOT_DEVELOPER, BOT_ADMIN_IDS
-from utils.music_handler import download_music, play_music, search_youtube, get_audio_info
+from config import (
+    BOT_TOKEN,
+    OWNER_ID,
+    BOT_CHANNEL,
+    BOT_DEVELOPER,
+    BOT_ADMIN_IDS,
+    DEFAULT_PROTECTION_SETTINGS,
+    LIBRARY_SCAN_INTERVAL,
+    METRICS_SNAPSHOT_INTERVAL,
+    MODERATION_AUDIT_FLUSH_INTERVAL,
+    DECISION_LOG_FLUSH_INTERVAL,
+    STATS_ROLLUP_INTERVAL,
+    STATS_SAVE_INTERVAL,
+    AUDIO_FILE_IDS_SAVE_INTERVAL,
+    RECORD_UPDATES,
+    RECORDING_FLUSH_INTERVAL,
+    BOT_API_BASE_URL,
+    BOT_API_FILE_URL,
+    BOT_SHARDS
+)
+from utils.music_handler import (
+    download_music,
+    play_music,
+    search_youtube,
+    search_local_library,
+    get_track_title,
+    get_audio_info,
+    enqueue_track,
+    get_queue,
+    skip_track,
+    clear_queue,
+    is_delivering,
+    run_queue,
+    refresh_music_library
+)
+from utils.transcoder import shutdown_transcoder
+from utils.banned_images import shutdown_image_pool
+from utils.inline_search import (
+    inline_query_handler,
+    remember_file_id,
+    save_audio_file_ids,
+    save_audio_file_ids_sync,
+)
+from utils.chat_commands import (
+    add_chat_command,
+    remove_chat_command,
+    add_auto_reply,
+    remove_auto_reply,
+    get_chat_command,
+    get_chat_lists_text,
+    increment_chat_command_usage,
+    find_auto_reply,
+    save_all_chat_commands
+)
+from utils.metrics import InstrumentedApplication, InstrumentedBot, instrument_application, write_snapshot, clear_snapshots
+from utils.stats_store import record_event, get_summary, rollup, save_stats, save_stats_sync
+from utils.loop_monitor import start_loop_monitor, stop_loop_monitor, get_loop_health
+from utils.update_recorder import record_update, flush_recordings, flush_recordings_sync
+from utils.cleanup_queue import flush_all as flush_cleanup_queue
+from utils.moderation_actions import flush_audit, drain as drain_moderation
+from utils.decision_log import flush_decisions, flush_decisions_sync
+from utils.sharding import is_shard_worker, is_primary_shard, publish, register_shared, run_sharded
 from utils.group_protection import (
     handle_new_member,
     handle_left_member,
     delete_spam,
+    check_banned_photo,
     ban_user,
     kick_user,
     warn_user,
+    ban_image_by_reply,
     get_group_settings,
     update_group_settings
 )
@@ -43,23 +110,16 @@ from utils.custom_commands import (
     edit_custom_command,
     get_custom_command,
     get_all_custom_commands,
-    increment_command_usage
+    increment_command_usage,
+    render_response,
+    save_custom_commands,
+    CustomCommandHandler
 )
 # سيتم استيراد الدوال من utils.bot_settings فقط عند الحاجة إليها لتجنب الاستيراد الدائري
 
 # إحصائيات البوت
 BOT_START_TIME = time.time()  # وقت بدء تشغيل البوت
-BOT_STATISTICS = {
-    "messages_received": 0,
-    "songs_played": 0,
-    "searches_performed": 0,
-    "downloads_completed": 0,
-    "commands_used": 0,
-    "groups_joined": 0,
-    "users_warned": 0,
-    "users_banned": 0,
-    "broadcasts_sent": 0,
-}
+# العدادات نفسها محفوظة في utils.stats_store حتى لا تضيع عند إعادة التشغيل
 from utils.command_handler import get_commands_text
 
 # Set up logging
@@ -203,6 +263,7 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
             keyboard.append([InlineKeyboardButton("إرسال رسالة لجميع المستخدمين", callback_data="broadcast")])
             keyboard.append([InlineKeyboardButton("تعديل رسالة الترحيب", callback_data="set_welcome")])
             keyboard.append([InlineKeyboardButton("⚙️ الإعدادات المتقدمة", callback_data="advanced_settings")])
+            keyboard.append([InlineKeyboardButton("🩺 صحة حلقة الأحداث", callback_data="loop_health")])
         
         keyboard.append([InlineKeyboardButton("👨‍💻 تواصل مع المطور", url=f"https://t.me/{BOT_DEVELOPER.replace('@', '')}")])
         keyboard.append([InlineKeyboardButton("العودة", callback_data="back_to_main")])
@@ -458,7 +519,8 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         # تحديث الإعدادات
         from utils.group_protection import get_group_settings, update_group_settings
         settings = get_group_settings(chat_id)
-        settings[setting_name] = not settings.get(setting_name, True)
+        # الإعدادات المضافة حديثًا قد لا توجد في إعدادات المجموعات القديمة
+        settings[setting_name] = not settings.get(setting_name, DEFAULT_PROTECTION_SETTINGS.get(setting_name, True))
         update_group_settings(chat_id, settings)
         
         # تحديث لوحة الإعدادات
@@ -468,6 +530,11 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         await query.answer(f"تم {'تفعيل' if settings[setting_name] else 'تعطيل'} {setting_name}")
         await query.message.edit_reply_markup(reply_markup=keyboard)
         
+    elif query.data.startswith("protection_words"):
+        # قوائم كلمات المجموعة (الإضافات والاستثناءات)
+        from utils.group_protection import handle_protection_setting_callback
+        await handle_protection_setting_callback(update, context, query.data)
+        
     elif query.data.startswith("protection_warn_limit:"):
         # تغيير حد التحذيرات
         parts = query.data.split(":")
@@ -730,19 +797,37 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         if seconds > 0 or not uptime_str:
             uptime_str += f"{seconds} ثانية"
         
-        # إنشاء نص الإحصائيات
+        # إنشاء نص الإحصائيات (الإجمالي ثم آخر ساعة / يوم / أسبوع ونسبة التغير عن اليوم السابق)
+        summary = get_summary()
+        labels = [
+            ("messages_received", "📨 الرسائل المستلمة"),
+            ("songs_played", "🎵 الأغاني التي تم تشغيلها"),
+            ("searches_performed", "🔍 عمليات البحث"),
+            ("downloads_completed", "⬇️ التنزيلات المكتملة"),
+            ("commands_used", "💬 الأوامر المستخدمة"),
+            ("groups_joined", "👥 المجموعات المنضم إليها"),
+            ("users_warned", "⚠️ المستخدمين المحذرين"),
+            ("users_banned", "🚫 المستخدمين المحظورين"),
+            ("broadcasts_sent", "📢 رسائل البث المرسلة"),
+        ]
+        
         stats_text = (
             "📊 **إحصائيات البوت**\n\n"
             f"⏱️ وقت التشغيل: {uptime_str}\n"
-            f"📨 الرسائل المستلمة: {BOT_STATISTICS['messages_received']}\n"
-            f"🎵 الأغاني التي تم تشغيلها: {BOT_STATISTICS['songs_played']}\n"
-            f"🔍 عمليات البحث: {BOT_STATISTICS['searches_performed']}\n"
-            f"⬇️ التنزيلات المكتملة: {BOT_STATISTICS['downloads_completed']}\n"
-            f"💬 الأوامر المستخدمة: {BOT_STATISTICS['commands_used']}\n"
-            f"👥 المجموعات المنضم إليها: {BOT_STATISTICS['groups_joined']}\n"
-            f"⚠️ المستخدمين المحذرين: {BOT_STATISTICS['users_warned']}\n"
-            f"🚫 المستخدمين المحظورين: {BOT_STATISTICS['users_banned']}\n"
-            f"📢 رسائل البث المرسلة: {BOT_STATISTICS['broadcasts_sent']}\n\n"
+            "(الإجمالي — ساعة / يوم / أسبوع)\n\n"
+        )
+        for name, label in labels:
+            values = summary[name]
+            trend = ""
+            if values['trend'] is not None:
+                trend = f" {'📈' if values['trend'] >= 0 else '📉'} {values['trend']:+d}%"
+            stats_text += (
+                f"{label}: {values['total']} — "
+                f"{values['hour']} / {values['day']} / {values['week']}{trend}\n"
+            )
+        
+        stats_text += (
+            "\n"
             f"👑 مالك البوت: {BOT_DEVELOPER}\n"
             f"📣 قناة البوت: {BOT_CHANNEL}"
         )
@@ -756,6 +841,44 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         
         await query.message.edit_text(stats_text, reply_markup=reply_markup, parse_mode=ParseMode.MARKDOWN)
     
+    elif query.data == "loop_health":
+        # تشخيص حلقة الأحداث (لمالك البوت فقط لأنه يعرض مكدس الاستدعاءات)
+        user = update.effective_user
+        if str(user.id) != OWNER_ID:
+            await query.message.reply_text("عذراً، هذه الميزة متاحة فقط لمالك البوت.")
+            return
+        
+        health = get_loop_health()
+        health_text = (
+            "🩺 صحة حلقة الأحداث\n\n"
+            f"الحالة: {'✅ تعمل' if health['running'] else '❌ متوقفة'}\n"
+            f"عدد العينات: {health['samples']}\n"
+            f"تأخر الجدولة p50: {health['p50'] * 1000:.1f} ms\n"
+            f"تأخر الجدولة p95: {health['p95'] * 1000:.1f} ms\n"
+            f"تأخر الجدولة p99: {health['p99'] * 1000:.1f} ms\n"
+            f"أقصى تأخر: {health['max'] * 1000:.1f} ms\n"
+            f"الاستدعاءات البطيئة: {health['slow_total']}\n"
+        )
+        
+        if health['recent']:
+            health_text += "\nآخر التوقفات:\n"
+            for incident in reversed(health['recent'][-5:]):
+                when = datetime.fromtimestamp(incident['time']).strftime("%H:%M:%S")
+                duration = f"{incident['duration']:.2f} ث" if incident['duration'] else "جارٍ"
+                health_text += f"• {when} — {incident['handler']} ({duration})\n"
+            
+            # آخر أسطر المكدس لأحدث توقف
+            last_stack = health['recent'][-1]['stack'].strip().splitlines()[-6:]
+            health_text += "\nمكدس آخر توقف:\n" + "\n".join(last_stack)
+        
+        keyboard = [
+            [InlineKeyboardButton("تحديث", callback_data="loop_health")],
+            [InlineKeyboardButton("العودة للوحة التحكم", callback_data="admin_panel")]
+        ]
+        reply_markup = InlineKeyboardMarkup(keyboard)
+        
+        await query.message.edit_text(health_text[:4000], reply_markup=reply_markup)
+    
     elif query.data == "broadcast":
         # التحقق من صلاحيات المستخدم
         user = update.effective_user
@@ -1034,6 +1157,7 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
                 
                 # البحث باستخدام اسم الفنان في يوتيوب
                 search_query = f"{artist_name} أغنية"
+                record_event("searches_performed")
                 results = await search_youtube(search_query)
                 
                 if not results:
@@ -1065,23 +1189,10 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     elif query.data.startswith("play_"):
         try:
             # استخراج معرف الفيديو
-            video_id = query.data.split("_")[1]
-            url = f"https://www.youtube.com/watch?v={video_id}"
+            video_id = query.data.split("_", 1)[1]
             
-            await query.message.reply_text("جاري تحميل الأغنية...")
-            
-            # تشغيل الأغنية
-            success, result = await play_music(url, update.effective_chat.id)
-            if success:
-                await query.message.reply_audio(
-                    audio=result['file'],
-                    title=result['title'],
-                    performer=result['performer'],
-                    duration=result['duration'],
-                    caption=f"تم تشغيل: {result['title']}"
-                )
-            else:
-                await query.message.reply_text(f"حدث خطأ أثناء تشغيل الأغنية: {result}")
+            # إضافة الأغنية إلى قائمة التشغيل في المحادثة
+            await enqueue_and_play(update, context, video_id, get_track_title(video_id))
         except Exception as e:
             await query.message.reply_text(f"حدث خطأ أثناء تشغيل الأغنية: {str(e)}")
     
@@ -1095,12 +1206,17 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
             await query.message.reply_text("جاري تحميل الأغنية...")
             
             # تحميل الأغنية
-            success, result = await download_music(url)
+            success, result = await download_music(url, query.from_user.id)
             if success:
-                await query.message.reply_audio(
-                    audio=result,
+                record_event("downloads_completed")
+                sent = await query.message.reply_audio(
+                    audio=result['file'],
+                    title=result['title'],
+                    performer=result['performer'],
+                    duration=result['duration'],
                     caption="تم تحميل الأغنية بنجاح!"
                 )
+                remember_file_id(url, sent)
             else:
                 await query.message.reply_text(f"حدث خطأ أثناء تحميل الأغنية: {result}")
         except Exception as e:
@@ -1113,8 +1229,7 @@ async def search_command(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         return
     
     # تحديث إحصائيات البوت
-    BOT_STATISTICS["commands_used"] += 1
-    BOT_STATISTICS["searches_performed"] += 1
+    record_event("searches_performed")
     
     query = " ".join(context.args)
     results = await search_youtube(query)
@@ -1142,19 +1257,20 @@ async def play_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
         await update.message.reply_text("الرجاء إدخال رابط الفيديو لتشغيله.")
         return
     
-    # تحديث إحصائيات البوت
-    BOT_STATISTICS["commands_used"] += 1
-    BOT_STATISTICS["songs_played"] += 1
-    
     url = context.args[0]
     await update.message.reply_text("جاري تحميل الأغنية...")
     
-    success, result = await play_music(url, update.effective_chat.id)
+    success, result = await play_music(url, update.effective_chat.id, update.effective_user.id)
     if success:
-        await update.message.reply_audio(
-            audio=result,
+        record_event("songs_played")
+        sent = await update.message.reply_audio(
+            audio=result['file'],
+            title=result['title'],
+            performer=result['performer'],
+            duration=result['duration'],
             caption="تم تشغيل الأغنية بنجاح!"
         )
+        remember_file_id(url, sent)
     else:
         await update.message.reply_text(f"حدث خطأ أثناء تشغيل الأغنية: {result}")
 
@@ -1164,19 +1280,20 @@ async def download_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -
         await update.message.reply_text("الرجاء إدخال رابط الفيديو لتحميله.")
         return
     
-    # تحديث إحصائيات البوت
-    BOT_STATISTICS["commands_used"] += 1
-    BOT_STATISTICS["downloads_completed"] += 1
-    
     url = context.args[0]
     await update.message.reply_text("جاري تحميل الأغنية...")
     
-    success, result = await download_music(url)
+    success, result = await download_music(url, update.effective_user.id)
     if success:
-        await update.message.reply_audio(
-            audio=result,
+        record_event("downloads_completed")
+        sent = await update.message.reply_audio(
+            audio=result['file'],
+            title=result['title'],
+            performer=result['performer'],
+            duration=result['duration'],
             caption="تم تحميل الأغنية بنجاح!"
         )
+        remember_file_id(url, sent)
     else:
         await update.message.reply_text(f"حدث خطأ أثناء تحميل الأغنية: {result}")
 
@@ -1186,9 +1303,6 @@ async def ban_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> Non
         await update.message.reply_text("هذا الأمر يعمل فقط في المجموعات.")
         return
     
-    # تحديث إحصائيات البوت
-    BOT_STATISTICS["commands_used"] += 1
-    
     # Check if user is admin or owner
     user = update.effective_user
     if str(user.id) != OWNER_ID:
@@ -1200,7 +1314,7 @@ async def ban_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> Non
     
     success, message = await ban_user(update, context)
     if success:
-        BOT_STATISTICS["users_banned"] += 1
+        record_event("users_banned")
     await update.message.reply_text(message)
 
 async def kick_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -1227,9 +1341,6 @@ async def warn_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
         await update.message.reply_text("هذا الأمر يعمل فقط في المجموعات.")
         return
     
-    # تحديث إحصائيات البوت
-    BOT_STATISTICS["commands_used"] += 1
-    
     # Check if user is admin or owner
     user = update.effective_user
     if str(user.id) != OWNER_ID:
@@ -1241,15 +1352,115 @@ async def warn_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
     
     success, message = await warn_user(update, context)
     if success:
-        BOT_STATISTICS["users_warned"] += 1
+        record_event("users_warned")
+    await update.message.reply_text(message)
+
+async def banimage_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Handle /banimage and /unbanimage, sent as a reply to a photo."""
+    if update.effective_chat.type == "private":
+        await update.message.reply_text("هذا الأمر يعمل فقط في المجموعات.")
+        return
+    
+    # Check if user is admin or owner
+    user = update.effective_user
+    if str(user.id) != OWNER_ID:
+        chat_admins = await context.bot.get_chat_administrators(update.effective_chat.id)
+        admin_ids = [admin.user.id for admin in chat_admins]
+        if user.id not in admin_ids:
+            await update.message.reply_text("هذا الأمر متاح فقط للمشرفين.")
+            return
+    
+    unban = update.message.text.split()[0].lstrip("/").split("@")[0].lower() == "unbanimage"
+    success, message = await ban_image_by_reply(update, context, unban=unban)
+    await update.message.reply_text(message)
+
+async def chat_commands_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Manage the group's own commands and keyword auto-replies (/addcmd, /delcmd, /addreply, /delreply, /chatcmds)."""
+    if update.effective_chat.type == "private":
+        await update.message.reply_text("هذا الأمر يعمل فقط في المجموعات.")
+        return
+    
+    chat_id = update.effective_chat.id
+    command, _, rest = update.message.text.partition(" ")
+    command = command.lstrip("/").split("@")[0].lower()
+    rest = rest.strip()
+    
+    if command == "chatcmds":
+        await update.message.reply_text(get_chat_lists_text(chat_id))
+        return
+    
+    # Check if user is admin or owner
+    user = update.effective_user
+    if str(user.id) != OWNER_ID:
+        chat_admins = await context.bot.get_chat_administrators(chat_id)
+        admin_ids = [admin.user.id for admin in chat_admins]
+        if user.id not in admin_ids:
+            await update.message.reply_text("هذا الأمر متاح فقط للمشرفين.")
+            return
+    
+    # نص الرد: الرسالة التي يرد عليها الأمر، أو ما بعد الاسم/العبارة في الأمر نفسه
+    replied = update.message.reply_to_message
+    replied_text = (replied.text or replied.caption) if replied else None
+    
+    if command == "addcmd":
+        name, _, response = rest.partition(" ") if not replied_text else (rest, "", replied_text)
+        if not name or not response.strip():
+            await update.message.reply_text("الاستخدام: /addcmd الاسم نص الرد (أو بالرد على رسالة: /addcmd الاسم)")
+            return
+        success, message = add_chat_command(chat_id, name, response.strip(), user.id)
+    elif command == "delcmd":
+        success, message = remove_chat_command(chat_id, rest)
+    elif command == "addreply":
+        if replied_text:
+            trigger, response = rest, replied_text
+        else:
+            # العبارة ثم | أو سطر جديد ثم نص الرد
+            separator = "|" if "|" in rest else "\n"
+            trigger, _, response = rest.partition(separator)
+        if not trigger.strip() or not response.strip():
+            await update.message.reply_text("الاستخدام: /addreply العبارة | نص الرد (أو بالرد على رسالة: /addreply العبارة)")
+            return
+        success, message = add_auto_reply(chat_id, trigger, response.strip(), user.id)
+    else:
+        success, message = remove_auto_reply(chat_id, rest)
+    
     await update.message.reply_text(message)
 
+async def handle_photo(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Check photos posted in groups against the chat's banned images."""
+    record_event("messages_received")
+    if update.effective_chat.type != "private":
+        await check_banned_photo(update, context)
+
+async def custom_command_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Reply to a user-defined command resolved by CustomCommandHandler."""
+    # أمر خاص بالمجموعة أو أمر عام
+    if context.custom_command_chat is not None:
+        custom_command = get_chat_command(context.custom_command_chat, context.custom_command)
+        if not custom_command:
+            return
+        increment_chat_command_usage(context.custom_command_chat, context.custom_command)
+    else:
+        custom_command = get_custom_command(context.custom_command)
+        if not custom_command:
+            return
+        
+        # تسجيل استخدام الأمر
+        increment_command_usage(context.custom_command)
+    
+    # الرد بقالب الأمر بعد ملء المتغيرات (التنسيق تُرجم وتُحقق منه عند الإضافة)
+    chat = update.effective_chat
+    await update.message.reply_text(
+        render_response(custom_command, update.effective_user.mention_html(), chat.title or chat.full_name or ""),
+        parse_mode=ParseMode.HTML
+    )
+
 async def handle_new_member_join(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handle new members joining a group."""
-    # تحديث إحصائيات المجموعات
-    BOT_STATISTICS["groups_joined"] += 1
-    
     for member in update.message.new_chat_members:
+        # تحديث إحصائيات المجموعات عند إضافة البوت نفسه إلى مجموعة
+        if member.id == context.bot.id:
+            record_event("groups_joined")
         await handle_new_member(update, context, member)
 
 async def handle_member_left(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -1259,7 +1470,7 @@ async def handle_member_left(update: Update, context: ContextTypes.DEFAULT_TYPE)
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handle all messages that are not commands."""
     # زيادة عداد الرسائل المستلمة
-    BOT_STATISTICS["messages_received"] += 1
+    record_event("messages_received")
     
     # Check for spam and delete if necessary
     if update.effective_chat.type != "private":
@@ -1270,7 +1481,19 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     user_id = update.effective_user.id
     if 'users' not in context.bot_data:
         context.bot_data['users'] = set()
-    context.bot_data['users'].add(user_id)
+    if user_id not in context.bot_data['users']:
+        context.bot_data['users'].add(user_id)
+        # مشاركة المستخدم الجديد مع باقي العمليات عند توزيع التحديثات (يحتاجه البث)
+        publish("user", user_id, True)
+    
+    # حالة انتظار كلمة لقائمة كلمات المجموعة (من لوحة إعدادات الحماية، في المجموعة أو الخاص)
+    # تُقبل الكلمة فقط من المحادثة التي ظهر فيها طلبها، ورسائل المشرف في غيرها تُعالج كالمعتاد
+    word_state = context.user_data.get('state', {}).get('waiting_for_word')
+    if word_state and update.message.text and word_state.get("origin") == update.effective_chat.id:
+        context.user_data['state']['waiting_for_word'] = None
+        from utils.group_protection import handle_word_list_input
+        await handle_word_list_input(update, context, word_state)
+        return
     
     # التحقق إذا كان المستخدم في انتظار حالة خاصة (مثل رسالة البث أو تعديل إعدادات الحماية)
     if update.effective_chat.type == "private" and str(user_id) == OWNER_ID:
@@ -1301,7 +1524,7 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
                     logger.error(f"فشل إرسال رسالة البث للمستخدم {user_id}: {str(e)}")
             
             # تحديث إحصائيات البث
-            BOT_STATISTICS["broadcasts_sent"] += 1
+            record_event("broadcasts_sent")
             
             # إرسال ملخص النتائج
             await update.message.reply_text(
@@ -1396,7 +1619,8 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
             await update.message.reply_text(
                 f"👍 تم اختيار اسم الأمر: /{command_name}\n\n"
                 f"الآن، أرسل النص الذي سيرد به البوت عند استخدام هذا الأمر.\n"
-                f"يمكنك استخدام النص العادي، الإيموجي، وكذلك تنسيق Markdown.\n\n"
+                f"يمكنك استخدام النص العادي، الإيموجي، وكذلك تنسيق Markdown (*عريض* _مائل_ `كود` [نص](رابط)).\n"
+                f"المتغيرات: {{user}} اسم المستخدم، {{chat}} اسم المحادثة، {{count}} عدد مرات استخدام الأمر.\n\n"
                 f"أرسل /cancel لإلغاء العملية."
             )
             return
@@ -1467,24 +1691,6 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
                 
             return
     
-    # التحقق من الأوامر المخصصة
-    if update.message.text and update.message.text.startswith('/'):
-        command = update.message.text.split(' ')[0].lower()  # الحصول على الأمر بدون باراميترات
-        command_name = command[1:]  # إزالة علامة /
-        
-        # البحث عن الأمر في قاعدة بيانات الأوامر المخصصة
-        custom_command = get_custom_command(command_name)
-        if custom_command:
-            # تسجيل استخدام الأمر
-            increment_command_usage(command_name)
-            
-            # الرد بنص الأمر المخصص
-            await update.message.reply_text(
-                custom_command['response'],
-                parse_mode=ParseMode.MARKDOWN
-            )
-            return
-    
     # Handle direct text commands in Arabic
     message_text = update.message.text.lower() if update.message.text else ""
     
@@ -1501,23 +1707,9 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
                 await update.message.reply_text("لم أتمكن من العثور على نتائج للبحث. حاول مرة أخرى بكلمات مختلفة.")
                 return
             
-            # Get the first result and play it
+            # Get the first result and add it to the chat's play queue
             title, video_id = results[0]
-            url = f"https://www.youtube.com/watch?v={video_id}"
-            
-            await update.message.reply_text(f"تم العثور على: {title}\nجاري تشغيل الأغنية...")
-            
-            success, result = await play_music(url, update.effective_chat.id)
-            if success:
-                await update.message.reply_audio(
-                    audio=result['file'],
-                    title=result['title'],
-                    performer=result['performer'],
-                    duration=result['duration'],
-                    caption=f"تم تشغيل: {title}"
-                )
-            else:
-                await update.message.reply_text(f"حدث خطأ أثناء تشغيل الأغنية: {result}")
+            await enqueue_and_play(update, context, video_id, title)
             return
             
     elif message_text.startswith("فيد") or message_text.startswith("فيديو"):
@@ -1550,10 +1742,13 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         query = message_text.split(" ", 1)
         if len(query) > 1:
             search_query = query[1]
-            await update.message.reply_text(f"جاري البحث عن: {search_query}")
             
-            # Search for music
-            results = await search_youtube(search_query)
+            # Answer from the local library first when it has a good match
+            record_event("searches_performed")
+            results = search_local_library(search_query)
+            if not results:
+                await update.message.reply_text(f"جاري البحث عن: {search_query}")
+                results = await search_youtube(search_query)
             if not results:
                 await update.message.reply_text("لم أتمكن من العثور على نتائج للبحث. حاول مرة أخرى بكلمات مختلفة.")
                 return
@@ -1591,19 +1786,33 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
             
             await update.message.reply_text(f"تم العثور على: {title}\nجاري تحميل الأغنية...")
             
-            success, result = await download_music(url)
+            success, result = await download_music(url, update.effective_user.id)
             if success:
-                await update.message.reply_audio(
+                record_event("downloads_completed")
+                sent = await update.message.reply_audio(
                     audio=result['file'],
                     title=result['title'],
                     performer=result['performer'],
                     duration=result['duration'],
                     caption=f"تم تحميل: {title}"
                 )
+                remember_file_id(url, sent)
             else:
                 await update.message.reply_text(f"حدث خطأ أثناء تحميل الأغنية: {result}")
             return
             
+    elif message_text == "تخطي":
+        await skip_command(update, context)
+        return
+        
+    elif message_text == "قائمة التشغيل":
+        await queue_command(update, context)
+        return
+        
+    elif message_text == "مسح القائمة":
+        await clear_queue_command(update, context)
+        return
+        
     elif message_text == "قران" or message_text == "القران":
         await quran_command(update, context)
         return
@@ -1624,6 +1833,17 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         await source_command(update, context)
         return
     
+    # الردود التلقائية الخاصة بالمجموعة (فحص واحد للرسالة بكل عبارات المجموعة)
+    if update.effective_chat.type != "private" and update.message.text:
+        auto_reply = find_auto_reply(update.effective_chat.id, update.message.text)
+        if auto_reply:
+            chat = update.effective_chat
+            await update.message.reply_text(
+                render_response(auto_reply, update.effective_user.mention_html(), chat.title or ""),
+                parse_mode=ParseMode.HTML
+            )
+            return
+    
     # Generic suggestions
     if "موسيقى" in message_text or "أغنية" in message_text:
         await update.message.reply_text(
@@ -1638,6 +1858,68 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
             "هل تحتاج إلى استخدام ميزات الحماية؟ استخدم الأوامر /ban أو /kick أو /warn."
         )
 
+async def enqueue_and_play(update: Update, context: ContextTypes.DEFAULT_TYPE, video_id: str, title: str) -> None:
+    """Add a track to the chat's play queue and start delivering it if nothing is playing."""
+    chat_id = update.effective_chat.id
+    message = update.effective_message
+    
+    success, position = enqueue_track(chat_id, video_id, title, update.effective_user.id)
+    if not success:
+        await message.reply_text(position)
+        return
+    
+    if is_delivering(chat_id):
+        await message.reply_text(f"➕ تمت إضافة {title} إلى قائمة التشغيل (الموضع {position})")
+        return
+    
+    await message.reply_text(f"تم العثور على: {title}\nجاري تشغيل الأغنية...")
+    
+    async def deliver(track, ok, result) -> None:
+        if ok:
+            record_event("songs_played")
+            sent = await context.bot.send_audio(
+                chat_id=chat_id,
+                audio=result['file'],
+                title=result['title'],
+                performer=result['performer'],
+                duration=result['duration'],
+                caption=f"تم تشغيل: {result['title']}"
+            )
+            remember_file_id(track['id'], sent)
+        else:
+            await context.bot.send_message(chat_id=chat_id, text=f"حدث خطأ أثناء تشغيل الأغنية: {result}")
+    
+    # التسليم يتم في الخلفية حتى لا يتوقف البوت عن معالجة باقي الرسائل
+    context.application.create_task(run_queue(chat_id, deliver), update=update)
+
+async def queue_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Handle the /queue command to show the chat's play queue."""
+    queue = get_queue(update.effective_chat.id)
+    if not queue:
+        await update.message.reply_text("قائمة التشغيل فارغة.")
+        return
+    
+    text = "🎶 قائمة التشغيل:\n\n"
+    for i, track in enumerate(queue):
+        prefix = "▶️" if i == 0 else f"{i}."
+        text += f"{prefix} {track['title']}\n"
+    
+    await update.message.reply_text(text)
+
+async def skip_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Handle the /skip command to skip the current track."""
+    skipped = skip_track(update.effective_chat.id)
+    if not skipped:
+        await update.message.reply_text("قائمة التشغيل فارغة.")
+        return
+    
+    await update.message.reply_text(f"⏭️ تم تخطي: {skipped['title']}")
+
+async def clear_queue_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Handle the /clearqueue command to empty the chat's play queue."""
+    removed = clear_queue(update.effective_chat.id)
+    await update.message.reply_text(f"🗑️ تم مسح قائمة التشغيل ({removed} مقطع).")
+
 async def random_song_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handle the /random command to play a random song."""
     random_artists = ["عمرو دياب", "أم كلثوم", "تامر حسني", "إليسا", "فيروز", "محمد منير"]
@@ -1657,15 +1939,17 @@ async def random_song_command(update: Update, context: ContextTypes.DEFAULT_TYPE
     await update.message.reply_text("جاري تحميل الأغنية...")
     url = f"https://www.youtube.com/watch?v={video_id}"
     
-    success, result = await play_music(url, update.effective_chat.id)
+    success, result = await play_music(url, update.effective_chat.id, update.effective_user.id)
     if success:
-        await update.message.reply_audio(
+        record_event("songs_played")
+        sent = await update.message.reply_audio(
             audio=result['file'],
             title=result['title'],
             performer=result['performer'],
             duration=result['duration'],
             caption=f"تم تشغيل الأغنية العشوائية: {title}"
         )
+        remember_file_id(url, sent)
     else:
         await update.message.reply_text(f"حدث خطأ أثناء تشغيل الأغنية: {result}")
 
@@ -1841,10 +2125,109 @@ async def video_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
         f"يمكنك مشاهدته على: {url}"
     )
 
-def main() -> None:
-    """Start the bot."""
-    # Create the Application and pass it the bot's token
-    application = Application.builder().token(BOT_TOKEN).build()
+async def library_scan_job(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Rescan the music directory so new or changed files are picked up."""
+    try:
+        await refresh_music_library()
+    except Exception as e:
+        logger.error(f"خطأ في فحص مكتبة الموسيقى: {e}")
+
+async def metrics_snapshot_job(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Write the current metrics so the web app can serve them on /metrics."""
+    try:
+        await asyncio.get_running_loop().run_in_executor(None, write_snapshot)
+    except Exception as e:
+        logger.error(f"خطأ في كتابة لقطة المقاييس: {e}")
+
+async def count_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Count every command once, before the command's own handler runs."""
+    record_event("commands_used")
+
+async def stats_rollup_job(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Fold completed minutes of the statistics into their hourly buckets."""
+    rollup()
+
+async def stats_save_job(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Persist the statistics so they survive restarts."""
+    await save_stats()
+
+async def audio_file_ids_save_job(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Persist the Telegram file ids of sent audio used by inline search."""
+    await save_audio_file_ids()
+
+async def recording_flush_job(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Append recorded updates to today's recording file."""
+    await flush_recordings()
+
+async def moderation_audit_job(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Append finished moderation actions to the audit log."""
+    await flush_audit()
+
+async def decision_log_flush_job(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Append shadow mode decisions to today's decision log."""
+    await flush_decisions()
+
+async def on_startup(application: Application) -> None:
+    """Start background monitors once the event loop is running."""
+    start_loop_monitor()
+
+async def on_stop(application: Application) -> None:
+    """Finish queued moderation work while the bot can still reach the API."""
+    await drain_moderation()
+    await flush_audit()
+    await flush_cleanup_queue(application.bot)
+
+async def on_shutdown(application: Application) -> None:
+    """Release background resources when the bot stops."""
+    stop_loop_monitor()
+    shutdown_transcoder()
+    shutdown_image_pool()
+    write_snapshot()
+    rollup()
+    if is_primary_shard():
+        save_stats_sync()
+        save_custom_commands()
+        save_audio_file_ids_sync()
+    flush_recordings_sync()
+    flush_decisions_sync()
+    save_all_chat_commands()
+
+def build_application(bot: Optional[ExtBot] = None, background_jobs: bool = True) -> Application:
+    """Create the Application with every handler registered.
+    
+    Tools that replay or load-test the bot pass their own stub ``bot`` and disable
+    ``background_jobs`` so nothing is persisted or scheduled outside the handler graph.
+    """
+    # Create the Application with a bot that measures every Bot API call
+    if bot is None:
+        bot = InstrumentedBot(
+            BOT_TOKEN,
+            base_url=BOT_API_BASE_URL,
+            base_file_url=BOT_API_FILE_URL,
+            request=HTTPXRequest(connection_pool_size=256),
+            get_updates_request=HTTPXRequest()
+        )
+    builder = Application.builder().application_class(InstrumentedApplication).bot(bot)
+    if background_jobs:
+        builder = builder.post_init(on_startup).post_stop(on_stop).post_shutdown(on_shutdown)
+    application = builder.build()
+    
+    # Users registered by other shards (see utils/sharding.py)
+    def add_shared_user(user_id: int, value: bool) -> None:
+        application.bot_data.setdefault('users', set()).add(user_id)
+    register_shared("user", add_shared_user)
+    
+    # Record raw updates before any handler runs (opt-in, see RECORD_UPDATES);
+    # when sharded, the front process records them instead
+    if RECORD_UPDATES and background_jobs and not is_shard_worker():
+        application.add_handler(TypeHandler(Update, record_update), group=-100)
+        application.job_queue.run_repeating(recording_flush_job, interval=RECORDING_FLUSH_INTERVAL)
+    
+    # Count commands in a separate group so the command's own handler still runs
+    application.add_handler(MessageHandler(filters.COMMAND, count_command), group=-1)
+    
+    # User-defined commands first: one index lookup, and names that are not custom fall through
+    application.add_handler(CustomCommandHandler(custom_command_callback))
     
     # Add command handlers
     application.add_handler(CommandHandler("start", start))
@@ -1854,6 +2237,8 @@ def main() -> None:
     application.add_handler(CommandHandler("ban", ban_command))
     application.add_handler(CommandHandler("kick", kick_command))
     application.add_handler(CommandHandler("warn", warn_command))
+    application.add_handler(CommandHandler(["banimage", "unbanimage"], banimage_command))
+    application.add_handler(CommandHandler(["addcmd", "delcmd", "addreply", "delreply", "chatcmds"], chat_commands_command))
     
     # Add new handlers for the requested features
     application.add_handler(CommandHandler("random", random_song_command))
@@ -1863,6 +2248,9 @@ def main() -> None:
     application.add_handler(CommandHandler("quran", quran_command))
     application.add_handler(CommandHandler("songs", songs_command))
     application.add_handler(CommandHandler("video", video_command))
+    application.add_handler(CommandHandler("queue", queue_command))
+    application.add_handler(CommandHandler("skip", skip_command))
+    application.add_handler(CommandHandler("clearqueue", clear_queue_command))
     
     # We'll handle Arabic commands through message handlers instead of CommandHandler 
     # since Telegram doesn't support non-Latin command names
@@ -1870,12 +2258,50 @@ def main() -> None:
     # Add callback query handler for button presses
     application.add_handler(CallbackQueryHandler(button_callback))
     
+    # Inline music search (@bot <query>); non-blocking so the debounce wait doesn't hold up other updates
+    application.add_handler(InlineQueryHandler(inline_query_handler, block=False))
+    
     # Add handlers for group events
     application.add_handler(MessageHandler(filters.StatusUpdate.NEW_CHAT_MEMBERS, handle_new_member_join))
     application.add_handler(MessageHandler(filters.StatusUpdate.LEFT_CHAT_MEMBER, handle_member_left))
     
     # Add message handler for non-command messages (for text commands like "شغل" or "تشغيل")
     application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
+    application.add_handler(MessageHandler(filters.PHOTO, handle_photo))
+    
+    # Measure latency, errors and in-flight calls of every registered handler
+    # (InstrumentedApplication above also counts each update once all its handlers finished)
+    instrument_application(application)
+    
+    if background_jobs:
+        # Keep the music library index current (only changed files are re-read);
+        # one shard scans and publishes the new index to the others
+        if is_primary_shard():
+            application.job_queue.run_repeating(library_scan_job, interval=LIBRARY_SCAN_INTERVAL, first=1)
+        
+        # Roll up and persist the statistics in the background
+        application.job_queue.run_repeating(stats_rollup_job, interval=STATS_ROLLUP_INTERVAL)
+        if is_primary_shard():
+            application.job_queue.run_repeating(stats_save_job, interval=STATS_SAVE_INTERVAL)
+            application.job_queue.run_repeating(audio_file_ids_save_job, interval=AUDIO_FILE_IDS_SAVE_INTERVAL)
+        
+        application.job_queue.run_repeating(metrics_snapshot_job, interval=METRICS_SNAPSHOT_INTERVAL)
+        application.job_queue.run_repeating(moderation_audit_job, interval=MODERATION_AUDIT_FLUSH_INTERVAL)
+        application.job_queue.run_repeating(decision_log_flush_job, interval=DECISION_LOG_FLUSH_INTERVAL)
+    
+    return application
+
+def main() -> None:
+    """Start the bot."""
+    # Snapshots from a previous run (possibly with a different number of shards)
+    clear_snapshots()
+    
+    # Spread chats over several processes when one core is not enough
+    if BOT_SHARDS > 1:
+        run_sharded(BOT_SHARDS)
+        return
+    
+    application = build_application()
     
     # Start the Bot
     application.run_polling()
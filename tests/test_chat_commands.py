@@ -0,0 +1,96 @@
+import json
+
+import pytest
+
+from utils import chat_commands
+from utils.chat_commands import ChatCommandSet
+from utils.music_catalog import normalize_text
+
+CHAT = -200
+
+
+def matcher(*triggers):
+    return ChatCommandSet({"replies": {trigger: {"response": trigger} for trigger in triggers}})
+
+
+def match(chat_set, text):
+    return chat_set.match(normalize_text(text))
+
+
+def test_match_whole_words_only():
+    chat_set = matcher("hello")
+    assert match(chat_set, "say hello there") == "hello"
+    assert match(chat_set, "xhello") is None
+    assert match(chat_set, "hellos") is None
+
+
+def test_match_prefers_longest_trigger_at_same_start():
+    chat_set = matcher("hello", "hello world")
+    assert match(chat_set, "Hello, World!") == "hello world"
+    assert match(chat_set, "hello worlds") == "hello"
+
+
+def test_match_returns_leftmost_trigger():
+    chat_set = matcher("world", "hello world")
+    assert match(chat_set, "hello hello world") == "hello world"
+    assert match(chat_set, "world then hello world") == "world"
+
+
+def test_match_normalized_arabic_phrase():
+    chat_set = matcher("مرحبا بكم")
+    assert match(chat_set, "أهلا مرحبا بكم") == "مرحبا بكم"
+    assert match(chat_set, "مرحبا") is None
+
+
+def test_match_cost_does_not_depend_on_trigger_count():
+    chat_set = matcher(*(f"word{i} phrase" for i in range(1000)))
+    assert match(chat_set, "a message with word999 phrase in it") == "word999 phrase"
+
+
+@pytest.fixture
+def chat_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(chat_commands, "CHAT_COMMANDS_DIR", str(tmp_path))
+    monkeypatch.setattr(chat_commands, "publish", lambda *args, **kwargs: None)
+    chat_commands._loaded.clear()
+    chat_commands._scan_chats()
+    yield tmp_path
+    chat_commands._loaded.clear()
+    chat_commands._scan_chats()
+
+
+def read(chat_dir):
+    return json.loads((chat_dir / f"{CHAT}.json").read_text(encoding="utf-8"))
+
+
+def test_usage_save_keeps_changes_made_by_another_process(chat_dir):
+    chat_commands.add_chat_command(CHAT, "rules", "no spam", 1)
+    chat_commands.increment_chat_command_usage(CHAT, "rules")
+
+    # عملية أخرى أضافت أمرًا ولم يصل إشعارها بعد
+    data = read(chat_dir)
+    data["commands"]["links"] = dict(data["commands"]["rules"], usage_count=0)
+    (chat_dir / f"{CHAT}.json").write_text(json.dumps(data), encoding="utf-8")
+
+    chat_commands.save_all_chat_commands()
+    saved = read(chat_dir)
+    assert set(saved["commands"]) == {"rules", "links"}
+    assert saved["commands"]["rules"]["usage_count"] == 1
+
+
+def test_shared_change_keeps_unsaved_usage(chat_dir):
+    chat_commands.add_chat_command(CHAT, "rules", "no spam", 1)
+    for _ in range(3):
+        chat_commands.increment_chat_command_usage(CHAT, "rules")
+
+    chat_commands._apply_shared_change(CHAT, True)
+    assert CHAT not in chat_commands._loaded
+    assert read(chat_dir)["commands"]["rules"]["usage_count"] == 3
+
+
+def test_unreadable_file_is_not_overwritten(chat_dir):
+    (chat_dir / f"{CHAT}.json").write_text("{broken", encoding="utf-8")
+    chat_commands._scan_chats()
+
+    ok, _ = chat_commands.add_chat_command(CHAT, "rules", "no spam", 1)
+    assert not ok
+    assert (chat_dir / f"{CHAT}.json").read_text(encoding="utf-8") == "{broken"
@@ -0,0 +1,49 @@
+import pytest
+
+from utils import inline_search
+from utils.inline_search import cached_results
+
+NOW = 1_700_000_000.0
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    inline_search._search_cache.clear()
+    yield
+    inline_search._search_cache.clear()
+
+
+def cache(query, results, complete, when=NOW):
+    inline_search._search_cache[query] = (when, results, complete)
+
+
+def test_exact_query_is_served_even_when_incomplete():
+    results = [("🎵 song one", "a"), ("🎵 song two", "b")]
+    cache("song", results, complete=False)
+    assert cached_results("song", now=NOW) == results
+
+
+def test_longer_query_filters_a_complete_prefix():
+    cache("so", [("🎵 song one", "a"), ("🎵 sofa two", "b")], complete=True)
+    assert cached_results("song", now=NOW) == [("🎵 song one", "a")]
+
+
+def test_longer_query_ignores_an_incomplete_prefix():
+    cache("so", [("🎵 song one", "a"), ("🎵 sofa two", "b")], complete=False)
+    assert cached_results("song", now=NOW) is None
+
+
+def test_longest_usable_prefix_wins():
+    cache("so", [("🎵 song one", "a"), ("🎵 song two", "b")], complete=True)
+    cache("son", [("🎵 song two", "b")], complete=True)
+    assert cached_results("song t", now=NOW) == [("🎵 song two", "b")]
+
+
+def test_expired_entries_are_ignored():
+    cache("song", [("🎵 song one", "a")], complete=True, when=NOW - inline_search.INLINE_SEARCH_CACHE_TTL - 1)
+    assert cached_results("song", now=NOW) is None
+
+
+def test_prefix_without_matches_falls_through():
+    cache("so", [("🎵 sofa two", "b")], complete=True)
+    assert cached_results("song", now=NOW) is None
@@ -0,0 +1,105 @@
+import asyncio
+
+from telegram.error import BadRequest
+
+from utils import moderation_actions
+from utils.cleanup_queue import flush_pending
+from utils.moderation_actions import ModerationAction, merge_actions
+
+CHAT = -100
+
+
+def action(kind, user_id=0, message_ids=None):
+    return ModerationAction(kind, CHAT, user_id, message_ids)
+
+
+def summary(actions):
+    return [(a.kind, a.user_id, a.message_ids, a.revoke_messages) for a in actions]
+
+
+def test_deletes_are_combined():
+    merged = merge_actions([action("delete", 1, [10]), action("delete", 2, [11])])
+    assert summary(merged) == [("delete", 0, [10, 11], False)]
+
+
+def test_ban_revokes_messages_of_banned_user():
+    merged = merge_actions([action("delete", 5, [10]), action("ban", 5)])
+    assert summary(merged) == [("ban", 5, [10], True)]
+
+
+def test_kick_keeps_delete_and_does_not_revoke():
+    merged = merge_actions([action("delete", 5, [10]), action("ban", 5), action("unban", 5)])
+    assert summary(merged) == [
+        ("delete", 5, [10], False),
+        ("ban", 5, [], False),
+        ("unban", 5, [], False),
+    ]
+
+
+def test_kick_then_ban_leaves_user_banned():
+    merged = merge_actions([action("ban", 5), action("unban", 5), action("delete", 5, [10]), action("ban", 5)])
+    assert summary(merged) == [
+        ("ban", 5, [], False),
+        ("unban", 5, [], False),
+        ("ban", 5, [10], True),
+    ]
+
+
+def test_adjacent_duplicate_bans_collapse():
+    merged = merge_actions([action("ban", 5), action("delete", 5, [10]), action("ban", 5)])
+    assert summary(merged) == [("ban", 5, [10], True)]
+
+
+def test_restrict_dropped_only_for_users_staying_banned():
+    merged = merge_actions([action("restrict", 5), action("ban", 5), action("restrict", 6), action("ban", 6), action("unban", 6)])
+    assert [(a.kind, a.user_id) for a in merged] == [("ban", 5), ("restrict", 6), ("ban", 6), ("unban", 6)]
+
+
+class _FailingBanBot:
+    def __init__(self):
+        self.deleted = []
+
+    async def ban_chat_member(self, **kwargs):
+        raise BadRequest("Not enough rights to restrict/unrestrict chat member")
+
+    async def _post(self, method, data):
+        self.deleted.extend(data["message_ids"])
+        return True
+
+
+def test_failed_ban_still_deletes_messages():
+    bot = _FailingBanBot()
+
+    async def run():
+        moderation_actions.emit(bot, "delete", CHAT, 5, message_ids=[10])
+        moderation_actions.emit(bot, "ban", CHAT, 5)
+        await moderation_actions.drain()
+
+    asyncio.run(run())
+    del moderation_actions._audit_lines[:]
+    assert bot.deleted == [10]
+
+
+class _RecordingBot:
+    def __init__(self):
+        self.calls = []
+
+    async def _post(self, method, data):
+        self.calls.append((method, data["message_ids"]))
+        return True
+
+
+def test_deletes_from_separate_batches_share_one_request():
+    bot = _RecordingBot()
+
+    async def run():
+        moderation_actions.emit(bot, "delete", CHAT, 1, message_ids=[10])
+        await moderation_actions.drain()
+        moderation_actions.emit(bot, "delete", CHAT, 2, message_ids=[11])
+        await moderation_actions.drain()
+        assert bot.calls == []
+        await flush_pending(bot)
+
+    asyncio.run(run())
+    del moderation_actions._audit_lines[:]
+    assert bot.calls == [("deleteMessages", [10, 11])]
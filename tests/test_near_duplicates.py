@@ -0,0 +1,25 @@
+from utils import near_duplicates
+from utils.near_duplicates import check_message
+
+CHAT = -300
+
+
+def wave(texts):
+    near_duplicates.chat_indexes.pop(CHAT, None)
+    return [check_message(CHAT, user_id, 100 + user_id, text, now=1000 + user_id)[0] for user_id, text in enumerate(texts)]
+
+
+def test_short_wave_with_changed_digits_is_flagged():
+    texts = [f"رقم الواتس 05512345{n}7 للطلب" for n in range(4)]
+    assert wave(texts) == [False, False, True, True]
+
+
+def test_short_texts_with_different_words_are_not_flagged():
+    texts = ["اربح جائزة الان تواصل معنا", "مرحبا بالجميع في المجموعة", "من يعرف موعد المباراة اليوم", "شكرا لكم على المساعدة الكبيرة"]
+    assert wave(texts) == [False, False, False, False]
+
+
+def test_long_wave_with_small_edits_is_flagged():
+    base = "عرض خاص لفترة محدودة اشترك في القناة واحصل على هدية مجانية من المتجر رابط القناة في الوصف"
+    texts = [base, base + " الان", base.replace("هدية", "هديه"), base + " بسرعة"]
+    assert wave(texts) == [False, False, True, True]
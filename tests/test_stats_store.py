@@ -0,0 +1,53 @@
+from array import array
+
+import pytest
+
+from utils import stats_store
+from utils.stats_store import COUNTERS, HOUR_SLOTS, MINUTE_SLOTS, get_summary, record_event, rollup
+
+# بداية ساعة كاملة حتى لا تتجاوز الاختبارات حدود الساعات دون قصد
+BASE = 1_700_000_000 // 3600 * 3600
+
+
+@pytest.fixture(autouse=True)
+def empty_store(monkeypatch):
+    monkeypatch.setattr(stats_store, "_minute_counts", array("q", [0]) * (len(COUNTERS) * MINUTE_SLOTS))
+    monkeypatch.setattr(stats_store, "_hour_counts", array("q", [0]) * (len(COUNTERS) * HOUR_SLOTS))
+    monkeypatch.setattr(stats_store, "_minute_stamps", array("q", [-1]) * MINUTE_SLOTS)
+    monkeypatch.setattr(stats_store, "_hour_stamps", array("q", [-1]) * HOUR_SLOTS)
+    monkeypatch.setattr(stats_store, "_totals", array("q", [0]) * len(COUNTERS))
+    monkeypatch.setattr(stats_store, "_rolled_until", BASE // 60)
+    monkeypatch.setattr(stats_store, "_event_listeners", [])
+
+
+def test_rollup_moves_minutes_into_hours():
+    record_event("messages_received", 3, now=BASE + 10)
+    record_event("messages_received", 2, now=BASE + 70)
+    assert rollup(now=BASE + 180) == 2
+
+    summary = get_summary(now=BASE + 180)["messages_received"]
+    assert (summary["total"], summary["hour"], summary["day"], summary["week"]) == (5, 5, 5, 5)
+
+
+def test_back_dated_event_after_rollup_is_counted_once():
+    record_event("messages_received", 1, now=BASE + 10)
+    rollup(now=BASE + 600)
+
+    # دفعة متأخرة من عملية أخرى لدقيقة جُمّعت بالفعل
+    record_event("messages_received", 4, now=BASE + 20, notify=False)
+    rollup(now=BASE + 1200)
+
+    summary = get_summary(now=BASE + 1200)["messages_received"]
+    assert (summary["total"], summary["hour"], summary["day"], summary["week"]) == (5, 5, 5, 5)
+
+
+def test_back_dated_event_does_not_clear_newer_slots():
+    now = BASE + 10 * 86400
+    record_event("messages_received", 1, now=now)
+    rollup(now=now + 120)
+
+    # حدث أقدم من حلقتي الدقائق والساعات لا يمسح خانات أحدث تشترك معه في الموقع
+    record_event("messages_received", 7, now=now - 7 * 86400)
+
+    summary = get_summary(now=now + 120)["messages_received"]
+    assert (summary["total"], summary["day"], summary["week"]) == (8, 1, 1)
@@ -0,0 +1,20 @@
+from utils.transcoder import choose_bitrate, lower_bitrate
+
+MAX_SIZE = 50 * 1024 * 1024
+
+
+def test_choose_bitrate_fits_duration():
+    assert choose_bitrate(600, MAX_SIZE) == 192
+    assert choose_bitrate(3600, MAX_SIZE) == 96
+    assert choose_bitrate(100 * 3600, MAX_SIZE) is None
+
+
+def test_lower_bitrate_steps_down_in_proportion_to_size():
+    assert lower_bitrate(128, int(MAX_SIZE * 1.05), MAX_SIZE) == 96
+    assert lower_bitrate(96, int(MAX_SIZE * 1.02), MAX_SIZE) == 64
+    assert lower_bitrate(128, 3 * MAX_SIZE, MAX_SIZE) == 32
+
+
+def test_lower_bitrate_gives_up_when_nothing_fits():
+    assert lower_bitrate(128, 5 * MAX_SIZE, MAX_SIZE) is None
+    assert lower_bitrate(32, MAX_SIZE + 1, MAX_SIZE) is None
@@ -0,0 +1,4 @@
+"""
+أدوات التطوير والاختبار للبوت (قياس الأداء، المحاكاة، التشغيل دون اتصال)
+تُشغَّل من جذر المشروع، مثال: python -m tools.benchmark
+"""
@@ -0,0 +1,236 @@
+"""
+قياس أداء المسار الساخن لمعالجة رسائل المجموعات دون اتصال
+
+يشغل delete_spam أو handle_message على مجموعة رسائل مولدة باستخدام بوت مزيف، ثم يعرض:
+- عدد الرسائل في الثانية
+- زمن المعالجة p50 و p99 لكل رسالة
+- الذاكرة المخصصة لكل رسالة (ذروة الحجز المؤقت والكتل المتبقية بعد المعالجة)
+- عدد طلبات Bot API لكل رسالة
+
+تُحفظ النتائج كخط أساس لكل سيناريو في tools/benchmark_baselines.json لمقارنة التشغيلات
+
+أمثلة:
+    python -m tools.benchmark
+    python -m tools.benchmark --target message --messages 20000 --links 0.2
+    python -m tools.benchmark --save-baseline
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List
+
+from telegram.ext import Application, CallbackContext
+
+from tools.fakes import FakeBot, generate_corpus, parse_updates
+from utils.cleanup_queue import flush_pending
+from utils.moderation_actions import drain as drain_moderation
+
+BASELINES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_baselines.json")
+
+
+def _load_target(name: str) -> Callable:
+    """
+    استيراد الدالة المراد قياسها (الاستيراد هنا حتى لا يحمل main.py إلا عند الحاجة)
+    """
+    if name == "spam":
+        from utils.group_protection import delete_spam
+        return delete_spam
+    from main import handle_message
+    return handle_message
+
+
+def _reset_state() -> None:
+    """
+    تصفير الحالة المشتركة بين التشغيلات حتى تتطابق ظروف كل تمريرة
+    """
+    from utils import group_protection, moderation_actions
+    group_protection.user_message_count.clear()
+    group_protection.user_warnings.clear()
+    moderation_actions._audit_lines.clear()
+
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+async def run_benchmark(args: argparse.Namespace) -> Dict[str, Any]:
+    """
+    تشغيل تمريرة التوقيت ثم تمريرة قياس الذاكرة على نفس الرسائل
+
+    Returns:
+        نتائج القياس
+    """
+    target = _load_target(args.target)
+
+    bot = FakeBot(latency=args.api_latency)
+    await bot.initialize()
+    application = Application.builder().bot(bot).build()
+
+    raw_updates = generate_corpus(
+        args.messages,
+        chats=args.chats,
+        users_per_chat=args.users,
+        link_ratio=args.links,
+        forward_ratio=args.forwards,
+        profanity_ratio=args.profanity,
+        flood_ratio=args.flood,
+        seed=args.seed,
+    )
+    updates = parse_updates(raw_updates, bot)
+
+    async def process(update) -> Any:
+        context = CallbackContext.from_update(update, application)
+        return await target(update, context)
+
+    # تسخين: تحميل الوحدات وملء الذاكرات المؤقتة قبل القياس
+    _reset_state()
+    for update in updates[:args.warmup]:
+        await process(update)
+
+    # تمريرة التوقيت
+    _reset_state()
+    bot.reset_calls()
+    latencies: List[float] = []
+    actions = 0
+    started = time.perf_counter()
+    for update in updates:
+        t0 = time.perf_counter()
+        if await process(update):
+            actions += 1
+        latencies.append(time.perf_counter() - t0)
+    elapsed = time.perf_counter() - started
+    # إجراءات الإشراف تُنفذ خارج المعالج، فتُنتظر بعد التوقيت حتى تُحسب طلباتها
+    # (والحذف لا ينتظر نافذة الدفعة)
+    await drain_moderation()
+    await flush_pending(bot)
+    api_calls = sum(bot.api_calls.values())
+    api_by_method = dict(bot.api_calls)
+
+    # تمريرة الذاكرة (منفصلة لأن tracemalloc يبطئ التنفيذ)
+    _reset_state()
+    peak_bytes = 0
+    tracemalloc.start()
+    blocks_before = sys.getallocatedblocks()
+    for update in updates:
+        tracemalloc.reset_peak()
+        before, _ = tracemalloc.get_traced_memory()
+        await process(update)
+        _, peak = tracemalloc.get_traced_memory()
+        peak_bytes += peak - before
+    retained_blocks = sys.getallocatedblocks() - blocks_before
+    tracemalloc.stop()
+
+    await bot.shutdown()
+
+    latencies.sort()
+    count = len(updates)
+    return {
+        "messages": count,
+        "messages_per_sec": round(count / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(_percentile(latencies, 0.5) * 1000, 4),
+        "p99_ms": round(_percentile(latencies, 0.99) * 1000, 4),
+        "max_ms": round(latencies[-1] * 1000, 4) if latencies else 0.0,
+        "alloc_kib_per_msg": round(peak_bytes / count / 1024, 2) if count else 0.0,
+        "retained_blocks_per_msg": round(retained_blocks / count, 2) if count else 0.0,
+        "api_calls_per_msg": round(api_calls / count, 3) if count else 0.0,
+        "actions": actions,
+        "api_by_method": api_by_method,
+    }
+
+
+def scenario_key(args: argparse.Namespace) -> str:
+    """
+    مفتاح السيناريو في ملف خطوط الأساس (نفس المعاملات = نفس الرسائل)
+    """
+    return (
+        f"{args.target}:n={args.messages}:chats={args.chats}:users={args.users}:"
+        f"links={args.links}:fwd={args.forwards}:bad={args.profanity}:flood={args.flood}:"
+        f"seed={args.seed}:lat={args.api_latency}"
+    )
+
+
+def load_baselines() -> Dict[str, Dict[str, Any]]:
+    if not os.path.exists(BASELINES_FILE):
+        return {}
+    with open(BASELINES_FILE, "r", encoding="utf-8") as file:
+        return json.load(file)
+
+
+def save_baseline(key: str, result: Dict[str, Any]) -> None:
+    baselines = load_baselines()
+    baselines[key] = {**result, "recorded_at": int(time.time())}
+    with open(BASELINES_FILE, "w", encoding="utf-8") as file:
+        json.dump(baselines, file, ensure_ascii=False, indent=2)
+
+
+def print_report(key: str, result: Dict[str, Any], baseline: Dict[str, Any] = None) -> None:
+    """
+    طباعة النتائج مع نسبة التغير عن خط الأساس إن وجد
+    """
+    print(f"\nالسيناريو: {key}")
+    rows = [
+        ("messages/sec", "messages_per_sec", True),
+        ("p50 ms", "p50_ms", False),
+        ("p99 ms", "p99_ms", False),
+        ("max ms", "max_ms", False),
+        ("alloc KiB/msg", "alloc_kib_per_msg", False),
+        ("retained blocks/msg", "retained_blocks_per_msg", False),
+        ("api calls/msg", "api_calls_per_msg", False),
+    ]
+    for label, field, higher_is_better in rows:
+        line = f"  {label:<22}{result[field]:>12}"
+        if baseline and baseline.get(field):
+            change = (result[field] - baseline[field]) * 100 / baseline[field]
+            better = change > 0 if higher_is_better else change < 0
+            marker = "✅" if better else ("⚠️" if abs(change) >= 5 else "")
+            line += f"   baseline {baseline[field]:>10}  ({change:+.1f}%) {marker}"
+        print(line)
+    print(f"  {'actions':<22}{result['actions']:>12}")
+    print(f"  api by method: {result['api_by_method']}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="قياس أداء معالجة رسائل المجموعات دون اتصال")
+    parser.add_argument("--target", choices=["spam", "message"], default="spam",
+                        help="الدالة المراد قياسها: delete_spam أو handle_message")
+    parser.add_argument("--messages", type=int, default=5000, help="عدد الرسائل")
+    parser.add_argument("--chats", type=int, default=20, help="عدد المجموعات")
+    parser.add_argument("--users", type=int, default=50, help="عدد المستخدمين في كل مجموعة")
+    parser.add_argument("--links", type=float, default=0.05, help="نسبة الرسائل التي تحتوي روابط")
+    parser.add_argument("--forwards", type=float, default=0.03, help="نسبة الرسائل المحولة")
+    parser.add_argument("--profanity", type=float, default=0.04, help="نسبة الرسائل المسيئة")
+    parser.add_argument("--flood", type=float, default=0.05, help="نسبة رسائل دفعات الإغراق")
+    parser.add_argument("--seed", type=int, default=1, help="بذرة توليد الرسائل")
+    parser.add_argument("--warmup", type=int, default=200, help="عدد رسائل التسخين")
+    parser.add_argument("--api-latency", type=float, default=0.0, help="تأخير مصطنع لكل طلب API بالثواني")
+    parser.add_argument("--save-baseline", action="store_true", help="حفظ النتيجة كخط أساس للسيناريو")
+    parser.add_argument("--json", action="store_true", help="طباعة النتيجة بصيغة JSON فقط")
+    args = parser.parse_args()
+
+    # سجلات المعالجات (التحذيرات والحذف) تشوه التوقيت
+    logging.disable(logging.CRITICAL)
+
+    result = asyncio.run(run_benchmark(args))
+    key = scenario_key(args)
+
+    if args.json:
+        print(json.dumps({"scenario": key, **result}, ensure_ascii=False))
+    else:
+        print_report(key, result, load_baselines().get(key))
+
+    if args.save_baseline:
+        save_baseline(key, result)
+        if not args.json:
+            print("\nتم حفظ النتيجة كخط أساس.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""
+تقرير سجل قرارات وضع المراقبة
+
+يقرأ الملفات الثنائية التي يكتبها utils/decision_log.py ويعرض لكل قاعدة:
+- عدد مرات التقييم والمطابقة ونسبة المطابقة من الرسائل
+- كلفة التقييم (المتوسط وp99 بالميكروثانية والمجموع)
+- المطابقات التي انفردت بها القاعدة (لم تطابقها أي قاعدة أخرى على الرسالة نفسها)
+- أكثر العبارات مطابقة
+ثم جدول التداخل: عدد الرسائل التي طابقتها كل قاعدتين معًا
+
+أمثلة:
+    python -m tools.decision_report
+    python -m tools.decision_report data/decisions/decisions-20261019-*.bin --chat -1001234567890
+    python -m tools.decision_report --since 2026-10-01 --top 20 --json
+"""
+
+import argparse
+import json
+import sys
+from collections import Counter
+from datetime import datetime, timezone
+from itertools import combinations
+from typing import Any, Dict, Iterable, List, Optional
+
+from utils.decision_log import RULE_NAMES, Decision, decision_files, read_decisions
+
+
+def _percentile(sorted_values: List[int], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def _rule_name(rule_id: int) -> str:
+    return RULE_NAMES.get(rule_id, f"rule_{rule_id}")
+
+
+def aggregate(decisions: Iterable[Decision], top: int = 10) -> Dict[str, Any]:
+    """
+    تجميع السجلات في تقرير
+
+    Args:
+        decisions: السجلات
+        top: عدد العبارات المعروضة لكل قاعدة
+
+    Returns:
+        التقرير كقاموس
+    """
+    evaluations: Counter = Counter()
+    hits: Counter = Counter()
+    costs: Dict[int, List[int]] = {}
+    terms: Dict[int, Counter] = {}
+    # القواعد التي طابقت كل رسالة (الرسالة تُعرف بوقتها ومجموعتها وبصمتها)
+    matched_by_message: Dict[tuple, List[int]] = {}
+    messages = set()
+
+    for decision in decisions:
+        key = (decision.timestamp, decision.chat_id, decision.message_hash)
+        messages.add(key)
+        evaluations[decision.rule_id] += 1
+        costs.setdefault(decision.rule_id, []).append(decision.elapsed_ns)
+        if decision.matched:
+            hits[decision.rule_id] += 1
+            terms.setdefault(decision.rule_id, Counter())[decision.term] += 1
+            matched_by_message.setdefault(key, []).append(decision.rule_id)
+
+    unique_hits: Counter = Counter()
+    overlap: Counter = Counter()
+    for rule_ids in matched_by_message.values():
+        rule_ids = sorted(set(rule_ids))
+        if len(rule_ids) == 1:
+            unique_hits[rule_ids[0]] += 1
+        for first, second in combinations(rule_ids, 2):
+            overlap[(first, second)] += 1
+
+    rules = []
+    for rule_id in sorted(evaluations):
+        rule_costs = sorted(costs[rule_id])
+        total_ns = sum(rule_costs)
+        rules.append({
+            "rule": _rule_name(rule_id),
+            "evaluations": evaluations[rule_id],
+            "hits": hits[rule_id],
+            "hit_rate": round(hits[rule_id] / evaluations[rule_id], 4),
+            "unique_hits": unique_hits[rule_id],
+            "mean_us": round(total_ns / len(rule_costs) / 1000, 2),
+            "p99_us": round(_percentile(rule_costs, 0.99) / 1000, 2),
+            "total_ms": round(total_ns / 1e6, 2),
+            "top_terms": terms.get(rule_id, Counter()).most_common(top),
+        })
+
+    return {
+        "messages": len(messages),
+        "flagged_messages": len(matched_by_message),
+        "rules": rules,
+        "overlap": [
+            {"rules": [_rule_name(first), _rule_name(second)], "messages": count}
+            for (first, second), count in overlap.most_common()
+        ],
+    }
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    messages = report["messages"]
+    print(f"الرسائل: {messages}    الرسائل التي طابقت قاعدة واحدة على الأقل: {report['flagged_messages']}")
+    print()
+    print(f"{'القاعدة':<12}{'تقييم':>10}{'مطابقة':>10}{'النسبة':>9}{'منفردة':>9}{'متوسط µs':>11}{'p99 µs':>10}{'المجموع ms':>12}")
+    for rule in report["rules"]:
+        print(
+            f"{rule['rule']:<12}{rule['evaluations']:>10}{rule['hits']:>10}"
+            f"{rule['hit_rate'] * 100:>8.2f}%{rule['unique_hits']:>9}"
+            f"{rule['mean_us']:>11}{rule['p99_us']:>10}{rule['total_ms']:>12}"
+        )
+
+    for rule in report["rules"]:
+        if rule["top_terms"]:
+            print(f"\nأكثر العبارات مطابقة ({rule['rule']}):")
+            for term, count in rule["top_terms"]:
+                print(f"  {count:>8}  {term}")
+
+    if report["overlap"]:
+        print("\nالتداخل بين القواعد (رسائل طابقتها القاعدتان معًا):")
+        for item in report["overlap"]:
+            print(f"  {' + '.join(item['rules']):<24}{item['messages']:>8}")
+
+
+def _parse_day(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    return datetime.strptime(value, "%Y-%m-%d").replace(tzinfo=timezone.utc).timestamp()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="تقرير سجل قرارات وضع المراقبة")
+    parser.add_argument("files", nargs="*", help="ملفات السجل (الافتراضي: كل ملفات data/decisions)")
+    parser.add_argument("--chat", type=int, help="الاقتصار على مجموعة واحدة")
+    parser.add_argument("--since", help="من تاريخ (YYYY-MM-DD بتوقيت UTC)")
+    parser.add_argument("--until", help="حتى تاريخ (YYYY-MM-DD بتوقيت UTC، غير شامل)")
+    parser.add_argument("--top", type=int, default=10, help="عدد العبارات المعروضة لكل قاعدة")
+    parser.add_argument("--json", action="store_true", help="عرض التقرير بصيغة JSON")
+    args = parser.parse_args()
+
+    files = args.files or decision_files()
+    if not files:
+        print("لا توجد ملفات سجل قرارات.")
+        sys.exit(1)
+
+    since = _parse_day(args.since)
+    until = _parse_day(args.until)
+
+    def selected() -> Iterable[Decision]:
+        for path in files:
+            for decision in read_decisions(path):
+                if args.chat is not None and decision.chat_id != args.chat:
+                    continue
+                if since is not None and decision.timestamp < since:
+                    continue
+                if until is not None and decision.timestamp >= until:
+                    continue
+                yield decision
+
+    report = aggregate(selected(), top=args.top)
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        print_report(report)
+
+
+if __name__ == "__main__":
+    main()
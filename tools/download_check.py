@@ -0,0 +1,181 @@
+"""
+فحص مسار تنزيل الصوتيات دون إنترنت
+
+يولد ملفات WAV قصيرة ويقدمها من خادم HTTP محلي، ثم يشغل download_audio عليها بذاكرة مؤقتة
+في مجلد مؤقت ويتحقق من:
+- مشاركة التنزيل بين الطلبات المتزامنة لنفس المصدر
+- تقديم الطلب المتكرر من الذاكرة المؤقتة دون أي طلب للخادم
+- تخزين المحتوى المتطابق من مصدرين مختلفين مرة واحدة
+- حد التنزيلات المتزامنة لكل مستخدم
+- حذف الملفات الأقدم استخدامًا عند تجاوز حد حجم الذاكرة المؤقتة
+
+مثال:
+    python -m tools.download_check
+"""
+
+import argparse
+import asyncio
+import io
+import logging
+import math
+import os
+import shutil
+import struct
+import sys
+import tempfile
+import threading
+import wave
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Tuple
+
+from utils import downloader
+
+# خيارات yt-dlp لخادم الاختبار المحلي فقط (لا تُستخدم في التنزيلات الفعلية)
+LOCAL_YDL_OVERRIDES = {"nocheckcertificate": True}
+
+
+def make_wav(frequency: float, seconds: float = 1.0, rate: int = 8000) -> bytes:
+    """
+    توليد ملف WAV أحادي بنغمة واحدة
+    """
+    frames = b"".join(
+        struct.pack("<h", int(12000 * math.sin(2 * math.pi * frequency * i / rate)))
+        for i in range(int(seconds * rate))
+    )
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as file:
+        file.setnchannels(1)
+        file.setsampwidth(2)
+        file.setframerate(rate)
+        file.writeframes(frames)
+    return buffer.getvalue()
+
+
+class _CountingHandler(SimpleHTTPRequestHandler):
+    """
+    معالج ملفات ساكنة يحصي الطلبات لكل مسار
+    """
+
+    counts: Dict[str, int] = {}
+
+    def do_GET(self) -> None:
+        self.counts[self.path] = self.counts.get(self.path, 0) + 1
+        super().do_GET()
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+
+def serve(directory: str) -> Tuple[ThreadingHTTPServer, str]:
+    """
+    تشغيل خادم الملفات المحلي في خيط منفصل
+
+    Returns:
+        Tuple من (الخادم، الرابط الأساسي)
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", 0), partial(_CountingHandler, directory=directory))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+async def run_checks(base_url: str) -> List[Tuple[str, bool, str]]:
+    """
+    تشغيل الفحوص على الخادم المحلي
+
+    Returns:
+        قائمة من (اسم الفحص، النجاح، التفاصيل)
+    """
+    counts = _CountingHandler.counts
+    results: List[Tuple[str, bool, str]] = []
+
+    def check(name: str, ok: bool, detail: str = "") -> None:
+        results.append((name, bool(ok), detail))
+
+    def download(name: str, user_id=None):
+        return downloader.download_audio(f"{base_url}/{name}", user_id, LOCAL_YDL_OVERRIDES)
+
+    # تنزيل منفرد لمعرفة عدد الطلبات التي يحتاجها تنزيل واحد
+    ok, first = await download("a.wav")
+    check("single download", ok and os.path.exists(first["path"]), str(first if not ok else first["path"]))
+    if not ok:
+        return results
+    per_download = counts.get("/a.wav", 0)
+
+    # ثلاثة طلبات متزامنة لنفس المصدر تُنزّل مرة واحدة
+    batch = await asyncio.gather(*(download("b.wav") for _ in range(3)))
+    paths = {result["path"] for ok, result in batch if ok}
+    check(
+        "single-flight",
+        all(ok for ok, _ in batch) and len(paths) == 1 and counts.get("/b.wav", 0) == per_download,
+        f"{counts.get('/b.wav', 0)} requests for 3 callers (one download = {per_download})",
+    )
+
+    # الطلب المتكرر من الذاكرة المؤقتة
+    before = counts.get("/a.wav", 0)
+    ok, again = await download("a.wav")
+    check("cache hit", ok and again["path"] == first["path"] and counts.get("/a.wav", 0) == before)
+
+    # نفس المحتوى من رابط مختلف يُخزن مرة واحدة
+    ok, copy = await download("a-copy.wav")
+    check("content addressed", ok and copy["path"] == first["path"])
+
+    # مستخدم واحد لا يبدأ تنزيلين في نفس الوقت
+    (ok_c, _), (ok_d, limited) = await asyncio.gather(download("c.wav", 1), download("d.wav", 1))
+    check("per-user limit", ok_c and not ok_d, str(limited))
+
+    # حد الحجم: يكفي لملفين فقط، فيُحذف الأقدم استخدامًا عند إضافة ثالث
+    sizes = {entry["sha256"]: entry["size"] for entry in downloader.cache_index.values()}
+    downloader.AUDIO_CACHE_MAX_BYTES = 2 * max(sizes.values())
+    downloader.get_cached_audio(f"{base_url}/c.wav")
+    ok, _ = await download("d.wav")
+    kept = [name for name in ("a.wav", "b.wav", "c.wav", "d.wav") if downloader.get_cached_audio(f"{base_url}/{name}")]
+    check(
+        "size-bounded eviction",
+        ok and kept == ["c.wav", "d.wav"] and not os.path.exists(first["path"]),
+        f"kept {kept}",
+    )
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="فحص مسار تنزيل الصوتيات دون إنترنت")
+    parser.add_argument("--keep", action="store_true", help="الإبقاء على المجلد المؤقت بعد الفحص")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    if downloader.yt_dlp is None:
+        print("مكتبة yt-dlp غير مثبتة")
+        sys.exit(1)
+
+    work_dir = tempfile.mkdtemp(prefix="download_check_")
+    files_dir = os.path.join(work_dir, "files")
+    os.makedirs(files_dir)
+    tones = {"a.wav": 440, "b.wav": 550, "c.wav": 660, "d.wav": 770}
+    for name, frequency in tones.items():
+        with open(os.path.join(files_dir, name), "wb") as file:
+            file.write(make_wav(frequency))
+    shutil.copy(os.path.join(files_dir, "a.wav"), os.path.join(files_dir, "a-copy.wav"))
+
+    # ذاكرة مؤقتة معزولة حتى لا يلمس الفحص ملفات البوت
+    downloader.AUDIO_CACHE_DIR = os.path.join(work_dir, "cache")
+    downloader.AUDIO_CACHE_INDEX = os.path.join(downloader.AUDIO_CACHE_DIR, "index.json")
+    os.makedirs(downloader.AUDIO_CACHE_DIR)
+    downloader.cache_index.clear()
+
+    server, base_url = serve(files_dir)
+    try:
+        results = asyncio.run(run_checks(base_url))
+    finally:
+        server.shutdown()
+        if not args.keep:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    for name, ok, detail in results:
+        print(f"  {'ok' if ok else 'FAIL':<6}{name:<24}{detail}")
+    if not all(ok for _, ok, _ in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
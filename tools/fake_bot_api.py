@@ -0,0 +1,459 @@
+"""
+خادم محلي يحاكي Telegram Bot API لاختبارات التحميل والتكامل
+
+يطبق الطرق التي يستخدمها البوت (getUpdates وإرسال التحديثات عبر webhook، sendMessage،
+sendAudio، sendPhoto، deleteMessage، getChatMember، getChatAdministrators، banChatMember،
+restrictChatMember، editMessageText وغيرها)، مع تأخير قابل للتعديل وحقن أخطاء ومحاكاة
+RetryAfter (خطأ 429)
+
+لتوجيه البوت إليه:
+    python -m tools.fake_bot_api --port 8081
+    BOT_API_BASE_URL=http://127.0.0.1:8081/bot BOT_API_FILE_URL=http://127.0.0.1:8081/file/bot python run.py
+
+نقاط تحكم للاختبارات (خارج واجهة Telegram):
+    POST /control/updates   إضافة تحديثات (قائمة JSON) إلى طابور البوت
+    GET  /control/stats     عدد الطلبات لكل طريقة والأخطاء المحقونة وزمن الاستجابة
+    POST /control/config    تعديل التأخير ونسب الأخطاء أثناء التشغيل
+    POST /control/reset     تصفير العدادات والحالة
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import random
+import time
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from aiohttp import ClientSession, web
+
+logger = logging.getLogger(__name__)
+
+FAKE_BOT_USER = {
+    "id": 777000111,
+    "is_bot": True,
+    "first_name": "FakeBot",
+    "username": "fake_test_bot",
+    "can_join_groups": True,
+    "can_read_all_group_messages": True,
+    "supports_inline_queries": True,
+}
+
+# الطرق التي لا تعيد سوى True عند النجاح
+_BOOLEAN_METHODS = {
+    "unbanChatMember", "answerCallbackQuery", "answerInlineQuery", "setMyCommands",
+    "deleteMyCommands", "leaveChat", "pinChatMessage", "unpinChatMessage", "sendChatAction",
+    "approveChatJoinRequest", "declineChatJoinRequest", "setChatPermissions",
+}
+
+
+class FakeBotApi:
+    """
+    حالة الخادم المزيف: طابور التحديثات والرسائل وأعضاء المجموعات والعدادات
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        retry_after_rate: float = 0.0,
+        retry_after: int = 1,
+        admins: Optional[List[Tuple[int, int]]] = None,
+        seed: Optional[int] = None,
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.retry_after_rate = retry_after_rate
+        self.retry_after = retry_after
+        self._rng = random.Random(seed)
+        self._admins = set(admins or [])
+        self.reset()
+
+    def reset(self) -> None:
+        self.updates: List[Dict[str, Any]] = []
+        self._update_ids = itertools.count(1)
+        self._new_updates = asyncio.Event()
+        self._message_ids: Dict[int, itertools.count] = {}
+        self.messages: Set[Tuple[int, int]] = set()
+        self.member_status: Dict[Tuple[int, int], str] = {}
+        self.calls: Dict[str, int] = {}
+        self.injected_errors: Dict[str, int] = {}
+        self.sent_messages = 0
+        self.total_latency = 0.0
+        self.webhook_url: Optional[str] = None
+        self.webhook_secret: Optional[str] = None
+        self._webhook_task: Optional[asyncio.Task] = None
+
+        # لقياس زمن قرار الإشراف: وقت إضافة كل رسالة وآخر رسالة لكل مستخدم في كل مجموعة
+        self.acknowledged = 0
+        self._pushed_at: Dict[Tuple[int, int], float] = {}
+        self._user_pushed_at: Dict[Tuple[int, int], float] = {}
+        self.moderation_latencies: List[float] = []
+
+    # --- التحديثات ---
+
+    def push_update(self, update: Dict[str, Any]) -> int:
+        """
+        إضافة تحديث إلى الطابور مع رقم تسلسلي، وتسجيل رسالته حتى يمكن حذفها
+        """
+        update = dict(update)
+        update["update_id"] = next(self._update_ids)
+        message = update.get("message") or update.get("edited_message")
+        if update.get("callback_query"):
+            message = update["callback_query"].get("message")
+        if message:
+            now = time.monotonic()
+            chat_id = message["chat"]["id"]
+            self.messages.add((chat_id, message["message_id"]))
+            self._pushed_at[(chat_id, message["message_id"])] = now
+            if "from" in message:
+                self._user_pushed_at[(chat_id, message["from"]["id"])] = now
+            if update["update_id"] % 10000 == 0:
+                self._prune_push_times(now - 120)
+        self.updates.append(update)
+        self._new_updates.set()
+        return update["update_id"]
+
+    async def get_updates(self, offset: int, limit: int, timeout: float) -> List[Dict[str, Any]]:
+        # التحديثات الأقدم من offset تم تأكيد استلامها
+        if offset:
+            remaining = [u for u in self.updates if u["update_id"] >= offset]
+            self.acknowledged += len(self.updates) - len(remaining)
+            self.updates = remaining
+        if not self.updates and timeout > 0:
+            self._new_updates.clear()
+            try:
+                await asyncio.wait_for(self._new_updates.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self.updates[:limit]
+
+    async def _push_to_webhook(self) -> None:
+        """
+        إرسال التحديثات إلى webhook بدل getUpdates
+        """
+        headers = {"Content-Type": "application/json"}
+        if self.webhook_secret:
+            headers["X-Telegram-Bot-Api-Secret-Token"] = self.webhook_secret
+
+        async with ClientSession() as session:
+            while self.webhook_url:
+                if not self.updates:
+                    self._new_updates.clear()
+                    await self._new_updates.wait()
+                    continue
+                update = self.updates[0]
+                try:
+                    async with session.post(self.webhook_url, data=json.dumps(update), headers=headers) as response:
+                        if response.status < 300:
+                            self.updates.pop(0)
+                            continue
+                except Exception as e:
+                    logger.warning(f"فشل إرسال التحديث إلى webhook: {e}")
+                await asyncio.sleep(1)
+
+    def _prune_push_times(self, older_than: float) -> None:
+        self._pushed_at = {k: t for k, t in self._pushed_at.items() if t >= older_than}
+        self._user_pushed_at = {k: t for k, t in self._user_pushed_at.items() if t >= older_than}
+
+    def _moderation_done(self, pushed_at: Optional[float]) -> None:
+        if pushed_at is not None:
+            self.moderation_latencies.append(time.monotonic() - pushed_at)
+
+    # --- الرسائل والأعضاء ---
+
+    def _next_message_id(self, chat_id: int) -> int:
+        counter = self._message_ids.get(chat_id)
+        if counter is None:
+            counter = self._message_ids[chat_id] = itertools.count(1_000_000)
+        return next(counter)
+
+    def _message(self, chat_id: int, **fields: Any) -> Dict[str, Any]:
+        message_id = self._next_message_id(chat_id)
+        self.messages.add((chat_id, message_id))
+        self.sent_messages += 1
+        message = {
+            "message_id": message_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "supergroup" if chat_id < 0 else "private"},
+            "from": FAKE_BOT_USER,
+        }
+        message.update({k: v for k, v in fields.items() if v is not None})
+        return message
+
+    def _chat_member(self, chat_id: int, user_id: int) -> Dict[str, Any]:
+        user = {"id": user_id, "is_bot": user_id == FAKE_BOT_USER["id"], "first_name": f"User{user_id % 1000}"}
+        if (chat_id, user_id) in self._admins or user_id == FAKE_BOT_USER["id"]:
+            return {
+                "status": "administrator", "user": user, "can_be_edited": False, "is_anonymous": False,
+                "can_manage_chat": True, "can_delete_messages": True, "can_manage_video_chats": True,
+                "can_restrict_members": True, "can_promote_members": False, "can_change_info": True,
+                "can_invite_users": True,
+            }
+
+        status = self.member_status.get((chat_id, user_id), "member")
+        if status == "kicked":
+            return {"status": "kicked", "user": user, "until_date": 0}
+        if status == "restricted":
+            permissions = {
+                name: False for name in (
+                    "can_change_info", "can_invite_users", "can_pin_messages", "can_send_messages",
+                    "can_send_polls", "can_send_other_messages", "can_add_web_page_previews",
+                    "can_manage_topics", "can_send_audios", "can_send_documents", "can_send_photos",
+                    "can_send_videos", "can_send_video_notes", "can_send_voice_notes",
+                )
+            }
+            return {"status": "restricted", "user": user, "is_member": True, "until_date": 0, **permissions}
+        return {"status": status, "user": user}
+
+    # --- تنفيذ الطرق ---
+
+    def execute(self, method: str, params: Dict[str, Any]) -> Tuple[int, Dict[str, Any]]:
+        """
+        تنفيذ طريقة API وإرجاع (رمز HTTP، جسم الرد)
+        """
+        chat_id = _as_int(params.get("chat_id"))
+        user_id = _as_int(params.get("user_id"))
+
+        if method == "getMe":
+            return _ok(FAKE_BOT_USER)
+        if method in ("deleteWebhook", "setWebhook"):
+            return _ok(True)
+        if method == "getWebhookInfo":
+            return _ok({"url": self.webhook_url or "", "has_custom_certificate": False, "pending_update_count": len(self.updates)})
+        if method == "sendMessage":
+            return _ok(self._message(chat_id, text=params.get("text", "")))
+        if method in ("sendAudio", "sendPhoto", "sendDocument", "sendVideo", "sendVoice", "sendAnimation"):
+            return _ok(self._message(chat_id, caption=params.get("caption")))
+        if method in ("editMessageText", "editMessageCaption", "editMessageReplyMarkup"):
+            if params.get("inline_message_id"):
+                return _ok(True)
+            message_id = _as_int(params.get("message_id"))
+            if (chat_id, message_id) not in self.messages:
+                return _error(400, "Bad Request: message to edit not found")
+            return _ok({
+                "message_id": message_id,
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "supergroup" if chat_id < 0 else "private"},
+                "from": FAKE_BOT_USER,
+                "text": params.get("text") or params.get("caption") or "",
+            })
+        if method == "deleteMessage":
+            key = (chat_id, _as_int(params.get("message_id")))
+            if key not in self.messages:
+                return _error(400, "Bad Request: message to delete not found")
+            self.messages.discard(key)
+            self._moderation_done(self._pushed_at.pop(key, None))
+            return _ok(True)
+        if method == "deleteMessages":
+            for message_id in _as_list(params.get("message_ids")):
+                key = (chat_id, int(message_id))
+                self.messages.discard(key)
+                self._moderation_done(self._pushed_at.pop(key, None))
+            return _ok(True)
+        if method == "getChatMember":
+            return _ok(self._chat_member(chat_id, user_id))
+        if method == "getChatAdministrators":
+            admins = [self._chat_member(c, u) for c, u in self._admins if c == chat_id]
+            return _ok(admins + [self._chat_member(chat_id, FAKE_BOT_USER["id"])])
+        if method == "getChat":
+            return _ok({"id": chat_id, "type": "supergroup" if chat_id < 0 else "private", "title": f"Group {abs(chat_id) % 1000}"})
+        if method == "banChatMember":
+            self.member_status[(chat_id, user_id)] = "kicked"
+            self._moderation_done(self._user_pushed_at.get((chat_id, user_id)))
+            return _ok(True)
+        if method == "unbanChatMember":
+            self.member_status[(chat_id, user_id)] = "left"
+            return _ok(True)
+        if method == "restrictChatMember":
+            self.member_status[(chat_id, user_id)] = "restricted"
+            self._moderation_done(self._user_pushed_at.get((chat_id, user_id)))
+            return _ok(True)
+        if method in _BOOLEAN_METHODS:
+            return _ok(True)
+        return _error(404, "Not Found: method not found")
+
+    async def handle(self, request: web.Request) -> web.Response:
+        """
+        معالج طلبات /bot<token>/<method>
+        """
+        method = request.match_info["method"]
+        params = await _read_params(request)
+        self.calls[method] = self.calls.get(method, 0) + 1
+
+        # getUpdates لا يتأخر ولا تُحقن فيه أخطاء حتى لا يتشوه تدفق التحديثات
+        if method == "getUpdates":
+            if self.webhook_url:
+                return web.json_response(_error(409, "Conflict: can't use getUpdates method while webhook is active")[1], status=409)
+            updates = await self.get_updates(
+                _as_int(params.get("offset")) or 0,
+                _as_int(params.get("limit")) or 100,
+                float(params.get("timeout") or 0),
+            )
+            return web.json_response(_ok(updates)[1])
+
+        delay = self.latency + (self._rng.uniform(0, self.jitter) if self.jitter else 0.0)
+        if delay:
+            await asyncio.sleep(delay)
+        self.total_latency += delay
+
+        roll = self._rng.random()
+        if roll < self.retry_after_rate:
+            self.injected_errors["retry_after"] = self.injected_errors.get("retry_after", 0) + 1
+            status, body = _error(429, f"Too Many Requests: retry after {self.retry_after}")
+            body["parameters"] = {"retry_after": self.retry_after}
+            return web.json_response(body, status=status)
+        if roll < self.retry_after_rate + self.error_rate:
+            self.injected_errors["server_error"] = self.injected_errors.get("server_error", 0) + 1
+            status, body = _error(500, "Internal Server Error: injected")
+            return web.json_response(body, status=status)
+
+        if method == "setWebhook":
+            self.webhook_url = params.get("url") or None
+            self.webhook_secret = params.get("secret_token")
+            if self.webhook_url and (self._webhook_task is None or self._webhook_task.done()):
+                self._webhook_task = asyncio.create_task(self._push_to_webhook())
+        elif method == "deleteWebhook":
+            self.webhook_url = None
+            self._new_updates.set()
+
+        status, body = self.execute(method, params)
+        return web.json_response(body, status=status)
+
+    # --- نقاط التحكم ---
+
+    async def control_updates(self, request: web.Request) -> web.Response:
+        payload = await request.json()
+        updates = payload if isinstance(payload, list) else [payload]
+        ids = [self.push_update(update) for update in updates]
+        return web.json_response({"ok": True, "update_ids": ids})
+
+    async def control_stats(self, request: web.Request) -> web.Response:
+        return web.json_response(self.stats())
+
+    async def control_config(self, request: web.Request) -> web.Response:
+        payload = await request.json()
+        for key in ("latency", "jitter", "error_rate", "retry_after_rate", "retry_after"):
+            if key in payload:
+                setattr(self, key, payload[key])
+        return web.json_response({"ok": True})
+
+    async def control_reset(self, request: web.Request) -> web.Response:
+        self.reset()
+        return web.json_response({"ok": True})
+
+    def stats(self) -> Dict[str, Any]:
+        calls = sum(count for method, count in self.calls.items() if method != "getUpdates")
+        return {
+            "calls": dict(self.calls),
+            "api_calls": calls,
+            "sent_messages": self.sent_messages,
+            "pending_updates": len(self.updates),
+            "acknowledged_updates": self.acknowledged,
+            "moderation_actions": len(self.moderation_latencies),
+            "injected_errors": dict(self.injected_errors),
+            "mean_injected_latency_ms": round(self.total_latency * 1000 / calls, 3) if calls else 0.0,
+        }
+
+    def make_app(self) -> web.Application:
+        app = web.Application(client_max_size=60 * 1024 * 1024)
+        app.router.add_route("*", "/bot{token}/{method}", self.handle)
+        app.router.add_post("/control/updates", self.control_updates)
+        app.router.add_get("/control/stats", self.control_stats)
+        app.router.add_post("/control/config", self.control_config)
+        app.router.add_post("/control/reset", self.control_reset)
+        return app
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8081) -> web.AppRunner:
+        """
+        تشغيل الخادم داخل حلقة الأحداث الحالية (للاستخدام من أدوات أخرى)
+
+        Returns:
+            المشغل، ويُوقف الخادم باستدعاء cleanup عليه
+        """
+        runner = web.AppRunner(self.make_app())
+        await runner.setup()
+        await web.TCPSite(runner, host, port).start()
+        return runner
+
+
+def _ok(result: Any) -> Tuple[int, Dict[str, Any]]:
+    return 200, {"ok": True, "result": result}
+
+
+def _error(code: int, description: str) -> Tuple[int, Dict[str, Any]]:
+    return code, {"ok": False, "error_code": code, "description": description}
+
+
+def _as_int(value: Any) -> Optional[int]:
+    try:
+        return int(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _as_list(value: Any) -> List[Any]:
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except ValueError:
+            return []
+    return value if isinstance(value, list) else []
+
+
+async def _read_params(request: web.Request) -> Dict[str, Any]:
+    """
+    قراءة معاملات الطلب من الرابط أو JSON أو النموذج (الملفات المرفوعة يكفي معرفة وجودها)
+    """
+    params: Dict[str, Any] = dict(request.query)
+    if request.method != "POST" or not request.can_read_body:
+        return params
+
+    if request.content_type == "application/json":
+        params.update(await request.json())
+        return params
+
+    form = await request.post()
+    for key, value in form.items():
+        params[key] = value if isinstance(value, str) else "<file>"
+    return params
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="خادم محلي يحاكي Telegram Bot API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency", type=float, default=0.0, help="تأخير ثابت لكل طلب بالثواني")
+    parser.add_argument("--jitter", type=float, default=0.0, help="تأخير عشوائي إضافي حتى هذه القيمة بالثواني")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="نسبة الطلبات التي تفشل بخطأ 500")
+    parser.add_argument("--retry-after-rate", type=float, default=0.0, help="نسبة الطلبات التي ترد بخطأ 429")
+    parser.add_argument("--retry-after", type=int, default=1, help="قيمة retry_after بالثواني")
+    parser.add_argument("--admin", action="append", default=[], metavar="CHAT:USER",
+                        help="تعيين مستخدم كمشرف في مجموعة (يمكن تكراره)")
+    parser.add_argument("--seed", type=int, help="بذرة حقن الأخطاء")
+    args = parser.parse_args()
+
+    logging.basicConfig(format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO)
+
+    admins = []
+    for item in args.admin:
+        chat, user = item.split(":")
+        admins.append((int(chat), int(user)))
+
+    api = FakeBotApi(
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        retry_after_rate=args.retry_after_rate,
+        retry_after=args.retry_after,
+        admins=admins,
+        seed=args.seed,
+    )
+    web.run_app(api.make_app(), host=args.host, port=args.port, print=None)
+
+
+if __name__ == "__main__":
+    main()
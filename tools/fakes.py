@@ -0,0 +1,227 @@
+"""
+كائنات مزيفة لتشغيل معالجات البوت دون اتصال بـ Telegram
+يحتوي على بوت يرد على طلبات Bot API بردود جاهزة، ومولد لتحديثات رسائل المجموعات
+بنصوص عربية وإنجليزية واقعية مع نسب قابلة للتعديل من الروابط والرسائل المحولة
+والكلمات المسيئة ورسائل الإغراق
+"""
+
+import asyncio
+import itertools
+import random
+import time
+from typing import Any, Dict, List, Optional
+
+from telegram import Update
+from telegram.ext import ExtBot
+
+from config import BAD_WORDS
+
+# بيانات حساب البوت المزيف
+FAKE_BOT_USER = {
+    "id": 777000111,
+    "is_bot": True,
+    "first_name": "FakeBot",
+    "username": "fake_test_bot",
+}
+
+# معرفات المستخدمين والمجموعات المزيفة تبدأ من هذه القيم حتى لا تتداخل مع معرف المالك
+FIRST_USER_ID = 10_000_000
+FIRST_CHAT_ID = -100_000_000_000
+
+ARABIC_WORDS = [
+    "السلام", "عليكم", "صباح", "الخير", "مساء", "كيف", "حالكم", "اليوم", "الشباب",
+    "المجموعة", "شكرا", "جزاك", "الله", "خيرا", "متى", "الموعد", "الدرس", "القادم",
+    "أغنية", "جميلة", "سمعت", "الجديدة", "رمضان", "كريم", "عيد", "مبارك", "نعم",
+    "لا", "ربما", "بكرة", "إن", "شاء", "تمام", "ممتاز", "فكرة", "رائعة", "سؤال",
+    "عندي", "مشكلة", "البرنامج", "الرابط", "أرسل", "الملف", "ساعدني", "أحتاج",
+]
+
+ENGLISH_WORDS = [
+    "hello", "everyone", "good", "morning", "how", "are", "you", "today", "thanks",
+    "great", "idea", "when", "is", "the", "next", "meeting", "song", "music", "play",
+    "please", "share", "file", "question", "problem", "with", "app", "update", "new",
+    "version", "ok", "sure", "maybe", "tomorrow", "weekend", "nice", "welcome", "team",
+]
+
+LINK_SAMPLES = [
+    "https://example.com/offer", "t.me/joinchat/AbCdEf", "bit.ly/3xYzAbc",
+    "www.free-gifts.net", "t.me/+QwErTy", "http://promo.example.org",
+]
+
+
+class FakeBot(ExtBot):
+    """
+    بوت لا يتصل بالشبكة: كل طلب API يُحسب ويُرد عليه برد جاهز
+    """
+
+    def __init__(
+        self,
+        token: str = "123456:FAKE-TOKEN",
+        latency: float = 0.0,
+        member_status: str = "member",
+        admins: Optional[List[int]] = None,
+        **kwargs: Any,
+    ):
+        super().__init__(token, **kwargs)
+        # كائنات telegram مجمدة بعد الإنشاء، لذا نضيف الخصائص داخل _unfrozen
+        with self._unfrozen():
+            self._latency = latency
+            self._member_status = member_status
+            self._admins = admins or []
+            self._message_ids = itertools.count(1)
+            self.api_calls: Dict[str, int] = {}
+
+    def reset_calls(self) -> None:
+        self.api_calls.clear()
+
+    async def _do_post(self, endpoint: str, data: Dict[str, Any], *args: Any, **kwargs: Any) -> Any:
+        self.api_calls[endpoint] = self.api_calls.get(endpoint, 0) + 1
+        if self._latency:
+            await asyncio.sleep(self._latency)
+        return self._respond(endpoint, data)
+
+    def _message(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        chat_id = data.get("chat_id", 0)
+        return {
+            "message_id": next(self._message_ids),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "supergroup" if str(chat_id).startswith("-") else "private"},
+            "from": FAKE_BOT_USER,
+            "text": data.get("text") or data.get("caption") or "",
+        }
+
+    def _respond(self, endpoint: str, data: Dict[str, Any]) -> Any:
+        if endpoint == "getMe":
+            return FAKE_BOT_USER
+        if endpoint.startswith("send") or endpoint.startswith("edit"):
+            return self._message(data)
+        if endpoint == "getChatMember":
+            user_id = data.get("user_id")
+            status = "administrator" if user_id in self._admins else self._member_status
+            member = {"status": status, "user": {"id": user_id, "is_bot": False, "first_name": "User"}}
+            if status == "administrator":
+                member.update({
+                    "can_be_edited": False, "is_anonymous": False, "can_manage_chat": True,
+                    "can_delete_messages": True, "can_manage_video_chats": True,
+                    "can_restrict_members": True, "can_promote_members": False,
+                    "can_change_info": True, "can_invite_users": True,
+                })
+            return member
+        if endpoint == "getChatAdministrators":
+            return []
+        if endpoint == "getChat":
+            return {"id": data.get("chat_id", 0), "type": "supergroup", "title": "Group"}
+        return True
+
+
+def make_message(
+    update_id: int,
+    chat_id: int,
+    user_id: int,
+    text: str,
+    forwarded: bool = False,
+    chat_type: str = "supergroup",
+    date: Optional[int] = None,
+) -> Dict[str, Any]:
+    """
+    إنشاء تحديث رسالة نصية بصيغة JSON كما يرسلها Telegram
+
+    Args:
+        update_id: رقم التحديث
+        chat_id: معرف المحادثة
+        user_id: معرف المرسل
+        text: نص الرسالة
+        forwarded: هل الرسالة محولة
+        chat_type: نوع المحادثة
+        date: وقت الرسالة (الوقت الحالي إذا لم يحدد)
+
+    Returns:
+        قاموس التحديث
+    """
+    date = date or int(time.time())
+    message = {
+        "message_id": update_id,
+        "date": date,
+        "chat": {"id": chat_id, "type": chat_type, "title": f"Group {abs(chat_id) % 1000}"},
+        "from": {"id": user_id, "is_bot": False, "first_name": f"User{user_id % 1000}"},
+        "text": text,
+    }
+    if text.startswith("/"):
+        # بدون هذا الكيان لا تتعرف CommandHandler على الأمر
+        message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+    if forwarded:
+        message["forward_date"] = date - 3600
+        message["forward_from"] = {"id": user_id + 1, "is_bot": False, "first_name": "Source"}
+    return {"update_id": update_id, "message": message}
+
+
+def random_sentence(rng: random.Random) -> str:
+    """
+    جملة عشوائية من كلمات عربية (غالبًا) أو إنجليزية
+    """
+    words = ARABIC_WORDS if rng.random() < 0.7 else ENGLISH_WORDS
+    return " ".join(rng.choice(words) for _ in range(rng.randint(3, 14)))
+
+
+def generate_corpus(
+    count: int,
+    chats: int = 20,
+    users_per_chat: int = 50,
+    link_ratio: float = 0.05,
+    forward_ratio: float = 0.03,
+    profanity_ratio: float = 0.04,
+    flood_ratio: float = 0.05,
+    seed: int = 1,
+) -> List[Dict[str, Any]]:
+    """
+    توليد مجموعة رسائل مجموعات واقعية
+
+    Args:
+        count: عدد الرسائل
+        chats: عدد المجموعات
+        users_per_chat: عدد المستخدمين في كل مجموعة
+        link_ratio: نسبة الرسائل التي تحتوي روابط
+        forward_ratio: نسبة الرسائل المحولة
+        profanity_ratio: نسبة الرسائل التي تحتوي كلمات مسيئة
+        flood_ratio: نسبة الرسائل التي تأتي ضمن دفعات إغراق من مستخدم واحد
+        seed: بذرة العشوائية حتى تتكرر نفس المجموعة في كل تشغيل
+
+    Returns:
+        قائمة التحديثات بصيغة JSON
+    """
+    rng = random.Random(seed)
+    updates: List[Dict[str, Any]] = []
+    update_id = 1
+
+    while len(updates) < count:
+        chat_index = rng.randrange(chats)
+        chat_id = FIRST_CHAT_ID - chat_index
+        user_id = FIRST_USER_ID + chat_index * users_per_chat + rng.randrange(users_per_chat)
+
+        if rng.random() < flood_ratio / 15:
+            # دفعة إغراق: 15 رسالة متتالية من نفس المستخدم
+            for _ in range(min(15, count - len(updates))):
+                updates.append(make_message(update_id, chat_id, user_id, random_sentence(rng)))
+                update_id += 1
+            continue
+
+        text = random_sentence(rng)
+        roll = rng.random()
+        if roll < link_ratio:
+            text = f"{text} {rng.choice(LINK_SAMPLES)}"
+        elif roll < link_ratio + profanity_ratio:
+            text = f"{text} {rng.choice(BAD_WORDS)}"
+
+        forwarded = rng.random() < forward_ratio
+        updates.append(make_message(update_id, chat_id, user_id, text, forwarded=forwarded))
+        update_id += 1
+
+    return updates
+
+
+def parse_updates(raw_updates: List[Dict[str, Any]], bot: ExtBot) -> List[Update]:
+    """
+    تحويل تحديثات JSON إلى كائنات Update مرتبطة بالبوت
+    """
+    return [Update.de_json(raw, bot) for raw in raw_updates]
+
@@ -0,0 +1,375 @@
+"""
+مولد حمل لمجموعات متعددة لتقدير عدد المجموعات التي تستطيع عملية بوت واحدة حمايتها
+
+يشغل الخادم المزيف (tools/fake_bot_api.py) داخل هذه العملية، ويشغل البوت الحقيقي (run.py)
+كعملية منفصلة موجهة إليه، ثم يضخ حركة N مجموعة × M مستخدم: رسائل عادية ورسائل مزعجة
+(روابط، كلمات مسيئة، رسائل محولة)، وطلبات موسيقى من المكتبة المضمنة، وضغطات أزرار،
+ودفعات انضمام ومغادرة. في النهاية يعرض تقرير السعة:
+- التحديثات التي عالجها البوت في الثانية مقارنة بالمعدل المرسل
+- التراكم: ما استلمه البوت من الخادم ولم تكتمل معالجته بعد مهلة التصريف
+- زمن قرار الإشراف (من إضافة الرسالة حتى حذفها أو تقييد مرسلها) p50/p95/p99
+- عدد طلبات Bot API لكل تحديث
+- نمو ذاكرة عملية البوت (RSS)
+
+التحديثات المعالجة تُقرأ من لقطات مقاييس البوت (telegram_bot_update_duration_seconds_count)
+لا من getUpdates: مكتبة البوت تضع ما تجلبه في طابور غير محدود قبل تشغيل أي معالج، فعدد
+ما سلمه الخادم يقيس سرعة الجلب فقط. يعمل البوت بفترة لقطات قصيرة (SNAPSHOT_INTERVAL)
+
+يُعتبر السيناريو ضمن السعة إذا لم يبقَ تراكم، وعالج البوت 95% من المعدل المرسل على الأقل،
+ولم يتجاوز زمن الإشراف p99 الحد المحدد (--max-moderation-p99)
+
+يمكن تمرير عدة قيم لعدد المجموعات لتشغيل سيناريو لكل قيمة ومعرفة أين يبدأ التراكم:
+    python -m tools.load_generator --groups 10,50,200 --users 30 --rate 0.5 --duration 60
+
+ملاحظة: البوت يعمل بإعداداته وملفات بياناته المعتادة، لذا يُفضل تشغيله على نسخة تطوير
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import signal
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+from config import BAD_WORDS
+from tools.fake_bot_api import FAKE_BOT_USER, FakeBotApi
+from tools.fakes import FIRST_CHAT_ID, FIRST_USER_ID, LINK_SAMPLES, make_message, random_sentence
+from utils.metrics import METRICS_SNAPSHOT_FILE, processed_updates, read_snapshot
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# فترة كتابة لقطات المقاييس في البوت أثناء الاختبار (بالثواني)
+SNAPSHOT_INTERVAL = 0.5
+
+# أزرار لا تحتاج صلاحيات خاصة
+CALLBACK_CHOICES = ["commands", "add_to_group", "play_music", "back_to_main"]
+
+# معرفات الأغاني المضمنة (تُخدم من القرص دون تنزيل)
+MUSIC_IDS = ["song1", "song2", "song3"]
+
+
+class TrafficModel:
+    """
+    توليد تحديثات مجموعات وفق النسب المطلوبة
+    """
+
+    def __init__(self, args: argparse.Namespace, groups: int):
+        self.args = args
+        self.groups = groups
+        self.rng = random.Random(args.seed)
+        self._message_ids: Dict[int, int] = {}
+        self._next_joiner = FIRST_USER_ID + 5_000_000
+        self._menus = [
+            {
+                "message_id": 0,
+                "date": int(time.time()),
+                "chat": {"id": self._chat(i), "type": "supergroup", "title": f"Group {i}"},
+                "from": FAKE_BOT_USER,
+                "caption": "menu",
+            }
+            for i in range(groups)
+        ]
+
+    def _chat(self, index: int) -> int:
+        return FIRST_CHAT_ID - index
+
+    def _user(self, index: int) -> int:
+        return FIRST_USER_ID + index * self.args.users + self.rng.randrange(self.args.users)
+
+    def _next_message_id(self, chat_id: int) -> int:
+        self._message_ids[chat_id] = self._message_ids.get(chat_id, 0) + 1
+        return self._message_ids[chat_id]
+
+    def next_update(self) -> Dict[str, Any]:
+        index = self.rng.randrange(self.groups)
+        chat_id = self._chat(index)
+        user_id = self._user(index)
+        message_id = self._next_message_id(chat_id)
+        roll = self.rng.random()
+        args = self.args
+
+        if roll < args.callbacks:
+            user = {"id": user_id, "is_bot": False, "first_name": f"User{user_id % 1000}"}
+            return {
+                "callback_query": {
+                    "id": str(self.rng.getrandbits(48)),
+                    "from": user,
+                    "chat_instance": str(chat_id),
+                    "data": self.rng.choice(CALLBACK_CHOICES),
+                    # رسالة البوت في المجموعة التي تحمل الأزرار (يسجلها الخادم عند الإضافة)
+                    "message": self._menus[index],
+                }
+            }
+        roll -= args.callbacks
+
+        if roll < args.music:
+            text = f"/play {self.rng.choice(MUSIC_IDS)}"
+            return self._message(chat_id, message_id, user_id, text)
+        roll -= args.music
+
+        text = random_sentence(self.rng)
+        forwarded = False
+        if roll < args.spam:
+            kind = self.rng.randrange(3)
+            if kind == 0:
+                text = f"{text} {self.rng.choice(LINK_SAMPLES)}"
+            elif kind == 1:
+                text = f"{text} {self.rng.choice(BAD_WORDS)}"
+            else:
+                forwarded = True
+        return self._message(chat_id, message_id, user_id, text, forwarded)
+
+    def _message(self, chat_id: int, message_id: int, user_id: int, text: str, forwarded: bool = False) -> Dict[str, Any]:
+        update = make_message(0, chat_id, user_id, text, forwarded=forwarded)
+        update["message"]["message_id"] = message_id
+        return update
+
+    def membership_burst(self) -> List[Dict[str, Any]]:
+        """
+        دفعة انضمام لعدة مستخدمين جدد في مجموعة واحدة، ثم مغادرة بعضهم
+        """
+        index = self.rng.randrange(self.groups)
+        chat = {"id": self._chat(index), "type": "supergroup", "title": f"Group {index}"}
+        updates = []
+        joiners = []
+        for _ in range(self.args.burst_size):
+            self._next_joiner += 1
+            joiners.append({"id": self._next_joiner, "is_bot": False, "first_name": f"New{self._next_joiner % 1000}"})
+        for joiner in joiners:
+            updates.append({"message": {
+                "message_id": self._next_message_id(chat["id"]), "date": int(time.time()),
+                "chat": chat, "from": joiner, "new_chat_members": [joiner],
+            }})
+        for joiner in joiners[: len(joiners) // 3]:
+            updates.append({"message": {
+                "message_id": self._next_message_id(chat["id"]), "date": int(time.time()),
+                "chat": chat, "from": joiner, "left_chat_member": joiner,
+            }})
+        return updates
+
+
+def _rss_mb(pid: int) -> Optional[float]:
+    """
+    ذاكرة العملية المقيمة بالميجابايت (لينكس فقط)
+    """
+    try:
+        with open(f"/proc/{pid}/status", "r") as file:
+            for line in file:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        return None
+    return None
+
+
+def _processed() -> int:
+    """
+    عدد التحديثات التي اكتملت معالجتها في البوت حسب آخر لقطة مقاييس (مدمجة لكل العمليات)
+    """
+    return processed_updates(read_snapshot(os.path.join(PROJECT_DIR, METRICS_SNAPSHOT_FILE)))
+
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+async def run_scenario(args: argparse.Namespace, groups: int) -> Dict[str, Any]:
+    """
+    تشغيل سيناريو واحد: بوت جديد وخادم جديد وحركة بعدد المجموعات المطلوب
+
+    Returns:
+        تقرير السيناريو
+    """
+    api = FakeBotApi(
+        latency=args.api_latency,
+        jitter=args.api_jitter,
+        error_rate=args.error_rate,
+        retry_after_rate=args.retry_after_rate,
+        seed=args.seed,
+    )
+    runner = await api.start(port=args.port)
+
+    env = dict(os.environ)
+    env["BOT_API_BASE_URL"] = f"http://127.0.0.1:{args.port}/bot"
+    env["BOT_API_FILE_URL"] = f"http://127.0.0.1:{args.port}/file/bot"
+    env["METRICS_SNAPSHOT_INTERVAL"] = str(SNAPSHOT_INTERVAL)
+    bot_log = open(args.bot_log, "a") if args.bot_log else subprocess.DEVNULL
+    bot = subprocess.Popen([sys.executable, "run.py"], cwd=PROJECT_DIR, env=env, stdout=bot_log, stderr=bot_log)
+
+    try:
+        # انتظار بدء البوت في طلب التحديثات
+        deadline = time.monotonic() + 60
+        while not api.calls.get("getUpdates"):
+            if bot.poll() is not None or time.monotonic() > deadline:
+                raise RuntimeError("لم يبدأ البوت في طلب التحديثات")
+            await asyncio.sleep(0.2)
+
+        model = TrafficModel(args, groups)
+        baseline_calls = sum(v for k, v in api.calls.items() if k != "getUpdates")
+        baseline_received = api.acknowledged
+        baseline_processed = _processed()
+        rss_start = _rss_mb(bot.pid)
+        rss_samples = []
+
+        offered_rate = groups * args.rate
+        tick = 0.05
+        owed = 0.0
+        burst_owed = 0.0
+        pushed = 0
+        started = time.monotonic()
+        next_sample = started
+
+        while time.monotonic() - started < args.duration:
+            owed += offered_rate * tick
+            while owed >= 1:
+                api.push_update(model.next_update())
+                pushed += 1
+                owed -= 1
+
+            burst_owed += args.join_bursts / 60 * tick
+            while burst_owed >= 1:
+                for update in model.membership_burst():
+                    api.push_update(update)
+                    pushed += 1
+                burst_owed -= 1
+
+            if time.monotonic() >= next_sample:
+                rss = _rss_mb(bot.pid)
+                if rss is not None:
+                    rss_samples.append(rss)
+                next_sample += 1.0
+            await asyncio.sleep(tick)
+
+        sending_time = time.monotonic() - started
+        # انتظار لقطة تغطي نهاية فترة الإرسال
+        await asyncio.sleep(SNAPSHOT_INTERVAL * 2)
+        processed_during_load = _processed() - baseline_processed
+
+        # مهلة لتصريف ما تبقى: ما لم يجلبه البوت من الخادم وما جلبه ولم يعالجه بعد
+        drain_deadline = time.monotonic() + args.drain
+        while time.monotonic() < drain_deadline:
+            received = api.acknowledged - baseline_received
+            processed = _processed() - baseline_processed
+            if not api.updates and processed >= received:
+                break
+            await asyncio.sleep(0.2)
+        received = api.acknowledged - baseline_received
+        processed = _processed() - baseline_processed
+        backlog = len(api.updates) + max(received - processed, 0)
+
+        rss_end = _rss_mb(bot.pid)
+        api_calls = sum(v for k, v in api.calls.items() if k != "getUpdates") - baseline_calls
+        latencies = sorted(api.moderation_latencies)
+
+        return {
+            "groups": groups,
+            "users_per_group": args.users,
+            "offered_updates_per_sec": round(pushed / sending_time, 1),
+            "sustained_updates_per_sec": round(processed_during_load / sending_time, 1),
+            "received_updates": received,
+            "processed_updates": processed,
+            "backlog_after_drain": backlog,
+            "moderation_actions": len(latencies),
+            "moderation_p50_ms": round(_percentile(latencies, 0.5) * 1000, 1),
+            "moderation_p95_ms": round(_percentile(latencies, 0.95) * 1000, 1),
+            "moderation_p99_ms": round(_percentile(latencies, 0.99) * 1000, 1),
+            "api_calls_per_update": round(api_calls / max(processed, 1), 3),
+            "injected_errors": dict(api.injected_errors),
+            "rss_start_mb": round(rss_start, 1) if rss_start else None,
+            "rss_peak_mb": round(max(rss_samples), 1) if rss_samples else None,
+            "rss_end_mb": round(rss_end, 1) if rss_end else None,
+            "rss_growth_mb": round(rss_end - rss_start, 1) if rss_start and rss_end else None,
+        }
+    finally:
+        # إيقاف البوت بشكل طبيعي حتى يحفظ بياناته
+        if bot.poll() is None:
+            bot.send_signal(signal.SIGINT)
+            try:
+                bot.wait(timeout=20)
+            except subprocess.TimeoutExpired:
+                bot.kill()
+        if bot_log is not subprocess.DEVNULL:
+            bot_log.close()
+        await runner.cleanup()
+
+
+def within_capacity(report: Dict[str, Any], max_moderation_p99: float) -> bool:
+    """
+    هل عالج البوت السيناريو دون تراكم وبزمن إشراف مقبول
+    """
+    return (
+        report["backlog_after_drain"] == 0
+        and report["sustained_updates_per_sec"] >= 0.95 * report["offered_updates_per_sec"]
+        and report["moderation_p99_ms"] <= max_moderation_p99
+    )
+
+
+def print_report(reports: List[Dict[str, Any]], max_moderation_p99: float) -> None:
+    columns = [
+        ("groups", "المجموعات"),
+        ("offered_updates_per_sec", "المرسل/ث"),
+        ("sustained_updates_per_sec", "المعالج/ث"),
+        ("backlog_after_drain", "المتراكم"),
+        ("moderation_p50_ms", "إشراف p50"),
+        ("moderation_p99_ms", "إشراف p99"),
+        ("api_calls_per_update", "API/تحديث"),
+        ("rss_growth_mb", "نمو الذاكرة MB"),
+    ]
+    print()
+    print(" | ".join(title for _, title in columns))
+    for report in reports:
+        print(" | ".join(str(report.get(key)) for key, _ in columns))
+
+    # أكبر عدد مجموعات عالجها البوت دون تراكم وبزمن إشراف ضمن الحد
+    healthy = [r["groups"] for r in reports if within_capacity(r, max_moderation_p99)]
+    if healthy:
+        print(f"\nأكبر عدد مجموعات دون تراكم وبزمن إشراف p99 ≤ {max_moderation_p99:g} ms: {max(healthy)}")
+    else:
+        print(f"\nتراكمت التحديثات أو تجاوز زمن الإشراف p99 {max_moderation_p99:g} ms في كل السيناريوهات")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="مولد حمل لمجموعات متعددة وتقرير سعة البوت")
+    parser.add_argument("--groups", default="10,50,100", help="عدد المجموعات (قيمة أو قائمة مفصولة بفواصل)")
+    parser.add_argument("--users", type=int, default=30, help="عدد المستخدمين في كل مجموعة")
+    parser.add_argument("--rate", type=float, default=0.5, help="رسائل في الثانية لكل مجموعة")
+    parser.add_argument("--duration", type=float, default=30, help="مدة كل سيناريو بالثواني")
+    parser.add_argument("--spam", type=float, default=0.1, help="نسبة الرسائل المزعجة")
+    parser.add_argument("--music", type=float, default=0.02, help="نسبة طلبات الموسيقى")
+    parser.add_argument("--callbacks", type=float, default=0.03, help="نسبة ضغطات الأزرار")
+    parser.add_argument("--join-bursts", type=float, default=2, help="دفعات الانضمام في الدقيقة")
+    parser.add_argument("--burst-size", type=int, default=20, help="عدد المنضمين في كل دفعة")
+    parser.add_argument("--api-latency", type=float, default=0.02, help="تأخير الخادم المزيف لكل طلب")
+    parser.add_argument("--api-jitter", type=float, default=0.01, help="تأخير عشوائي إضافي")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="نسبة أخطاء 500 المحقونة")
+    parser.add_argument("--retry-after-rate", type=float, default=0.0, help="نسبة أخطاء 429 المحقونة")
+    parser.add_argument("--drain", type=float, default=15, help="مهلة تصريف التحديثات المتبقية بالثواني")
+    parser.add_argument("--max-moderation-p99", type=float, default=2000, help="أقصى زمن إشراف p99 مقبول (ms)")
+    parser.add_argument("--port", type=int, default=8092, help="منفذ الخادم المزيف")
+    parser.add_argument("--seed", type=int, default=1, help="بذرة توليد الحركة")
+    parser.add_argument("--bot-log", help="ملف لحفظ مخرجات البوت")
+    parser.add_argument("--json", help="حفظ التقرير في ملف JSON")
+    args = parser.parse_args()
+
+    reports = []
+    for groups in (int(value) for value in args.groups.split(",")):
+        print(f"تشغيل سيناريو {groups} مجموعة...", flush=True)
+        report = asyncio.run(run_scenario(args, groups))
+        print(json.dumps(report, ensure_ascii=False))
+        reports.append(report)
+
+    print_report(reports, args.max_moderation_p99)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as file:
+            json.dump(reports, file, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
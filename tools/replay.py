@@ -0,0 +1,167 @@
+"""
+إعادة تشغيل التحديثات المسجلة عبر معالجات البوت الحقيقية
+
+يقرأ ملف تسجيل (JSONL مضغوط أو عادي، كما يكتبه utils/update_recorder.py) ويمرر كل تحديث
+إلى Application الذي يبنيه main.build_application، مع بوت مزيف بدل Telegram.
+يمكن التشغيل بنفس سرعة التسجيل أو بأقصى سرعة، ويعرض عدد التحديثات في الثانية وزمن
+المعالجة والأخطاء وطلبات Bot API، ويمكن حفظ الملخص ومقارنته لاحقًا كاختبار تراجع
+
+ملاحظة: المعالجات التي تنزل الموسيقى تستخدم الشبكة أو الذاكرة المؤقتة كما في التشغيل الفعلي
+
+أمثلة:
+    python -m tools.replay data/recordings/updates-20261019.jsonl.gz
+    python -m tools.replay rec.jsonl.gz --speed 10
+    python -m tools.replay rec.jsonl.gz --fast --save-summary replay_summary.json
+    python -m tools.replay rec.jsonl.gz --fast --compare replay_summary.json
+"""
+
+import argparse
+import asyncio
+import gzip
+import json
+import logging
+import sys
+import time
+from typing import Any, Dict, Iterator, List
+
+from telegram import Update
+
+from tools.fakes import FakeBot
+
+
+def read_records(path: str) -> Iterator[Dict[str, Any]]:
+    """
+    قراءة سجلات التحديثات من الملف
+    """
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8") as file:
+        for line in file:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+async def replay(args: argparse.Namespace) -> Dict[str, Any]:
+    """
+    تمرير التحديثات المسجلة إلى معالجات البوت
+
+    Returns:
+        ملخص التشغيل
+    """
+    from main import build_application
+
+    bot = FakeBot(latency=args.api_latency)
+    application = build_application(bot=bot, background_jobs=False)
+
+    errors: Dict[str, int] = {}
+
+    async def on_error(update: object, context) -> None:
+        name = type(context.error).__name__
+        errors[name] = errors.get(name, 0) + 1
+        if args.verbose:
+            print(f"خطأ أثناء معالجة تحديث: {context.error!r}", file=sys.stderr)
+
+    application.add_error_handler(on_error)
+
+    await application.initialize()
+    bot.reset_calls()
+
+    latencies: List[float] = []
+    first_recorded = None
+    started = time.perf_counter()
+
+    for index, record in enumerate(read_records(args.recording)):
+        if args.limit and index >= args.limit:
+            break
+
+        if not args.fast:
+            # الانتظار حتى موعد التحديث بحسب توقيت التسجيل مقسومًا على معامل السرعة
+            if first_recorded is None:
+                first_recorded = record["t"]
+            due = (record["t"] - first_recorded) / args.speed
+            delay = due - (time.perf_counter() - started)
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+        update = Update.de_json(record["update"], bot)
+        t0 = time.perf_counter()
+        await application.process_update(update)
+        latencies.append(time.perf_counter() - t0)
+
+    # انتظار المهام التي أطلقتها المعالجات في الخلفية (مثل تسليم قائمة التشغيل)
+    pending = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+    if pending:
+        await asyncio.wait(pending, timeout=args.drain_timeout)
+
+    elapsed = time.perf_counter() - started
+    await application.shutdown()
+
+    latencies.sort()
+    count = len(latencies)
+    return {
+        "updates": count,
+        "elapsed_sec": round(elapsed, 3),
+        "updates_per_sec": round(count / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(_percentile(latencies, 0.5) * 1000, 3),
+        "p99_ms": round(_percentile(latencies, 0.99) * 1000, 3),
+        "errors": errors,
+        "api_by_method": dict(sorted(bot.api_calls.items())),
+    }
+
+
+def compare(summary: Dict[str, Any], expected: Dict[str, Any]) -> List[str]:
+    """
+    مقارنة السلوك (الأخطاء وطلبات API) مع ملخص محفوظ، دون مقارنة التوقيت
+
+    Returns:
+        قائمة الفروقات
+    """
+    differences = []
+    for field in ("updates", "errors", "api_by_method"):
+        if summary.get(field) != expected.get(field):
+            differences.append(f"{field}: المتوقع {expected.get(field)} والناتج {summary.get(field)}")
+    return differences
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="إعادة تشغيل التحديثات المسجلة عبر معالجات البوت")
+    parser.add_argument("recording", help="ملف التسجيل (jsonl أو jsonl.gz)")
+    parser.add_argument("--fast", action="store_true", help="التشغيل بأقصى سرعة بدل توقيت التسجيل")
+    parser.add_argument("--speed", type=float, default=1.0, help="معامل تسريع توقيت التسجيل")
+    parser.add_argument("--limit", type=int, default=0, help="الحد الأقصى لعدد التحديثات")
+    parser.add_argument("--api-latency", type=float, default=0.0, help="تأخير مصطنع لكل طلب API بالثواني")
+    parser.add_argument("--drain-timeout", type=float, default=30.0, help="مهلة انتظار مهام الخلفية بالثواني")
+    parser.add_argument("--save-summary", help="حفظ الملخص في ملف JSON")
+    parser.add_argument("--compare", help="مقارنة الناتج مع ملخص محفوظ (رمز خروج 1 عند الاختلاف)")
+    parser.add_argument("--verbose", action="store_true", help="عرض السجلات والأخطاء")
+    args = parser.parse_args()
+
+    if not args.verbose:
+        logging.disable(logging.CRITICAL)
+
+    summary = asyncio.run(replay(args))
+    print(json.dumps(summary, ensure_ascii=False, indent=2))
+
+    if args.save_summary:
+        with open(args.save_summary, "w", encoding="utf-8") as file:
+            json.dump(summary, file, ensure_ascii=False, indent=2)
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as file:
+            differences = compare(summary, json.load(file))
+        if differences:
+            print("\nاختلاف عن الملخص المحفوظ:")
+            for difference in differences:
+                print(f"  - {difference}")
+            sys.exit(1)
+        print("\nالسلوك مطابق للملخص المحفوظ.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,304 @@
+"""
+وحدة حظر الصور المكررة (سبام الصور)
+لكل صورة تُحسب بصمة إدراكية dHash من 64 بت: الصورة نفسها بعد قص بسيط أو إعادة ضغط أو تغيير
+الحجم تعطي بصمة تختلف في بتات قليلة فقط
+
+- يُنزّل أصغر حجم للصورة فقط (الصورة المصغرة)، وتُحسب البصمة في مجموعة عمليات بعيدًا عن حلقة الأحداث
+- بصمات كل ملف تُحفظ حسب file_unique_id فلا تُنزّل الصورة نفسها مرتين
+- بصمات الصور المحظورة في كل مجموعة مفهرسة في شجرة BK، فالبحث عن أقرب بصمة ضمن حد المسافة
+  لا يمر على كل البصمات
+وتُحفظ الصور المحظورة في data/banned_images.json
+"""
+
+import asyncio
+import io
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+import logging
+
+from telegram import Bot, PhotoSize
+
+from config import IMAGE_HASH_MAX_DISTANCE, IMAGE_HASH_WORKERS, IMAGE_HASH_CACHE_SIZE, MAX_BANNED_IMAGES
+from utils.sharding import publish, register_shared
+
+logger = logging.getLogger(__name__)
+
+# المسار إلى ملف تخزين الصور المحظورة
+BANNED_IMAGES_FILE = "data/banned_images.json"
+
+# أبعاد الصورة المصغرة التي تُحسب منها البصمة (9 أعمدة تعطي 8 مقارنات في كل صف)
+HASH_WIDTH = 9
+HASH_HEIGHT = 8
+
+
+def dhash(data: bytes) -> Optional[int]:
+    """
+    حساب بصمة dHash لصورة (تُنفذ في عملية منفصلة)
+
+    Args:
+        data: محتوى ملف الصورة
+
+    Returns:
+        البصمة (64 بت)، أو None إذا تعذرت قراءة الصورة
+    """
+    from PIL import Image
+
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            image.draft("L", (HASH_WIDTH * 4, HASH_HEIGHT * 4))
+            pixels = image.convert("L").resize((HASH_WIDTH, HASH_HEIGHT), Image.LANCZOS).tobytes()
+    except Exception:
+        return None
+
+    value = 0
+    for row in range(HASH_HEIGHT):
+        offset = row * HASH_WIDTH
+        for column in range(HASH_WIDTH - 1):
+            value = (value << 1) | (pixels[offset + column] > pixels[offset + column + 1])
+    return value
+
+
+class BKTree:
+    """
+    شجرة BK لبصمات 64 بت بمسافة Hamming: كل فرع يحمل مسافته عن العقدة الأم، فعند البحث
+    ضمن مسافة d من عقدة على بعد k لا يُزار إلا الفروع من k-d إلى k+d
+    """
+
+    __slots__ = ("root", "size")
+
+    def __init__(self, hashes: Optional[List[int]] = None):
+        # العقدة: [البصمة، {المسافة: العقدة الفرعية}]
+        self.root: Optional[list] = None
+        self.size = 0
+        for value in hashes or ():
+            self.add(value)
+
+    def add(self, value: int) -> None:
+        self.size += 1
+        if self.root is None:
+            self.root = [value, {}]
+            return
+        node = self.root
+        while True:
+            distance = (node[0] ^ value).bit_count()
+            if distance == 0:
+                self.size -= 1
+                return
+            child = node[1].get(distance)
+            if child is None:
+                node[1][distance] = [value, {}]
+                return
+            node = child
+
+    def nearest(self, value: int, max_distance: int) -> Optional[Tuple[int, int]]:
+        """
+        أقرب بصمة ضمن المسافة المحددة
+
+        Returns:
+            Tuple من (البصمة، المسافة)، أو None
+        """
+        if self.root is None:
+            return None
+        best: Optional[Tuple[int, int]] = None
+        limit = max_distance
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            distance = (node[0] ^ value).bit_count()
+            if distance <= limit:
+                best = (node[0], distance)
+                if distance == 0:
+                    break
+                # لا داعي بعدها لأي بصمة ليست أقرب
+                limit = distance - 1
+            for edge, child in node[1].items():
+                if distance - limit <= edge <= distance + limit:
+                    stack.append(child)
+        return best
+
+
+# الصور المحظورة لكل مجموعة: {البصمة بصيغة hex: {"by": المشرف، "t": وقت الحظر}}
+banned_images: Dict[int, Dict[str, Dict[str, Any]]] = {}
+
+# شجرة البحث لكل مجموعة فيها صور محظورة
+_trees: Dict[int, BKTree] = {}
+
+# بصمات الملفات المحسوبة حسب file_unique_id (None للملفات التي تعذرت قراءتها)
+_hash_cache: Dict[str, Optional[int]] = {}
+
+# مجموعة العمليات (تُنشأ عند أول استخدام)
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=IMAGE_HASH_WORKERS)
+    return _pool
+
+
+def shutdown_image_pool() -> None:
+    """
+    إيقاف مجموعة العمليات عند إيقاف البوت
+    """
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def has_banned_images(chat_id: int) -> bool:
+    """
+    هل في المجموعة صور محظورة (إذا لم يكن فيها فلا داعي لتنزيل أي صورة)
+    """
+    return chat_id in _trees
+
+
+async def photo_hash(bot: Bot, photos: List[PhotoSize]) -> Optional[int]:
+    """
+    بصمة صورة من رسالة (يُنزّل أصغر حجم فقط)
+
+    Args:
+        bot: كائن البوت
+        photos: أحجام الصورة كما في message.photo
+
+    Returns:
+        البصمة، أو None إذا تعذر تنزيل الصورة أو قراءتها
+    """
+    if not photos:
+        return None
+    smallest = min(photos, key=lambda size: size.width * size.height)
+    if smallest.file_unique_id in _hash_cache:
+        return _hash_cache[smallest.file_unique_id]
+
+    try:
+        file = await bot.get_file(smallest.file_id)
+        data = bytes(await file.download_as_bytearray())
+    except Exception as e:
+        logger.error(f"خطأ في تنزيل الصورة لحساب بصمتها: {e}")
+        return None
+
+    value = await asyncio.get_running_loop().run_in_executor(_get_pool(), dhash, data)
+    if len(_hash_cache) >= IMAGE_HASH_CACHE_SIZE:
+        _hash_cache.clear()
+    _hash_cache[smallest.file_unique_id] = value
+    return value
+
+
+def find_banned(chat_id: int, value: int) -> Optional[Tuple[int, int]]:
+    """
+    البحث عن صورة محظورة قريبة من البصمة
+
+    Returns:
+        Tuple من (بصمة الصورة المحظورة، المسافة)، أو None
+    """
+    tree = _trees.get(chat_id)
+    if tree is None:
+        return None
+    return tree.nearest(value, IMAGE_HASH_MAX_DISTANCE)
+
+
+def _rebuild(chat_id: int) -> None:
+    images = banned_images.get(chat_id)
+    if not images:
+        banned_images.pop(chat_id, None)
+        _trees.pop(chat_id, None)
+        return
+    _trees[chat_id] = BKTree([int(key, 16) for key in images])
+
+
+def _changed(chat_id: int) -> None:
+    _rebuild(chat_id)
+    save_banned_images()
+    publish("banned_images", chat_id, banned_images.get(chat_id))
+
+
+def ban_image(chat_id: int, value: int, user_id: int) -> Tuple[bool, str]:
+    """
+    حظر صورة في المجموعة
+
+    Args:
+        chat_id: معرف المجموعة
+        value: بصمة الصورة
+        user_id: المشرف الذي حظرها
+
+    Returns:
+        Tuple من (نجاح العملية، رسالة النتيجة)
+    """
+    if find_banned(chat_id, value):
+        return False, "هذه الصورة (أو صورة شبيهة بها) محظورة بالفعل."
+    images = banned_images.setdefault(chat_id, {})
+    if len(images) >= MAX_BANNED_IMAGES:
+        return False, f"لا يمكن حظر أكثر من {MAX_BANNED_IMAGES} صورة في المجموعة."
+
+    images[f"{value:016x}"] = {"by": user_id, "t": int(time.time())}
+    _changed(chat_id)
+    return True, "تم حظر الصورة. ستُحذف هي والصور الشبيهة بها تلقائيًا."
+
+
+def unban_image(chat_id: int, value: int) -> Tuple[bool, str]:
+    """
+    إلغاء حظر الصورة المحظورة الأقرب إلى البصمة
+
+    Returns:
+        Tuple من (نجاح العملية، رسالة النتيجة)
+    """
+    match = find_banned(chat_id, value)
+    if match is None:
+        return False, "هذه الصورة ليست محظورة."
+    del banned_images[chat_id][f"{match[0]:016x}"]
+    _changed(chat_id)
+    return True, "تم إلغاء حظر الصورة."
+
+
+def load_banned_images() -> None:
+    """
+    تحميل الصور المحظورة من الملف وبناء أشجار البحث
+    """
+    global banned_images
+
+    try:
+        if os.path.exists(BANNED_IMAGES_FILE):
+            with open(BANNED_IMAGES_FILE, "r", encoding="utf-8") as file:
+                data = json.load(file)
+            banned_images = {int(chat_id): images for chat_id, images in data.items()}
+    except Exception as e:
+        logger.error(f"خطأ في تحميل الصور المحظورة: {e}")
+        banned_images = {}
+
+    _trees.clear()
+    for chat_id in list(banned_images):
+        _rebuild(chat_id)
+
+
+def save_banned_images() -> None:
+    """
+    حفظ الصور المحظورة في الملف
+    """
+    try:
+        os.makedirs(os.path.dirname(BANNED_IMAGES_FILE), exist_ok=True)
+        temp_path = f"{BANNED_IMAGES_FILE}.{os.getpid()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump({str(chat_id): images for chat_id, images in banned_images.items()}, file, ensure_ascii=False, indent=4)
+        os.replace(temp_path, BANNED_IMAGES_FILE)
+    except Exception as e:
+        logger.error(f"خطأ في حفظ الصور المحظورة: {e}")
+
+
+def _apply_shared_images(chat_id: int, images: Optional[Dict[str, Dict[str, Any]]]) -> None:
+    """
+    تطبيق حظر أو إلغاء حظر أجرته عملية أخرى
+    """
+    if images is None:
+        banned_images.pop(chat_id, None)
+    else:
+        banned_images[chat_id] = images
+    _rebuild(chat_id)
+
+
+# تحميل الصور المحظورة عند استيراد الوحدة
+load_banned_images()
+register_shared("banned_images", _apply_shared_images)
@@ -0,0 +1,485 @@
+"""
+وحدة أوامر المجموعات والردود التلقائية
+لكل مجموعة أوامرها المخصصة (/name) وردود تلقائية تُرسل عند ظهور عبارة معينة في رسالة،
+إضافة إلى الأوامر العامة في utils/custom_commands.py (أمر المجموعة يسبق الأمر العام بالاسم نفسه)
+
+- بيانات كل مجموعة في ملف مستقل (data/chat_commands/<chat_id>.json) ولا تُحمّل إلا عند أول رسالة
+  من المجموعة، ويُحتفظ في الذاكرة بآخر CHAT_COMMANDS_CACHE_SIZE مجموعة نشطة فقط
+- كل عبارات الردود في المجموعة تُجمّع في شجرة كلمات (trie)، فتُفحص كل كلمة في الرسالة
+  بعدد من عمليات البحث في القاموس لا يتجاوز طول أطول عبارة، مهما كان عدد العبارات
+- نصوص الردود تُترجم إلى قوالب HTML عند الإضافة كما في الأوامر العامة (compile_response)
+- التعديلات وعدادات الاستخدام تُطبق على آخر نسخة من الملف، فلا تستبدل نسخة قديمة في الذاكرة
+  تعديلًا حفظته عملية أخرى ولم يصل إشعاره بعد
+"""
+
+import json
+import os
+import re
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Set, Tuple
+import logging
+
+from config import CHAT_COMMANDS_CACHE_SIZE, MAX_CHAT_COMMANDS, MAX_AUTO_REPLIES, AUTO_REPLY_COOLDOWN
+from utils.custom_commands import RESERVED_COMMANDS, compile_response
+from utils.music_catalog import normalize_text
+from utils.sharding import publish, register_shared
+
+logger = logging.getLogger(__name__)
+
+# مجلد ملفات المجموعات
+CHAT_COMMANDS_DIR = "data/chat_commands"
+
+# أقصى طول لاسم الأمر (حد Telegram)
+MAX_COMMAND_NAME_LENGTH = 32
+
+# رد الإضافة عندما يتعذر تحميل ملف المجموعة (حتى لا يُستبدل بملف جديد)
+UNREADABLE_MESSAGE = "تعذر قراءة ملف أوامر هذه المجموعة، لن يُعدل حتى يُصلح."
+
+_COMMAND_NAME = re.compile(r"^[a-z0-9_]{1,%d}$" % MAX_COMMAND_NAME_LENGTH)
+
+
+class ChatCommandSet:
+    """
+    أوامر مجموعة واحدة وردودها التلقائية، مع شجرة كلمات عبارات الردود
+    """
+
+    __slots__ = ("commands", "replies", "trie", "triggers", "pending_usage", "last_replied")
+
+    def __init__(self, data: Dict[str, Any]):
+        self.commands: Dict[str, Dict[str, Any]] = data.get("commands", {})
+        self.replies: Dict[str, Dict[str, Any]] = data.get("replies", {})
+        # الصيغة الموحدة للعبارة -> العبارة كما حُفظت
+        self.triggers: Dict[str, str] = {}
+        # كلمة -> العقدة التالية، والمفتاح None في العقدة يحمل العبارة التي تنتهي عندها
+        self.trie: Dict[Optional[str], Any] = {}
+        # زيادات عدادات الاستخدام التي لم تُحفظ بعد: اسم الأمر -> الزيادة
+        self.pending_usage: Dict[str, int] = {}
+        # آخر وقت رُد فيه على كل عبارة (لمنع تكرار الرد في المحادثات السريعة)
+        self.last_replied: Dict[str, float] = {}
+        self.compile()
+
+    def compile(self) -> None:
+        """
+        بناء شجرة الكلمات من كل عبارات الردود (العبارة تطابق كلمات كاملة فقط)
+        """
+        self.triggers = {}
+        self.trie = {}
+        for trigger in self.replies:
+            normalized = normalize_text(trigger)
+            if not normalized or normalized in self.triggers:
+                continue
+            self.triggers[normalized] = trigger
+            node = self.trie
+            for word in normalized.split():
+                node = node.setdefault(word, {})
+            node[None] = trigger
+
+    def match(self, text: str) -> Optional[str]:
+        """
+        أول عبارة تظهر في النص الموحد (الأطول عند تساوي البداية)
+
+        Args:
+            text: نص الرسالة بعد normalize_text
+
+        Returns:
+            العبارة كما حُفظت، أو None
+        """
+        trie = self.trie
+        words = text.split()
+        for start, word in enumerate(words):
+            node = trie.get(word)
+            if node is None:
+                continue
+            found = node.get(None)
+            for next_word in words[start + 1:]:
+                node = node.get(next_word)
+                if node is None:
+                    break
+                found = node.get(None, found)
+            if found is not None:
+                return found
+        return None
+
+    def to_json(self) -> Dict[str, Any]:
+        return {"commands": self.commands, "replies": self.replies}
+
+
+# المجموعات التي لها ملف بيانات (لا يُقرأ القرص لغيرها)
+_chats_with_data: Set[int] = set()
+
+# بيانات المجموعات المحملة، الأحدث استخدامًا في الآخر
+_loaded: "OrderedDict[int, ChatCommandSet]" = OrderedDict()
+
+
+def _path(chat_id: int) -> str:
+    return os.path.join(CHAT_COMMANDS_DIR, f"{chat_id}.json")
+
+
+def _scan_chats() -> None:
+    """
+    معرفة المجموعات التي لها ملف بيانات (أسماء الملفات فقط، دون قراءتها)
+    """
+    _chats_with_data.clear()
+    if not os.path.isdir(CHAT_COMMANDS_DIR):
+        return
+    for name in os.listdir(CHAT_COMMANDS_DIR):
+        if name.endswith(".json"):
+            try:
+                _chats_with_data.add(int(name[:-5]))
+            except ValueError:
+                continue
+
+
+def _read(chat_id: int) -> Optional[Dict[str, Any]]:
+    """
+    قراءة ملف المجموعة
+
+    Returns:
+        البيانات، أو None إذا تعذرت القراءة
+    """
+    try:
+        with open(_path(chat_id), "r", encoding="utf-8") as file:
+            return json.load(file)
+    except Exception as e:
+        logger.error(f"خطأ في تحميل أوامر المجموعة {chat_id}: {e}")
+        return None
+
+
+def _write(chat_id: int, data: Dict[str, Any]) -> None:
+    os.makedirs(CHAT_COMMANDS_DIR, exist_ok=True)
+    path = _path(chat_id)
+    if not data.get("commands") and not data.get("replies"):
+        if os.path.exists(path):
+            os.remove(path)
+        _chats_with_data.discard(chat_id)
+    else:
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump(data, file, ensure_ascii=False, indent=4)
+        os.replace(temp_path, path)
+        _chats_with_data.add(chat_id)
+
+
+def _save(chat_id: int, chat_set: ChatCommandSet) -> None:
+    """
+    حفظ بيانات المجموعة كاملة (بعد تعديل أجري على نسخة أعيد تحميلها من الملف)
+    """
+    try:
+        _write(chat_id, chat_set.to_json())
+        chat_set.pending_usage = {}
+    except Exception as e:
+        logger.error(f"خطأ في حفظ أوامر المجموعة {chat_id}: {e}")
+
+
+def _save_usage(chat_id: int, chat_set: ChatCommandSet) -> None:
+    """
+    إضافة زيادات عدادات الاستخدام إلى آخر نسخة محفوظة من الملف (دون كتابة النسخة التي في الذاكرة،
+    فقد تكون عملية أخرى عدلت الملف ولم يصل إشعارها بعد)
+    """
+    pending = chat_set.pending_usage
+    if not pending or chat_id not in _chats_with_data:
+        return
+    data = _read(chat_id)
+    if data is None:
+        return
+    chat_set.pending_usage = {}
+    for command_name, count in pending.items():
+        command = data.get("commands", {}).get(command_name)
+        if command is not None:
+            command["usage_count"] = command.get("usage_count", 0) + count
+    try:
+        _write(chat_id, data)
+    except Exception as e:
+        logger.error(f"خطأ في حفظ عدادات أوامر المجموعة {chat_id}: {e}")
+
+
+def _get(chat_id: int, create: bool = False) -> Optional[ChatCommandSet]:
+    """
+    بيانات المجموعة (تُحمّل من القرص عند أول استخدام)
+
+    Args:
+        chat_id: معرف المجموعة
+        create: إنشاء بيانات فارغة إذا لم يكن للمجموعة ملف
+
+    Returns:
+        بيانات المجموعة، أو None إذا لم يكن لها أوامر ولا ردود أو تعذرت قراءة ملفها
+    """
+    chat_set = _loaded.get(chat_id)
+    if chat_set is not None:
+        _loaded.move_to_end(chat_id)
+        return chat_set
+    if chat_id not in _chats_with_data and not create:
+        return None
+
+    data: Dict[str, Any] = {}
+    if chat_id in _chats_with_data:
+        data = _read(chat_id)
+        if data is None:
+            # لا نبدأ ببيانات فارغة حتى لا يستبدل أول حفظ الملف الذي تعذرت قراءته
+            return None
+
+    chat_set = _loaded[chat_id] = ChatCommandSet(data)
+    while len(_loaded) > CHAT_COMMANDS_CACHE_SIZE:
+        evicted_id, evicted = _loaded.popitem(last=False)
+        _save_usage(evicted_id, evicted)
+    return chat_set
+
+
+def _reload(chat_id: int, create: bool = False) -> Optional[ChatCommandSet]:
+    """
+    بيانات المجموعة من الملف قبل تعديلها، مع زيادات الاستخدام التي لم تُحفظ من النسخة المحملة
+
+    Returns:
+        بيانات المجموعة، أو None كما في _get (وتبقى النسخة المحملة إذا تعذرت قراءة الملف)
+    """
+    previous = _loaded.pop(chat_id, None)
+    chat_set = _get(chat_id, create)
+    if previous is None:
+        return chat_set
+    if chat_set is None:
+        _loaded[chat_id] = previous
+        return None
+    for command_name, count in previous.pending_usage.items():
+        command = chat_set.commands.get(command_name)
+        if command is not None:
+            command["usage_count"] = command.get("usage_count", 0) + count
+            chat_set.pending_usage[command_name] = count
+    chat_set.last_replied = previous.last_replied
+    return chat_set
+
+
+def _changed(chat_id: int, chat_set: ChatCommandSet) -> None:
+    _save(chat_id, chat_set)
+    # العمليات الأخرى تحذف نسختها وتعيد تحميل الملف عند الحاجة
+    publish("chat_commands", chat_id, chat_id in _chats_with_data)
+
+
+def _clean_name(command_name: str) -> str:
+    command_name = command_name.strip().lower()
+    return command_name[1:] if command_name.startswith("/") else command_name
+
+
+def add_chat_command(chat_id: int, command_name: str, response_text: str, created_by: int) -> Tuple[bool, str]:
+    """
+    إضافة أمر خاص بالمجموعة (أو استبدال رده إذا كان موجودًا)
+
+    Returns:
+        Tuple من (نجاح العملية، رسالة النتيجة)
+    """
+    command_name = _clean_name(command_name)
+    if not _COMMAND_NAME.match(command_name):
+        return False, f"اسم الأمر يجب أن يتكون من حروف إنجليزية صغيرة وأرقام و_ فقط (حتى {MAX_COMMAND_NAME_LENGTH} حرفًا)."
+    if command_name in RESERVED_COMMANDS:
+        return False, f"الأمر /{command_name} محجوز للاستخدام النظامي"
+
+    template, error = compile_response(response_text)
+    if template is None:
+        return False, f"تنسيق نص الرد غير صحيح: {error}"
+
+    chat_set = _reload(chat_id, create=True)
+    if chat_set is None:
+        return False, UNREADABLE_MESSAGE
+    existing = chat_set.commands.get(command_name)
+    if existing is None and len(chat_set.commands) >= MAX_CHAT_COMMANDS:
+        return False, f"لا يمكن إضافة أكثر من {MAX_CHAT_COMMANDS} أمر في المجموعة."
+
+    chat_set.commands[command_name] = {
+        "response": response_text,
+        "template": template,
+        "created_by": created_by,
+        "created_at": int(time.time()),
+        "usage_count": existing["usage_count"] if existing else 0,
+    }
+    _changed(chat_id, chat_set)
+    if existing:
+        return True, f"تم تعديل الأمر /{command_name} في هذه المجموعة"
+    return True, f"تم إضافة الأمر /{command_name} لهذه المجموعة"
+
+
+def remove_chat_command(chat_id: int, command_name: str) -> Tuple[bool, str]:
+    """
+    حذف أمر خاص بالمجموعة
+
+    Returns:
+        Tuple من (نجاح العملية، رسالة النتيجة)
+    """
+    command_name = _clean_name(command_name)
+    chat_set = _reload(chat_id)
+    if chat_set is None or command_name not in chat_set.commands:
+        return False, f"الأمر /{command_name} غير موجود في هذه المجموعة"
+    del chat_set.commands[command_name]
+    _changed(chat_id, chat_set)
+    return True, f"تم حذف الأمر /{command_name} من هذه المجموعة"
+
+
+def add_auto_reply(chat_id: int, trigger: str, response_text: str, created_by: int) -> Tuple[bool, str]:
+    """
+    إضافة رد تلقائي عند ظهور عبارة في رسالة (أو استبدال رده إذا كانت العبارة موجودة)
+
+    Returns:
+        Tuple من (نجاح العملية، رسالة النتيجة)
+    """
+    trigger = " ".join(trigger.split())
+    normalized = normalize_text(trigger)
+    if not normalized:
+        return False, "العبارة فارغة."
+
+    template, error = compile_response(response_text)
+    if template is None:
+        return False, f"تنسيق نص الرد غير صحيح: {error}"
+
+    chat_set = _reload(chat_id, create=True)
+    if chat_set is None:
+        return False, UNREADABLE_MESSAGE
+    # العبارة نفسها بصيغة أخرى (حروف كبيرة، تشكيل...) تستبدل القديمة
+    existing = chat_set.triggers.get(normalized)
+    if existing is None and len(chat_set.replies) >= MAX_AUTO_REPLIES:
+        return False, f"لا يمكن إضافة أكثر من {MAX_AUTO_REPLIES} رد تلقائي في المجموعة."
+    if existing is not None:
+        del chat_set.replies[existing]
+
+    chat_set.replies[trigger] = {
+        "response": response_text,
+        "template": template,
+        "created_by": created_by,
+        "created_at": int(time.time()),
+    }
+    chat_set.compile()
+    _changed(chat_id, chat_set)
+    if existing is not None:
+        return True, f"تم تعديل الرد على \"{trigger}\""
+    return True, f"تم إضافة رد تلقائي على \"{trigger}\""
+
+
+def remove_auto_reply(chat_id: int, trigger: str) -> Tuple[bool, str]:
+    """
+    حذف رد تلقائي
+
+    Returns:
+        Tuple من (نجاح العملية، رسالة النتيجة)
+    """
+    chat_set = _reload(chat_id)
+    existing = chat_set.triggers.get(normalize_text(trigger)) if chat_set else None
+    if existing is None:
+        return False, f"لا يوجد رد تلقائي على \"{trigger.strip()}\""
+    del chat_set.replies[existing]
+    chat_set.compile()
+    _changed(chat_id, chat_set)
+    return True, f"تم حذف الرد التلقائي على \"{existing}\""
+
+
+def get_chat_command(chat_id: int, command_name: str) -> Optional[Dict[str, Any]]:
+    """
+    أمر المجموعة بالاسم (الاسم بأحرف صغيرة بدون /)
+    """
+    chat_set = _get(chat_id)
+    return chat_set.commands.get(command_name) if chat_set else None
+
+
+def resolve_chat_command(chat_id: int, text: str, length: int, username: Optional[str]) -> Optional[str]:
+    """
+    اسم أمر المجموعة في بداية الرسالة
+
+    Args:
+        chat_id: معرف المجموعة
+        text: نص الرسالة
+        length: طول كيان الأمر في بداية النص (مع /)
+        username: اسم مستخدم البوت
+
+    Returns:
+        اسم الأمر، أو None إذا لم يكن أمرًا للمجموعة (أو كان موجهًا لبوت آخر)
+    """
+    chat_set = _get(chat_id)
+    if chat_set is None or not chat_set.commands:
+        return None
+    command_name, _, target = text[1:length].lower().partition("@")
+    if target and (not username or target != username.lower()):
+        return None
+    return command_name if command_name in chat_set.commands else None
+
+
+def increment_chat_command_usage(chat_id: int, command_name: str) -> None:
+    """
+    زيادة عداد استخدام أمر المجموعة (يُحفظ كل 5 استخدامات، وعند إخراج المجموعة من الذاكرة)
+    """
+    chat_set = _get(chat_id)
+    command = chat_set.commands.get(command_name) if chat_set else None
+    if command is None:
+        return
+    command["usage_count"] = command.get("usage_count", 0) + 1
+    chat_set.pending_usage[command_name] = chat_set.pending_usage.get(command_name, 0) + 1
+    if sum(chat_set.pending_usage.values()) >= 5:
+        _save_usage(chat_id, chat_set)
+
+
+def find_auto_reply(chat_id: int, text: str, now: Optional[float] = None) -> Optional[Dict[str, Any]]:
+    """
+    الرد التلقائي على رسالة (مرور واحد على كلمات الرسالة في شجرة عبارات المجموعة)
+
+    Args:
+        chat_id: معرف المجموعة
+        text: نص الرسالة
+        now: الوقت الحالي (للاختبار)
+
+    Returns:
+        بيانات الرد، أو None إذا لم تطابق أي عبارة أو رُد على العبارة قبل أقل من AUTO_REPLY_COOLDOWN
+    """
+    chat_set = _get(chat_id)
+    if chat_set is None or not chat_set.trie:
+        return None
+    trigger = chat_set.match(normalize_text(text))
+    if trigger is None:
+        return None
+
+    now = now or time.time()
+    if now - chat_set.last_replied.get(trigger, 0) < AUTO_REPLY_COOLDOWN:
+        return None
+    chat_set.last_replied[trigger] = now
+    return chat_set.replies[trigger]
+
+
+def get_chat_lists_text(chat_id: int) -> str:
+    """
+    قائمة أوامر المجموعة وردودها التلقائية (نص عادي)
+    """
+    chat_set = _get(chat_id)
+    if chat_set is None:
+        return "لا توجد أوامر أو ردود تلقائية خاصة بهذه المجموعة."
+    lines = []
+    if chat_set.commands:
+        lines.append("🤖 أوامر المجموعة:")
+        lines.extend(f"/{name} ({command.get('usage_count', 0)} استخدام)" for name, command in sorted(chat_set.commands.items()))
+    if chat_set.replies:
+        if lines:
+            lines.append("")
+        lines.append("💬 الردود التلقائية:")
+        lines.extend(f"• {trigger}" for trigger in sorted(chat_set.replies))
+    return "\n".join(lines)
+
+
+def save_all_chat_commands() -> None:
+    """
+    حفظ عدادات الاستخدام التي لم تُحفظ بعد (عند إيقاف البوت)
+    """
+    for chat_id, chat_set in list(_loaded.items()):
+        _save_usage(chat_id, chat_set)
+
+
+def _apply_shared_change(chat_id: int, has_data: bool) -> None:
+    """
+    عملية أخرى عدلت بيانات المجموعة وحفظتها: تُحذف النسخة المحملة وتُقرأ من الملف عند الحاجة
+    (بعد إضافة زياداتها غير المحفوظة إلى الملف الجديد)
+    """
+    if has_data:
+        _chats_with_data.add(chat_id)
+    else:
+        _chats_with_data.discard(chat_id)
+    chat_set = _loaded.pop(chat_id, None)
+    if chat_set is not None:
+        _save_usage(chat_id, chat_set)
+
+
+# معرفة المجموعات التي لها بيانات عند استيراد الوحدة (دون تحميلها)
+_scan_chats()
+register_shared("chat_commands", _apply_shared_change)
@@ -0,0 +1,406 @@
+"""
+وحدة قوائم الكلمات المسيئة الخاصة بكل مجموعة
+كل مجموعة يمكنها إضافة كلمات إلى القائمة العامة (config.BAD_WORDS) أو استثناء كلمات منها،
+وتُحفظ التخصيصات في data/chat_word_lists.json
+
+لكل قائمة فعلية (العامة ∪ الإضافات − الاستثناءات) تعبير نمطي واحد مُجمّع:
+- المجموعات بلا تخصيص تشترك كلها في تعبير القائمة العامة
+- عند تعديل قائمة مجموعة يُعاد تجميع تعبير تلك المجموعة وحدها
+
+قبل البحث يمر النص بمرحلة توحيد خطية (canonicalize) لمقاومة التمويه:
+- حذف المحارف الخفية (zero-width) والتطويل والتشكيل مع استبدال الحروف المتشابهة في مرور واحد
+- اختصار الحرف المكرر (كلللللب) بالقاعدة نفسها في الرسالة وفي الكلمات
+- نسخة ظل تجمع الحروف المفردة المفصولة بمسافات أو رموز (ك ل ب)، وخريطة مواضعها في النص الموحد
+  تُبنى عند طلبها فقط (لا يحتاجها البحث)
+ويبحث التعبير في النص الموحد ونسخة الظل معًا في بحث واحد، وكل حرف غير عربي في الكلمة
+يقبل تكراره (fuuuuck) دون أن يقل عدد تكراره عما في الكلمة (ass لا تطابق as)
+"""
+
+import hashlib
+import json
+import os
+import re
+from typing import Dict, List, Match, Optional, Pattern, Tuple
+import logging
+
+from config import BAD_WORDS
+from utils.sharding import publish, register_shared
+
+logger = logging.getLogger(__name__)
+
+# المسار إلى ملف تخزين القوائم
+CHAT_WORD_LISTS_FILE = "data/chat_word_lists.json"
+
+# الحروف المتشابهة التي يستخدمها الناس للتحايل على الفلتر
+BAD_WORD_REPLACEMENTS = {
+    '0': 'o', '1': 'i', '3': 'e', '4': 'a', '5': 's', '7': 't', '8': 'b',
+    '@': 'a', '$': 's', '+': 't', 'أ': 'ا', 'إ': 'ا', 'آ': 'ا',
+    'ة': 'ه', 'ى': 'ي', '_': '', '-': '', '.': '', ',': ''
+}
+
+# محارف تُحذف قبل البحث: المحارف الخفية وعلامات الاتجاه، التطويل، والتشكيل العربي
+_IGNORED_CHARACTERS = (
+    "\u00ad\u200b\u200c\u200d\u200e\u200f\u202a\u202b\u202c\u202d\u202e"
+    "\u2060\u2061\u2062\u2063\u2064\ufeff\u0640\u0670"
+    + "".join(chr(code) for code in range(0x064B, 0x0660))
+)
+_REPLACEMENT_TABLE = str.maketrans({
+    **BAD_WORD_REPLACEMENTS,
+    **{character: None for character in _IGNORED_CHARACTERS},
+})
+
+# الحرف العربي المكرر يُختصر إلى حرف واحد (التضعيف يُكتب بالشدة لا بتكرار الحرف)،
+# وغيره يُختصر من ثلاثة تكرارات أو أكثر إلى حرفين حتى لا تضيع الحروف المضاعفة فعلًا (ass، hell)
+_ARABIC_LETTER = re.compile(r"[\u0621-\u064a]")
+_REPEATED_LETTERS = re.compile(r"([\u0621-\u064a])\1+|(\w)\2{2,}")
+_NON_LETTERS = re.compile(r"\W+")
+_ANY_REPEAT = re.compile(r"(.)\1+")
+
+# ثلاثة حروف مفردة أو أكثر تفصل بينها مسافات أو رموز (ك ل ب، f u c k)
+_SPLIT_LETTERS = re.compile(r"(?<!\w)\w(?:\W+\w(?!\w)){2,}")
+
+# فاصل النص الموحد عن نسخة الظل (لا يطابقه أي جزء من التعبير)
+_STREAM_SEPARATOR = "\x00"
+_SEPARATOR_PATTERN = f"[^\\w{_STREAM_SEPARATOR}]*"
+
+# أقصى عدد كلمات مخصصة لكل مجموعة (في كل من الإضافات والاستثناءات)
+MAX_CUSTOM_WORDS = 200
+
+# تخصيصات كل مجموعة: {"add": [...], "exempt": [...]}
+chat_word_lists: Dict[int, Dict[str, List[str]]] = {}
+
+
+class WordMatcher:
+    """
+    تعبير نمطي مُجمّع لقائمة كلمات، مع ربط كل صيغة موحدة بالكلمة كما كُتبت في القائمة
+    """
+
+    __slots__ = ("pattern", "originals", "_stretched")
+
+    def __init__(self, words: List[str]):
+        # المفتاح هو هيكل الكلمة (بلا فواصل) حتى لا تتكرر الكلمة بصيغ مختلفة
+        self.originals: Dict[str, str] = {}
+        alternatives: Dict[str, str] = {}
+        for word in words:
+            skeleton = word_skeleton(word)
+            if skeleton and skeleton not in self.originals:
+                self.originals[skeleton] = word
+                # المسافة داخل العبارة تقبل أي فاصل أو لا شيء (كس امك، كسامك)
+                alternatives[skeleton] = _SEPARATOR_PATTERN.join(
+                    map(_stretchable, normalize_for_matching(word).split())
+                )
+        # الأطول أولًا حتى تُذكر العبارة الأطول عند تطابق عدة كلمات في الموضع نفسه
+        # (بلا مجموعات داخل التعبير: المجموعات تعطل البحث السريع عن بدايات البدائل)
+        ordered = sorted(alternatives, key=len, reverse=True)
+        self.pattern: Optional[Pattern] = (
+            re.compile("|".join(alternatives[skeleton] for skeleton in ordered)) if ordered else None
+        )
+        # للمطابقات الممطوطة: هيكل الكلمة بعد اختصار كل تكرار إلى حرف -> بدائلها بالترتيب نفسه
+        self._stretched: Dict[str, List[Tuple[str, str]]] = {}
+        for skeleton in ordered:
+            self._stretched.setdefault(_squeeze_all(skeleton), []).append(
+                (alternatives[skeleton], self.originals[skeleton])
+            )
+
+    def search(self, stream: str) -> Optional[str]:
+        """
+        البحث في ناتج canonicalize (النص الموحد ونسخة الظل معًا)
+        """
+        if self.pattern is None:
+            return None
+        match = self.pattern.search(stream)
+        if not match:
+            return None
+        skeleton = _NON_LETTERS.sub("", match.group())
+        original = self.originals.get(skeleton)
+        if original is not None:
+            return original
+        # حروف ممطوطة (fuuuck): البديل الذي تطابقه المطابقة كاملة
+        for alternative, original in self._stretched.get(_squeeze_all(skeleton), ()):
+            if re.fullmatch(alternative, match.group()):
+                return original
+        return None
+
+
+# التعبير المشترك للقائمة العامة، وتعبيرات المجموعات المخصصة فقط
+_global_matcher: Optional[WordMatcher] = None
+_chat_matchers: Dict[int, WordMatcher] = {}
+
+
+def normalize_for_matching(text: str) -> str:
+    """
+    توحيد النص قبل البحث عن الكلمات المسيئة (تطبق على الرسائل وعلى الكلمات نفسها)
+    """
+    return _REPEATED_LETTERS.sub(_squeeze_run, text.lower().translate(_REPLACEMENT_TABLE))
+
+
+def _squeeze_run(run: Match) -> str:
+    return run.group(1) or run.group(2) * 2
+
+
+def _squeeze_all(text: str) -> str:
+    return _ANY_REPEAT.sub(r"\1", text)
+
+
+def _stretchable(token: str) -> str:
+    """
+    تعبير لكلمة موحدة يقبل تكرار كل حرف غير عربي (الحروف العربية المكررة مختصرة في النص أصلًا)
+    """
+    return "".join(
+        re.escape(character) if _ARABIC_LETTER.match(character) or not character.isalnum()
+        else re.escape(character) + "+"
+        for character in token
+    )
+
+
+def word_skeleton(text: str) -> str:
+    """
+    هيكل الكلمة: الصيغة الموحدة بلا مسافات ولا فواصل
+    """
+    return _NON_LETTERS.sub("", normalize_for_matching(text))
+
+
+def _squeeze(letters: List[str], character: str) -> bool:
+    # نفس قاعدة _REPEATED_LETTERS لحرف يُضاف إلى نسخة الظل
+    if not letters or letters[-1] != character:
+        return False
+    return _ARABIC_LETTER.match(character) is not None or (len(letters) >= 2 and letters[-2] == character)
+
+
+def canonicalize(text: str, offsets: Optional[List[int]] = None) -> str:
+    """
+    توحيد رسالة للبحث في خطوة خطية واحدة
+
+    Args:
+        text: نص الرسالة
+        offsets: قائمة تُملأ بخريطة مواضع نسخة الظل في النص الموحد إذا مُررت
+            (الموضع i من نسخة الظل يقابل الموضع offsets[i] من النص الموحد)؛ البحث لا يحتاجها
+
+    Returns:
+        النص الموحد متبوعًا بنسخة الظل
+    """
+    canonical = normalize_for_matching(text)
+    shadow: List[str] = []
+    for run in _SPLIT_LETTERS.finditer(canonical):
+        if shadow:
+            shadow.append(_STREAM_SEPARATOR)
+            if offsets is not None:
+                offsets.append(offsets[-1])
+        start = run.start()
+        for index, character in enumerate(run.group()):
+            if _NON_LETTERS.match(character):
+                continue
+            # اختصار التكرار داخل نسخة الظل أيضًا (ك ل ل ل ب)
+            if _squeeze(shadow, character):
+                continue
+            shadow.append(character)
+            if offsets is not None:
+                offsets.append(start + index)
+
+    if not shadow:
+        return canonical
+    return canonical + _STREAM_SEPARATOR + "".join(shadow)
+
+
+def _global() -> WordMatcher:
+    global _global_matcher
+    if _global_matcher is None:
+        _global_matcher = WordMatcher(BAD_WORDS)
+    return _global_matcher
+
+
+def _rebuild(chat_id: int) -> None:
+    """
+    إعادة تجميع تعبير مجموعة واحدة بعد تعديل قائمتها
+    """
+    lists = chat_word_lists.get(chat_id)
+    if not lists or not (lists["add"] or lists["exempt"]):
+        chat_word_lists.pop(chat_id, None)
+        _chat_matchers.pop(chat_id, None)
+        return
+
+    exempt = {normalize_for_matching(word) for word in lists["exempt"]}
+    words = [word for word in BAD_WORDS if normalize_for_matching(word) not in exempt]
+    words.extend(lists["add"])
+    _chat_matchers[chat_id] = WordMatcher(words)
+
+
+def find_word(chat_id: int, text: str) -> Optional[str]:
+    """
+    البحث عن أول كلمة مسيئة في الرسالة حسب قائمة المجموعة
+
+    Args:
+        chat_id: معرف المجموعة
+        text: نص الرسالة
+
+    Returns:
+        الكلمة المطابقة كما كُتبت في القائمة، أو None
+    """
+    matcher = _chat_matchers.get(chat_id) or _global()
+    return matcher.search(canonicalize(text))
+
+
+def get_word_lists(chat_id: int) -> Dict[str, List[str]]:
+    """
+    إضافات المجموعة واستثناءاتها
+    """
+    lists = chat_word_lists.get(chat_id)
+    if not lists:
+        return {"add": [], "exempt": []}
+    return {"add": list(lists["add"]), "exempt": list(lists["exempt"])}
+
+
+def _in_global(word: str) -> bool:
+    return word_skeleton(word) in _global().originals
+
+
+def _changed(chat_id: int, lists: Dict[str, List[str]]) -> None:
+    chat_word_lists[chat_id] = lists
+    _rebuild(chat_id)
+    save_word_lists()
+    publish("chat_words", chat_id, chat_word_lists.get(chat_id))
+
+
+def add_word(chat_id: int, word: str) -> Tuple[bool, str]:
+    """
+    إضافة كلمة إلى قائمة المجموعة (أو إلغاء استثنائها إذا كانت مستثناة)
+
+    Returns:
+        Tuple من (نجاح العملية، رسالة النتيجة)
+    """
+    word = word.strip()
+    if not normalize_for_matching(word).strip():
+        return False, "الكلمة فارغة."
+
+    lists = chat_word_lists.get(chat_id) or {"add": [], "exempt": []}
+    normalized = normalize_for_matching(word)
+    exempted = [item for item in lists["exempt"] if normalize_for_matching(item) == normalized]
+    if exempted:
+        for item in exempted:
+            lists["exempt"].remove(item)
+        _changed(chat_id, lists)
+        return True, f"تم إلغاء استثناء الكلمة \"{word}\"، وستُحذف الرسائل التي تحتويها."
+
+    if _in_global(word) or any(normalize_for_matching(item) == normalized for item in lists["add"]):
+        return False, f"الكلمة \"{word}\" موجودة بالفعل في القائمة."
+    if len(lists["add"]) >= MAX_CUSTOM_WORDS:
+        return False, f"لا يمكن إضافة أكثر من {MAX_CUSTOM_WORDS} كلمة."
+
+    lists["add"].append(word)
+    _changed(chat_id, lists)
+    return True, f"تمت إضافة الكلمة \"{word}\" إلى قائمة المجموعة."
+
+
+def exempt_word(chat_id: int, word: str) -> Tuple[bool, str]:
+    """
+    استثناء كلمة من القائمة العامة في المجموعة (أو حذفها إذا كانت من إضافات المجموعة)
+
+    Returns:
+        Tuple من (نجاح العملية، رسالة النتيجة)
+    """
+    word = word.strip()
+    if not normalize_for_matching(word).strip():
+        return False, "الكلمة فارغة."
+
+    lists = chat_word_lists.get(chat_id) or {"add": [], "exempt": []}
+    normalized = normalize_for_matching(word)
+    added = [item for item in lists["add"] if normalize_for_matching(item) == normalized]
+    if added:
+        for item in added:
+            lists["add"].remove(item)
+        _changed(chat_id, lists)
+        return True, f"تم حذف الكلمة \"{word}\" من إضافات المجموعة."
+
+    if not _in_global(word):
+        return False, f"الكلمة \"{word}\" ليست في القائمة العامة."
+    if any(normalize_for_matching(item) == normalized for item in lists["exempt"]):
+        return False, f"الكلمة \"{word}\" مستثناة بالفعل."
+    if len(lists["exempt"]) >= MAX_CUSTOM_WORDS:
+        return False, f"لا يمكن استثناء أكثر من {MAX_CUSTOM_WORDS} كلمة."
+
+    lists["exempt"].append(word)
+    _changed(chat_id, lists)
+    return True, f"تم استثناء الكلمة \"{word}\" في هذه المجموعة."
+
+
+def word_id(word: str) -> str:
+    """
+    معرف قصير ثابت للكلمة يُستخدم في أزرار الحذف (لا يتغير بحذف كلمات أخرى من القائمة)
+    """
+    return hashlib.blake2b(word.encode("utf-8"), digest_size=4).hexdigest()
+
+
+def remove_entry(chat_id: int, kind: str, entry_id: str) -> Tuple[bool, str]:
+    """
+    حذف عنصر من إضافات المجموعة أو استثناءاتها حسب معرفه
+
+    Args:
+        chat_id: معرف المجموعة
+        kind: "add" أو "exempt"
+        entry_id: معرف الكلمة (word_id)
+
+    Returns:
+        Tuple من (نجاح العملية، رسالة النتيجة)
+    """
+    lists = chat_word_lists.get(chat_id)
+    if not lists or kind not in lists:
+        return False, "العنصر غير موجود."
+    word = next((item for item in lists[kind] if word_id(item) == entry_id), None)
+    if word is None:
+        return False, "العنصر غير موجود."
+    lists[kind].remove(word)
+    _changed(chat_id, lists)
+    return True, f"تم حذف \"{word}\"."
+
+
+def load_word_lists() -> None:
+    """
+    تحميل القوائم من الملف وتجميع تعبيرات المجموعات المخصصة
+    """
+    global chat_word_lists
+
+    try:
+        if os.path.exists(CHAT_WORD_LISTS_FILE):
+            with open(CHAT_WORD_LISTS_FILE, "r", encoding="utf-8") as file:
+                data = json.load(file)
+            chat_word_lists = {
+                int(chat_id): {"add": lists.get("add", []), "exempt": lists.get("exempt", [])}
+                for chat_id, lists in data.items()
+            }
+    except Exception as e:
+        logger.error(f"خطأ في تحميل قوائم كلمات المجموعات: {e}")
+        chat_word_lists = {}
+
+    _chat_matchers.clear()
+    for chat_id in list(chat_word_lists):
+        _rebuild(chat_id)
+
+
+def save_word_lists() -> None:
+    """
+    حفظ القوائم في الملف
+    """
+    try:
+        os.makedirs(os.path.dirname(CHAT_WORD_LISTS_FILE), exist_ok=True)
+        temp_path = f"{CHAT_WORD_LISTS_FILE}.{os.getpid()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump({str(chat_id): lists for chat_id, lists in chat_word_lists.items()}, file, ensure_ascii=False, indent=4)
+        os.replace(temp_path, CHAT_WORD_LISTS_FILE)
+    except Exception as e:
+        logger.error(f"خطأ في حفظ قوائم كلمات المجموعات: {e}")
+
+
+def _apply_shared_lists(chat_id: int, lists: Optional[Dict[str, List[str]]]) -> None:
+    """
+    تطبيق تعديل قائمة أجرته عملية أخرى (العملية التي أجرت التعديل هي التي تحفظه)
+    """
+    if lists is None:
+        chat_word_lists.pop(chat_id, None)
+    else:
+        chat_word_lists[chat_id] = lists
+    _rebuild(chat_id)
+
+
+# تحميل القوائم عند استيراد الوحدة
+load_word_lists()
+register_shared("chat_words", _apply_shared_lists)
@@ -0,0 +1,177 @@
+"""
+وحدة طابور الحذف والتنظيف
+بدل انتظار طلب حذف لكل رسالة مخالفة داخل المعالج، تُضاف معرفات الرسائل إلى طابور لكل مجموعة
+وتُحذف معًا بطلب deleteMessages واحد بعد نافذة قصيرة (أو فور بلوغ حد الطلب)
+
+رسائل التنبيه التي يرسلها البوت تُرسل في الخلفية أيضًا، وتُضاف إلى الطابور نفسه بعد انتهاء مدة بقائها
+"""
+
+import asyncio
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+import logging
+
+from telegram import Bot
+from telegram.error import BadRequest, TelegramError
+
+from config import DELETE_BATCH_WINDOW, DELETE_BATCH_MAX, NOTICE_TTL
+
+logger = logging.getLogger(__name__)
+
+# معرفات الرسائل المنتظرة للحذف لكل مجموعة
+_pending: Dict[int, List[int]] = {}
+
+# مهمة الحذف المجدولة لكل مجموعة
+_flush_tasks: Dict[int, asyncio.Task] = {}
+
+# مؤقتات حذف التنبيهات: (المجموعة، الرسالة) -> المؤقت
+_notice_timers: Dict[Tuple[int, int], asyncio.TimerHandle] = {}
+
+# مهام الخلفية (يُحتفظ بمرجع لها حتى لا تُجمع قبل انتهائها)
+_background: Set[asyncio.Task] = set()
+
+
+def _spawn(coro) -> asyncio.Task:
+    task = asyncio.create_task(coro)
+    _background.add(task)
+    task.add_done_callback(_background.discard)
+    return task
+
+
+def delete_later(bot: Bot, chat_id: int, message_ids: Iterable[int]) -> None:
+    """
+    إضافة رسائل إلى طابور الحذف
+
+    Args:
+        bot: كائن البوت
+        chat_id: معرف المجموعة
+        message_ids: معرفات الرسائل
+    """
+    pending = _pending.setdefault(chat_id, [])
+    pending.extend(message_ids)
+    if not pending:
+        return
+
+    if len(pending) >= DELETE_BATCH_MAX:
+        _spawn(_flush_chat(bot, chat_id))
+    elif chat_id not in _flush_tasks:
+        _flush_tasks[chat_id] = _spawn(_flush_after(bot, chat_id, DELETE_BATCH_WINDOW))
+
+
+def send_notice(
+    bot: Bot,
+    chat_id: int,
+    text: str,
+    parse_mode: Optional[str] = "HTML",
+    ttl: Optional[float] = NOTICE_TTL,
+) -> None:
+    """
+    إرسال رسالة تنبيه في الخلفية وحذفها تلقائيًا بعد مدة
+
+    Args:
+        bot: كائن البوت
+        chat_id: معرف المجموعة
+        text: نص التنبيه
+        parse_mode: طريقة تنسيق النص
+        ttl: مدة بقاء التنبيه بالثواني (None لإبقائه)
+    """
+    _spawn(_send_notice(bot, chat_id, text, parse_mode, ttl))
+
+
+async def _send_notice(bot: Bot, chat_id: int, text: str, parse_mode: Optional[str], ttl: Optional[float]) -> None:
+    try:
+        message = await bot.send_message(chat_id=chat_id, text=text, parse_mode=parse_mode)
+    except TelegramError as e:
+        logger.error(f"خطأ في إرسال رسالة التنبيه: {e}")
+        return
+
+    if ttl is not None:
+        expire_later(bot, chat_id, message.message_id, ttl)
+
+
+def expire_later(bot: Bot, chat_id: int, message_id: int, ttl: float) -> None:
+    """
+    جدولة حذف رسالة من رسائل البوت بعد مدة
+
+    Args:
+        bot: كائن البوت
+        chat_id: معرف المجموعة
+        message_id: معرف الرسالة
+        ttl: المدة بالثواني
+    """
+    key = (chat_id, message_id)
+    _notice_timers[key] = asyncio.get_running_loop().call_later(ttl, _expire_notice, bot, key)
+
+
+def _expire_notice(bot: Bot, key: Tuple[int, int]) -> None:
+    _notice_timers.pop(key, None)
+    delete_later(bot, key[0], [key[1]])
+
+
+async def _flush_after(bot: Bot, chat_id: int, delay: float) -> None:
+    await asyncio.sleep(delay)
+    _flush_tasks.pop(chat_id, None)
+    await _flush_chat(bot, chat_id)
+
+
+async def delete_messages(bot: Bot, chat_id: int, message_ids: List[int]) -> None:
+    """
+    حذف رسائل مجموعة بطلبات deleteMessages على دفعات بحجم DELETE_BATCH_MAX
+
+    Args:
+        bot: كائن البوت
+        chat_id: معرف المجموعة
+        message_ids: معرفات الرسائل
+    """
+    for start in range(0, len(message_ids), DELETE_BATCH_MAX):
+        batch = message_ids[start:start + DELETE_BATCH_MAX]
+        try:
+            # الإصدار الحالي من المكتبة لا يوفر delete_messages، لذا يُستدعى التابع مباشرة
+            await bot._post("deleteMessages", {"chat_id": chat_id, "message_ids": batch})
+        except BadRequest as e:
+            # خوادم Bot API القديمة لا تدعم الحذف الجماعي: الرجوع إلى الحذف رسالة رسالة
+            logger.warning(f"تعذر الحذف الجماعي في المجموعة {chat_id}: {e}")
+            for message_id in batch:
+                try:
+                    await bot.delete_message(chat_id=chat_id, message_id=message_id)
+                except BadRequest:
+                    pass
+
+
+async def _flush_chat(bot: Bot, chat_id: int) -> None:
+    message_ids = _pending.pop(chat_id, None)
+    if not message_ids:
+        return
+    try:
+        await delete_messages(bot, chat_id, message_ids)
+    except TelegramError as e:
+        logger.error(f"خطأ في حذف الرسائل في المجموعة {chat_id}: {e}")
+
+
+async def flush_all(bot: Bot) -> None:
+    """
+    حذف كل ما في الطابور فورًا، بما فيه التنبيهات التي لم تنته مدتها (عند إيقاف البوت)
+    """
+    # الحذف المجدول يُنفذ الآن مباشرة، والتنبيهات قيد الإرسال تُنتظر حتى تُعرف معرفاتها
+    for task in _flush_tasks.values():
+        task.cancel()
+    _flush_tasks.clear()
+    current = asyncio.current_task()
+    await asyncio.gather(*[task for task in _background if task is not current], return_exceptions=True)
+
+    for (chat_id, message_id), timer in _notice_timers.items():
+        timer.cancel()
+        _pending.setdefault(chat_id, []).append(message_id)
+    _notice_timers.clear()
+
+    await flush_pending(bot)
+
+
+async def flush_pending(bot: Bot) -> None:
+    """
+    حذف الرسائل المنتظرة في الطابور فورًا دون انتظار نافذة الدفعة (التنبيهات المؤقتة تبقى كما هي)
+    """
+    for task in _flush_tasks.values():
+        task.cancel()
+    _flush_tasks.clear()
+    for chat_id in list(_pending):
+        await _flush_chat(bot, chat_id)
@@ -12,6 +12,9 @@ def get_commands_text() -> str:
 » <code>شغل</code> او <code>تشغيل</code> - لتشغيل الموسيقى  
 » <code>فيد</code> او <code>فيديو</code>  - لتشغيل مقطع فيديو 
 » <code>تشغيل عشوائي</code>  - لتشغيل اغنيه عشوائية 
+» <code>قائمة التشغيل</code> - عرض قائمة التشغيل في المحادثة
+» <code>تخطي</code> - تخطي المقطع الحالي
+» <code>مسح القائمة</code> - مسح قائمة التشغيل
 » <code>بحث</code> - للبحث عن نتائج في اليوتيوب
 » <code>تحميل</code> + اسم الفيديو - لتحميل مقطع فيديو
 » <code>تنزيل</code> + اسم الاغنيه - لتحميل ملف صوتي
@@ -25,6 +28,12 @@ def get_commands_text() -> str:
 » <code>/ban</code> [المستخدم] [السبب] - حظر مستخدم من المجموعة
 » <code>/kick</code> [المستخدم] [السبب] - طرد مستخدم من المجموعة
 » <code>/warn</code> [المستخدم] [السبب] - تحذير مستخدم في المجموعة
+» <code>/banimage</code> (بالرد على صورة) - حظر الصورة والصور الشبيهة بها
+» <code>/unbanimage</code> (بالرد على صورة) - إلغاء حظر الصورة
+» <code>/addcmd</code> الاسم الرد - إضافة أمر خاص بالمجموعة
+» <code>/addreply</code> العبارة | الرد - رد تلقائي عند ظهور العبارة
+» <code>/delcmd</code> و <code>/delreply</code> - حذف أمر أو رد تلقائي
+» <code>/chatcmds</code> - عرض أوامر المجموعة وردودها التلقائية
 » <code>/settings</code> - عرض وتغيير إعدادات المجموعة
 
 <b>⚡️  Developer by DARKCODE</b>"""
@@ -46,6 +55,9 @@ def get_standard_command_list() -> List[Tuple[str, str]]:
         ("video", "تشغيل فيديو من يوتيوب"),
         ("random", "تشغيل أغنية عشوائية"),
         ("search", "البحث عن أغنية على يوتيوب"),
+        ("queue", "عرض قائمة التشغيل"),
+        ("skip", "تخطي المقطع الحالي"),
+        ("clearqueue", "مسح قائمة التشغيل"),
         ("download", "تحميل فيديو من يوتيوب"),
         ("downloadaudio", "تحميل ملف صوتي من يوتيوب"),
         ("quran", "عرض قائمة القرآن الكريم"),
@@ -56,6 +68,13 @@ def get_standard_command_list() -> List[Tuple[str, str]]:
         ("ban", "حظر مستخدم من المجموعة"),
         ("kick", "طرد مستخدم من المجموعة"),
         ("warn", "تحذير مستخدم في المجموعة"),
+        ("banimage", "حظر صورة بالرد عليها"),
+        ("unbanimage", "إلغاء حظر صورة بالرد عليها"),
+        ("addcmd", "إضافة أمر خاص بالمجموعة"),
+        ("delcmd", "حذف أمر خاص بالمجموعة"),
+        ("addreply", "إضافة رد تلقائي على عبارة"),
+        ("delreply", "حذف رد تلقائي"),
+        ("chatcmds", "عرض أوامر المجموعة وردودها التلقائية"),
         ("settings", "عرض وتغيير إعدادات المجموعة"),
     ]
 
@@ -1,14 +1,32 @@
 """
 وحدة إدارة الأوامر المخصصة للبوت
 تتيح للمشرفين إضافة أوامر مخصصة من خلال لوحة التحكم
+
+الأوامر المخصصة تُنفذ عبر CustomCommandHandler المسجل قبل الأوامر المدمجة: فهرس جاهز يربط
+/name و/name@botusername (بأحرف صغيرة) باسم الأمر، فيكفي بحث واحد في القاموس لكل أمر،
+ويُحدَّث الفهرس مع كل إضافة أو حذف دون إعادة تسجيل أي معالج
+
+نص الرد يُكتب بتنسيق Markdown ويُترجم مرة واحدة عند الإضافة أو التعديل (compile_response):
+يُتحقق من صحة التنسيق، ويُحوّل إلى HTML جاهز (النص مُهرّب مسبقًا)، وتُحوّل المتغيرات {user} و{chat}
+و{count} إلى قالب str.format محفوظ مع الأمر في الحقل "template"، فلا يبقى عند الاستخدام إلا ملء المتغيرات
+
+عند توزيع التحديثات على عدة عمليات تُنشر تعريفات الأوامر كاملة، أما زيادات عداد الاستخدام فتُجمع
+وتُرسل كفروقات مع مزامنة الإحصائيات، والعملية الأساسية وحدها تحفظ الملف
 """
 
+import html
 import json
 import os
+import re
 import time
 from typing import Dict, Any, List, Optional, Tuple
 import logging
 
+from telegram import MessageEntity, Update
+from telegram.ext import BaseHandler
+
+from utils.sharding import is_primary_shard, is_shard_worker, publish, register_delta_flusher, register_shared
+
 logger = logging.getLogger(__name__)
 
 # المسار إلى ملف تخزين الأوامر المخصصة
@@ -21,6 +39,218 @@ os.makedirs(os.path.dirname(CUSTOM_COMMANDS_FILE), exist_ok=True)
 # المفتاح هو اسم الأمر، والقيمة هي قاموس يحتوي على معلومات الأمر
 custom_commands: Dict[str, Dict[str, Any]] = {}
 
+# أسماء الأوامر المدمجة التي لا يمكن استخدامها كأوامر مخصصة
+RESERVED_COMMANDS = frozenset({
+    "start", "help", "settings", "search", "play", "download",
+    "ban", "kick", "warn", "random", "ping", "source", "adhan",
+    "quran", "songs", "video", "cancel", "admin",
+    "queue", "skip", "clearqueue", "banimage", "unbanimage",
+    "addcmd", "delcmd", "addreply", "delreply", "chatcmds",
+})
+
+# فهرس التوجيه: "name" و"name@botusername" -> اسم الأمر
+_command_index: Dict[str, str] = {}
+
+# اسم مستخدم البوت (بأحرف صغيرة) المستخدم في مفاتيح الفهرس الحالية
+_index_username: Optional[str] = None
+
+# زيادات عداد الاستخدام التي لم تُرسل بعد إلى باقي العمليات: اسم الأمر -> الزيادة
+_pending_usage: Dict[str, int] = {}
+
+# مرات الاستخدام منذ آخر حفظ (الحفظ بعد كل USAGE_SAVE_EVERY استخدامات)
+_unsaved_usage = 0
+USAGE_SAVE_EVERY = 5
+
+def _index_command(command_name: str) -> None:
+    _command_index[command_name] = command_name
+    if _index_username:
+        _command_index[f"{command_name}@{_index_username}"] = command_name
+
+def _unindex_command(command_name: str) -> None:
+    _command_index.pop(command_name, None)
+    if _index_username:
+        _command_index.pop(f"{command_name}@{_index_username}", None)
+
+def _rebuild_index(username: Optional[str]) -> None:
+    """
+    إعادة بناء فهرس التوجيه (عند التحميل، أو عند معرفة اسم مستخدم البوت أول مرة)
+    """
+    global _index_username
+    _index_username = username.lower() if username else None
+    _command_index.clear()
+    for command_name in custom_commands:
+        _index_command(command_name)
+
+def resolve_command(text: str, length: int, username: Optional[str]) -> Optional[str]:
+    """
+    اسم الأمر المخصص في بداية الرسالة
+    
+    Args:
+        text: نص الرسالة
+        length: طول كيان الأمر في بداية النص (مع /)
+        username: اسم مستخدم البوت
+        
+    Returns:
+        اسم الأمر، أو None إذا لم يكن أمرًا مخصصًا (أو كان موجهًا لبوت آخر)
+    """
+    if username and username.lower() != _index_username:
+        _rebuild_index(username)
+    return _command_index.get(text[1:length].lower())
+
+class CustomCommandHandler(BaseHandler):
+    """
+    معالج الأوامر المخصصة: يطابق /name و/name@botusername من أوامر المجموعة ثم من الفهرس العام،
+    ويضع اسم الأمر في context.custom_command، ومعرف المجموعة في context.custom_command_chat
+    (None للأمر العام)، والنص بعده في context.args
+    """
+    
+    __slots__ = ()
+    
+    def check_update(self, update: object) -> Optional[Tuple[str, Optional[int], List[str]]]:
+        if not isinstance(update, Update) or not update.effective_message:
+            return None
+        message = update.effective_message
+        if not (
+            message.text
+            and message.entities
+            and message.entities[0].type == MessageEntity.BOT_COMMAND
+            and message.entities[0].offset == 0
+        ):
+            return None
+        length = message.entities[0].length
+        username = message.get_bot().username
+        
+        # أمر المجموعة يسبق الأمر العام بالاسم نفسه
+        chat = update.effective_chat
+        if chat and chat.type != "private":
+            from utils.chat_commands import resolve_chat_command
+            command_name = resolve_chat_command(chat.id, message.text, length, username)
+            if command_name is not None:
+                return command_name, chat.id, message.text.split()[1:]
+        
+        command_name = resolve_command(message.text, length, username)
+        if command_name is None:
+            return None
+        return command_name, None, message.text.split()[1:]
+    
+    def collect_additional_context(self, context, update, application, check_result) -> None:
+        context.custom_command = check_result[0]
+        context.custom_command_chat = check_result[1]
+        context.args = check_result[2]
+
+# المتغيرات المسموح بها في نص الرد
+RESPONSE_PLACEHOLDERS = ("user", "chat", "count")
+
+_PLACEHOLDER_OR_BRACE = re.compile(r"\{(%s)\}|[{}]" % "|".join(RESPONSE_PLACEHOLDERS))
+
+# الروابط المسموح بها في نص الرد
+_LINK_SCHEMES = ("http://", "https://", "tg://")
+
+def _literal(text: str, quote: bool = False) -> str:
+    # نص بلا متغيرات: تهريب HTML ومضاعفة الأقواس حتى لا يفسرها str.format
+    return html.escape(text, quote=quote).replace("{", "{{").replace("}", "}}")
+
+def _with_slots(text: str) -> str:
+    # نص تُترك فيه المتغيرات المعروفة كخانات في القالب
+    return _PLACEHOLDER_OR_BRACE.sub(
+        lambda match: match.group(0) if match.group(1) else match.group(0) * 2,
+        html.escape(text, quote=False),
+    )
+
+def compile_response(text: str) -> Tuple[Optional[str], str]:
+    """
+    ترجمة نص رد بتنسيق Markdown إلى قالب HTML
+    
+    يدعم *عريض* و_مائل_ و`كود` و```كتلة كود``` و[نص](رابط)، و\\ قبل الرمز لكتابته كما هو.
+    المتغيرات تعمل في النص العادي والعريض والمائل، وتبقى كما هي داخل الكود والروابط.
+    
+    Args:
+        text: نص الرد كما كتبه المشرف
+        
+    Returns:
+        Tuple من (القالب، رسالة الخطأ). القالب None إذا كان التنسيق غير صحيح
+    """
+    if not text.strip():
+        return None, "نص الرد فارغ"
+    
+    parts: List[str] = []
+    plain_start = 0
+    i = 0
+    length = len(text)
+    
+    def flush_plain(end: int) -> None:
+        if end > plain_start:
+            parts.append(_with_slots(text[plain_start:end]))
+    
+    while i < length:
+        char = text[i]
+        if char == "\\" and i + 1 < length and text[i + 1] in "*_`[":
+            flush_plain(i)
+            parts.append(_literal(text[i + 1]))
+            i += 2
+        elif text.startswith("```", i):
+            end = text.find("```", i + 3)
+            if end == -1:
+                return None, "كتلة كود ``` غير مغلقة"
+            flush_plain(i)
+            parts.append(f"<pre>{_literal(text[i + 3:end].strip(chr(10)))}</pre>")
+            i = end + 3
+        elif char == "`":
+            end = text.find("`", i + 1)
+            if end == -1:
+                return None, "علامة ` غير مغلقة"
+            flush_plain(i)
+            parts.append(f"<code>{_literal(text[i + 1:end])}</code>")
+            i = end + 1
+        elif char in "*_":
+            end = text.find(char, i + 1)
+            if end == -1:
+                return None, f"علامة {char} غير مغلقة (اكتب \\{char} لعرضها كما هي)"
+            tag = "b" if char == "*" else "i"
+            flush_plain(i)
+            parts.append(f"<{tag}>{_with_slots(text[i + 1:end])}</{tag}>")
+            i = end + 1
+        elif char == "[":
+            middle = text.find("](", i + 1)
+            end = text.find(")", middle + 2) if middle != -1 else -1
+            if end == -1:
+                return None, "رابط غير مكتمل، الصيغة الصحيحة: [النص](الرابط)"
+            url = text[middle + 2:end].strip()
+            if not url.startswith(_LINK_SCHEMES):
+                return None, f"رابط غير صالح: {url}"
+            flush_plain(i)
+            parts.append(f'<a href="{_literal(url, quote=True)}">{_literal(text[i + 1:middle])}</a>')
+            i = end + 1
+        else:
+            i += 1
+            continue
+        plain_start = i
+    
+    flush_plain(length)
+    return "".join(parts), ""
+
+def _plain_template(text: str) -> str:
+    # رد قديم لم يجتز التحقق: يُعرض كنص عادي بدل أن يفشل إرساله في كل مرة
+    return _literal(text)
+
+def render_response(command: Dict[str, Any], user_html: str, chat_title: str) -> str:
+    """
+    ملء متغيرات قالب الرد
+    
+    Args:
+        command: بيانات الأمر
+        user_html: رابط المستخدم بصيغة HTML
+        chat_title: اسم المحادثة
+        
+    Returns:
+        نص الرد بصيغة HTML
+    """
+    return command["template"].format(
+        user=user_html,
+        chat=html.escape(chat_title, quote=False),
+        count=command.get("usage_count", 0),
+    )
+
 def load_custom_commands() -> None:
     """
     تحميل الأوامر المخصصة من الملف
@@ -34,21 +264,46 @@ def load_custom_commands() -> None:
         else:
             # إنشاء ملف فارغ إذا لم يكن موجودًا
             custom_commands = {}
-            save_custom_commands()
     except Exception as e:
         logger.error(f"خطأ في تحميل الأوامر المخصصة: {e}")
         custom_commands = {}
+    
+    # الأوامر المحفوظة قبل إضافة القوالب تُترجم مرة واحدة عند التحميل
+    compiled = False
+    for command_name, command in custom_commands.items():
+        if "template" not in command:
+            template, error = compile_response(command.get("response", ""))
+            if template is None:
+                logger.warning(f"رد الأمر /{command_name} غير صالح ({error})، سيُرسل كنص عادي")
+                template = _plain_template(command.get("response", ""))
+            command["template"] = template
+            compiled = True
+    if compiled and is_primary_shard():
+        save_custom_commands()
+    
+    _rebuild_index(_index_username)
 
 def save_custom_commands() -> None:
     """
     حفظ الأوامر المخصصة في الملف
     """
+    global _unsaved_usage
     try:
-        with open(CUSTOM_COMMANDS_FILE, "w", encoding="utf-8") as file:
+        temp_path = f"{CUSTOM_COMMANDS_FILE}.{os.getpid()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
             json.dump(custom_commands, file, ensure_ascii=False, indent=4)
+        os.replace(temp_path, CUSTOM_COMMANDS_FILE)
+        _unsaved_usage = 0
     except Exception as e:
         logger.error(f"خطأ في حفظ الأوامر المخصصة: {e}")
 
+def _persist() -> None:
+    """
+    حفظ الأوامر بعد تغييرها (العملية الأساسية فقط، وباقي العمليات تنشر التغيير إليها)
+    """
+    if is_primary_shard():
+        save_custom_commands()
+
 def add_custom_command(command_name: str, response_text: str, created_by: int) -> Tuple[bool, str]:
     """
     إضافة أمر مخصص جديد
@@ -71,25 +326,28 @@ def add_custom_command(command_name: str, response_text: str, created_by: int) -
         return False, f"الأمر /{command_name} موجود بالفعل"
     
     # التحقق من أن الأمر ليس من الأوامر المحجوزة
-    reserved_commands = [
-        "start", "help", "settings", "search", "play", "download",
-        "ban", "kick", "warn", "random", "ping", "source", "adhan",
-        "quran", "songs", "video", "cancel", "admin"
-    ]
-    
-    if command_name in reserved_commands:
+    if command_name in RESERVED_COMMANDS:
         return False, f"الأمر /{command_name} محجوز للاستخدام النظامي"
     
+    # ترجمة نص الرد والتحقق من تنسيقه
+    template, error = compile_response(response_text)
+    if template is None:
+        return False, f"تنسيق نص الرد غير صحيح: {error}"
+    
     # إضافة الأمر
     custom_commands[command_name] = {
         "response": response_text,
+        "template": template,
         "created_by": created_by,
         "created_at": int(time.time()),
         "usage_count": 0
     }
     
+    _index_command(command_name)
+    
     # حفظ التغييرات
-    save_custom_commands()
+    _persist()
+    publish("custom_command", command_name, custom_commands[command_name])
     
     return True, f"تم إضافة الأمر /{command_name} بنجاح"
 
@@ -114,9 +372,11 @@ def remove_custom_command(command_name: str) -> Tuple[bool, str]:
     
     # حذف الأمر
     del custom_commands[command_name]
+    _unindex_command(command_name)
     
     # حفظ التغييرات
-    save_custom_commands()
+    _persist()
+    publish("custom_command", command_name, None)
     
     return True, f"تم حذف الأمر /{command_name} بنجاح"
 
@@ -140,11 +400,18 @@ def edit_custom_command(command_name: str, new_response: str) -> Tuple[bool, str
     if command_name not in custom_commands:
         return False, f"الأمر /{command_name} غير موجود"
     
+    # ترجمة نص الرد والتحقق من تنسيقه
+    template, error = compile_response(new_response)
+    if template is None:
+        return False, f"تنسيق نص الرد غير صحيح: {error}"
+    
     # تعديل الأمر
     custom_commands[command_name]["response"] = new_response
+    custom_commands[command_name]["template"] = template
     
     # حفظ التغييرات
-    save_custom_commands()
+    _persist()
+    publish("custom_command", command_name, custom_commands[command_name])
     
     return True, f"تم تعديل الأمر /{command_name} بنجاح"
 
@@ -188,9 +455,59 @@ def increment_command_usage(command_name: str) -> None:
     
     if command_name in custom_commands:
         custom_commands[command_name]["usage_count"] += 1
-        # حفظ التغييرات بشكل دوري
-        if custom_commands[command_name]["usage_count"] % 5 == 0:
-            save_custom_commands()
+        if is_shard_worker():
+            _pending_usage[command_name] = _pending_usage.get(command_name, 0) + 1
+        _count_usage(1)
+
+def _count_usage(count: int) -> None:
+    """
+    حفظ التغييرات بشكل دوري حسب عدد مرات الاستخدام
+    """
+    global _unsaved_usage
+    if not is_primary_shard():
+        return
+    _unsaved_usage += count
+    if _unsaved_usage >= USAGE_SAVE_EVERY:
+        save_custom_commands()
+
+def _flush_usage() -> None:
+    """
+    إرسال زيادات عداد الاستخدام المتراكمة إلى باقي العمليات
+    """
+    if not _pending_usage:
+        return
+    batch = dict(_pending_usage)
+    _pending_usage.clear()
+    publish("custom_command_usage", None, batch, delta=True)
+
+def _apply_shared_usage(key: Any, batch: Dict[str, int]) -> None:
+    """
+    إضافة زيادات عداد الاستخدام الواردة من عملية أخرى
+    """
+    applied = 0
+    for command_name, count in batch.items():
+        if command_name in custom_commands:
+            custom_commands[command_name]["usage_count"] += count
+            applied += count
+    _count_usage(applied)
+
+def _apply_shared_command(command_name: str, command: Optional[Dict[str, Any]]) -> None:
+    """
+    تطبيق تغيير في أمر مخصص أجرته عملية أخرى (العملية الأساسية تحفظه)
+    """
+    if command is None:
+        custom_commands.pop(command_name, None)
+        _unindex_command(command_name)
+    else:
+        # عداد الاستخدام يُزامن بالفروقات، فلا يُستبدل بقيمة العملية الأخرى
+        if command_name in custom_commands:
+            command = {**command, "usage_count": custom_commands[command_name]["usage_count"]}
+        custom_commands[command_name] = command
+        _index_command(command_name)
+    _persist()
 
 # تحميل الأوامر المخصصة عند استيراد الوحدة
-load_custom_commands()
\ No newline at end of file
+load_custom_commands()
+register_shared("custom_command", _apply_shared_command)
+register_shared("custom_command_usage", _apply_shared_usage)
+register_delta_flusher(_flush_usage)
@@ -0,0 +1,160 @@
+"""
+وحدة سجل قرارات قواعد الحماية (وضع المراقبة)
+في المجموعات التي فُعّل فيها وضع المراقبة تُقيّم كل القواعد على كل رسالة دون اتخاذ أي إجراء،
+ويُسجل لكل قاعدة سجل ثنائي مضغوط: الوقت، المجموعة، بصمة الرسالة، رقم القاعدة، هل طابقت،
+زمن التقييم بالنانوثانية، والعبارة المطابقة
+
+الملفات يومية ولكل عملية ملف مستقل (data/decisions/decisions-YYYYMMDD-PID.bin)
+وتقرأها أداة tools/decision_report.py
+"""
+
+import asyncio
+import glob
+import hashlib
+import os
+import struct
+import time
+from datetime import datetime, timezone
+from typing import Iterator, List, NamedTuple, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+# مجلد ملفات السجل
+DECISIONS_DIR = "data/decisions"
+
+# أرقام القواعد (ثابتة حتى تبقى السجلات القديمة مفهومة)
+RULE_FORWARD = 1
+RULE_BAD_WORD = 2
+RULE_LINK = 3
+RULE_DUPLICATE = 4
+RULE_FLOOD = 5
+RULE_BANNED_IMAGE = 6
+
+RULE_NAMES = {
+    RULE_FORWARD: "forward",
+    RULE_BAD_WORD: "bad_word",
+    RULE_LINK: "link",
+    RULE_DUPLICATE: "duplicate",
+    RULE_FLOOD: "flood",
+    RULE_BANNED_IMAGE: "banned_image",
+}
+
+# رأس السجل: الوقت، المجموعة، بصمة الرسالة، القاعدة، مطابقة، زمن التقييم (ns)، طول العبارة
+# ثم العبارة المطابقة بترميز UTF-8 (255 بايت كحد أقصى)
+_HEADER = struct.Struct("<dqQBBIB")
+
+# السجلات التي لم تُكتب على القرص بعد
+_pending = bytearray()
+
+
+class Decision(NamedTuple):
+    timestamp: float
+    chat_id: int
+    message_hash: int
+    rule_id: int
+    matched: bool
+    elapsed_ns: int
+    term: str
+
+
+def message_hash(text: str) -> int:
+    """
+    بصمة ثابتة للرسالة (64 بت) لتمييز الرسائل دون حفظ نصها
+    """
+    return int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def log_decision(
+    chat_id: int,
+    digest: int,
+    rule_id: int,
+    term: Optional[str],
+    elapsed_ns: int,
+    now: Optional[float] = None,
+) -> None:
+    """
+    تسجيل نتيجة تقييم قاعدة واحدة على رسالة
+
+    Args:
+        chat_id: معرف المجموعة
+        digest: بصمة الرسالة (message_hash)
+        rule_id: رقم القاعدة
+        term: العبارة المطابقة (None إذا لم تطابق القاعدة)
+        elapsed_ns: زمن التقييم بالنانوثانية
+        now: وقت الرسالة (للاختبار)
+    """
+    encoded = term.encode("utf-8")[:255] if term else b""
+    _pending.extend(_HEADER.pack(
+        now or time.time(), chat_id, digest, rule_id, term is not None,
+        min(elapsed_ns, 0xFFFFFFFF), len(encoded),
+    ))
+    _pending.extend(encoded)
+
+
+def read_decisions(path: str) -> Iterator[Decision]:
+    """
+    قراءة السجلات من ملف (يتجاهل سجلًا أخيرًا ناقصًا إذا انقطعت الكتابة)
+    """
+    with open(path, "rb") as file:
+        data = file.read()
+    offset = 0
+    size = _HEADER.size
+    while offset + size <= len(data):
+        timestamp, chat_id, digest, rule_id, matched, elapsed_ns, term_length = _HEADER.unpack_from(data, offset)
+        offset += size
+        if offset + term_length > len(data):
+            break
+        term = data[offset:offset + term_length].decode("utf-8", errors="replace")
+        offset += term_length
+        yield Decision(timestamp, chat_id, digest, rule_id, bool(matched), elapsed_ns, term)
+
+
+def decision_files(directory: str = DECISIONS_DIR) -> List[str]:
+    """
+    كل ملفات السجل مرتبة حسب الاسم (أي حسب اليوم)
+    """
+    return sorted(glob.glob(os.path.join(directory, "decisions-*.bin")))
+
+
+def _log_path(now: Optional[float] = None) -> str:
+    day = datetime.fromtimestamp(now or time.time(), tz=timezone.utc).strftime("%Y%m%d")
+    return os.path.join(DECISIONS_DIR, f"decisions-{day}-{os.getpid()}.bin")
+
+
+def _write(path: str, data: bytes) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "ab") as file:
+        file.write(data)
+
+
+def _take_pending() -> bytes:
+    data = bytes(_pending)
+    del _pending[:len(data)]
+    return data
+
+
+async def flush_decisions() -> None:
+    """
+    كتابة السجلات على القرص دون حجب حلقة الأحداث
+    """
+    data = _take_pending()
+    if not data:
+        return
+    try:
+        await asyncio.get_running_loop().run_in_executor(None, _write, _log_path(), data)
+    except Exception as e:
+        logger.error(f"خطأ في حفظ سجل القرارات: {e}")
+
+
+def flush_decisions_sync() -> None:
+    """
+    كتابة السجلات مباشرة (عند إيقاف البوت)
+    """
+    data = _take_pending()
+    if not data:
+        return
+    try:
+        _write(_log_path(), data)
+    except Exception as e:
+        logger.error(f"خطأ في حفظ سجل القرارات: {e}")
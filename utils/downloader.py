@@ -0,0 +1,408 @@
+"""
+وحدة تنزيل الملفات الصوتية باستخدام yt-dlp
+تختار أصغر صيغة صوتية تحقق الحد الأدنى للجودة، وتخزن الملفات في ذاكرة مؤقتة
+على القرص تعتمد على بصمة المحتوى، مع حدود للتنزيلات المتزامنة ومنع تكرار نفس التنزيل
+
+حجم الذاكرة المؤقتة محدود بـ AUDIO_CACHE_MAX_BYTES، وعند تجاوزه تُحذف الملفات الأقدم استخدامًا
+
+يقبل المصدر معرف فيديو يوتيوب أو أي رابط مباشر، لذا يمكن تجربة المسار كاملًا
+دون إنترنت بتقديم ملف صوتي من خادم محلي (انظر python -m tools.download_check)
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from typing import Any, Dict, List, Optional, Tuple
+import logging
+
+try:
+    import yt_dlp
+except ImportError:
+    yt_dlp = None
+
+from config import (
+    AUDIO_CACHE_MAX_BYTES,
+    DOWNLOAD_CONCURRENCY,
+    DOWNLOAD_PER_USER_LIMIT,
+    MIN_AUDIO_BITRATE,
+)
+
+logger = logging.getLogger(__name__)
+
+# مجلد الذاكرة المؤقتة للملفات الصوتية (مسار كل ملف مشتق من بصمة محتواه)
+AUDIO_CACHE_DIR = "data/cache/audio"
+AUDIO_CACHE_INDEX = os.path.join(AUDIO_CACHE_DIR, "index.json")
+
+# التأكد من وجود المجلد
+os.makedirs(AUDIO_CACHE_DIR, exist_ok=True)
+
+# فهرس الذاكرة المؤقتة: مفتاح المصدر -> معلومات الملف وبصمته
+cache_index: Dict[str, Dict[str, Any]] = {}
+
+# التنزيلات الجارية حاليًا، لمشاركة نفس التنزيل بين الطلبات المتطابقة
+_in_flight: Dict[str, asyncio.Future] = {}
+
+# عدد التنزيلات الجارية لكل مستخدم
+_user_active: Dict[int, int] = {}
+
+# حد التنزيلات المتزامنة على مستوى البوت (يُنشأ داخل حلقة الأحداث)
+_global_limit: Optional[asyncio.Semaphore] = None
+
+
+def load_cache_index() -> None:
+    """
+    تحميل فهرس الذاكرة المؤقتة من الملف
+    """
+    global cache_index
+
+    try:
+        if os.path.exists(AUDIO_CACHE_INDEX):
+            with open(AUDIO_CACHE_INDEX, "r", encoding="utf-8") as file:
+                cache_index = json.load(file)
+    except Exception as e:
+        logger.error(f"خطأ في تحميل فهرس الذاكرة المؤقتة للصوتيات: {e}")
+        cache_index = {}
+
+
+def _write_cache_index(snapshot: Dict[str, Dict[str, Any]]) -> None:
+    """
+    كتابة الفهرس بشكل ذري حتى لا يتلف الملف عند الانقطاع
+    """
+    # اسم مؤقت لكل عملية (قد تحفظ عدة عمليات موزعة الفهرس في نفس اللحظة)
+    temp_path = f"{AUDIO_CACHE_INDEX}.{os.getpid()}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as file:
+        json.dump(snapshot, file, ensure_ascii=False)
+    os.replace(temp_path, AUDIO_CACHE_INDEX)
+
+
+async def save_cache_index() -> None:
+    """
+    حفظ فهرس الذاكرة المؤقتة دون حجب حلقة الأحداث
+    """
+    try:
+        await asyncio.get_running_loop().run_in_executor(None, _write_cache_index, dict(cache_index))
+    except Exception as e:
+        logger.error(f"خطأ في حفظ فهرس الذاكرة المؤقتة للصوتيات: {e}")
+
+
+def source_key(source: str) -> str:
+    """
+    توحيد المصدر إلى مفتاح ثابت (معرف يوتيوب أو الرابط كما هو)
+
+    Args:
+        source: معرف الفيديو أو الرابط
+
+    Returns:
+        مفتاح المصدر
+    """
+    source = source.strip()
+    if "youtube.com" in source and "v=" in source:
+        return source.split("v=")[1].split("&")[0]
+    if "youtu.be/" in source:
+        return source.split("youtu.be/")[1].split("?")[0]
+    return source
+
+
+def _source_url(key: str) -> str:
+    """
+    تحويل مفتاح المصدر إلى رابط يمكن تمريره إلى yt-dlp
+    """
+    if key.startswith(("http://", "https://", "file://")):
+        return key
+    return f"https://www.youtube.com/watch?v={key}"
+
+
+def _estimated_size(fmt: Dict[str, Any], duration: float) -> float:
+    """
+    تقدير حجم الصيغة بالبايت من الحجم المعلن أو من معدل البت والمدة
+    """
+    size = fmt.get("filesize") or fmt.get("filesize_approx")
+    if size:
+        return float(size)
+    bitrate = fmt.get("abr") or fmt.get("tbr")
+    if bitrate and duration:
+        return bitrate * 125 * duration
+    return float("inf")
+
+
+def select_audio_format(
+    formats: List[Dict[str, Any]],
+    duration: float = 0,
+    min_abr: float = MIN_AUDIO_BITRATE,
+) -> Optional[str]:
+    """
+    اختيار أصغر صيغة صوتية فقط (بدون فيديو) تحقق الحد الأدنى لمعدل البت
+
+    Args:
+        formats: قائمة الصيغ كما يعيدها yt-dlp
+        duration: مدة المقطع بالثواني لتقدير الحجم
+        min_abr: الحد الأدنى لمعدل البت الصوتي (kbps)
+
+    Returns:
+        معرف الصيغة المختارة، أو None إذا لم توجد صيغة صوتية منفصلة
+    """
+    audio_only = [
+        fmt for fmt in formats
+        if fmt.get("vcodec") == "none" and fmt.get("acodec") not in (None, "none")
+    ]
+    if not audio_only:
+        return None
+
+    acceptable = [fmt for fmt in audio_only if (fmt.get("abr") or 0) >= min_abr]
+    if acceptable:
+        best = min(acceptable, key=lambda fmt: _estimated_size(fmt, duration))
+    else:
+        # لا توجد صيغة تحقق الحد الأدنى، نأخذ الأعلى جودة بين المتاح
+        best = max(audio_only, key=lambda fmt: fmt.get("abr") or 0)
+
+    return best.get("format_id")
+
+
+def get_cached_audio(source: str) -> Optional[Dict[str, Any]]:
+    """
+    البحث عن ملف صوتي في الذاكرة المؤقتة على القرص
+
+    Args:
+        source: معرف الفيديو أو الرابط
+
+    Returns:
+        معلومات الملف مع مساره، أو None إذا لم يكن مخزنًا
+    """
+    entry = cache_index.get(source_key(source))
+    if not entry:
+        return None
+
+    path = _content_path(entry["sha256"], entry["ext"])
+    if not os.path.exists(path):
+        return None
+
+    # وقت آخر استخدام يحدد ترتيب الحذف عند امتلاء الذاكرة المؤقتة
+    entry["used"] = time.time()
+    return {**entry, "path": path}
+
+
+def _content_path(digest: str, ext: str) -> str:
+    """
+    مسار الملف داخل الذاكرة المؤقتة بحسب بصمة محتواه
+    """
+    return os.path.join(AUDIO_CACHE_DIR, digest[:2], f"{digest}.{ext}")
+
+
+def _store_by_content(temp_path: str) -> Tuple[str, str]:
+    """
+    حساب بصمة الملف ونقله إلى مكانه الدائم (الملفات المتطابقة تُخزن مرة واحدة)
+
+    Returns:
+        Tuple من (البصمة، المسار النهائي)
+    """
+    sha = hashlib.sha256()
+    with open(temp_path, "rb") as file:
+        for chunk in iter(lambda: file.read(1024 * 1024), b""):
+            sha.update(chunk)
+    digest = sha.hexdigest()
+
+    ext = os.path.splitext(temp_path)[1].lstrip(".") or "bin"
+    final_path = _content_path(digest, ext)
+    os.makedirs(os.path.dirname(final_path), exist_ok=True)
+
+    if os.path.exists(final_path):
+        os.remove(temp_path)
+    else:
+        shutil.move(temp_path, final_path)
+
+    return digest, final_path
+
+
+def _download_blocking(url: str, ydl_overrides: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    استخراج المعلومات واختيار الصيغة ثم التنزيل (تعمل داخل خيط منفصل)
+
+    Returns:
+        معلومات الملف المنزل مع مساره المؤقت
+    """
+    base_opts = {
+        "quiet": True,
+        "no_warnings": True,
+        "noplaylist": True,
+        "noprogress": True,
+    }
+    base_opts.update(ydl_overrides or {})
+
+    with yt_dlp.YoutubeDL(base_opts) as ydl:
+        info = ydl.extract_info(url, download=False)
+    if not info:
+        raise Exception("فشل في استخراج معلومات المقطع")
+
+    duration = info.get("duration") or 0
+    format_id = select_audio_format(info.get("formats") or [], duration)
+
+    temp_dir = tempfile.mkdtemp(prefix="dl_", dir=AUDIO_CACHE_DIR)
+    download_opts = dict(base_opts)
+    download_opts.update({
+        "format": format_id or "bestaudio/best",
+        "outtmpl": os.path.join(temp_dir, "audio.%(ext)s"),
+    })
+
+    try:
+        with yt_dlp.YoutubeDL(download_opts) as ydl:
+            result = ydl.extract_info(url, download=True)
+            temp_path = ydl.prepare_filename(result)
+
+        digest, final_path = _store_by_content(temp_path)
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    return {
+        "sha256": digest,
+        "ext": os.path.splitext(final_path)[1].lstrip("."),
+        "title": info.get("title") or "Unknown",
+        "performer": info.get("uploader") or info.get("artist") or "Unknown",
+        "duration": int(duration),
+        "format_id": format_id,
+        "size": os.path.getsize(final_path),
+        "path": final_path,
+    }
+
+
+def _evict_blocking(snapshot: Dict[str, Dict[str, Any]], keep: str, max_bytes: int) -> List[str]:
+    """
+    حذف الملفات الأقدم استخدامًا حتى يعود حجم الذاكرة المؤقتة ضمن الحد (تعمل داخل خيط منفصل)
+
+    Args:
+        snapshot: نسخة من الفهرس
+        keep: بصمة الملف الذي نُزّل للتو (لا يُحذف)
+        max_bytes: الحد الأقصى لحجم الذاكرة المؤقتة
+
+    Returns:
+        مفاتيح المصادر التي حُذفت ملفاتها
+    """
+    # عدة مصادر قد تشير إلى الملف نفسه، فالحجم ووقت الاستخدام يُحسبان لكل بصمة
+    files: Dict[str, Dict[str, Any]] = {}
+    for key, entry in snapshot.items():
+        item = files.setdefault(entry["sha256"], {"ext": entry["ext"], "size": entry.get("size"), "used": 0, "keys": []})
+        item["used"] = max(item["used"], entry.get("used", 0))
+        item["keys"].append(key)
+
+    total = 0
+    for digest, item in files.items():
+        if item["size"] is None:
+            path = _content_path(digest, item["ext"])
+            item["size"] = os.path.getsize(path) if os.path.exists(path) else 0
+        total += item["size"]
+
+    removed: List[str] = []
+    for digest, item in sorted(files.items(), key=lambda pair: pair[1]["used"]):
+        if total <= max_bytes:
+            break
+        if digest == keep:
+            continue
+        try:
+            os.remove(_content_path(digest, item["ext"]))
+        except FileNotFoundError:
+            pass
+        total -= item["size"]
+        removed.extend(item["keys"])
+    return removed
+
+
+async def _evict_over_limit(keep: str) -> None:
+    """
+    تطبيق حد حجم الذاكرة المؤقتة بعد إضافة ملف جديد
+    """
+    try:
+        removed = await asyncio.get_running_loop().run_in_executor(
+            None, _evict_blocking, dict(cache_index), keep, AUDIO_CACHE_MAX_BYTES
+        )
+    except Exception as e:
+        logger.error(f"خطأ في تنظيف الذاكرة المؤقتة للصوتيات: {e}")
+        return
+
+    for key in removed:
+        cache_index.pop(key, None)
+    if removed:
+        logger.info(f"حُذف {len(removed)} ملفًا صوتيًا من الذاكرة المؤقتة لتجاوز الحد")
+
+
+async def _download_and_index(key: str, ydl_overrides: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    تنزيل المصدر ضمن الحد العام وتسجيله في الفهرس
+    """
+    global _global_limit
+    if _global_limit is None:
+        _global_limit = asyncio.Semaphore(DOWNLOAD_CONCURRENCY)
+
+    async with _global_limit:
+        loop = asyncio.get_running_loop()
+        result = await loop.run_in_executor(None, _download_blocking, _source_url(key), ydl_overrides)
+
+    cache_index[key] = {k: v for k, v in result.items() if k != "path"}
+    cache_index[key]["used"] = time.time()
+    await _evict_over_limit(result["sha256"])
+    await save_cache_index()
+    return result
+
+
+async def download_audio(
+    source: str,
+    user_id: Optional[int] = None,
+    ydl_overrides: Optional[Dict[str, Any]] = None,
+) -> Tuple[bool, Any]:
+    """
+    تنزيل ملف صوتي مع الاستفادة من الذاكرة المؤقتة ومشاركة التنزيلات المتطابقة
+
+    Args:
+        source: معرف فيديو يوتيوب أو رابط مباشر
+        user_id: معرف المستخدم صاحب الطلب لتطبيق الحد الخاص بكل مستخدم
+        ydl_overrides: خيارات إضافية لـ yt-dlp (مثل nocheckcertificate لخادم اختبار محلي بشهادة موقعة ذاتيًا)
+
+    Returns:
+        زوج من (نجاح العملية، النتيجة) حيث تكون النتيجة معلومات الملف أو رسالة خطأ
+    """
+    if not yt_dlp:
+        return False, "مكتبة yt-dlp غير مثبتة"
+
+    key = source_key(source)
+
+    cached = get_cached_audio(key)
+    if cached:
+        return True, cached
+
+    # الانضمام إلى تنزيل جارٍ لنفس المصدر بدلاً من تكراره
+    pending = _in_flight.get(key)
+    if pending is not None:
+        try:
+            return True, await asyncio.shield(pending)
+        except Exception as e:
+            return False, f"فشل تنزيل الملف الصوتي: {e}"
+
+    if user_id is not None and _user_active.get(user_id, 0) >= DOWNLOAD_PER_USER_LIMIT:
+        return False, "لديك تنزيل جارٍ بالفعل، انتظر حتى يكتمل ثم حاول مرة أخرى"
+
+    if user_id is not None:
+        _user_active[user_id] = _user_active.get(user_id, 0) + 1
+
+    future = asyncio.ensure_future(_download_and_index(key, ydl_overrides))
+    _in_flight[key] = future
+    try:
+        result = await asyncio.shield(future)
+        return True, result
+    except Exception as e:
+        logger.error(f"فشل تنزيل {key}: {e}")
+        return False, "فشل تنزيل الملف الصوتي، حاول مرة أخرى لاحقًا"
+    finally:
+        if user_id is not None:
+            _user_active[user_id] -= 1
+            if _user_active[user_id] <= 0:
+                del _user_active[user_id]
+        if future.done():
+            _in_flight.pop(key, None)
+        else:
+            future.add_done_callback(lambda _: _in_flight.pop(key, None))
+
+
+# تحميل فهرس الذاكرة المؤقتة عند استيراد الوحدة
+load_cache_index()
@@ -6,6 +6,18 @@ from telegram import Update, User, Chat, ChatPermissions, InlineKeyboardButton,
 from telegram.error import BadRequest
 from telegram.ext import ContextTypes
 from config import DEFAULT_PROTECTION_SETTINGS, SPAM_URL_PATTERNS
+from utils.sharding import publish, register_shared
+from utils.near_duplicates import check_message as check_near_duplicate
+from utils.raid_guard import record_join, handle_raid_join
+from utils.moderation_actions import emit
+from utils.chat_word_lists import (
+    find_word as find_bad_word, get_word_lists, add_word, exempt_word, remove_entry as remove_word_entry, word_id,
+)
+from utils.banned_images import has_banned_images, photo_hash, find_banned, ban_image, unban_image
+from utils.decision_log import (
+    RULE_FORWARD, RULE_BAD_WORD, RULE_LINK, RULE_DUPLICATE, RULE_FLOOD, RULE_BANNED_IMAGE,
+    log_decision, message_hash,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -15,6 +27,8 @@ user_message_count: Dict[str, Dict[int, int]] = {}
 user_warnings: Dict[str, Dict[int, int]] = {}
 # Store group settings
 group_settings: Dict[int, Dict[str, Any]] = {}
+# Entries of each word list shown as delete buttons
+MAX_WORD_BUTTONS = 20
 
 async def handle_new_member(update: Update, context: ContextTypes.DEFAULT_TYPE, user: User) -> None:
     """
@@ -30,6 +44,16 @@ async def handle_new_member(update: Update, context: ContextTypes.DEFAULT_TYPE,
     # Get group settings or use default
     settings = group_settings.get(chat_id, DEFAULT_PROTECTION_SETTINGS)
     
+    # During a join raid, welcomes are batched and joiners optionally restricted
+    if record_join(chat_id):
+        await handle_raid_join(context.bot, chat_id, user, settings)
+        if user.is_bot and settings.get("ban_bots", False):
+            try:
+                await context.bot.ban_chat_member(chat_id=chat_id, user_id=user.id)
+            except BadRequest as e:
+                logger.error(f"Error banning bot: {e}")
+        return
+    
     # Send welcome message
     if settings.get("welcome_message"):
         welcome_message = settings["welcome_message"].replace("{username}", user.mention_html())
@@ -77,6 +101,157 @@ async def handle_left_member(update: Update, context: ContextTypes.DEFAULT_TYPE,
             parse_mode="HTML"
         )
 
+def find_spam_link(text: str) -> Optional[str]:
+    """
+    Find the first spam URL pattern in a message.
+    
+    Args:
+        text: The message text.
+        
+    Returns:
+        The matched entry of SPAM_URL_PATTERNS, or None.
+    """
+    lowered = text.lower()
+    for pattern in SPAM_URL_PATTERNS:
+        if pattern.lower() in lowered:
+            return pattern
+    return None
+
+def count_flood(chat_id: int, user_id: int) -> bool:
+    """
+    Count a message towards the flood limit.
+    
+    Args:
+        chat_id: The chat ID.
+        user_id: The sender's user ID.
+        
+    Returns:
+        True if the user just went over the limit (the counter is reset).
+    """
+    # Initialize counter for this chat if it doesn't exist
+    chat_key = str(chat_id)
+    if chat_key not in user_message_count:
+        user_message_count[chat_key] = {}
+    
+    # Get current time
+    current_time = int(time.time())
+    
+    # Clean old entries (more than 60 seconds old)
+    user_message_count[chat_key] = {
+        uid: timestamp for uid, timestamp in user_message_count[chat_key].items()
+        if current_time - timestamp < 60
+    }
+    
+    # Increment counter for user
+    if user_id in user_message_count[chat_key]:
+        user_message_count[chat_key][user_id] += 1
+    else:
+        user_message_count[chat_key][user_id] = 1
+    
+    # Check for flood (more than 10 messages in 60 seconds)
+    if user_message_count[chat_key][user_id] > 10:
+        # Reset counter
+        user_message_count[chat_key][user_id] = 0
+        return True
+    return False
+
+def shadow_evaluate(update: Update, chat_id: int, user_id: int) -> None:
+    """
+    Evaluate every rule on a message and log the decisions without acting (shadow mode).
+    
+    All rules run, whatever the chat's anti_* toggles say, so the log shows hit rates,
+    cost and overlap of the full rule set.
+    
+    Args:
+        update: The update object.
+        chat_id: The chat ID.
+        user_id: The sender's user ID.
+    """
+    message = update.message
+    text = message.text
+    message_text = message.text or message.caption
+    digest = message_hash(message_text or "")
+    now = time.time()
+    
+    checks = (
+        (RULE_FORWARD, lambda: "forward" if message.forward_date else None),
+        (RULE_BAD_WORD, lambda: find_bad_word(chat_id, text) if text else None),
+        (RULE_LINK, lambda: find_spam_link(text) if text else None),
+        (RULE_DUPLICATE, lambda: "wave" if message_text and check_near_duplicate(
+            chat_id, user_id, message.message_id, message_text)[0] else None),
+        (RULE_FLOOD, lambda: "flood" if count_flood(chat_id, user_id) else None),
+    )
+    for rule_id, check in checks:
+        started = time.perf_counter_ns()
+        term = check()
+        log_decision(chat_id, digest, rule_id, term, time.perf_counter_ns() - started, now)
+
+async def _is_exempt(context: ContextTypes.DEFAULT_TYPE, chat_id: int, user_id: int) -> bool:
+    """
+    Whether the sender is the owner or a chat admin (their messages are never moderated).
+    """
+    from config import OWNER_ID
+    if str(user_id) == OWNER_ID:
+        return True
+    
+    try:
+        chat_member = await context.bot.get_chat_member(chat_id, user_id)
+        return chat_member.status in ['administrator', 'creator']
+    except BadRequest:
+        # If we can't get chat member, proceed with checks
+        return False
+
+async def check_banned_photo(update: Update, context: ContextTypes.DEFAULT_TYPE) -> bool:
+    """
+    Delete a photo that matches one of the chat's banned images.
+    
+    Photos only go through this check, not the text rules of delete_spam. Chats without
+    banned images return before any API call or download.
+    
+    Args:
+        update: The update object.
+        context: The context object.
+        
+    Returns:
+        True if the photo was banned and deleted, False otherwise.
+    """
+    chat_id = update.effective_chat.id
+    user_id = update.effective_user.id
+    if not has_banned_images(chat_id):
+        return False
+    
+    settings = group_settings.get(chat_id, DEFAULT_PROTECTION_SETTINGS)
+    shadow = settings.get("shadow_mode", False)
+    if not shadow and not settings.get("anti_banned_images", True):
+        return False
+    if await _is_exempt(context, chat_id, user_id):
+        return False
+    
+    started = time.perf_counter_ns()
+    image_hash = await photo_hash(context.bot, update.message.photo)
+    match = find_banned(chat_id, image_hash) if image_hash is not None else None
+    
+    # Shadow mode: log the decision (the term is the matched banned hash), take no action
+    if shadow:
+        log_decision(
+            chat_id, message_hash(update.message.photo[-1].file_unique_id), RULE_BANNED_IMAGE,
+            f"{match[0]:016x}" if match else None, time.perf_counter_ns() - started,
+        )
+        return False
+    if not match:
+        return False
+    
+    emit(context.bot, "delete", chat_id, user_id, message_ids=[update.message.message_id])
+    emit(context.bot, "notify", chat_id, user_id, text=f"⚠️ {update.effective_user.mention_html()}: تم حذف الصورة لأنها محظورة في هذه المجموعة.")
+    
+    await warn_user_internal(
+        context, chat_id, user_id,
+        update.effective_user.mention_html(),
+        "نشر صورة محظورة"
+    )
+    
+    return True
+
 async def delete_spam(update: Update, context: ContextTypes.DEFAULT_TYPE) -> bool:
     """
     Check for spam and delete if necessary.
@@ -92,175 +267,87 @@ async def delete_spam(update: Update, context: ContextTypes.DEFAULT_TYPE) -> boo
     user_id = update.effective_user.id
     
     # Skip checks for admins and the owner
-    from config import OWNER_ID, BAD_WORDS
-    if str(user_id) == OWNER_ID:
+    if await _is_exempt(context, chat_id, user_id):
         return False
     
-    try:
-        chat_member = await context.bot.get_chat_member(chat_id, user_id)
-        if chat_member.status in ['administrator', 'creator']:
-            return False
-    except BadRequest:
-        # If we can't get chat member, proceed with checks
-        pass
-    
     # Get group settings or use default
     settings = group_settings.get(chat_id, DEFAULT_PROTECTION_SETTINGS)
     
+    # Shadow mode: log what the rules would do, take no action
+    if settings.get("shadow_mode", False):
+        shadow_evaluate(update, chat_id, user_id)
+        return False
+    
     # 1. Check for forwarded messages
     if settings.get("anti_forward", True) and update.message.forward_date:
-        try:
-            await update.message.delete()
-            await context.bot.send_message(
-                chat_id=chat_id,
-                text=f"⚠️ {update.effective_user.mention_html()}: غير مسموح بإعادة توجيه الرسائل في هذه المجموعة",
-                parse_mode="HTML"
-            )
-            
-            # Give a warning for forwarded message
-            await warn_user_internal(
-                context, chat_id, user_id, 
-                update.effective_user.mention_html(),
-                "إرسال رسالة محولة"
-            )
-            
-            return True
-        except BadRequest as e:
-            logger.error(f"Error deleting forwarded message: {e}")
-            return False
+        emit(context.bot, "delete", chat_id, user_id, message_ids=[update.message.message_id])
+        emit(context.bot, "notify", chat_id, user_id, text=f"⚠️ {update.effective_user.mention_html()}: غير مسموح بإعادة توجيه الرسائل في هذه المجموعة")
+        
+        # Give a warning for forwarded message
+        await warn_user_internal(
+            context, chat_id, user_id, 
+            update.effective_user.mention_html(),
+            "إرسال رسالة محولة"
+        )
+        
+        return True
     
     # 2. Check for bad words/offensive language
-    if settings.get("anti_bad_words", True) and update.message.text:
-        message_text = update.message.text.lower()
-        
-        # تحسين التعرف على الكلمات المسيئة
-        normalized_text = message_text
+    if settings.get("anti_bad_words", True) and update.message.text and find_bad_word(chat_id, update.message.text):
+        emit(context.bot, "delete", chat_id, user_id, message_ids=[update.message.message_id])
+        emit(context.bot, "notify", chat_id, user_id, text=f"⚠️ {update.effective_user.mention_html()}: تم حذف رسالتك لاحتوائها على كلمات غير لائقة. التكرار سيؤدي إلى الحظر.")
         
-        # استبدال بعض الحروف المتشابهة التي يستخدمها الناس للتحايل
-        replacements = {
-            '0': 'o', '1': 'i', '3': 'e', '4': 'a', '5': 's', '7': 't', '8': 'b',
-            '@': 'a', '$': 's', '+': 't', 'أ': 'ا', 'إ': 'ا', 'آ': 'ا',
-            'ة': 'ه', 'ى': 'ي', '_': '', '-': '', '.': '', ',': ''
-        }
+        # إعطاء تحذير لاستخدام كلمات مسيئة
+        await warn_user_internal(
+            context, chat_id, user_id, 
+            update.effective_user.mention_html(),
+            "استخدام كلمات مسيئة"
+        )
         
-        for old, new in replacements.items():
-            normalized_text = normalized_text.replace(old, new)
+        return True
+    
+    # 3. Check for spam links
+    if settings.get("anti_link", True) and update.message.text and find_spam_link(update.message.text):
+        emit(context.bot, "delete", chat_id, user_id, message_ids=[update.message.message_id])
+        emit(context.bot, "notify", chat_id, user_id, text=f"⚠️ {update.effective_user.mention_html()}: غير مسموح بإرسال روابط في هذه المجموعة.")
         
-        # تقطيع الجمل إلى كلمات للبحث عن الكلمات المسيئة
-        words = normalized_text.split()
+        # Give a warning for posting links
+        await warn_user_internal(
+            context, chat_id, user_id, 
+            update.effective_user.mention_html(),
+            "نشر روابط غير مصرح بها"
+        )
         
-        # فحص كل كلمة مسيئة
-        for bad_word in BAD_WORDS:
-            bad_word_lower = bad_word.lower()
-            
-            # التحقق من وجود الكلمة كاملة
-            if bad_word_lower in normalized_text:
-                try:
-                    await update.message.delete()
-                    await context.bot.send_message(
-                        chat_id=chat_id,
-                        text=f"⚠️ {update.effective_user.mention_html()}: تم حذف رسالتك لاحتوائها على كلمات غير لائقة. التكرار سيؤدي إلى الحظر.",
-                        parse_mode="HTML"
-                    )
-                    
-                    # إعطاء تحذير لاستخدام كلمات مسيئة
-                    await warn_user_internal(
-                        context, chat_id, user_id, 
-                        update.effective_user.mention_html(),
-                        "استخدام كلمات مسيئة"
-                    )
-                    
-                    return True
-                except BadRequest as e:
-                    logger.error(f"Error deleting message with bad words: {e}")
-                    return False
-                
-            # التحقق من وجود الكلمة كجزء من كلمة أخرى
-            for word in words:
-                # تحقق ما إذا كانت الكلمة المسيئة موجودة كجزء من الكلمة
-                if len(bad_word_lower) > 3 and bad_word_lower in word:
-                    try:
-                        await update.message.delete()
-                        await context.bot.send_message(
-                            chat_id=chat_id,
-                            text=f"⚠️ {update.effective_user.mention_html()}: تم حذف رسالتك لاحتوائها على كلمات غير لائقة. التكرار سيؤدي إلى الحظر.",
-                            parse_mode="HTML"
-                        )
-                        
-                        # إعطاء تحذير لاستخدام كلمات مسيئة
-                        await warn_user_internal(
-                            context, chat_id, user_id, 
-                            update.effective_user.mention_html(),
-                            "استخدام كلمات مسيئة"
-                        )
-                        
-                        return True
-                    except BadRequest as e:
-                        logger.error(f"Error deleting message with bad words: {e}")
-                        return False
+        return True
     
-    # 3. Check for spam links
-    if settings.get("anti_link", True) and update.message.text:
-        for pattern in SPAM_URL_PATTERNS:
-            if pattern.lower() in update.message.text.lower():
-                try:
-                    await update.message.delete()
-                    await context.bot.send_message(
-                        chat_id=chat_id,
-                        text=f"⚠️ {update.effective_user.mention_html()}: غير مسموح بإرسال روابط في هذه المجموعة.",
-                        parse_mode="HTML"
-                    )
-                    
-                    # Give a warning for posting links
-                    await warn_user_internal(
-                        context, chat_id, user_id, 
-                        update.effective_user.mention_html(),
-                        "نشر روابط غير مصرح بها"
-                    )
-                    
-                    return True
-                except BadRequest as e:
-                    logger.error(f"Error deleting spam message: {e}")
-                    return False
+    # 4. Check for copy-paste waves (near-identical messages from several users)
+    message_text = update.message.text or update.message.caption
+    if settings.get("anti_duplicates", True) and message_text:
+        is_wave, earlier_ids = check_near_duplicate(chat_id, user_id, update.message.message_id, message_text)
+        if is_wave:
+            # The earlier copies (from other users) are merged into the same deleteMessages call
+            emit(context.bot, "delete", chat_id, user_id, message_ids=[update.message.message_id])
+            if earlier_ids:
+                emit(context.bot, "delete", chat_id, message_ids=earlier_ids)
+            emit(context.bot, "notify", chat_id, user_id, text=f"⚠️ {update.effective_user.mention_html()}: تم حذف رسالتك لأنها منسوخة ضمن موجة رسائل متطابقة من عدة حسابات.")
+            
+            await warn_user_internal(
+                context, chat_id, user_id,
+                update.effective_user.mention_html(),
+                "نشر رسائل منسوخة (سبام)"
+            )
+            
+            return True
     
     # Check for flood
-    if settings.get("anti_flood", True):
-        # Initialize counter for this chat if it doesn't exist
-        chat_key = str(chat_id)
-        if chat_key not in user_message_count:
-            user_message_count[chat_key] = {}
-        
-        # Get current time
-        current_time = int(time.time())
-        
-        # Clean old entries (more than 60 seconds old)
-        user_message_count[chat_key] = {
-            uid: timestamp for uid, timestamp in user_message_count[chat_key].items()
-            if current_time - timestamp < 60
-        }
-        
-        # Increment counter for user
-        if user_id in user_message_count[chat_key]:
-            user_message_count[chat_key][user_id] += 1
-        else:
-            user_message_count[chat_key][user_id] = 1
-        
-        # Check for flood (more than 10 messages in 60 seconds)
-        if user_message_count[chat_key][user_id] > 10:
-            try:
-                # Reset counter
-                user_message_count[chat_key][user_id] = 0
-                
-                # Warn or mute the user
-                success, message = await warn_user_internal(
-                    context, chat_id, user_id, 
-                    update.effective_user.mention_html(),
-                    "إرسال رسائل كثيرة بسرعة (flood)"
-                )
-                return success
-            except BadRequest as e:
-                logger.error(f"Error handling flood: {e}")
-                return False
+    if settings.get("anti_flood", True) and count_flood(chat_id, user_id):
+        # Warn or mute the user
+        success, message = await warn_user_internal(
+            context, chat_id, user_id, 
+            update.effective_user.mention_html(),
+            "إرسال رسائل كثيرة بسرعة (flood)"
+        )
+        return success
     
     return False
 
@@ -425,6 +512,36 @@ async def kick_user(update: Update, context: ContextTypes.DEFAULT_TYPE) -> Tuple
         logger.error(f"Error kicking user: {e}")
         return False, f"حدث خطأ أثناء محاولة طرد المستخدم: {str(e)}"
 
+async def ban_image_by_reply(update: Update, context: ContextTypes.DEFAULT_TYPE, unban: bool = False) -> Tuple[bool, str]:
+    """
+    Ban (or unban) the photo in the replied-to message.
+    
+    Args:
+        update: The update object.
+        context: The context object.
+        unban: Lift the ban instead.
+        
+    Returns:
+        A tuple of (success, message).
+    """
+    target = update.message.reply_to_message
+    if not target or not target.photo:
+        return False, "الرجاء الرد على رسالة فيها صورة."
+    
+    image_hash = await photo_hash(context.bot, target.photo)
+    if image_hash is None:
+        return False, "تعذرت قراءة الصورة."
+    
+    chat_id = update.effective_chat.id
+    if unban:
+        return unban_image(chat_id, image_hash)
+    
+    success, message = ban_image(chat_id, image_hash, update.effective_user.id)
+    if success:
+        # The banned photo itself goes too
+        emit(context.bot, "delete", chat_id, target.from_user.id if target.from_user else 0, message_ids=[target.message_id])
+    return success, message
+
 async def warn_user(update: Update, context: ContextTypes.DEFAULT_TYPE) -> Tuple[bool, str]:
     """
     Warn a user in a group.
@@ -540,38 +657,33 @@ async def warn_user_internal(
     
     current_warnings = user_warnings[chat_key][user_id]
     
+    # Record the warning in the moderation audit trail, in order with the chat's other actions
+    emit(context.bot, "warn", chat_id, user_id, reason=reason)
+    
     # Check if warnings exceed limit
     if current_warnings >= warn_limit:
         # Reset warnings
         user_warnings[chat_key][user_id] = 0
         
-        # Take action based on warn_action
-        action_message = ""
-        try:
-            if warn_action == "ban":
-                await context.bot.ban_chat_member(chat_id=chat_id, user_id=user_id)
-                action_message = f"تم حظر {user_mention} بعد تجاوز عدد التحذيرات المسموح ({warn_limit})."
-            elif warn_action == "kick":
-                await context.bot.ban_chat_member(chat_id=chat_id, user_id=user_id)
-                await context.bot.unban_chat_member(chat_id=chat_id, user_id=user_id)
-                action_message = f"تم طرد {user_mention} بعد تجاوز عدد التحذيرات المسموح ({warn_limit})."
-            else:  # mute
-                from telegram import ChatPermissions
-                await context.bot.restrict_chat_member(
-                    chat_id=chat_id,
-                    user_id=user_id,
-                    permissions=ChatPermissions(
-                        can_send_messages=False,
-                        can_send_media_messages=False,
-                        can_send_other_messages=False
-                    )
+        # Queue the action based on warn_action (executed with retries by utils/moderation_actions.py)
+        if warn_action == "ban":
+            emit(context.bot, "ban", chat_id, user_id, reason=reason)
+            return True, f"تم حظر {user_mention} بعد تجاوز عدد التحذيرات المسموح ({warn_limit})."
+        elif warn_action == "kick":
+            emit(context.bot, "ban", chat_id, user_id, reason=reason)
+            emit(context.bot, "unban", chat_id, user_id, reason=reason)
+            return True, f"تم طرد {user_mention} بعد تجاوز عدد التحذيرات المسموح ({warn_limit})."
+        else:  # mute
+            emit(
+                context.bot, "restrict", chat_id, user_id,
+                reason=reason,
+                permissions=ChatPermissions(
+                    can_send_messages=False,
+                    can_send_media_messages=False,
+                    can_send_other_messages=False
                 )
-                action_message = f"تم كتم {user_mention} بعد تجاوز عدد التحذيرات المسموح ({warn_limit})."
-            
-            return True, action_message
-        except BadRequest as e:
-            logger.error(f"Error taking action after warnings: {e}")
-            return False, f"حدث خطأ أثناء محاولة تنفيذ الإجراء بعد التحذيرات: {str(e)}"
+            )
+            return True, f"تم كتم {user_mention} بعد تجاوز عدد التحذيرات المسموح ({warn_limit})."
     
     # If warnings don't exceed limit yet
     return True, f"تم تحذير {user_mention} ({current_warnings}/{warn_limit}).\nالسبب: {reason}"
@@ -602,6 +714,17 @@ def update_group_settings(chat_id: int, new_settings: Dict[str, Any]) -> None:
         settings = DEFAULT_PROTECTION_SETTINGS.copy()
         settings.update(new_settings)
         group_settings[chat_id] = settings
+    
+    # The settings may be edited from a private chat handled by another shard
+    publish("group_settings", chat_id, group_settings[chat_id])
+
+def _apply_shared_settings(chat_id: int, settings: Dict[str, Any]) -> None:
+    """
+    Apply group settings changed by another shard.
+    """
+    group_settings[chat_id] = settings
+
+register_shared("group_settings", _apply_shared_settings)
 
 async def get_protection_settings_keyboard(chat_id: int) -> InlineKeyboardMarkup:
     """
@@ -644,6 +767,13 @@ async def get_protection_settings_keyboard(chat_id: int) -> InlineKeyboardMarkup
         )
     ])
     
+    keyboard.append([
+        InlineKeyboardButton(
+            "📝 كلمات المجموعة (إضافة واستثناء)",
+            callback_data=f"protection_words:{chat_id}"
+        )
+    ])
+    
     keyboard.append([
         InlineKeyboardButton(
             f"{'🌊 رسائل متكررة' if settings['anti_flood'] else '🌊 رسائل متكررة'} ({on_emoji if settings['anti_flood'] else off_emoji})", 
@@ -651,6 +781,34 @@ async def get_protection_settings_keyboard(chat_id: int) -> InlineKeyboardMarkup
         )
     ])
     
+    keyboard.append([
+        InlineKeyboardButton(
+            f"📋 رسائل منسوخة ({on_emoji if settings.get('anti_duplicates', True) else off_emoji})",
+            callback_data=f"protection_toggle:anti_duplicates:{chat_id}"
+        )
+    ])
+    
+    keyboard.append([
+        InlineKeyboardButton(
+            f"🖼 صور محظورة ({on_emoji if settings.get('anti_banned_images', True) else off_emoji})",
+            callback_data=f"protection_toggle:anti_banned_images:{chat_id}"
+        )
+    ])
+    
+    keyboard.append([
+        InlineKeyboardButton(
+            f"🚨 تقييد المقتحمين ({on_emoji if settings.get('raid_restrict', False) else off_emoji})",
+            callback_data=f"protection_toggle:raid_restrict:{chat_id}"
+        )
+    ])
+    
+    keyboard.append([
+        InlineKeyboardButton(
+            f"👁 وضع المراقبة بلا إجراءات ({on_emoji if settings.get('shadow_mode', False) else off_emoji})",
+            callback_data=f"protection_toggle:shadow_mode:{chat_id}"
+        )
+    ])
+    
     # Add warning settings
     warn_limit = settings.get("warn_limit", 3)
     warn_action = settings.get("warn_action", "kick")
@@ -694,6 +852,76 @@ async def get_protection_settings_keyboard(chat_id: int) -> InlineKeyboardMarkup
     
     return InlineKeyboardMarkup(keyboard)
 
+async def _can_manage(context: ContextTypes.DEFAULT_TYPE, chat_id: int, user: User) -> bool:
+    """
+    Check that the user is an admin of the chat or the bot owner.
+    """
+    from config import OWNER_ID
+    if str(user.id) == OWNER_ID:
+        return True
+    try:
+        chat_member = await context.bot.get_chat_member(chat_id, user.id)
+        return chat_member.status in ['administrator', 'creator']
+    except BadRequest:
+        return False
+
+def get_word_lists_menu(chat_id: int) -> Tuple[str, InlineKeyboardMarkup]:
+    """
+    Build the text and keyboard listing a chat's added and exempted words.
+    
+    Args:
+        chat_id: The chat ID.
+        
+    Returns:
+        A tuple of (text, keyboard).
+    """
+    lists = get_word_lists(chat_id)
+    text = "📝 كلمات المجموعة\n\n"
+    text += "تُطبق القائمة العامة للكلمات المسيئة مع إضافات المجموعة، عدا الكلمات المستثناة.\n\n"
+    text += "➕ الإضافات: " + ("، ".join(lists["add"]) if lists["add"] else "لا يوجد") + "\n"
+    text += "✅ الاستثناءات: " + ("، ".join(lists["exempt"]) if lists["exempt"] else "لا يوجد") + "\n\n"
+    if lists["add"] or lists["exempt"]:
+        text += "اضغط على كلمة لحذفها من القائمة."
+    
+    keyboard = [
+        [
+            InlineKeyboardButton("➕ إضافة كلمة", callback_data=f"protection_words_add:{chat_id}"),
+            InlineKeyboardButton("✅ استثناء كلمة", callback_data=f"protection_words_exempt:{chat_id}")
+        ]
+    ]
+    
+    # One delete button per entry (the callback carries a short hash of the word: words can exceed
+    # the 64-byte limit, and a position would point at another word once the list changes)
+    for kind, icon in (("add", "❌"), ("exempt", "↩️")):
+        for word in lists[kind][:MAX_WORD_BUTTONS]:
+            keyboard.append([
+                InlineKeyboardButton(f"{icon} {word}", callback_data=f"protection_words_del:{chat_id}:{kind}:{word_id(word)}")
+            ])
+    
+    keyboard.append([InlineKeyboardButton("العودة", callback_data="protection_settings")])
+    return text, InlineKeyboardMarkup(keyboard)
+
+async def handle_word_list_input(update: Update, context: ContextTypes.DEFAULT_TYPE, word_state: Dict[str, Any]) -> None:
+    """
+    Handle the word an admin sent after pressing add/exempt in the word list menu.
+    
+    Args:
+        update: The update object.
+        context: The context object.
+        word_state: The pending state ({"chat_id": ..., "mode": "add" or "exempt", "origin": ...}).
+    """
+    chat_id = word_state["chat_id"]
+    if not await _can_manage(context, chat_id, update.effective_user):
+        return
+    
+    if word_state["mode"] == "add":
+        success, message = add_word(chat_id, update.message.text)
+    else:
+        success, message = exempt_word(chat_id, update.message.text)
+    
+    text, keyboard = get_word_lists_menu(chat_id)
+    await update.message.reply_text(f"{'✅' if success else '⚠️'} {message}\n\n{text}", reply_markup=keyboard)
+
 async def handle_protection_setting_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, callback_data: str) -> None:
     """
     معالجة استجابات الأزرار المتعلقة بإعدادات الحماية
@@ -729,7 +957,7 @@ async def handle_protection_setting_callback(update: Update, context: ContextTyp
             
         # تحديث الإعدادات
         settings = get_group_settings(chat_id)
-        settings[setting_name] = not settings.get(setting_name, True)
+        settings[setting_name] = not settings.get(setting_name, DEFAULT_PROTECTION_SETTINGS.get(setting_name, True))
         update_group_settings(chat_id, settings)
         
         # تحديث لوحة الإعدادات
@@ -881,6 +1109,45 @@ async def handle_protection_setting_callback(update: Update, context: ContextTyp
             parse_mode="MARKDOWN"
         )
         
+    elif callback_data.startswith("protection_words"):
+        # قوائم كلمات المجموعة: protection_words:<chat> أو protection_words_add:<chat>
+        # أو protection_words_exempt:<chat> أو protection_words_del:<chat>:<add|exempt>:<word id>
+        parts = callback_data.split(":")
+        action = parts[0]
+        chat_id = int(parts[1])
+        
+        if not await _can_manage(context, chat_id, user):
+            await query.answer("عذراً، هذه الميزة متاحة فقط للمشرفين.")
+            return
+        
+        if action in ("protection_words_add", "protection_words_exempt"):
+            if 'state' not in context.user_data:
+                context.user_data['state'] = {}
+            mode = "add" if action == "protection_words_add" else "exempt"
+            # The word is only taken from the chat where the prompt was shown
+            context.user_data['state']['waiting_for_word'] = {
+                "chat_id": chat_id, "mode": mode, "origin": query.message.chat.id
+            }
+            await query.message.edit_text(
+                "✏️ أرسل الآن الكلمة التي تريد إضافتها إلى قائمة المجموعة:"
+                if mode == "add" else
+                "✏️ أرسل الآن الكلمة التي تريد استثناءها من القائمة العامة في هذه المجموعة:",
+                reply_markup=InlineKeyboardMarkup([[
+                    InlineKeyboardButton("إلغاء", callback_data=f"protection_words:{chat_id}")
+                ]])
+            )
+            return
+        
+        result = ""
+        if action == "protection_words_del" and len(parts) == 4:
+            success, message = remove_word_entry(chat_id, parts[2], parts[3])
+            result = f"{'✅' if success else '⚠️'} {message}\n\n"
+        elif 'state' in context.user_data:
+            context.user_data['state'].pop('waiting_for_word', None)
+        
+        text, keyboard = get_word_lists_menu(chat_id)
+        await query.message.edit_text(result + text, reply_markup=keyboard)
+        
     elif callback_data.startswith("protection_settings:"):
         # استرجاع رقم المحادثة إذا كان موجودًا في البيانات
         chat_id = update.effective_chat.id
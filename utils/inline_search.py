@@ -0,0 +1,267 @@
+"""
+وحدة البحث عن الموسيقى في الوضع المضمن (@bot اسم الأغنية)
+- الاستعلامات التي تصل مع كل حرف يكتبه المستخدم تُؤجل قليلًا (INLINE_DEBOUNCE)، ولا يُبحث إلا عن آخرها
+- نتائج البحث تُحفظ في ذاكرة مؤقتة، والاستعلام الذي يبدأ باستعلام محفوظ نتائجه كاملة (أقل من حد
+  البحث) يُجاب من نتائجه مباشرة بعد تصفيتها دون انتظار ولا بحث جديد
+- الأغاني التي أرسلها البوت من قبل تُعرض كملفات صوتية محفوظة لدى Telegram (file_id)
+  فيُرسل الملف فور اختياره، والباقي تُعرض كنتائج ترسل أمر التشغيل
+- المعرفات تُنشر لباقي العمليات عند التوزيع، وتحفظها العملية الأساسية وحدها دوريًا دون حجب حلقة الأحداث
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+import logging
+
+from telegram import (
+    InlineQueryResultArticle,
+    InlineQueryResultCachedAudio,
+    InputTextMessageContent,
+    Message,
+    Update,
+)
+from telegram.error import BadRequest
+from telegram.ext import ContextTypes
+
+from config import (
+    AUDIO_FILE_IDS_LIMIT,
+    INLINE_DEBOUNCE,
+    INLINE_CACHE_TIME,
+    INLINE_MIN_QUERY_LENGTH,
+    INLINE_SEARCH_CACHE_TTL,
+    INLINE_SEARCH_CACHE_SIZE,
+)
+from utils.downloader import source_key
+from utils.music_catalog import normalize_text
+from utils.music_handler import search_local_library, search_youtube
+from utils.sharding import publish, register_shared
+
+logger = logging.getLogger(__name__)
+
+# المسار إلى ملف معرفات الملفات الصوتية المرسلة
+AUDIO_FILE_IDS_FILE = "data/audio_file_ids.json"
+
+# معرف الملف الصوتي لدى Telegram لكل مصدر أرسله البوت: مفتاح المصدر -> file_id
+# (الأحدث استخدامًا في الآخر، ولا يُحتفظ بأكثر من AUDIO_FILE_IDS_LIMIT)
+audio_file_ids: "OrderedDict[str, str]" = OrderedDict()
+
+# هل تغيرت المعرفات منذ آخر حفظ
+_file_ids_dirty = False
+
+# عدد النتائج التي يعيدها كل من البحث المحلي وبحث يوتيوب
+SEARCH_LIMIT = 5
+
+# نتائج البحث: الاستعلام الموحد -> (وقت البحث، النتائج كأزواج (العنوان، المعرف)، هل النتائج كاملة)
+# النتائج كاملة إذا أعاد كل بحث أقل من SEARCH_LIMIT، فلا توجد نتائج أخرى لم تُعرض
+_search_cache: "OrderedDict[str, Tuple[float, List[Tuple[str, str]], bool]]" = OrderedDict()
+
+# آخر استعلام مضمن لكل مستخدم (الاستعلامات الأقدم منه لا يُجاب عنها)
+_latest_query: Dict[int, str] = {}
+
+# عمليات البحث الجارية، حتى لا يُبحث عن الاستعلام نفسه مرتين في وقت واحد
+_in_flight: Dict[str, asyncio.Future] = {}
+
+
+def remember_file_id(source: str, message: Optional[Message]) -> None:
+    """
+    حفظ معرف الملف الصوتي لرسالة أرسلها البوت لاستخدامه في نتائج البحث المضمن
+
+    Args:
+        source: معرف الفيديو أو الرابط الذي أُرسل منه الملف
+        message: رسالة الملف الصوتي المرسلة
+    """
+    if message is None or message.audio is None:
+        return
+    key = source_key(source)
+    if audio_file_ids.get(key) == message.audio.file_id:
+        return
+    _set_file_id(key, message.audio.file_id)
+    # فرق لا تحفظه العملية الأمامية (العمليات التي يُعاد تشغيلها تقرأ الملف)
+    publish("audio_file_id", key, message.audio.file_id, delta=True)
+
+
+def _set_file_id(key: str, file_id: str) -> None:
+    global _file_ids_dirty
+
+    audio_file_ids[key] = file_id
+    audio_file_ids.move_to_end(key)
+    while len(audio_file_ids) > AUDIO_FILE_IDS_LIMIT:
+        audio_file_ids.popitem(last=False)
+    _file_ids_dirty = True
+
+
+def cached_results(query: str, now: Optional[float] = None) -> Optional[List[Tuple[str, str]]]:
+    """
+    نتائج استعلام موحد من الذاكرة المؤقتة: النتائج المحفوظة للاستعلام نفسه، أو نتائج أطول استعلام
+    محفوظ يبدأ به بعد الإبقاء على ما يحتوي كل كلمات الاستعلام الجديد (إذا كانت نتائجه كاملة فقط،
+    وإلا فقد تكون أفضل نتائج الاستعلام الجديد خارج ما حُفظ)
+
+    Returns:
+        النتائج، أو None إذا لم يوجد ما يجيب عن الاستعلام
+    """
+    now = now or time.time()
+    words = query.split()
+    for length in range(len(query), INLINE_MIN_QUERY_LENGTH - 1, -1):
+        entry = _search_cache.get(query[:length])
+        if entry is None or now - entry[0] > INLINE_SEARCH_CACHE_TTL:
+            continue
+        if length == len(query):
+            _search_cache.move_to_end(query)
+            return entry[1]
+        if not entry[2]:
+            continue
+        _search_cache.move_to_end(query[:length])
+        matches = [
+            (title, item_id) for title, item_id in entry[1]
+            if all(word in normalize_text(title) for word in words)
+        ]
+        if matches:
+            return matches
+    return None
+
+
+async def _run_search(query: str) -> List[Tuple[str, str]]:
+    """
+    البحث في المكتبة المحلية ثم يوتيوب وحفظ النتائج
+    """
+    results = search_local_library(query, limit=SEARCH_LIMIT)
+    complete = len(results) < SEARCH_LIMIT
+    seen = {item_id for _, item_id in results}
+    youtube_results = await search_youtube(query)
+    complete = complete and len(youtube_results) < SEARCH_LIMIT
+    results.extend(item for item in youtube_results if item[1] not in seen)
+
+    # البحث الفاشل يعيد قائمة فارغة، فلا تُحفظ حتى يُعاد البحث في المرة القادمة
+    if results:
+        _search_cache[query] = (time.time(), results, complete)
+        while len(_search_cache) > INLINE_SEARCH_CACHE_SIZE:
+            _search_cache.popitem(last=False)
+    return results
+
+
+async def _search(query: str) -> List[Tuple[str, str]]:
+    """
+    البحث عن استعلام (ينضم إلى بحث جارٍ عن الاستعلام نفسه بدل تكراره)
+    """
+    future = _in_flight.get(query)
+    if future is None:
+        future = _in_flight[query] = asyncio.ensure_future(_run_search(query))
+        future.add_done_callback(lambda _: _in_flight.pop(query, None))
+    return await asyncio.shield(future)
+
+
+def _result_id(prefix: str, item_id: str) -> str:
+    # معرف النتيجة محدود بـ64 بايت، ومعرفات المكتبة المحلية قد تكون أطول
+    return prefix + hashlib.blake2b(item_id.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def build_results(results: List[Tuple[str, str]]) -> list:
+    """
+    تحويل نتائج البحث إلى نتائج مضمنة: ملف صوتي محفوظ إن وجد، وإلا نتيجة ترسل أمر التشغيل
+    """
+    inline_results = []
+    for title, item_id in results:
+        key = source_key(item_id)
+        file_id = audio_file_ids.get(key)
+        if file_id:
+            audio_file_ids.move_to_end(key)
+            inline_results.append(InlineQueryResultCachedAudio(
+                id=_result_id("a", item_id),
+                audio_file_id=file_id,
+            ))
+        else:
+            inline_results.append(InlineQueryResultArticle(
+                id=_result_id("p", item_id),
+                title=title,
+                description="اضغط لتشغيل الأغنية في المحادثة",
+                input_message_content=InputTextMessageContent(f"/play {item_id}"),
+            ))
+    return inline_results
+
+
+async def inline_query_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    الإجابة عن استعلام مضمن بنتائج البحث عن الموسيقى
+    """
+    inline_query = update.inline_query
+    query = normalize_text(inline_query.query)
+    if len(query) < INLINE_MIN_QUERY_LENGTH:
+        return
+
+    results = cached_results(query)
+    if results is None:
+        # انتظار توقف المستخدم عن الكتابة: إذا وصل استعلام أحدث منه فهو الذي يُبحث عنه
+        user_id = inline_query.from_user.id
+        _latest_query[user_id] = inline_query.id
+        await asyncio.sleep(INLINE_DEBOUNCE)
+        if _latest_query.get(user_id) != inline_query.id:
+            return
+        try:
+            results = await _search(query)
+        finally:
+            if _latest_query.get(user_id) == inline_query.id:
+                del _latest_query[user_id]
+
+    try:
+        await inline_query.answer(build_results(results), cache_time=INLINE_CACHE_TIME)
+    except BadRequest as e:
+        # الاستعلام انتهت صلاحيته (المستخدم أكمل الكتابة أو أغلق القائمة)
+        logger.debug(f"تعذرت الإجابة عن الاستعلام المضمن: {e}")
+
+
+def load_audio_file_ids() -> None:
+    """
+    تحميل معرفات الملفات الصوتية من الملف
+    """
+    audio_file_ids.clear()
+    try:
+        if os.path.exists(AUDIO_FILE_IDS_FILE):
+            with open(AUDIO_FILE_IDS_FILE, "r", encoding="utf-8") as file:
+                # الملف محفوظ بترتيب الاستخدام، فيُحتفظ بالأحدث فقط إذا صغر الحد
+                audio_file_ids.update(list(json.load(file).items())[-AUDIO_FILE_IDS_LIMIT:])
+    except Exception as e:
+        logger.error(f"خطأ في تحميل معرفات الملفات الصوتية: {e}")
+        audio_file_ids.clear()
+
+
+def _write_audio_file_ids(snapshot: Dict[str, str]) -> None:
+    try:
+        os.makedirs(os.path.dirname(AUDIO_FILE_IDS_FILE), exist_ok=True)
+        temp_path = f"{AUDIO_FILE_IDS_FILE}.{os.getpid()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump(snapshot, file, ensure_ascii=False)
+        os.replace(temp_path, AUDIO_FILE_IDS_FILE)
+    except Exception as e:
+        logger.error(f"خطأ في حفظ معرفات الملفات الصوتية: {e}")
+
+
+async def save_audio_file_ids() -> None:
+    """
+    حفظ معرفات الملفات الصوتية إذا تغيرت، دون حجب حلقة الأحداث
+    """
+    global _file_ids_dirty
+
+    if not _file_ids_dirty:
+        return
+    _file_ids_dirty = False
+    await asyncio.get_running_loop().run_in_executor(None, _write_audio_file_ids, dict(audio_file_ids))
+
+
+def save_audio_file_ids_sync() -> None:
+    """
+    حفظ معرفات الملفات الصوتية عند إيقاف البوت
+    """
+    global _file_ids_dirty
+
+    if _file_ids_dirty:
+        _file_ids_dirty = False
+        _write_audio_file_ids(dict(audio_file_ids))
+
+
+# تحميل المعرفات عند استيراد الوحدة
+load_audio_file_ids()
+register_shared("audio_file_id", _set_file_id)
@@ -0,0 +1,402 @@
+"""
+وحدة فحص مكتبة الملفات الصوتية في assets/music
+تقرأ وسوم ID3 وتحسب المدة من رؤوس إطارات MP3 دون فك الترميز، وتحفظ النتائج
+في فهرس مفتاحه (المسار + وقت التعديل + الحجم) حتى لا يُعاد فحص إلا الملفات المتغيرة
+"""
+
+import asyncio
+import hashlib
+import json
+import mmap
+import os
+import struct
+from typing import Any, Dict, List, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+# مسار ملف الفهرس
+LIBRARY_INDEX_FILE = "data/music_library.json"
+
+# التأكد من وجود المجلد
+os.makedirs(os.path.dirname(LIBRARY_INDEX_FILE), exist_ok=True)
+
+# امتدادات الملفات الصوتية التي تتم فهرستها
+AUDIO_EXTENSIONS = (".mp3", ".ogg", ".m4a")
+
+# الفهرس: المسار النسبي -> البيانات الوصفية
+library_index: Dict[str, Dict[str, Any]] = {}
+
+# جداول معدلات البت (kbps) حسب (إصدار MPEG، الطبقة)
+_BITRATES = {
+    (1, 1): [0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448],
+    (1, 2): [0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384],
+    (1, 3): [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    (2, 1): [0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256],
+    (2, 2): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+    (2, 3): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+
+# معدلات العينة حسب إصدار MPEG
+_SAMPLE_RATES = {
+    1: [44100, 48000, 32000],
+    2: [22050, 24000, 16000],
+    2.5: [11025, 12000, 8000],
+}
+
+# أسماء إطارات ID3 المطلوبة (v2.3/v2.4 ثم v2.2)
+_TAG_FRAMES = {
+    "TIT2": "title", "TPE1": "performer", "TALB": "album",
+    "TT2": "title", "TP1": "performer", "TAL": "album",
+}
+
+
+def _syncsafe(data: bytes) -> int:
+    """
+    تحويل عدد بصيغة syncsafe (7 بتات لكل بايت) إلى عدد صحيح
+    """
+    value = 0
+    for byte in data:
+        value = (value << 7) | (byte & 0x7F)
+    return value
+
+
+def _decode_text(payload: bytes) -> str:
+    """
+    فك ترميز نص إطار ID3 حسب بايت الترميز الأول
+    """
+    if not payload:
+        return ""
+    encoding, body = payload[0], payload[1:]
+    codec = {0: "latin-1", 1: "utf-16", 2: "utf-16-be", 3: "utf-8"}.get(encoding, "latin-1")
+    return body.decode(codec, "replace").rstrip("\x00").strip()
+
+
+def _parse_id3v2(data) -> Tuple[Dict[str, str], int]:
+    """
+    قراءة وسوم ID3v2 من بداية الملف
+
+    Returns:
+        Tuple من (الوسوم، موضع بداية بيانات الصوت)
+    """
+    if len(data) < 10 or data[:3] != b"ID3":
+        return {}, 0
+
+    major = data[3]
+    flags = data[5]
+    tag_size = _syncsafe(data[6:10])
+    end = 10 + tag_size + (10 if flags & 0x10 else 0)
+
+    tags: Dict[str, str] = {}
+    pos = 10
+    id_len, header_len = (3, 6) if major == 2 else (4, 10)
+
+    while pos + header_len <= min(end, len(data)):
+        frame_id = bytes(data[pos:pos + id_len])
+        if not frame_id.strip(b"\x00"):
+            break
+
+        if major == 2:
+            size = int.from_bytes(data[pos + 3:pos + 6], "big")
+        elif major == 4:
+            size = _syncsafe(data[pos + 4:pos + 8])
+        else:
+            size = struct.unpack(">I", data[pos + 4:pos + 8])[0]
+
+        name = _TAG_FRAMES.get(frame_id.decode("latin-1", "replace"))
+        if name and name not in tags:
+            tags[name] = _decode_text(bytes(data[pos + header_len:pos + header_len + size]))
+
+        pos += header_len + size
+
+    return tags, end
+
+
+def _parse_id3v1(data) -> Dict[str, str]:
+    """
+    قراءة وسوم ID3v1 من آخر 128 بايت في الملف
+    """
+    if len(data) < 128 or data[-128:-125] != b"TAG":
+        return {}
+
+    def field(start: int, length: int) -> str:
+        return bytes(data[-128 + start:-128 + start + length]).split(b"\x00")[0].decode("latin-1").strip()
+
+    return {k: v for k, v in (("title", field(3, 30)), ("performer", field(33, 30)), ("album", field(63, 30))) if v}
+
+
+def _frame_info(header: int) -> Optional[Tuple[int, int, int, float]]:
+    """
+    تحليل رأس إطار MP3 من 4 بايت
+
+    Returns:
+        (طول الإطار، عدد العينات في الإطار، معدل العينة، معدل البت) أو None إذا كان الرأس غير صالح
+    """
+    if (header >> 21) & 0x7FF != 0x7FF:
+        return None
+
+    version_bits = (header >> 19) & 0x3
+    layer_bits = (header >> 17) & 0x3
+    bitrate_index = (header >> 12) & 0xF
+    rate_index = (header >> 10) & 0x3
+    padding = (header >> 9) & 0x1
+
+    if version_bits == 1 or layer_bits == 0 or bitrate_index in (0, 15) or rate_index == 3:
+        return None
+
+    version = {3: 1, 2: 2, 0: 2.5}[version_bits]
+    layer = 4 - layer_bits
+    bitrate = _BITRATES[(1 if version == 1 else 2, layer)][bitrate_index] * 1000
+    sample_rate = _SAMPLE_RATES[version][rate_index]
+
+    if layer == 1:
+        samples = 384
+        length = (12 * bitrate // sample_rate + padding) * 4
+    else:
+        samples = 1152 if (layer == 2 or version == 1) else 576
+        length = samples // 8 * bitrate // sample_rate + padding
+
+    return length, samples, sample_rate, bitrate
+
+
+def mp3_duration(data, audio_start: int = 0) -> float:
+    """
+    حساب مدة ملف MP3 من رؤوس الإطارات فقط
+
+    يستخدم رأس Xing/Info أو VBRI إن وجد، وإلا يمر على رؤوس الإطارات
+    بالقفز من رأس إلى الذي يليه دون قراءة بيانات الصوت
+
+    Args:
+        data: محتوى الملف (bytes أو mmap)
+        audio_start: موضع بداية بيانات الصوت بعد وسوم ID3v2
+
+    Returns:
+        المدة بالثواني (0 إذا لم يتم العثور على إطارات صالحة)
+    """
+    size = len(data)
+    if size >= 128 and data[-128:-125] == b"TAG":
+        size -= 128
+
+    # البحث عن أول إطار صالح
+    pos = audio_start
+    info = None
+    while pos + 4 <= size:
+        if data[pos] == 0xFF:
+            info = _frame_info(struct.unpack(">I", data[pos:pos + 4])[0])
+            if info:
+                break
+        pos += 1
+    if not info:
+        return 0.0
+
+    length, samples, sample_rate, _ = info
+    first_frame = bytes(data[pos:pos + min(length, 200)])
+
+    # رأس Xing/Info للملفات متغيرة معدل البت
+    for marker in (b"Xing", b"Info"):
+        offset = first_frame.find(marker)
+        if offset != -1 and len(first_frame) >= offset + 12:
+            flags = struct.unpack(">I", first_frame[offset + 4:offset + 8])[0]
+            if flags & 0x1:
+                frames = struct.unpack(">I", first_frame[offset + 8:offset + 12])[0]
+                return frames * samples / sample_rate
+
+    # رأس VBRI (يوجد دائمًا بعد 32 بايت من رأس الإطار)
+    if first_frame[36:40] == b"VBRI" and len(first_frame) >= 36 + 18:
+        frames = struct.unpack(">I", first_frame[36 + 14:36 + 18])[0]
+        return frames * samples / sample_rate
+
+    # المرور على رؤوس الإطارات
+    total_samples = 0
+    while pos + 4 <= size:
+        info = _frame_info(struct.unpack(">I", data[pos:pos + 4])[0])
+        if not info or info[0] <= 0:
+            break
+        total_samples += info[1]
+        pos += info[0]
+
+    return total_samples / sample_rate
+
+
+def read_metadata(path: str) -> Dict[str, Any]:
+    """
+    قراءة الوسوم والمدة لملف صوتي
+
+    Args:
+        path: مسار الملف
+
+    Returns:
+        قاموس يحتوي على title و performer و album و duration
+    """
+    metadata: Dict[str, Any] = {"title": "", "performer": "", "album": "", "duration": 0}
+    if not path.lower().endswith(".mp3") or os.path.getsize(path) == 0:
+        return metadata
+
+    with open(path, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        tags, audio_start = _parse_id3v2(data)
+        for key, value in _parse_id3v1(data).items():
+            tags.setdefault(key, value)
+        metadata.update(tags)
+        metadata["duration"] = int(round(mp3_duration(data, audio_start)))
+
+    return metadata
+
+
+def load_library_index() -> None:
+    """
+    تحميل فهرس المكتبة من الملف
+    """
+    global library_index
+
+    try:
+        if os.path.exists(LIBRARY_INDEX_FILE):
+            with open(LIBRARY_INDEX_FILE, "r", encoding="utf-8") as file:
+                library_index = json.load(file)
+    except Exception as e:
+        logger.error(f"خطأ في تحميل فهرس مكتبة الموسيقى: {e}")
+        library_index = {}
+
+
+def save_library_index(index: Optional[Dict[str, Dict[str, Any]]] = None) -> None:
+    """
+    حفظ فهرس المكتبة في الملف
+
+    Args:
+        index: الفهرس المراد حفظه (الفهرس الحالي إذا لم يُحدد)
+    """
+    try:
+        # ملف مؤقت خاص بكل عملية حتى لا تتداخل الكتابة عند توزيع التحديثات على عدة عمليات
+        temp_path = f"{LIBRARY_INDEX_FILE}.{os.getpid()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump(library_index if index is None else index, file, ensure_ascii=False, indent=4)
+        os.replace(temp_path, LIBRARY_INDEX_FILE)
+    except Exception as e:
+        logger.error(f"خطأ في حفظ فهرس مكتبة الموسيقى: {e}")
+
+
+def _scan(music_dir: str, previous: Dict[str, Dict[str, Any]]) -> Tuple[Dict[str, Dict[str, Any]], List[str], List[str]]:
+    """
+    بناء فهرس جديد لمجلد الموسيقى مع إعادة استخدام بيانات الملفات غير المتغيرة من الفهرس السابق
+    (لا يعدل الفهرس العام، فيمكن تشغيله في خيط منفصل بينما يُقرأ الفهرس في حلقة الأحداث)
+
+    Args:
+        music_dir: مسار مجلد الموسيقى
+        previous: الفهرس السابق
+
+    Returns:
+        Tuple من (الفهرس الجديد، المسارات المضافة أو المحدثة، المسارات المحذوفة)
+    """
+    index: Dict[str, Dict[str, Any]] = {}
+    changed = []
+
+    for root, _, files in os.walk(music_dir):
+        for name in files:
+            if not name.lower().endswith(AUDIO_EXTENSIONS):
+                continue
+
+            path = os.path.join(root, name)
+            rel_path = os.path.relpath(path, music_dir)
+
+            stat = os.stat(path)
+            entry = previous.get(rel_path)
+            if entry and entry["mtime"] == stat.st_mtime_ns and entry["size"] == stat.st_size:
+                index[rel_path] = entry
+                continue
+
+            try:
+                metadata = read_metadata(path)
+            except Exception as e:
+                logger.warning(f"تعذر قراءة البيانات الوصفية للملف {path}: {e}")
+                metadata = {"title": "", "performer": "", "album": "", "duration": 0}
+
+            index[rel_path] = {
+                "mtime": stat.st_mtime_ns,
+                "size": stat.st_size,
+                **metadata,
+            }
+            changed.append(rel_path)
+
+    removed = [rel_path for rel_path in previous if rel_path not in index]
+    return index, changed, removed
+
+
+def apply_scan(index: Dict[str, Dict[str, Any]], changed: List[str], removed: List[str]) -> None:
+    """
+    استبدال الفهرس العام بنتيجة الفحص (من هذه العملية أو من العملية التي تفحص المكتبة)
+    """
+    global library_index
+    library_index = index
+    if changed or removed:
+        logger.info(f"تم تحديث فهرس المكتبة: {len(changed)} ملف جديد/معدل، {len(removed)} ملف محذوف")
+
+
+def scan_library(music_dir: str) -> Tuple[List[str], List[str]]:
+    """
+    فحص مجلد الموسيقى وتحديث الفهرس للملفات الجديدة أو المتغيرة فقط
+
+    Args:
+        music_dir: مسار مجلد الموسيقى
+
+    Returns:
+        Tuple من (المسارات المضافة أو المحدثة، المسارات المحذوفة)
+    """
+    index, changed, removed = _scan(music_dir, library_index)
+    apply_scan(index, changed, removed)
+    if changed or removed:
+        save_library_index(index)
+    return changed, removed
+
+
+def library_entry_id(rel_path: str) -> str:
+    """
+    معرف ثابت لملف في المكتبة يمكن استخدامه في أزرار التشغيل
+    """
+    return "lib_" + hashlib.sha1(rel_path.encode("utf-8")).hexdigest()[:10]
+
+
+def get_library_index() -> Dict[str, Dict[str, Any]]:
+    """
+    الفهرس الحالي (يُستبدل كاملًا عند كل فحص ولا يُعدل في مكانه)
+    """
+    return library_index
+
+
+def get_file_metadata(rel_path: str) -> Optional[Dict[str, Any]]:
+    """
+    الحصول على البيانات الوصفية لملف من الفهرس
+
+    Args:
+        rel_path: مسار الملف نسبةً إلى مجلد الموسيقى
+
+    Returns:
+        البيانات الوصفية، أو None إذا لم يكن الملف مفهرسًا
+    """
+    return library_index.get(rel_path)
+
+
+def get_library_files() -> List[str]:
+    """
+    الحصول على جميع الملفات المفهرسة غير الفارغة
+
+    Returns:
+        قائمة بالمسارات النسبية
+    """
+    return [rel_path for rel_path, entry in library_index.items() if entry["size"] > 0]
+
+
+async def scan_library_async(music_dir: str) -> Tuple[List[str], List[str]]:
+    """
+    تشغيل فحص المكتبة في خيط منفصل دون حجب حلقة الأحداث
+    يُبنى الفهرس الجديد في الخيط ثم يُستبدل به الفهرس العام هنا في حلقة الأحداث، فلا يتغير
+    القاموس أثناء قراءته من المعالجات
+    """
+    loop = asyncio.get_running_loop()
+    index, changed, removed = await loop.run_in_executor(None, _scan, music_dir, library_index)
+    apply_scan(index, changed, removed)
+    if changed or removed:
+        await loop.run_in_executor(None, save_library_index, index)
+    return changed, removed
+
+
+# تحميل الفهرس عند استيراد الوحدة
+load_library_index()
@@ -0,0 +1,210 @@
+"""
+وحدة مراقبة صحة حلقة الأحداث
+تقيس تأخر جدولة حلقة الأحداث بعينات دورية، وتراقب من خيط منفصل أي استدعاء يحجز
+الحلقة أطول من الحد المسموح، فتسجل مكدس الاستدعاءات واسم المعالج الذي كان يعمل
+"""
+
+import asyncio
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+import logging
+
+from config import LOOP_LAG_SAMPLE_INTERVAL, SLOW_CALLBACK_THRESHOLD
+from utils.metrics import Histogram, handler_name_in_stack, register_collector
+
+logger = logging.getLogger(__name__)
+
+# عدد عينات التأخر المحفوظة لحساب النسب المئوية (حوالي 5 دقائق بالفترة الافتراضية)
+LAG_SAMPLE_WINDOW = 3000
+
+# عدد الإطارات المحفوظة من مكدس كل استدعاء بطيء
+STACK_DEPTH = 12
+
+# حدود فئات توزيع التأخر بالثواني
+LAG_BUCKETS = [0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0]
+
+# مجلد المشروع لتحديد مصدر التوقف عندما لا يكون داخل معالج مُقاس
+_PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# آخر عينات التأخر بالثواني
+lag_samples: Deque[float] = deque(maxlen=LAG_SAMPLE_WINDOW)
+lag_histogram = Histogram(LAG_BUCKETS)
+
+# آخر الاستدعاءات البطيئة وعددها لكل معالج
+slow_callbacks: Deque[Dict[str, Any]] = deque(maxlen=20)
+slow_callback_counts: Dict[str, int] = {}
+
+# حالة المراقبة
+_last_tick = time.monotonic()
+_loop_thread_id: Optional[int] = None
+_open_incident: Optional[Dict[str, Any]] = None
+_sampler_task: Optional[asyncio.Task] = None
+_watchdog_thread: Optional[threading.Thread] = None
+_stop_event = threading.Event()
+
+
+async def _sample_lag(interval: float) -> None:
+    """
+    قياس الفرق بين موعد الاستيقاظ المتوقع والفعلي بعد كل فترة
+    """
+    global _last_tick, _open_incident
+
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        lag = max(0.0, loop.time() - start - interval)
+        _last_tick = time.monotonic()
+
+        lag_samples.append(lag)
+        lag_histogram.observe(lag)
+
+        # انتهى التوقف الذي رصده المراقب، نسجل مدته الفعلية
+        incident = _open_incident
+        if incident is not None:
+            incident["duration"] = round(lag + interval, 3)
+            _open_incident = None
+
+
+def _stall_origin(frame) -> str:
+    """
+    تحديد اسم المعالج الذي حجز الحلقة، أو أقرب دالة من ملفات المشروع
+    """
+    handler = handler_name_in_stack(frame)
+    if handler:
+        return handler
+
+    origin = "unknown"
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename.startswith(_PROJECT_DIR) and "site-packages" not in filename:
+            origin = frame.f_code.co_name
+        frame = frame.f_back
+    return origin
+
+
+def _watchdog(interval: float, threshold: float) -> None:
+    """
+    خيط المراقبة: إذا تأخرت عينة الحلقة عن الحد يلتقط مكدس خيط الحلقة
+    """
+    global _open_incident
+
+    while not _stop_event.wait(min(threshold / 2, 0.25)):
+        stalled = time.monotonic() - _last_tick - interval
+        if stalled < threshold or _open_incident is not None:
+            continue
+
+        frame = sys._current_frames().get(_loop_thread_id)
+        if frame is None:
+            continue
+
+        handler = _stall_origin(frame)
+        stack = "".join(traceback.format_stack(frame, limit=STACK_DEPTH))
+        del frame
+
+        incident = {
+            "time": time.time(),
+            "handler": handler,
+            "duration": None,
+            "stack": stack,
+        }
+        _open_incident = incident
+        slow_callbacks.append(incident)
+        slow_callback_counts[handler] = slow_callback_counts.get(handler, 0) + 1
+
+        logger.warning(f"حلقة الأحداث متوقفة منذ {stalled:.2f} ثانية داخل {handler}:\n{stack}")
+
+
+def _percentile(sorted_samples: List[float], q: float) -> float:
+    if not sorted_samples:
+        return 0.0
+    return sorted_samples[min(len(sorted_samples) - 1, int(q * len(sorted_samples)))]
+
+
+def get_loop_health() -> Dict[str, Any]:
+    """
+    ملخص صحة حلقة الأحداث
+
+    Returns:
+        قاموس يحتوي النسب المئوية للتأخر (بالثواني) وعدد الاستدعاءات البطيئة وآخرها
+    """
+    samples = sorted(lag_samples)
+    return {
+        "running": _sampler_task is not None and not _sampler_task.done(),
+        "samples": len(samples),
+        "p50": _percentile(samples, 0.5),
+        "p95": _percentile(samples, 0.95),
+        "p99": _percentile(samples, 0.99),
+        "max": samples[-1] if samples else 0.0,
+        "slow_total": sum(slow_callback_counts.values()),
+        "slow_by_handler": dict(slow_callback_counts),
+        "recent": list(slow_callbacks),
+    }
+
+
+def _collect_metrics() -> List[str]:
+    """
+    أسطر مقاييس حلقة الأحداث بصيغة Prometheus
+    """
+    samples = sorted(lag_samples)
+    lines = [
+        "# HELP telegram_bot_event_loop_lag_seconds Event loop scheduling lag.",
+        "# TYPE telegram_bot_event_loop_lag_seconds summary",
+    ]
+    for q in (0.5, 0.9, 0.99):
+        lines.append(f'telegram_bot_event_loop_lag_seconds{{quantile="{q}"}} {_percentile(samples, q):.6f}')
+    lines.append(f"telegram_bot_event_loop_lag_seconds_sum {lag_histogram.total:.6f}")
+    lines.append(f"telegram_bot_event_loop_lag_seconds_count {lag_histogram.count}")
+
+    lines.append("# HELP telegram_bot_slow_callbacks_total Event loop stalls longer than the threshold.")
+    lines.append("# TYPE telegram_bot_slow_callbacks_total counter")
+    for handler, count in sorted(slow_callback_counts.items()):
+        lines.append(f'telegram_bot_slow_callbacks_total{{handler="{handler}"}} {count}')
+    return lines
+
+
+def start_loop_monitor(
+    interval: float = LOOP_LAG_SAMPLE_INTERVAL,
+    threshold: float = SLOW_CALLBACK_THRESHOLD,
+) -> None:
+    """
+    بدء مراقبة حلقة الأحداث (يجب استدعاؤها من داخل الحلقة)
+
+    Args:
+        interval: الفترة بين العينات بالثواني
+        threshold: مدة التوقف التي تُعتبر بطيئة بالثواني
+    """
+    global _loop_thread_id, _sampler_task, _watchdog_thread, _last_tick
+
+    if _sampler_task is not None and not _sampler_task.done():
+        return
+
+    _loop_thread_id = threading.get_ident()
+    _last_tick = time.monotonic()
+    _stop_event.clear()
+
+    _sampler_task = asyncio.get_running_loop().create_task(_sample_lag(interval))
+    _watchdog_thread = threading.Thread(
+        target=_watchdog, args=(interval, threshold), name="loop-watchdog", daemon=True
+    )
+    _watchdog_thread.start()
+
+
+def stop_loop_monitor() -> None:
+    """
+    إيقاف مراقبة حلقة الأحداث
+    """
+    global _sampler_task
+
+    _stop_event.set()
+    if _sampler_task is not None:
+        _sampler_task.cancel()
+        _sampler_task = None
+
+
+register_collector(_collect_metrics)
@@ -0,0 +1,341 @@
+"""
+وحدة قياس أداء البوت
+تسجل توزيع زمن الاستجابة وعدد الأخطاء والطلبات الجارية لكل معالج ولكل طريقة
+من طرق Telegram Bot API، وتصدرها بصيغة Prometheus النصية
+"""
+
+import functools
+import glob
+import os
+import time
+from bisect import bisect_left
+from contextlib import asynccontextmanager
+from typing import Any, Callable, Dict, List, Optional
+import logging
+
+from telegram import Update
+from telegram.ext import Application, ExtBot
+
+logger = logging.getLogger(__name__)
+
+# ملف اللقطة التي يقرأها تطبيق الويب (البوت وتطبيق Flask يعملان في عمليتين منفصلتين)
+METRICS_SNAPSHOT_FILE = "data/metrics.prom"
+
+# مسار لقطة هذه العملية والتسميات التي تضاف إلى كل عينة فيها
+# (عند توزيع التحديثات تكتب كل عملية ملفها الخاص مع تسمية shard)
+snapshot_path = METRICS_SNAPSHOT_FILE
+snapshot_labels = ""
+
+# حدود فئات التوزيع بالثواني
+LATENCY_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0]
+
+
+class Histogram:
+    """
+    توزيع تراكمي بفئات ثابتة (نفس نموذج Prometheus)
+    """
+
+    __slots__ = ("buckets", "counts", "total", "count")
+
+    def __init__(self, buckets: List[float] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """
+        تقدير قيمة النسبة المئوية من الفئات (الحد الأعلى للفئة التي تحتويها)
+        """
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= rank:
+                return self.buckets[i] if i < len(self.buckets) else float("inf")
+        return float("inf")
+
+
+class MetricFamily:
+    """
+    مجموعة مقاييس لنوع واحد (المعالجات أو طرق API) مفهرسة بالاسم
+    """
+
+    def __init__(self, kind: str, label: str):
+        self.kind = kind
+        self.label = label
+        self.latency: Dict[str, Histogram] = {}
+        self.errors: Dict[str, int] = {}
+        self.in_flight: Dict[str, int] = {}
+
+    @asynccontextmanager
+    async def track(self, name: str):
+        self.in_flight[name] = self.in_flight.get(name, 0) + 1
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.errors[name] = self.errors.get(name, 0) + 1
+            raise
+        finally:
+            self.in_flight[name] -= 1
+            histogram = self.latency.get(name)
+            if histogram is None:
+                histogram = self.latency[name] = Histogram()
+            histogram.observe(time.perf_counter() - start)
+
+    def render(self) -> List[str]:
+        prefix = f"telegram_bot_{self.kind}"
+        lines = [
+            f"# HELP {prefix}_duration_seconds Latency of {self.kind} calls.",
+            f"# TYPE {prefix}_duration_seconds histogram",
+        ]
+        for name, histogram in sorted(self.latency.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(histogram.buckets, histogram.counts):
+                cumulative += bucket_count
+                lines.append(f'{prefix}_duration_seconds_bucket{{{self.label}="{name}",le="{bound}"}} {cumulative}')
+            lines.append(f'{prefix}_duration_seconds_bucket{{{self.label}="{name}",le="+Inf"}} {histogram.count}')
+            lines.append(f'{prefix}_duration_seconds_sum{{{self.label}="{name}"}} {histogram.total:.6f}')
+            lines.append(f'{prefix}_duration_seconds_count{{{self.label}="{name}"}} {histogram.count}')
+
+        lines.append(f"# HELP {prefix}_errors_total Failed {self.kind} calls.")
+        lines.append(f"# TYPE {prefix}_errors_total counter")
+        for name in sorted(self.latency):
+            lines.append(f'{prefix}_errors_total{{{self.label}="{name}"}} {self.errors.get(name, 0)}')
+
+        lines.append(f"# HELP {prefix}_in_flight {self.kind} calls currently running.")
+        lines.append(f"# TYPE {prefix}_in_flight gauge")
+        for name, value in sorted(self.in_flight.items()):
+            lines.append(f'{prefix}_in_flight{{{self.label}="{name}"}} {value}')
+
+        return lines
+
+
+# مقاييس المعالجات المسجلة ومقاييس طلبات Bot API
+handler_metrics = MetricFamily("handler", "handler")
+api_metrics = MetricFamily("api", "method")
+
+# التحديثات التي اكتملت معالجتها حسب نوعها (عددها هو ما عالجه البوت فعلًا، لا ما استلمه)
+update_metrics = MetricFamily("update", "type")
+
+# طابور التحديثات التي استلمها التطبيق ولم يبدأ معالجتها بعد
+_update_queue: Optional[Any] = None
+
+# مصادر إضافية تضيف أسطرًا إلى المخرجات (مثل مراقب حلقة الأحداث)
+_extra_collectors: List[Callable[[], List[str]]] = []
+
+
+def register_collector(collector: Callable[[], List[str]]) -> None:
+    """
+    تسجيل دالة تعيد أسطرًا إضافية بصيغة Prometheus
+    """
+    _extra_collectors.append(collector)
+
+
+class InstrumentedBot(ExtBot):
+    """
+    بوت يقيس كل طلب إلى Bot API حسب اسم الطريقة
+    """
+
+    async def _do_post(self, endpoint: str, data: Dict[str, Any], *args: Any, **kwargs: Any) -> Any:
+        async with api_metrics.track(endpoint):
+            return await super()._do_post(endpoint, data, *args, **kwargs)
+
+
+class InstrumentedApplication(Application):
+    """
+    تطبيق يقيس زمن معالجة كل تحديث من أول معالج حتى آخر معالج حاجب
+    """
+
+    async def process_update(self, update: object) -> None:
+        kind = "other"
+        if isinstance(update, Update):
+            kind = next((name for name in Update.ALL_TYPES if getattr(update, name, None) is not None), kind)
+        async with update_metrics.track(kind):
+            await super().process_update(update)
+
+
+def instrument_handler(callback: Callable, name: str) -> Callable:
+    """
+    تغليف دالة معالج لقياس زمنها وأخطائها
+
+    Args:
+        callback: دالة المعالج الأصلية
+        name: الاسم المستخدم في المقاييس
+
+    Returns:
+        الدالة المغلفة
+    """
+    if getattr(callback, "__instrumented__", False):
+        return callback
+
+    @functools.wraps(callback)
+    async def wrapper(update, context):
+        async with handler_metrics.track(name):
+            return await callback(update, context)
+
+    wrapper.__instrumented__ = True
+    return wrapper
+
+
+def handler_name_in_stack(frame) -> Optional[str]:
+    """
+    البحث في سلسلة الإطارات عن أقرب معالج مُقاس وإعادة اسمه
+
+    Args:
+        frame: أعمق إطار في السلسلة
+
+    Returns:
+        اسم المعالج، أو None إذا لم تكن السلسلة داخل معالج مُقاس
+    """
+    while frame is not None:
+        code = frame.f_code
+        if code.co_name == "wrapper" and code.co_filename == __file__:
+            return frame.f_locals.get("name")
+        frame = frame.f_back
+    return None
+
+
+def instrument_application(application: Application) -> None:
+    """
+    تغليف جميع المعالجات المسجلة في التطبيق
+
+    Args:
+        application: تطبيق البوت بعد تسجيل المعالجات
+    """
+    global _update_queue
+    for handlers in application.handlers.values():
+        for handler in handlers:
+            handler.callback = instrument_handler(handler.callback, handler.callback.__name__)
+    _update_queue = application.update_queue
+
+
+def _collect_queue_metrics() -> List[str]:
+    if _update_queue is None:
+        return []
+    return [
+        "# HELP telegram_bot_update_queue_size Updates received but not yet processed.",
+        "# TYPE telegram_bot_update_queue_size gauge",
+        f"telegram_bot_update_queue_size {_update_queue.qsize()}",
+    ]
+
+
+def processed_updates(text: str) -> int:
+    """
+    عدد التحديثات التي اكتملت معالجتها في نص مقاييس (لقطة عملية واحدة أو لقطات مدمجة)
+    """
+    return sum(
+        int(line.rsplit(" ", 1)[1]) for line in text.splitlines()
+        if line.startswith("telegram_bot_update_duration_seconds_count")
+    )
+
+
+def render_prometheus() -> str:
+    """
+    إنشاء نص المقاييس بصيغة Prometheus
+
+    Returns:
+        النص الكامل للمقاييس
+    """
+    lines = handler_metrics.render() + api_metrics.render() + update_metrics.render() + _collect_queue_metrics()
+    for collector in _extra_collectors:
+        try:
+            lines.extend(collector())
+        except Exception as e:
+            logger.error(f"خطأ في جمع المقاييس الإضافية: {e}")
+    return "\n".join(lines) + "\n"
+
+
+def _label_line(line: str, labels: str) -> str:
+    """
+    إضافة تسميات ثابتة إلى سطر عينة بصيغة Prometheus
+    """
+    if not line or line.startswith("#"):
+        return line
+    name_end = min(i for i in (line.find("{"), line.find(" ")) if i >= 0)
+    if line[name_end] == "{":
+        return f"{line[:name_end + 1]}{labels},{line[name_end + 1:]}"
+    return f"{line[:name_end]}{{{labels}}}{line[name_end:]}"
+
+
+def write_snapshot(path: Optional[str] = None) -> None:
+    """
+    كتابة لقطة من المقاييس إلى ملف ليعرضها تطبيق الويب
+    """
+    path = path or snapshot_path
+    text = render_prometheus()
+    if snapshot_labels:
+        text = "\n".join(_label_line(line, snapshot_labels) for line in text.split("\n"))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as file:
+        file.write(text)
+    os.replace(temp_path, path)
+
+
+def _snapshot_files(path: str) -> List[str]:
+    """
+    ملف اللقطة وملفات لقطات العمليات الموزعة بجانبه
+    """
+    base, ext = os.path.splitext(path)
+    return [path] + sorted(glob.glob(f"{base}.shard*{ext}"))
+
+
+def clear_snapshots(path: str = METRICS_SNAPSHOT_FILE) -> None:
+    """
+    حذف اللقطات القديمة عند بدء التشغيل (حتى لا تُدمج لقطات عمليات لم تعد موجودة)
+    """
+    for file_path in _snapshot_files(path):
+        try:
+            os.remove(file_path)
+        except FileNotFoundError:
+            pass
+
+
+def _merge_snapshots(texts: List[str]) -> str:
+    """
+    دمج لقطات عدة عمليات مع إبقاء عينات كل مقياس متتالية تحت سطري HELP و TYPE الخاصين به
+    """
+    headers: Dict[str, List[str]] = {}
+    samples: Dict[str, List[str]] = {}
+    for text in texts:
+        family = None
+        for line in text.splitlines():
+            if line.startswith("# HELP ") or line.startswith("# TYPE "):
+                family = line.split()[2]
+                header = headers.setdefault(family, [])
+                samples.setdefault(family, [])
+                if line not in header:
+                    header.append(line)
+            elif line and family is not None:
+                samples[family].append(line)
+
+    lines = []
+    for family, header in headers.items():
+        lines.extend(header)
+        lines.extend(samples[family])
+    return "\n".join(lines) + "\n"
+
+
+def read_snapshot(path: str = METRICS_SNAPSHOT_FILE) -> str:
+    """
+    قراءة آخر لقطة للمقاييس (نص فارغ إذا لم يكتب البوت أي لقطة بعد)
+    """
+    texts = []
+    for file_path in _snapshot_files(path):
+        try:
+            with open(file_path, "r", encoding="utf-8") as file:
+                texts.append(file.read())
+        except FileNotFoundError:
+            continue
+    if len(texts) <= 1:
+        return texts[0] if texts else ""
+    return _merge_snapshots(texts)
@@ -0,0 +1,328 @@
+"""
+وحدة تنفيذ إجراءات الإشراف
+المعالجات لا تنتظر طلبات الحذف والتنبيه والحظر بنفسها، بل تضيف سجل إجراء إلى طابور مرتب خاص بكل مجموعة.
+عامل واحد لكل مجموعة ينفذ ما في الطابور بالترتيب:
+- يرسل الحذف إلى طابور الحذف (utils/cleanup_queue.py) فتُجمع رسائل المجموعة خلال نافذة قصيرة
+  في طلب deleteMessages واحد، أما الحذف البديل عند فشل الحظر فيُنفذ فورًا
+- يدمج الإجراءات المتكررة قبل التنفيذ (عدة عمليات حذف في طلب واحد، وحذف رسائل مستخدم سيبقى محظورًا
+  يصبح حظرًا مع revoke_messages، وتُحذف الرسائل وحدها إذا فشل الحظر)
+- يعيد المحاولة مع انتظار متزايد عند أخطاء الشبكة أو تجاوز حد الطلبات، بينما أخطاء BadRequest نهائية
+  لذلك الإجراء وحده ولا توقف باقي الطابور
+- يسجل نتيجة كل إجراء في سجل تدقيق (data/moderation_audit.jsonl) وفي مقاييس /metrics
+"""
+
+import asyncio
+import json
+import os
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+import logging
+
+from telegram import Bot, ChatPermissions
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter, TelegramError
+
+from config import MODERATION_MAX_ATTEMPTS, MODERATION_RETRY_BASE, NOTICE_TTL
+from utils.cleanup_queue import delete_later, delete_messages, expire_later
+from utils.metrics import register_collector
+
+logger = logging.getLogger(__name__)
+
+# ملف سجل التدقيق (سطر JSON لكل إجراء منفذ)
+AUDIT_FILE = "data/moderation_audit.jsonl"
+
+# أنواع الإجراءات المدعومة
+ACTION_KINDS = ("delete", "notify", "warn", "restrict", "ban", "unban")
+
+
+class ModerationAction:
+    """
+    سجل إجراء إشراف واحد
+    """
+
+    __slots__ = (
+        "kind", "chat_id", "user_id", "message_ids", "text", "reason",
+        "permissions", "until_date", "revoke_messages", "created",
+    )
+
+    def __init__(
+        self,
+        kind: str,
+        chat_id: int,
+        user_id: int = 0,
+        message_ids: Optional[List[int]] = None,
+        text: Optional[str] = None,
+        reason: Optional[str] = None,
+        permissions: Optional[ChatPermissions] = None,
+        until_date: Optional[int] = None,
+    ):
+        if kind not in ACTION_KINDS:
+            raise ValueError(f"نوع إجراء غير معروف: {kind}")
+        self.kind = kind
+        self.chat_id = chat_id
+        # صاحب الرسائل في إجراء الحذف (0 إذا كانت لعدة مستخدمين)
+        self.user_id = user_id
+        self.message_ids = list(message_ids or [])
+        self.text = text
+        self.reason = reason
+        self.permissions = permissions
+        self.until_date = until_date
+        self.revoke_messages = False
+        self.created = time.time()
+
+
+# طابور الإجراءات لكل مجموعة والعامل الذي ينفذه
+_queues: Dict[int, Deque[ModerationAction]] = {}
+_workers: Dict[int, asyncio.Task] = {}
+
+# نتائج الإجراءات التي لم تُكتب في سجل التدقيق بعد
+_audit_lines: List[str] = []
+
+# عدد الإجراءات المنفذة حسب (النوع، النتيجة) للمقاييس
+_outcomes: Dict[Tuple[str, str], int] = {}
+
+
+def emit(bot: Bot, kind: str, chat_id: int, user_id: int = 0, **details: Any) -> None:
+    """
+    إضافة إجراء إلى طابور المجموعة (لا تنتظر تنفيذه)
+
+    Args:
+        bot: كائن البوت
+        kind: نوع الإجراء (delete، notify، warn، restrict، ban، unban)
+        chat_id: معرف المجموعة
+        user_id: المستخدم المستهدف
+        **details: باقي حقول الإجراء (message_ids، text، reason، permissions، until_date)
+    """
+    action = ModerationAction(kind, chat_id, user_id, **details)
+    queue = _queues.get(chat_id)
+    if queue is None:
+        queue = _queues[chat_id] = deque()
+    queue.append(action)
+
+    if chat_id not in _workers:
+        _workers[chat_id] = asyncio.create_task(_worker(bot, chat_id))
+
+
+def merge_actions(actions: List[ModerationAction]) -> List[ModerationAction]:
+    """
+    دمج الإجراءات المتكررة في دفعة واحدة من طابور مجموعة
+
+    Args:
+        actions: الإجراءات بترتيب إضافتها
+
+    Returns:
+        الإجراءات بعد الدمج، بالترتيب نفسه
+    """
+    # آخر حظر أو إلغاء حظر لكل مستخدم: المستخدم يبقى محظورًا إذا كان آخرها حظرًا
+    # (الطرد حظر يتبعه إلغاء حظر، فلا تُحذف معه كل رسائل المستخدم)
+    last_ban: Dict[int, Optional[int]] = {}
+    for index, action in enumerate(actions):
+        if action.kind in ("ban", "unban"):
+            last_ban[action.user_id] = index if action.kind == "ban" else None
+    banned = {user_id for user_id, index in last_ban.items() if index is not None}
+
+    # رسائل المستخدمين المحظورين تُحذف بالحظر نفسه (revoke_messages)
+    revoked: Dict[int, List[int]] = {}
+    for action in actions:
+        if action.kind == "delete" and action.user_id and action.user_id in banned:
+            revoked.setdefault(action.user_id, []).extend(action.message_ids)
+
+    merged = []
+    delete = None
+    # آخر حظر أو إلغاء حظر أُبقي عليه لكل مستخدم
+    kept: Dict[int, ModerationAction] = {}
+    for index, action in enumerate(actions):
+        if action.kind == "delete":
+            if action.user_id in revoked:
+                continue
+            if delete is None:
+                delete = ModerationAction("delete", action.chat_id, action.user_id, action.message_ids)
+                delete.created = action.created
+                merged.append(delete)
+            else:
+                delete.user_id = 0
+                delete.message_ids.extend(action.message_ids)
+            continue
+
+        if action.kind == "restrict" and action.user_id in banned:
+            continue
+        if action.kind in ("ban", "unban"):
+            # يُحذف فقط الإجراء المطابق للإجراء السابق للمستخدم نفسه (حظر ثم حظر)،
+            # أما حظر بعد إلغاء حظر فيبقى حتى لا يُلغى حظر مستخدم يجب أن يبقى محظورًا
+            previous = kept.get(action.user_id)
+            duplicate = previous is not None and previous.kind == action.kind
+            if not duplicate:
+                kept[action.user_id] = action
+            if index == last_ban.get(action.user_id) and action.user_id in revoked:
+                target = previous if duplicate else action
+                target.revoke_messages = True
+                # تُحذف هذه الرسائل وحدها إذا فشل الحظر
+                target.message_ids = revoked[action.user_id]
+            if duplicate:
+                continue
+        merged.append(action)
+    return merged
+
+
+async def _worker(bot: Bot, chat_id: int) -> None:
+    queue = _queues[chat_id]
+    try:
+        while queue:
+            # كل ما تراكم أثناء تنفيذ الدفعة السابقة يُدمج وينفذ كدفعة واحدة
+            batch = list(queue)
+            queue.clear()
+            for action in merge_actions(batch):
+                try:
+                    if action.kind == "delete":
+                        # يُحذف مع باقي رسائل المجموعة بعد نافذة الدفعة (أخطاؤه تُسجل في طابور الحذف)
+                        delete_later(bot, chat_id, action.message_ids)
+                        _record(action, "queued", 1)
+                        continue
+                    ok = await _execute(bot, action)
+                    if not ok and action.revoke_messages and action.message_ids:
+                        # الحظر لم يحذف رسائل المستخدم، فتُحذف الرسائل المخالفة وحدها
+                        fallback = ModerationAction("delete", chat_id, action.user_id, action.message_ids)
+                        fallback.created = action.created
+                        await _execute(bot, fallback)
+                except Exception as e:
+                    logger.error(f"خطأ في تنفيذ إجراء الإشراف {action.kind} في المجموعة {chat_id}: {e}")
+    finally:
+        del _workers[chat_id]
+        if queue:
+            _workers[chat_id] = asyncio.create_task(_worker(bot, chat_id))
+        else:
+            del _queues[chat_id]
+
+
+async def _perform(bot: Bot, action: ModerationAction) -> None:
+    if action.kind == "delete":
+        await delete_messages(bot, action.chat_id, action.message_ids)
+    elif action.kind == "notify":
+        message = await bot.send_message(chat_id=action.chat_id, text=action.text, parse_mode="HTML")
+        expire_later(bot, action.chat_id, message.message_id, NOTICE_TTL)
+    elif action.kind == "restrict":
+        await bot.restrict_chat_member(
+            chat_id=action.chat_id,
+            user_id=action.user_id,
+            permissions=action.permissions,
+            until_date=action.until_date,
+        )
+    elif action.kind == "ban":
+        await bot.ban_chat_member(
+            chat_id=action.chat_id,
+            user_id=action.user_id,
+            revoke_messages=action.revoke_messages or None,
+        )
+    elif action.kind == "unban":
+        await bot.unban_chat_member(chat_id=action.chat_id, user_id=action.user_id)
+    # التحذير يُحسب عند إضافته، ويُنفذ هنا فقط ليظهر في سجل التدقيق بترتيبه
+
+
+async def _execute(bot: Bot, action: ModerationAction) -> bool:
+    """
+    تنفيذ إجراء مع إعادة المحاولة وتسجيل النتيجة
+
+    Returns:
+        هل نُفذ الإجراء بنجاح
+    """
+    error = None
+    for attempt in range(1, MODERATION_MAX_ATTEMPTS + 1):
+        try:
+            await _perform(bot, action)
+            _record(action, "ok", attempt)
+            return True
+        except RetryAfter as e:
+            error = e
+            delay = e.retry_after
+        except (BadRequest, Forbidden) as e:
+            # BadRequest يرث NetworkError في المكتبة، لذا يُلتقط قبله كخطأ نهائي
+            _record(action, "failed", attempt, str(e))
+            return False
+        except NetworkError as e:
+            error = e
+            delay = MODERATION_RETRY_BASE * 2 ** (attempt - 1)
+        except TelegramError as e:
+            _record(action, "failed", attempt, str(e))
+            return False
+
+        if attempt < MODERATION_MAX_ATTEMPTS:
+            await asyncio.sleep(delay)
+
+    _record(action, "failed", MODERATION_MAX_ATTEMPTS, str(error))
+    return False
+
+
+def _record(action: ModerationAction, outcome: str, attempts: int, error: Optional[str] = None) -> None:
+    key = (action.kind, outcome)
+    _outcomes[key] = _outcomes.get(key, 0) + 1
+    if outcome != "ok":
+        logger.warning(f"فشل إجراء الإشراف {action.kind} في المجموعة {action.chat_id} بعد {attempts} محاولة: {error}")
+
+    entry = {
+        "t": round(time.time(), 3),
+        "chat_id": action.chat_id,
+        "action": action.kind,
+        "outcome": outcome,
+        "attempts": attempts,
+        "delay_ms": round((time.time() - action.created) * 1000, 1),
+    }
+    if action.user_id:
+        entry["user_id"] = action.user_id
+    if action.message_ids:
+        entry["message_ids"] = action.message_ids
+    if action.reason:
+        entry["reason"] = action.reason
+    if action.revoke_messages:
+        entry["revoke_messages"] = True
+    if error:
+        entry["error"] = error
+    _audit_lines.append(json.dumps(entry, ensure_ascii=False))
+
+
+def _write_audit(lines: List[str]) -> None:
+    os.makedirs(os.path.dirname(AUDIT_FILE), exist_ok=True)
+    with open(AUDIT_FILE, "a", encoding="utf-8") as file:
+        file.write("\n".join(lines) + "\n")
+
+
+def _take_audit_lines() -> List[str]:
+    lines = _audit_lines[:]
+    del _audit_lines[:len(lines)]
+    return lines
+
+
+async def flush_audit() -> None:
+    """
+    كتابة نتائج الإجراءات في سجل التدقيق دون حجب حلقة الأحداث
+    """
+    lines = _take_audit_lines()
+    if not lines:
+        return
+    try:
+        await asyncio.get_running_loop().run_in_executor(None, _write_audit, lines)
+    except Exception as e:
+        logger.error(f"خطأ في حفظ سجل إجراءات الإشراف: {e}")
+
+
+async def drain() -> None:
+    """
+    انتظار تنفيذ كل الإجراءات المنتظرة (عند إيقاف البوت)
+    """
+    while _workers:
+        await asyncio.gather(*list(_workers.values()), return_exceptions=True)
+
+
+def _collect_metrics() -> List[str]:
+    lines = [
+        "# HELP telegram_bot_moderation_actions_total Moderation actions by outcome.",
+        "# TYPE telegram_bot_moderation_actions_total counter",
+    ]
+    for (kind, outcome), count in sorted(_outcomes.items()):
+        lines.append(f'telegram_bot_moderation_actions_total{{action="{kind}",outcome="{outcome}"}} {count}')
+    lines.append("# HELP telegram_bot_moderation_queue_length Moderation actions waiting to run.")
+    lines.append("# TYPE telegram_bot_moderation_queue_length gauge")
+    lines.append(f"telegram_bot_moderation_queue_length {sum(len(queue) for queue in _queues.values())}")
+    return lines
+
+
+register_collector(_collect_metrics)
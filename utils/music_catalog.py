@@ -0,0 +1,178 @@
+"""
+وحدة فهرسة مكتبة الموسيقى المحلية
+توفر جدولًا للوصول المباشر بالمعرف، وفهرسًا للمقاطع الثلاثية (trigrams) على العناوين
+وأسماء المؤدين بعد توحيد الحروف العربية واللاتينية، للبحث في المكتبة دون اتصال
+"""
+
+import re
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+# التشكيل والتطويل وعلامات الاتجاه التي لا تؤثر على المعنى
+_IGNORED_CHARS = re.compile("[\u064b-\u0652\u0670\u0640\u200c-\u200f]")
+
+# توحيد أشكال الحروف العربية المتقاربة
+_CHAR_MAP = str.maketrans({
+    "أ": "ا", "إ": "ا", "آ": "ا", "ٱ": "ا",
+    "ة": "ه", "ى": "ي", "ؤ": "و", "ئ": "ي",
+})
+
+# كل ما ليس حرفًا أو رقمًا يتحول إلى مسافة
+_NON_WORD = re.compile(r"[^\w]+|_")
+
+# جدول الوصول المباشر: المعرف -> معلومات المقطع
+entries_by_id: Dict[str, Dict[str, Any]] = {}
+
+# فئة كل مقطع (embedded، arabic، ...)
+entry_categories: Dict[str, str] = {}
+
+# الفهرس المعكوس: المقطع الثلاثي -> معرفات المقاطع التي تحتويه
+gram_index: Dict[str, Set[str]] = {}
+
+# المقاطع الثلاثية لكل معرف (لحذفها عند التحديث ولحساب درجة التطابق)
+_entry_grams: Dict[str, Set[str]] = {}
+
+
+def normalize_text(text: str) -> str:
+    """
+    توحيد النص للبحث: حروف صغيرة، إزالة التشكيل، توحيد الحروف المتقاربة وإزالة الرموز
+
+    Args:
+        text: النص الأصلي
+
+    Returns:
+        النص بعد التوحيد
+    """
+    text = _IGNORED_CHARS.sub("", text.lower()).translate(_CHAR_MAP)
+    return " ".join(_NON_WORD.sub(" ", text).split())
+
+
+def _grams(text: str) -> Set[str]:
+    """
+    استخراج المقاطع الثلاثية من كل كلمة (مع حدود الكلمة حتى تُفهرس الكلمات القصيرة)
+    """
+    grams = set()
+    for word in normalize_text(text).split():
+        padded = f" {word} "
+        for i in range(len(padded) - 2):
+            grams.add(padded[i:i + 3])
+    return grams
+
+
+def _unindex(entry_id: str) -> None:
+    """
+    حذف مقطع من الفهرس المعكوس
+    """
+    for gram in _entry_grams.pop(entry_id, ()):
+        ids = gram_index.get(gram)
+        if ids is not None:
+            ids.discard(entry_id)
+            if not ids:
+                del gram_index[gram]
+
+
+def add_entries(entries: Iterable[Dict[str, Any]], category: str = "") -> int:
+    """
+    إضافة مقاطع إلى الفهرس أو تحديثها (يُعاد فهرسة المقاطع المضافة فقط)
+
+    Args:
+        entries: المقاطع، لكل منها "id" و"title" وربما "performer"
+        category: فئة المقاطع
+
+    Returns:
+        عدد المقاطع التي تمت فهرستها
+    """
+    count = 0
+    for entry in entries:
+        entry_id = entry["id"]
+        _unindex(entry_id)
+
+        entries_by_id[entry_id] = entry
+        entry_categories[entry_id] = category or entry_categories.get(entry_id, "")
+
+        grams = _grams(f"{entry.get('title', '')} {entry.get('performer', '')}")
+        _entry_grams[entry_id] = grams
+        for gram in grams:
+            gram_index.setdefault(gram, set()).add(entry_id)
+        count += 1
+
+    return count
+
+
+def remove_entry(entry_id: str) -> bool:
+    """
+    حذف مقطع من المكتبة
+
+    Args:
+        entry_id: معرف المقطع
+
+    Returns:
+        True إذا كان المقطع موجودًا وتم حذفه
+    """
+    if entry_id not in entries_by_id:
+        return False
+
+    _unindex(entry_id)
+    del entries_by_id[entry_id]
+    entry_categories.pop(entry_id, None)
+    return True
+
+
+def get_entry(entry_id: str) -> Optional[Dict[str, Any]]:
+    """
+    الحصول على مقطع بمعرفه مباشرة
+
+    Args:
+        entry_id: معرف المقطع
+
+    Returns:
+        معلومات المقطع، أو None إذا لم يكن موجودًا
+    """
+    return entries_by_id.get(entry_id)
+
+
+def get_category(entry_id: str) -> str:
+    """
+    الحصول على فئة مقطع
+    """
+    return entry_categories.get(entry_id, "")
+
+
+def search(query: str, limit: int = 5, min_score: float = 0.0) -> List[Tuple[Dict[str, Any], float]]:
+    """
+    البحث في العناوين وأسماء المؤدين
+
+    الدرجة هي نسبة المقاطع الثلاثية من الاستعلام الموجودة في المقطع، مع ترجيح
+    المقاطع الأقصر عند التساوي
+
+    Args:
+        query: نص البحث
+        limit: الحد الأقصى لعدد النتائج
+        min_score: أقل درجة مقبولة (من 0 إلى 1)
+
+    Returns:
+        قائمة من (المقطع، الدرجة) مرتبة تنازليًا
+    """
+    query_grams = _grams(query)
+    if not query_grams:
+        return []
+
+    # عدّ المقاطع المشتركة باستخدام الفهرس المعكوس فقط
+    hits: Dict[str, int] = {}
+    for gram in query_grams:
+        for entry_id in gram_index.get(gram, ()):
+            hits[entry_id] = hits.get(entry_id, 0) + 1
+
+    scored = []
+    total = len(query_grams)
+    for entry_id, shared in hits.items():
+        coverage = shared / total
+        if coverage < min_score:
+            continue
+        dice = 2 * shared / (total + len(_entry_grams[entry_id]))
+        scored.append((coverage, dice, entry_id))
+
+    scored.sort(reverse=True)
+    return [(entries_by_id[entry_id], coverage) for coverage, _, entry_id in scored[:limit]]
@@ -1,13 +1,13 @@
 import os
 import asyncio
-import tempfile
 import time
 import random
 import json
 import re
 import requests
 import io
-from typing import Tuple, List, Optional, Dict, Any
+from pathlib import Path
+from typing import Tuple, List, Optional, Dict, Any, Callable, Awaitable
 import logging
 
 try:
@@ -15,6 +15,19 @@ try:
 except ImportError:
     yt_dlp = None
 
+from utils.transcoder import ensure_sendable
+from utils.downloader import download_audio, get_cached_audio
+from utils import music_catalog
+from utils.library_scanner import (
+    apply_scan,
+    get_file_metadata,
+    get_library_files,
+    get_library_index,
+    library_entry_id,
+    scan_library_async,
+)
+from utils.sharding import publish, register_shared
+
 logger = logging.getLogger(__name__)
 
 # الدليل الذي يحتوي على الأغاني المخزنة مسبقًا
@@ -27,6 +40,11 @@ os.makedirs(MUSIC_DIR, exist_ok=True)
 # Cache for storing already downloaded songs
 song_cache = {}
 
+# عناوين نتائج البحث في يوتيوب حسب المعرف، لعرض العنوان عند اختيار نتيجة من الأزرار
+# (بيانات الزر لا تتسع للعنوان)
+search_titles: Dict[str, str] = {}
+SEARCH_TITLES_LIMIT = 1000
+
 # مصادر مختلفة للموسيقى والمحتوى الصوتي
 # كل مصدر له مجموعة من العناصر المتاحة
 
@@ -103,6 +121,10 @@ ALL_MUSIC_SOURCES = {
 # الحصول على جميع الأغاني من جميع المصادر في قائمة واحدة
 ALL_SONGS = EMBEDDED_SONGS + ARABIC_SONGS + GLOBAL_SONGS + QURAN_RECITATIONS + SOUND_EFFECTS
 
+# فهرسة جميع المصادر للوصول المباشر بالمعرف والبحث في العناوين
+for _category, _songs in ALL_MUSIC_SOURCES.items():
+    music_catalog.add_entries(_songs, _category)
+
 # List of alternative user agents to rotate
 USER_AGENTS = [
     'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
@@ -186,6 +208,7 @@ async def search_youtube(query: str) -> List[Tuple[str, str]]:
                     title = entry.get('title', 'Unknown Title')
                     video_id = entry.get('id', '')
                     formatted_results.append((f"🎵 {title}", video_id))
+                    _remember_title(video_id, title)
 
             return formatted_results[:5]  # إرجاع أول 5 نتائج
 
@@ -194,6 +217,47 @@ async def search_youtube(query: str) -> List[Tuple[str, str]]:
         # في حالة حدوث خطأ، نرجع قائمة فارغة
         return []
 
+def _remember_title(video_id: str, title: str) -> None:
+    search_titles.pop(video_id, None)
+    search_titles[video_id] = title
+    if len(search_titles) > SEARCH_TITLES_LIMIT:
+        # حذف أقدم عنوان (القواميس تحفظ ترتيب الإضافة)
+        del search_titles[next(iter(search_titles))]
+
+def get_track_title(video_id: str) -> str:
+    """
+    عنوان مقطع بمعرفه من الكتالوج أو من نتائج البحث الأخيرة.
+    
+    Args:
+        video_id: معرف المقطع.
+        
+    Returns:
+        العنوان، أو المعرف نفسه إذا لم يكن معروفًا.
+    """
+    entry = music_catalog.get_entry(video_id)
+    if entry:
+        return entry['title']
+    return search_titles.get(video_id, video_id)
+
+def search_local_library(query: str, limit: int = 5) -> List[Tuple[str, str]]:
+    """
+    البحث في المكتبة المحلية دون الاتصال بيوتيوب.
+    
+    Args:
+        query: كلمات البحث.
+        limit: الحد الأقصى لعدد النتائج.
+        
+    Returns:
+        قائمة بالنتائج الجيدة التطابق كأزواج (العنوان، المعرف)، وتكون فارغة إذا لم يوجد تطابق جيد.
+    """
+    from config import LOCAL_SEARCH_MIN_SCORE
+    
+    matches = music_catalog.search(query, limit=limit, min_score=LOCAL_SEARCH_MIN_SCORE)
+    return [
+        (f"{get_prefix_for_category(music_catalog.get_category(entry['id']))} {entry['title']}", entry['id'])
+        for entry, _ in matches
+    ]
+
 def get_prefix_for_category(category: str) -> str:
     """
     الحصول على رمز تعبيري مناسب لفئة الموسيقى.
@@ -213,13 +277,14 @@ def get_prefix_for_category(category: str) -> str:
     }
     return prefixes.get(category, "🎵")
 
-async def play_music(url: str, chat_id: int) -> Tuple[bool, Any]:
+async def play_music(url: str, chat_id: int, user_id: Optional[int] = None) -> Tuple[bool, Any]:
     """
     تشغيل ملف صوتي باستخدام معرف الأغنية.
     
     Args:
         url: معرف الأغنية أو رابط يوتيوب.
         chat_id: معرف المحادثة لتتبع الأغاني في المحادثات المختلفة.
+        user_id: معرف المستخدم صاحب الطلب لتطبيق حدود التنزيل.
         
     Returns:
         زوج من (نجاح العملية، النتيجة) حيث تكون النتيجة إما ملف صوتي أو رسالة خطأ.
@@ -244,28 +309,15 @@ async def play_music(url: str, chat_id: int) -> Tuple[bool, Any]:
         if url in song_cache:
             return True, song_cache[url]
         
-        # البحث في جميع المصادر المتاحة
-        for category, songs_list in ALL_MUSIC_SOURCES.items():
-            for song in songs_list:
-                if video_id == song["id"]:
-                    logger.info(f"تشغيل ملف صوتي من {song.get('source', category)}: {song['title']}")
-                    return await serve_embedded_song(song)
-        
-        # في حالة كان الاستعلام عن فيديو يوتيوب (معرف فيديو من 11 حرفًا)، نقدم بديلًا مناسبًا
-        if len(video_id) == 11:  # معرف فيديو يوتيوب عادةً ما يكون 11 حرفًا
-            # اختيار أغنية عشوائية من الأغاني العالمية أو العربية
-            available_sources = []
-            if 'global' in ALL_MUSIC_SOURCES and ALL_MUSIC_SOURCES['global']:
-                available_sources.append(ALL_MUSIC_SOURCES['global'])
-            if 'arabic' in ALL_MUSIC_SOURCES and ALL_MUSIC_SOURCES['arabic']:
-                available_sources.append(ALL_MUSIC_SOURCES['arabic'])
-                
-            if available_sources:
-                # اختيار مصدر عشوائي ثم أغنية عشوائية
-                source = random.choice(available_sources)
-                selected_song = random.choice(source)
-                logger.info(f"تقديم أغنية بديلة من {selected_song.get('source', 'المكتبة')}: {selected_song['title']}")
-                return await serve_embedded_song(selected_song)
+        # البحث في فهرس المكتبة المحلية مباشرة بالمعرف
+        song = music_catalog.get_entry(video_id)
+        if song:
+            logger.info(f"تشغيل ملف صوتي من {song.get('source', music_catalog.get_category(video_id))}: {song['title']}")
+            return await serve_embedded_song(song)
+        
+        # تنزيل المقطع المطلوب فعليًا (معرف يوتيوب أو رابط مباشر)
+        if len(video_id) == 11 or video_id.startswith(('http://', 'https://')):
+            return await serve_downloaded_song(video_id, user_id)
         
         # في حالة لم يتم العثور على الأغنية، قم بإرجاع أغنية عشوائية من الأغاني المضمنة
         random_song = EMBEDDED_SONGS[random.randint(0, len(EMBEDDED_SONGS)-1)]
@@ -302,60 +354,24 @@ async def serve_embedded_song(song: Dict[str, str]) -> Tuple[bool, Any]:
         # مسار ملف الأغنية
         filepath = os.path.join(MUSIC_DIR, filename)
         
-        # التحقق من وجود الملف
-        if os.path.exists(filepath):
+        # التحقق من وجود الملف في فهرس المكتبة (الملفات الفارغة لا تُعتبر متاحة)
+        metadata = get_file_metadata(filename)
+        if metadata and metadata['size'] > 0 and os.path.exists(filepath):
             logger.info(f"تم العثور على ملف الأغنية: {filepath}")
-            try:
-                # قراءة الملف
-                with open(filepath, 'rb') as audio_file:
-                    file_content = audio_file.read()
-                    
-                    if len(file_content) == 0:
-                        logger.warning(f"الملف {filepath} فارغ، سيتم استخدام ملف آخر")
-                        # استخدام ملف آخر معروف أنه غير فارغ
-                        random_file = os.path.join(MUSIC_DIR, "embedded_song1.mp3")
-                        with open(random_file, 'rb') as fallback_file:
-                            file_content = fallback_file.read()
-                    
-                    # تخزين الأغنية في الذاكرة المؤقتة
-                    song_cache[song_id] = {
-                        'file': file_content,
-                        'title': song_title,
-                        'performer': performer,
-                        'duration': 0  # قيمة افتراضية للمدة
-                    }
-                    
-                    return True, song_cache[song_id]
-            except Exception as file_error:
-                logger.error(f"خطأ في قراءة الملف {filepath}: {file_error}")
-        
-        # إذا وصلنا إلى هنا، فإن الملف غير موجود أو لا يمكن قراءته
-        # سنقوم باستخدام ملف آخر عشوائي من الملفات الموجودة
-        logger.warning(f"الملف {filename} غير موجود، جاري استخدام ملف بديل")
+            return await _serve_library_file(song_id, filename, song_title, performer)
         
-        # جلب جميع ملفات MP3 المتاحة
-        mp3_files = [f for f in os.listdir(MUSIC_DIR) if f.endswith('.mp3')]
+        # إذا وصلنا إلى هنا، فإن الملف غير موجود أو فارغ
+        # سنقوم باستخدام ملف آخر عشوائي من الملفات المفهرسة
+        logger.warning(f"الملف {filename} غير موجود، جاري استخدام ملف بديل")
         
-        if mp3_files:
-            # اختيار ملف عشوائي
-            random_file = os.path.join(MUSIC_DIR, random.choice(mp3_files))
+        library_files = get_library_files()
+        if library_files:
+            # اختيار ملف عشوائي، مع استخدام عنوانه الحقيقي من الفهرس
+            random_file = random.choice(library_files)
             logger.info(f"استخدام الملف البديل: {random_file}")
-            
-            # قراءة الملف
-            with open(random_file, 'rb') as audio_file:
-                file_content = audio_file.read()
-                
-                # تخزين الأغنية في الذاكرة المؤقتة
-                song_cache[song_id] = {
-                    'file': file_content,
-                    'title': song_title,
-                    'performer': performer,
-                    'duration': 0  # قيمة افتراضية للمدة
-                }
-                
-                return True, song_cache[song_id]
+            return await _serve_library_file(song_id, random_file, None, None)
         else:
-            # لا توجد ملفات MP3 على الإطلاق!
+            # لا توجد ملفات صوتية على الإطلاق!
             logger.error("لم يتم العثور على أي ملفات صوتية!")
             return False, "للأسف، لا توجد ملفات صوتية متاحة. يرجى إعادة المحاولة لاحقًا."
     
@@ -364,53 +380,134 @@ async def serve_embedded_song(song: Dict[str, str]) -> Tuple[bool, Any]:
         return False, f"غير قادر على تشغيل الأغنية، فضلاً حاول مرة أخرى لاحقًا."
 
 
-async def download_using_alternative_method(video_id: str) -> Tuple[bool, Any]:
+async def _serve_library_file(
+    song_id: str,
+    rel_path: str,
+    title: Optional[str],
+    performer: Optional[str],
+) -> Tuple[bool, Any]:
     """
-    محاولة تنزيل الفيديو باستخدام طريقة بديلة لـ yt-dlp
+    قراءة ملف من المكتبة وتخزينه في الذاكرة المؤقتة مع مدته وعنوانه من الفهرس.
     
     Args:
-        video_id: معرف الفيديو
+        song_id: معرف الأغنية في الذاكرة المؤقتة
+        rel_path: مسار الملف نسبةً إلى مجلد الموسيقى
+        title: العنوان المعروض (إن لم يوجد يُستخدم عنوان الوسوم أو اسم الملف)
+        performer: اسم المؤدي (إن لم يوجد يُستخدم اسم المؤدي من الوسوم)
         
     Returns:
-        الملف الصوتي ومعلوماته، أو False ورسالة الخطأ
+        زوج من (نجاح العملية، النتيجة)
     """
+    metadata = get_file_metadata(rel_path) or {}
+    filepath = os.path.join(MUSIC_DIR, rel_path)
+    
+    # تحويل الملف إذا كان بصيغة غير مدعومة أو أكبر من الحجم المسموح
+    ready, ready_path = await ensure_sendable(filepath, metadata.get('duration', 0))
+    if ready:
+        filepath = ready_path
+    else:
+        logger.warning(f"تعذر تجهيز الملف {filepath} للإرسال: {ready_path}")
+    
     try:
-        # الحصول على معلومات الفيديو
-        video_info = await get_youtube_info_simple(video_id)
-        if not video_info:
-            logger.warning(f"فشل في الحصول على معلومات الفيديو: {video_id}")
-            return False, "فشل في الحصول على معلومات الفيديو"
-        
-        # إنشاء مسار مؤقت لتنزيل الملف
-        with tempfile.TemporaryDirectory() as temp_dir:
-            output_path = os.path.join(temp_dir, f"{video_id}.mp3")
-            
-            # تنزيل الملف من مصدر بديل
-            # هنا يمكننا استخدام مصادر مختلفة للتنزيل أو خدمات تحويل
-            
-            # كمثال بسيط جدًا (سيحتاج إلى تطوير وتحسين):
-            url = f"https://www.yt-download.org/api/button/mp3/{video_id}"
-            
-            user_agent = random.choice(USER_AGENTS)
-            headers = {
-                'User-Agent': user_agent,
-                'Accept-Language': 'en-US,en;q=0.5',
-                'Referer': 'https://www.youtube.com/watch',
-            }
-            
-            # هذه مجرد محاولة مبسطة، وسيحتاج تنفيذ حقيقي إلى:
-            # 1. التعامل مع تتبع إعادة التوجيه
-            # 2. تحليل HTML للحصول على رابط التنزيل المباشر
-            # 3. استخدام خدمات تحويل متعددة
-            
-            # ملاحظة: هذه محاولة قد لا تنجح دائمًا ويفضل تنفيذها بطريقة أكثر تعقيدًا
-            
-            # محاكاة فشل هذه الطريقة لاختبار السلوك الاحتياطي
-            return False, "الطريقة البديلة غير مكتملة التنفيذ"
-            
-    except Exception as e:
-        logger.error(f"فشل في الطريقة البديلة للتنزيل: {e}")
-        return False, str(e)
+        with open(filepath, 'rb') as audio_file:
+            file_content = audio_file.read()
+    except Exception as file_error:
+        logger.error(f"خطأ في قراءة الملف {filepath}: {file_error}")
+        return False, "غير قادر على تشغيل الأغنية، فضلاً حاول مرة أخرى لاحقًا."
+    
+    # تخزين الأغنية في الذاكرة المؤقتة
+    song_cache[song_id] = {
+        'file': file_content,
+        'title': metadata.get('title') or title or os.path.splitext(os.path.basename(rel_path))[0],
+        'performer': metadata.get('performer') or performer or "البوت الموسيقي",
+        'duration': metadata.get('duration', 0)
+    }
+    
+    return True, song_cache[song_id]
+
+
+def _sync_library_catalog(changed: List[str], removed: List[str]) -> None:
+    """
+    تحديث فهرس البحث بالملفات التي تغيرت في المكتبة فقط.
+    """
+    for rel_path in removed:
+        music_catalog.remove_entry(library_entry_id(rel_path))
+    
+    # الملفات المرتبطة بأغاني مضمنة مفهرسة مسبقًا باسمها المعروض
+    embedded_files = {song.get('filename') for song in EMBEDDED_SONGS}
+    
+    entries = []
+    for rel_path in changed:
+        metadata = get_file_metadata(rel_path)
+        if not metadata or rel_path in embedded_files:
+            continue
+        entries.append({
+            'id': library_entry_id(rel_path),
+            'title': metadata.get('title') or os.path.splitext(os.path.basename(rel_path))[0],
+            'performer': metadata.get('performer') or "البوت الموسيقي",
+            'filename': rel_path,
+            'duration': metadata.get('duration', 0),
+            'source': "مكتبة الملفات",
+        })
+    music_catalog.add_entries(entries, "embedded")
+
+
+async def refresh_music_library() -> None:
+    """
+    فحص مجلد الموسيقى وتحديث الفهرس وفهرس البحث بالملفات الجديدة أو المتغيرة.
+    (عند توزيع التحديثات تفحص العملية الأساسية وحدها المجلد وتنشر الفهرس الجديد لباقي العمليات)
+    """
+    changed, removed = await scan_library_async(MUSIC_DIR)
+    if changed or removed:
+        _library_changed(changed, removed)
+        publish("music_library", None, (get_library_index(), changed, removed))
+
+def _library_changed(changed: List[str], removed: List[str]) -> None:
+    _sync_library_catalog(changed, removed)
+    
+    # حذف النسخ المخزنة في الذاكرة للملفات التي تغيرت
+    song_cache.clear()
+
+def _apply_shared_library(key: Any, value: Tuple[Dict[str, Dict[str, Any]], List[str], List[str]]) -> None:
+    """
+    تطبيق نتيجة فحص المكتبة الذي أجرته العملية الأساسية
+    """
+    index, changed, removed = value
+    apply_scan(index, changed, removed)
+    _library_changed(changed, removed)
+
+
+# فهرسة ملفات المكتبة المحفوظة من الفحص السابق دون إعادة فحص المجلد
+_sync_library_catalog(get_library_files(), [])
+register_shared("music_library", _apply_shared_library)
+
+
+async def serve_downloaded_song(video_id: str, user_id: Optional[int] = None) -> Tuple[bool, Any]:
+    """
+    تنزيل مقطع من يوتيوب (أو رابط مباشر) وتجهيزه للإرسال.
+    
+    Args:
+        video_id: معرف الفيديو أو الرابط
+        user_id: معرف المستخدم صاحب الطلب
+        
+    Returns:
+        زوج من (نجاح العملية، النتيجة) حيث تكون النتيجة معلومات الملف أو رسالة خطأ
+    """
+    success, result = await download_audio(video_id, user_id)
+    if not success:
+        return False, result
+    
+    # تحويل الملف إذا تجاوز الحجم المسموح أو كان بصيغة غير مدعومة
+    ready, ready_path = await ensure_sendable(result['path'], result['duration'])
+    if not ready:
+        return False, ready_path
+    
+    return True, {
+        'file': Path(ready_path),
+        'title': result['title'],
+        'performer': result['performer'],
+        'duration': result['duration'],
+    }
         
 
 async def download_fallback_song(video_id: str, title: str) -> Tuple[bool, Any]:
@@ -437,18 +534,19 @@ async def download_fallback_song(video_id: str, title: str) -> Tuple[bool, Any]:
         logger.error(f"خطأ في تقديم الأغنية البديلة: {e}")
         return False, f"غير قادر على تشغيل أغنية بديلة، فضلاً حاول لاحقًا."
 
-async def download_music(url: str) -> Tuple[bool, Any]:
+async def download_music(url: str, user_id: Optional[int] = None) -> Tuple[bool, Any]:
     """
     Download music from YouTube URL.
     
     Args:
         url: The YouTube URL.
+        user_id: The requesting user, for the per-user download limit.
         
     Returns:
         A tuple of (success, result), where result is either the file path or an error message.
     """
     # Reuse the play_music function as the implementation is the same
-    return await play_music(url, 0)  # 0 is a placeholder chat_id
+    return await play_music(url, 0, user_id)  # 0 is a placeholder chat_id
 
 async def get_audio_info(url: str) -> Optional[Dict[str, Any]]:
     """
@@ -543,3 +641,214 @@ def clean_cache():
         keys_to_remove = list(song_cache.keys())[:items_to_remove]
         for key in keys_to_remove:
             del song_cache[key]
+
+
+# ---------------------------------------------------------------------------
+# قوائم التشغيل لكل محادثة مع التحميل المسبق للمقاطع التالية
+# ---------------------------------------------------------------------------
+
+# قائمة التشغيل لكل محادثة، العنصر الأول هو المقطع الجاري تسليمه
+play_queues: Dict[int, List[Dict[str, Any]]] = {}
+
+# المحادثات التي يجري فيها تسليم المقاطع حاليًا
+_delivering_chats: set = set()
+
+# مهام التحميل المسبق الجارية لكل محادثة
+_prefetch_tasks: Dict[int, asyncio.Task] = {}
+
+
+def enqueue_track(chat_id: int, video_id: str, title: str, user_id: Optional[int] = None) -> Tuple[bool, Any]:
+    """
+    إضافة مقطع إلى قائمة التشغيل في المحادثة.
+    
+    Args:
+        chat_id: معرف المحادثة
+        video_id: معرف الفيديو أو الرابط
+        title: عنوان المقطع
+        user_id: معرف المستخدم الذي طلب المقطع
+        
+    Returns:
+        زوج من (نجاح العملية، موضع المقطع في القائمة أو رسالة خطأ)
+    """
+    from config import MAX_QUEUE_LENGTH
+    
+    queue = play_queues.setdefault(chat_id, [])
+    if len(queue) >= MAX_QUEUE_LENGTH:
+        return False, f"قائمة التشغيل ممتلئة (الحد الأقصى {MAX_QUEUE_LENGTH} مقطعًا)"
+    
+    queue.append({
+        'id': video_id,
+        'title': title,
+        'requested_by': user_id,
+        'added_at': time.time(),
+    })
+    
+    # بدء تحميل المقاطع التالية مبكرًا إذا كان هناك مقطع قيد التسليم
+    schedule_prefetch(chat_id)
+    
+    return True, len(queue)
+
+
+def get_queue(chat_id: int) -> List[Dict[str, Any]]:
+    """
+    الحصول على قائمة التشغيل الحالية للمحادثة.
+    
+    Args:
+        chat_id: معرف المحادثة
+        
+    Returns:
+        قائمة المقاطع (الأول هو المقطع الحالي)
+    """
+    return list(play_queues.get(chat_id, []))
+
+
+def skip_track(chat_id: int) -> Optional[Dict[str, Any]]:
+    """
+    تخطي المقطع الحالي في قائمة التشغيل.
+    
+    Args:
+        chat_id: معرف المحادثة
+        
+    Returns:
+        المقطع الذي تم تخطيه، أو None إذا كانت القائمة فارغة
+    """
+    queue = play_queues.get(chat_id)
+    if not queue:
+        return None
+    
+    skipped = queue.pop(0)
+    if not queue:
+        play_queues.pop(chat_id, None)
+    else:
+        schedule_prefetch(chat_id)
+    
+    return skipped
+
+
+def clear_queue(chat_id: int) -> int:
+    """
+    مسح قائمة التشغيل وإيقاف التحميل المسبق.
+    
+    Args:
+        chat_id: معرف المحادثة
+        
+    Returns:
+        عدد المقاطع التي تم حذفها
+    """
+    removed = len(play_queues.pop(chat_id, []))
+    
+    task = _prefetch_tasks.pop(chat_id, None)
+    if task and not task.done():
+        task.cancel()
+    
+    return removed
+
+
+def is_delivering(chat_id: int) -> bool:
+    """
+    التحقق مما إذا كان هناك مقطع قيد التسليم في المحادثة.
+    """
+    return chat_id in _delivering_chats
+
+
+def schedule_prefetch(chat_id: int) -> None:
+    """
+    جدولة تحميل المقاطع التالية في القائمة إلى الذاكرة المؤقتة في الخلفية.
+    
+    Args:
+        chat_id: معرف المحادثة
+    """
+    from config import QUEUE_PREFETCH_DEPTH
+    
+    queue = play_queues.get(chat_id, [])
+    upcoming = [track['id'] for track in queue[1:1 + QUEUE_PREFETCH_DEPTH]]
+    if not upcoming:
+        return
+    
+    running = _prefetch_tasks.get(chat_id)
+    if running and not running.done():
+        # المهمة الحالية ستعيد فحص القائمة عند انتهائها
+        return
+    
+    try:
+        task = asyncio.get_running_loop().create_task(_prefetch_upcoming(chat_id))
+    except RuntimeError:
+        return
+    _prefetch_tasks[chat_id] = task
+
+
+async def _prefetch_upcoming(chat_id: int) -> None:
+    """
+    تحميل المقاطع التالية واحدًا تلو الآخر حتى تصبح كلها في الذاكرة المؤقتة.
+    """
+    from config import QUEUE_PREFETCH_DEPTH
+    
+    attempted = set()
+    try:
+        while True:
+            queue = play_queues.get(chat_id, [])
+            pending = [
+                track['id'] for track in queue[1:1 + QUEUE_PREFETCH_DEPTH]
+                if track['id'] not in attempted
+            ]
+            if not pending:
+                return
+            
+            video_id = pending[0]
+            attempted.add(video_id)
+            
+            # المقاطع المضمنة لا تحتاج تنزيلًا
+            if get_cached_audio(video_id) or (len(video_id) != 11 and not video_id.startswith(('http://', 'https://'))):
+                continue
+            
+            success, result = await download_audio(video_id)
+            if success:
+                logger.info(f"تم تحميل المقطع التالي مسبقًا: {result['title']}")
+            else:
+                logger.warning(f"فشل التحميل المسبق للمقطع {video_id}: {result}")
+    except asyncio.CancelledError:
+        pass
+    finally:
+        if _prefetch_tasks.get(chat_id) is asyncio.current_task():
+            _prefetch_tasks.pop(chat_id, None)
+
+
+async def run_queue(
+    chat_id: int,
+    deliver: Callable[[Dict[str, Any], bool, Any], Awaitable[None]],
+) -> None:
+    """
+    تسليم مقاطع قائمة التشغيل بالترتيب مع تحميل المقاطع التالية أثناء رفع الحالي.
+    
+    Args:
+        chat_id: معرف المحادثة
+        deliver: دالة ترسل المقطع إلى المحادثة وتستقبل (المقطع، نجاح التحميل، النتيجة)
+    """
+    if chat_id in _delivering_chats:
+        return
+    
+    _delivering_chats.add(chat_id)
+    try:
+        while play_queues.get(chat_id):
+            track = play_queues[chat_id][0]
+            schedule_prefetch(chat_id)
+            
+            success, result = await play_music(track['id'], chat_id, track.get('requested_by'))
+            
+            # تجاهل المقطع إذا تم تخطيه أثناء تحميله
+            queue = play_queues.get(chat_id, [])
+            if not queue or queue[0] is not track:
+                continue
+            
+            try:
+                await deliver(track, success, result)
+            except Exception as e:
+                logger.error(f"خطأ في تسليم المقطع {track['title']}: {e}")
+            
+            queue = play_queues.get(chat_id, [])
+            if queue and queue[0] is track:
+                queue.pop(0)
+                if not queue:
+                    play_queues.pop(chat_id, None)
+    finally:
+        _delivering_chats.discard(chat_id)
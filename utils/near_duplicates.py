@@ -0,0 +1,214 @@
+"""
+وحدة كشف الرسائل شبه المتطابقة (موجات النسخ واللصق من عدة حسابات)
+تحسب لكل رسالة بصمة SimHash من 64 بت على المقاطع الثلاثية للنص بعد توحيده، فالرسائل التي
+تختلف في كلمة أو رمز تعطي بصمات متقاربة في عدد قليل من البتات
+
+الرسائل القصيرة (أقل من DUPLICATE_SHORT_LENGTH) لا تكفي مقاطعها لبصمة مستقرة، فتُستبدل بصمتها
+بتجزئة النص الموحد بعد استبدال كل رقم بصفر، وتُقارن بالتطابق التام (موجات الرسائل القصيرة
+غالبًا تغير رقم الهاتف أو المبلغ فقط)
+
+كل مجموعة لها فهرس حلقي ثابت الحجم لآخر البصمات، مقسم إلى 8 نطاقات من 8 بتات (LSH):
+الرسائل المتقاربة تشترك غالبًا في نطاق واحد على الأقل، فيُقارن النص الجديد فقط بالبصمات
+التي تشاركه نطاقًا بدل المرور على كل الفهرس
+"""
+
+import hashlib
+import re
+import time
+from array import array
+from typing import Dict, List, Optional, Tuple
+
+from config import (
+    DUPLICATE_THRESHOLD, DUPLICATE_WINDOW, DUPLICATE_MAX_DISTANCE,
+    DUPLICATE_INDEX_SIZE, DUPLICATE_MIN_LENGTH, DUPLICATE_SHORT_LENGTH,
+)
+from utils.music_catalog import normalize_text
+
+# طول المقطع (بالحروف) المستخدم في حساب البصمة
+SHINGLE_SIZE = 3
+
+# تقسيم البصمة إلى نطاقات للبحث
+BANDS = 8
+BAND_BITS = 8
+_BAND_MASK = (1 << BAND_BITS) - 1
+
+# أقصى عدد مقاطع يدخل في البصمة (يكفي لتمييز الرسائل، ولا يتجاوز سعة خانة العد)
+MAX_SHINGLES = 255
+
+# لجمع البتات: تجزئة كل مقطع تُوزع بتاتها على 64 خانة عرض كل منها 8 بتات،
+# فيصبح عد البتات الـ64 لكل المقاطع عملية جمع واحدة لعدد صحيح كبير
+_LANE_BITS = 8
+_SPREAD = [sum(((value >> i) & 1) << (_LANE_BITS * i) for i in range(8)) for value in range(256)]
+
+# قيمة كل مقطع بعد التوزيع على الخانات (تُفرغ عند امتلائها)
+_SHINGLE_CACHE_LIMIT = 20000
+_shingle_lanes: Dict[str, int] = {}
+
+_DIGIT = re.compile(r"\d")
+
+
+def _spread_shingle(shingle: str) -> int:
+    value = _shingle_lanes.get(shingle)
+    if value is None:
+        if len(_shingle_lanes) >= _SHINGLE_CACHE_LIMIT:
+            _shingle_lanes.clear()
+        # تجزئة ثابتة بين التشغيلات (hash() يتغير مع كل عملية) حتى تتكرر النتائج عند إعادة التشغيل
+        h = int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "little")
+        value = 0
+        for byte_index in range(8):
+            value |= _SPREAD[(h >> (8 * byte_index)) & 0xFF] << (8 * _LANE_BITS * byte_index)
+        _shingle_lanes[shingle] = value
+    return value
+
+
+def signature(text: str) -> Optional[int]:
+    """
+    حساب بصمة SimHash للنص
+
+    Args:
+        text: نص الرسالة
+
+    Returns:
+        البصمة (64 بت)، أو None إذا كان النص أقصر من أن يُفحص
+    """
+    normalized = normalize_text(text)
+    if len(normalized) < DUPLICATE_MIN_LENGTH:
+        return None
+    return _simhash(normalized)
+
+
+def _exact_hash(normalized: str) -> int:
+    """
+    تجزئة النص الموحد كاملًا بعد استبدال كل رقم بصفر (للرسائل القصيرة)
+    """
+    folded = _DIGIT.sub("0", normalized)
+    return int.from_bytes(hashlib.blake2b(folded.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def _simhash(normalized: str) -> int:
+    count = min(len(normalized) - SHINGLE_SIZE + 1, MAX_SHINGLES)
+    lanes = 0
+    for i in range(count):
+        lanes += _spread_shingle(normalized[i:i + SHINGLE_SIZE])
+
+    # البت يساوي 1 إذا كان 1 في أكثر من نصف المقاطع: كل خانة بايت واحد، فيحول جدول الترجمة
+    # البايتات إلى "0" و"1" ثم يُقرأ الناتج كعدد ثنائي (البت 0 في آخر النص)
+    half = count // 2
+    table = b"0" * (half + 1) + b"1" * (255 - half)
+    return int(lanes.to_bytes(64, "little").translate(table)[::-1], 2)
+
+
+class ChatIndex:
+    """
+    فهرس حلقي ثابت الحجم لآخر البصمات في مجموعة واحدة
+    """
+
+    __slots__ = ("size", "signatures", "times", "users", "message_ids", "next_slot", "buckets")
+
+    def __init__(self, size: int = DUPLICATE_INDEX_SIZE):
+        self.size = size
+        self.signatures = array("Q", [0]) * size
+        self.times = array("d", [0.0]) * size
+        self.users = array("q", [0]) * size
+        # 0 يعني أن الرسالة حُذفت بالفعل ضمن موجة سابقة
+        self.message_ids = array("q", [0]) * size
+        self.next_slot = 0
+        # (رقم النطاق، قيمته) -> الخانات التي تحمل بصمة بهذه القيمة في هذا النطاق
+        self.buckets: Dict[int, List[int]] = {}
+
+    @staticmethod
+    def _band_keys(sig: int) -> List[int]:
+        return [(band << BAND_BITS) | ((sig >> (band * BAND_BITS)) & _BAND_MASK) for band in range(BANDS)]
+
+    def add(self, sig: int, now: float, user_id: int, message_id: int) -> None:
+        slot = self.next_slot
+        self.next_slot = (slot + 1) % self.size
+
+        # إزالة البصمة القديمة في هذه الخانة من النطاقات
+        if self.times[slot]:
+            for key in self._band_keys(self.signatures[slot]):
+                slots = self.buckets.get(key)
+                if slots:
+                    slots.remove(slot)
+                    if not slots:
+                        del self.buckets[key]
+
+        self.signatures[slot] = sig
+        self.times[slot] = now
+        self.users[slot] = user_id
+        self.message_ids[slot] = message_id
+        for key in self._band_keys(sig):
+            self.buckets.setdefault(key, []).append(slot)
+
+    def find(self, sig: int, now: float, max_distance: int = DUPLICATE_MAX_DISTANCE) -> List[int]:
+        """
+        الخانات التي تحمل بصمة قريبة ضمن النافذة الزمنية
+        """
+        candidates = set()
+        for key in self._band_keys(sig):
+            slots = self.buckets.get(key)
+            if slots:
+                candidates.update(slots)
+
+        oldest = now - DUPLICATE_WINDOW
+        return [
+            slot for slot in candidates
+            if self.times[slot] >= oldest and (self.signatures[slot] ^ sig).bit_count() <= max_distance
+        ]
+
+
+# فهرس لكل مجموعة
+chat_indexes: Dict[int, ChatIndex] = {}
+
+
+def check_message(
+    chat_id: int,
+    user_id: int,
+    message_id: int,
+    text: str,
+    now: Optional[float] = None,
+) -> Tuple[bool, List[int]]:
+    """
+    إضافة رسالة إلى فهرس المجموعة والتحقق مما إذا كانت جزءًا من موجة نسخ ولصق
+
+    Args:
+        chat_id: معرف المجموعة
+        user_id: معرف المرسل
+        message_id: معرف الرسالة
+        text: نص الرسالة أو وصف الوسائط
+        now: الوقت الحالي (للاختبار)
+
+    Returns:
+        Tuple من (هل بلغت الموجة الحد، معرفات النسخ السابقة التي لم تُحذف بعد)
+    """
+    normalized = normalize_text(text)
+    if len(normalized) < DUPLICATE_MIN_LENGTH:
+        return False, []
+    # التجزئات التامة والبصمات في الفهرس نفسه: احتمال أن تقع تجزئة على بعد DUPLICATE_MAX_DISTANCE
+    # من بصمة نص آخر ضئيل جدًا (أقل من 1 من 10^7 لكل زوج)
+    if len(normalized) < DUPLICATE_SHORT_LENGTH:
+        sig, max_distance = _exact_hash(normalized), 0
+    else:
+        sig, max_distance = _simhash(normalized), DUPLICATE_MAX_DISTANCE
+
+    now = now or time.time()
+    index = chat_indexes.get(chat_id)
+    if index is None:
+        index = chat_indexes[chat_id] = ChatIndex()
+
+    matches = index.find(sig, now, max_distance)
+    # المستخدم الذي يكرر رسالته بنفسه يعالجه فحص الإغراق، وهنا يُحسب كل مستخدم مرة واحدة
+    users = {index.users[slot] for slot in matches}
+    users.add(user_id)
+    flagged = len(users) >= DUPLICATE_THRESHOLD
+
+    earlier_ids = []
+    if flagged:
+        for slot in matches:
+            if index.message_ids[slot]:
+                earlier_ids.append(index.message_ids[slot])
+                index.message_ids[slot] = 0
+
+    # الرسالة تبقى في الفهرس حتى تُكشف باقي نسخ الموجة (دون معرفها إذا كانت ستُحذف الآن)
+    index.add(sig, now, user_id, 0 if flagged else message_id)
+    return flagged, earlier_ids
@@ -0,0 +1,142 @@
+"""
+وحدة الحماية من موجات الانضمام الجماعي (الاقتحام)
+تراقب عدد المنضمين لكل مجموعة في نافذة زمنية منزلقة، وعند تجاوز الحد تدخل المجموعة وضع الحماية:
+- تُجمع رسائل الترحيب في رسالة واحدة كل بضع ثوانٍ تذكر المنضمين الجدد بدل رسالة لكل عضو
+- يمكن تقييد المنضمين مؤقتًا (خيار raid_restrict في إعدادات المجموعة)
+ويخرج وضع الحماية تلقائيًا بعد فترة هدوء بلا انضمامات جديدة
+"""
+
+import asyncio
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+import logging
+
+from telegram import Bot, ChatPermissions, User
+from telegram.error import TelegramError
+
+from utils.cleanup_queue import send_notice
+from utils.moderation_actions import emit
+from config import (
+    RAID_JOIN_THRESHOLD, RAID_WINDOW, RAID_COOLDOWN, RAID_WELCOME_INTERVAL,
+    RAID_WELCOME_MAX_MENTIONS, RAID_RESTRICT_DURATION,
+)
+
+logger = logging.getLogger(__name__)
+
+# أوقات آخر الانضمامات لكل مجموعة (بطول الحد فقط، فالذاكرة ثابتة لكل مجموعة)
+_recent_joins: Dict[int, Deque[float]] = {}
+
+# وقت انتهاء وضع الحماية لكل مجموعة في وضع الحماية
+raid_until: Dict[int, float] = {}
+
+# المنضمون الذين لم يُرحب بهم بعد (روابط أسمائهم بصيغة HTML)
+_pending_welcomes: Dict[int, List[str]] = {}
+
+# مهمة إرسال الترحيب المجمع لكل مجموعة
+_flush_tasks: Dict[int, asyncio.Task] = {}
+
+
+def record_join(chat_id: int, now: Optional[float] = None) -> bool:
+    """
+    تسجيل انضمام عضو والتحقق من وضع الحماية
+
+    Args:
+        chat_id: معرف المجموعة
+        now: الوقت الحالي (للاختبار)
+
+    Returns:
+        True إذا كانت المجموعة في وضع الحماية بعد هذا الانضمام
+    """
+    now = now or time.time()
+    joins = _recent_joins.get(chat_id)
+    if joins is None:
+        joins = _recent_joins[chat_id] = deque(maxlen=RAID_JOIN_THRESHOLD)
+    joins.append(now)
+
+    if chat_id in raid_until:
+        if now < raid_until[chat_id]:
+            raid_until[chat_id] = now + RAID_COOLDOWN
+            return True
+        del raid_until[chat_id]
+
+    # الحد بلغ إذا كانت آخر RAID_JOIN_THRESHOLD انضمامات كلها داخل النافذة
+    if len(joins) == RAID_JOIN_THRESHOLD and now - joins[0] <= RAID_WINDOW:
+        raid_until[chat_id] = now + RAID_COOLDOWN
+        logger.warning(f"موجة انضمام في المجموعة {chat_id}: تفعيل وضع الحماية")
+        return True
+    return False
+
+
+def is_raid_active(chat_id: int, now: Optional[float] = None) -> bool:
+    """
+    هل المجموعة في وضع الحماية حاليًا
+    """
+    until = raid_until.get(chat_id)
+    return until is not None and (now or time.time()) < until
+
+
+async def handle_raid_join(bot: Bot, chat_id: int, user: User, settings: Dict[str, Any]) -> None:
+    """
+    معالجة انضمام عضو أثناء وضع الحماية: إضافته إلى الترحيب المجمع وتقييده إذا كان الخيار مفعلًا
+
+    Args:
+        bot: كائن البوت
+        chat_id: معرف المجموعة
+        user: العضو المنضم
+        settings: إعدادات حماية المجموعة
+    """
+    if settings.get("welcome_message"):
+        _pending_welcomes.setdefault(chat_id, []).append(user.mention_html())
+
+    task = _flush_tasks.get(chat_id)
+    if task is None or task.done():
+        _flush_tasks[chat_id] = asyncio.create_task(_welcome_loop(bot, chat_id, settings))
+        # إعلان واحد عند بدء وضع الحماية (يُحذف تلقائيًا مع باقي التنبيهات)
+        send_notice(
+            bot, chat_id,
+            "🚨 تم رصد موجة انضمام جماعي. تم تفعيل وضع الحماية وسيتم الترحيب بالأعضاء الجدد في رسائل مجمعة.",
+            parse_mode=None,
+        )
+
+    if settings.get("raid_restrict", False):
+        emit(
+            bot, "restrict", chat_id, user.id,
+            reason="موجة انضمام جماعي",
+            permissions=ChatPermissions(can_send_messages=False),
+            until_date=int(time.time()) + RAID_RESTRICT_DURATION,
+        )
+
+
+def _welcome_text(template: str, mentions: List[str]) -> str:
+    shown = mentions[:RAID_WELCOME_MAX_MENTIONS]
+    names = "، ".join(shown)
+    if len(mentions) > len(shown):
+        names += f" و{len(mentions) - len(shown)} آخرين"
+    return template.replace("{username}", names)
+
+
+async def _welcome_loop(bot: Bot, chat_id: int, settings: Dict[str, Any]) -> None:
+    """
+    إرسال ترحيب واحد بكل المنضمين الجدد كل RAID_WELCOME_INTERVAL حتى ينتهي وضع الحماية
+    """
+    try:
+        while True:
+            await asyncio.sleep(RAID_WELCOME_INTERVAL)
+            mentions = _pending_welcomes.pop(chat_id, [])
+            if mentions:
+                try:
+                    await bot.send_message(
+                        chat_id=chat_id,
+                        text=_welcome_text(settings["welcome_message"], mentions),
+                        parse_mode="HTML",
+                    )
+                except TelegramError as e:
+                    logger.error(f"خطأ في إرسال الترحيب المجمع: {e}")
+            elif not is_raid_active(chat_id):
+                break
+    finally:
+        _flush_tasks.pop(chat_id, None)
+        if not is_raid_active(chat_id):
+            raid_until.pop(chat_id, None)
+            _recent_joins.pop(chat_id, None)
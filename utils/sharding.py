@@ -0,0 +1,442 @@
+"""
+وحدة توزيع التحديثات على عدة عمليات حسب معرف المحادثة
+عملية أمامية واحدة تستقبل التحديثات (polling أو Webhook) وتوجه كل تحديث إلى العملية
+العاملة المسؤولة عن محادثته (crc32 لمعرف المحادثة مقسومًا على عدد العمليات)، وكل عملية
+عاملة تشغل نفس معالجات البوت التي يبنيها main.build_application
+
+الحالة الخاصة بكل محادثة (عدادات الإغراق والتحذيرات وقوائم التشغيل) تبقى داخل عمليتها.
+الحالة العامة (سجل المستخدمين والأوامر المخصصة وإعدادات المجموعات والإحصائيات) تُشارك عبر
+طبقة تنسيق صغيرة: العملية التي تغير قيمة تنشرها بـ publish، والعملية الأمامية تحفظ آخر قيمة
+وتعيد إرسالها إلى باقي العمليات (وإلى أي عملية تُعاد تشغيلها). القراءة تبقى محلية دون أي اتصال
+بين العمليات، وكل شيء يعمل على جهاز واحد باستخدام multiprocessing دون خدمات خارجية
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import queue
+import secrets
+import signal
+import zlib
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+from aiohttp import web
+from telegram import Update
+from telegram.error import RetryAfter, TelegramError
+from telegram.ext import ExtBot
+from telegram.request import HTTPXRequest
+
+from config import (
+    BOT_TOKEN, BOT_API_BASE_URL, BOT_API_FILE_URL, RECORD_UPDATES, RECORDING_FLUSH_INTERVAL,
+    SHARD_WEBHOOK_URL, SHARD_WEBHOOK_LISTEN, SHARD_WEBHOOK_PORT, SHARD_SYNC_INTERVAL,
+)
+from utils import metrics, stats_store
+from utils.update_recorder import record_raw_update, flush_recordings, flush_recordings_sync
+
+logger = logging.getLogger(__name__)
+
+# مهلة الاستطلاع الطويل لطلب getUpdates في العملية الأمامية (بالثواني)
+POLL_TIMEOUT = 10
+
+# رسالة داخلية تطلب إيقاف العملية الأساسية بعد نقل كل ما سبقها من رسائل
+_STOP_PRIMARY = "stop_primary"
+
+# نوع رسائل فروقات الإحصائيات (أحداث تُضاف إلى العدادات وليست قيمًا تحفظها العملية الأمامية)
+STATS_KIND = "stats"
+
+# رقم العملية الحالية وعدد العمليات (None عند التشغيل في عملية واحدة)
+shard_index: Optional[int] = None
+shard_count = 1
+
+# قناة إرسال التغييرات إلى العملية الأمامية (في العمليات العاملة فقط)
+_outbox: Optional[Any] = None
+
+# دوال تطبيق التغييرات الواردة من العمليات الأخرى حسب نوع الحالة
+_appliers: Dict[str, Callable[[Any, Any], None]] = {}
+
+# فروقات الإحصائيات التي لم تُرسل بعد: (اسم العداد، رقم الدقيقة) -> الزيادة
+_pending_stats: Dict[Tuple[str, int], int] = {}
+
+# دوال ترسل فروقات متراكمة في وحدات أخرى (تُستدعى مع كل مزامنة للإحصائيات وعند الإيقاف)
+_delta_flushers: List[Callable[[], None]] = []
+
+
+def shard_for(chat_id: int, shards: int) -> int:
+    """
+    رقم العملية المسؤولة عن المحادثة (ثابت بين التشغيلات)
+    """
+    return zlib.crc32(str(chat_id).encode()) % shards
+
+
+def update_chat_id(raw: Dict[str, Any]) -> int:
+    """
+    معرف المحادثة التي ينتمي إليها تحديث بصيغة JSON
+    (معرف المستخدم للتحديثات التي لا تتبع محادثة مثل الاستعلامات المضمنة، و0 إذا لم يوجد أي منهما)
+    """
+    for key, value in raw.items():
+        if key == "update_id" or not isinstance(value, dict):
+            continue
+        chat = value.get("chat") or (value.get("message") or {}).get("chat")
+        if chat:
+            return chat["id"]
+        user = value.get("from")
+        if user:
+            return user["id"]
+    return 0
+
+
+def is_shard_worker() -> bool:
+    """
+    هل تعمل هذه العملية كعملية عاملة ضمن التشغيل الموزع
+    """
+    return shard_index is not None
+
+
+def is_primary_shard() -> bool:
+    """
+    هل هذه العملية مسؤولة عن المهام التي يجب أن تعمل مرة واحدة فقط (مثل حفظ الإحصائيات)
+    """
+    return shard_index in (None, 0)
+
+
+def register_shared(kind: str, applier: Callable[[Any, Any], None]) -> None:
+    """
+    تسجيل دالة تطبق تغييرًا واردًا من عملية أخرى على الحالة المحلية
+
+    Args:
+        kind: نوع الحالة (مثل "user" أو "custom_command")
+        applier: دالة تستقبل المفتاح والقيمة الجديدة (None تعني الحذف)
+    """
+    _appliers[kind] = applier
+
+
+def register_delta_flusher(flush: Callable[[], None]) -> None:
+    """
+    تسجيل دالة ترسل فروقات متراكمة (بـ publish مع delta=True) دوريًا وعند إيقاف العملية
+    """
+    _delta_flushers.append(flush)
+
+
+def publish(kind: str, key: Any, value: Any, delta: bool = False) -> None:
+    """
+    نشر تغيير في حالة عامة إلى باقي العمليات (لا تفعل شيئًا عند التشغيل في عملية واحدة)
+
+    Args:
+        kind: نوع الحالة
+        key: مفتاح العنصر الذي تغير
+        value: القيمة الجديدة (None للحذف)، ويجب أن تكون قابلة للتسلسل بـ pickle
+        delta: القيمة فرق يُضاف إلى قيم كل عملية (مثل زيادات العدادات)، فلا تحفظها العملية
+            الأمامية لتسليمها للعمليات التي يُعاد تشغيلها
+    """
+    if _outbox is None:
+        return
+    try:
+        _outbox.put((shard_index, kind, key, value, delta))
+    except Exception as e:
+        logger.error(f"خطأ في نشر تغيير الحالة المشتركة {kind}: {e}")
+
+
+def apply_shared(kind: str, key: Any, value: Any) -> None:
+    """
+    تطبيق تغيير وارد من عملية أخرى
+    """
+    applier = _appliers.get(kind)
+    if applier is None:
+        logger.warning(f"نوع حالة مشتركة غير معروف: {kind}")
+        return
+    try:
+        applier(key, value)
+    except Exception as e:
+        logger.error(f"خطأ في تطبيق تغيير الحالة المشتركة {kind}: {e}")
+
+
+def _queue_stats(name: str, count: int, minute: int) -> None:
+    key = (name, minute)
+    _pending_stats[key] = _pending_stats.get(key, 0) + count
+
+
+def _apply_stats(key: Any, batch: Dict[Tuple[str, int], int]) -> None:
+    for (name, minute), count in batch.items():
+        stats_store.record_event(name, count, now=minute * 60, notify=False)
+
+
+async def _stats_sync_job(context) -> None:
+    """
+    إرسال فروقات الإحصائيات (وفروقات الوحدات الأخرى) المتراكمة دفعة واحدة بدل رسالة لكل حدث
+    """
+    for flush in _delta_flushers:
+        try:
+            flush()
+        except Exception as e:
+            logger.error(f"خطأ في إرسال الفروقات المتراكمة: {e}")
+    if not _pending_stats:
+        return
+    batch = dict(_pending_stats)
+    _pending_stats.clear()
+    publish(STATS_KIND, None, batch, delta=True)
+
+
+def _next_message(inbox: Any) -> Optional[Tuple[str, Any]]:
+    """
+    انتظار الرسالة التالية من العملية الأمامية (None عند طلب الإيقاف أو توقف العملية الأمامية)
+    """
+    while True:
+        try:
+            return inbox.get(timeout=1)
+        except queue.Empty:
+            parent = multiprocessing.parent_process()
+            if parent is not None and not parent.is_alive():
+                return None
+
+
+async def _run_worker(inbox: Any) -> None:
+    """
+    تشغيل معالجات البوت على التحديثات الواردة من العملية الأمامية
+    """
+    from main import build_application
+
+    metrics.snapshot_path = f"data/metrics.shard{shard_index}.prom"
+    metrics.snapshot_labels = f'shard="{shard_index}"'
+    stats_store.add_event_listener(_queue_stats)
+    register_shared(STATS_KIND, _apply_stats)
+
+    application = build_application()
+    application.job_queue.run_repeating(_stats_sync_job, interval=SHARD_SYNC_INTERVAL)
+
+    # التطبيق لا يستخدم Updater هنا، لذا تُستدعى دوال بدء وإيقاف التشغيل يدويًا
+    await application.initialize()
+    if application.post_init:
+        await application.post_init(application)
+    await application.start()
+    logger.info(f"بدأت العملية {shard_index + 1} من {shard_count}")
+
+    loop = asyncio.get_running_loop()
+    try:
+        while True:
+            message = await loop.run_in_executor(None, _next_message, inbox)
+            if message is None:
+                break
+            kind, payload = message
+            if kind == "updates":
+                for raw in payload:
+                    await application.update_queue.put(Update.de_json(raw, application.bot))
+            else:
+                apply_shared(*payload)
+    finally:
+        await application.stop()
+        if application.post_stop:
+            await application.post_stop(application)
+        # إرسال آخر فروقات الإحصائيات بعد معالجة كل التحديثات المتبقية
+        await _stats_sync_job(None)
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)
+
+
+def worker_main(index: int, shards: int, inbox: Any, outbox: Any) -> None:
+    """
+    نقطة بدء العملية العاملة
+    """
+    global shard_index, shard_count, _outbox
+    # Ctrl+C يصل إلى كل العمليات، والإيقاف المنظم تطلبه العملية الأمامية عبر قناة الرسائل
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    shard_index, shard_count, _outbox = index, shards, outbox
+
+    logging.basicConfig(
+        format=f"%(asctime)s - shard {index} - %(name)s - %(levelname)s - %(message)s",
+        level=logging.INFO,
+        force=True,
+    )
+    asyncio.run(_run_worker(inbox))
+
+
+class ShardRouter:
+    """
+    العملية الأمامية: تستقبل التحديثات وتوزعها، وتنقل تغييرات الحالة العامة بين العمليات،
+    وتعيد تشغيل أي عملية عاملة تتوقف بشكل غير متوقع
+    """
+
+    def __init__(self, shards: int):
+        self.shards = shards
+        self._context = multiprocessing.get_context("spawn")
+        self.inboxes = [self._context.Queue() for _ in range(shards)]
+        self.outbox = self._context.Queue()
+        self.workers: List[Optional[multiprocessing.Process]] = [None] * shards
+        # آخر قيمة لكل عنصر في الحالة العامة: النوع -> المفتاح -> القيمة
+        self.state: Dict[str, Dict[Any, Any]] = {}
+        self.routed = [0] * shards
+        self._stopping: Optional[asyncio.Event] = None
+
+    def start_worker(self, index: int) -> None:
+        process = self._context.Process(
+            target=worker_main,
+            args=(index, self.shards, self.inboxes[index], self.outbox),
+            name=f"shard-{index}",
+        )
+        process.start()
+        self.workers[index] = process
+
+        # تسليم الحالة العامة الحالية للعملية (مهم عند إعادة تشغيلها بعد توقف)
+        for kind, entries in self.state.items():
+            for key, value in entries.items():
+                self.inboxes[index].put(("shared", (kind, key, value)))
+
+    def dispatch(self, raw_updates: List[Dict[str, Any]]) -> None:
+        """
+        توزيع دفعة تحديثات على العمليات مع الحفاظ على ترتيب تحديثات كل محادثة
+        """
+        batches: Dict[int, List[Dict[str, Any]]] = {}
+        for raw in raw_updates:
+            batches.setdefault(shard_for(update_chat_id(raw), self.shards), []).append(raw)
+            if RECORD_UPDATES:
+                record_raw_update(raw)
+        for index, batch in batches.items():
+            self.inboxes[index].put(("updates", batch))
+            self.routed[index] += len(batch)
+
+    async def _relay(self) -> None:
+        """
+        نقل تغييرات الحالة العامة من العملية التي غيرتها إلى باقي العمليات
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            message = await loop.run_in_executor(None, self.outbox.get)
+            if message is None:
+                return
+            if message == _STOP_PRIMARY:
+                # كل ما أرسلته العمليات الأخرى قبل توقفها نُقل بالفعل إلى العملية الأساسية
+                self.inboxes[0].put(None)
+                continue
+            origin, kind, key, value, delta = message
+            if not delta:
+                entries = self.state.setdefault(kind, {})
+                if value is None:
+                    entries.pop(key, None)
+                else:
+                    entries[key] = value
+            for index, inbox in enumerate(self.inboxes):
+                if index != origin:
+                    inbox.put(("shared", (kind, key, value)))
+
+    async def _poll(self, bot: ExtBot) -> None:
+        """
+        استقبال التحديثات عبر getUpdates (دون تحويلها إلى كائنات، فهي تُرسل كما هي إلى العمليات)
+        """
+        await bot.delete_webhook()
+        offset = 0
+        while True:
+            try:
+                raw_updates = await bot._post(
+                    "getUpdates",
+                    {"offset": offset, "timeout": POLL_TIMEOUT},
+                    read_timeout=POLL_TIMEOUT + 5,
+                )
+            except RetryAfter as e:
+                await asyncio.sleep(e.retry_after)
+                continue
+            except TelegramError as e:
+                logger.error(f"خطأ في جلب التحديثات: {e}")
+                await asyncio.sleep(1)
+                continue
+
+            if raw_updates:
+                offset = raw_updates[-1]["update_id"] + 1
+                self.dispatch(raw_updates)
+
+    async def _serve_webhook(self, bot: ExtBot) -> None:
+        """
+        استقبال التحديثات عبر Webhook مع التحقق من الرمز السري في كل طلب
+        """
+        secret = secrets.token_hex(16)
+
+        async def receive(request: web.Request) -> web.Response:
+            if request.headers.get("X-Telegram-Bot-Api-Secret-Token") != secret:
+                return web.Response(status=403)
+            self.dispatch([await request.json()])
+            return web.Response()
+
+        app = web.Application()
+        app.router.add_post(urlparse(SHARD_WEBHOOK_URL).path or "/", receive)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        await web.TCPSite(runner, SHARD_WEBHOOK_LISTEN, SHARD_WEBHOOK_PORT).start()
+        await bot.set_webhook(SHARD_WEBHOOK_URL, secret_token=secret)
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await runner.cleanup()
+
+    async def _join_workers(self, workers: List[Optional[multiprocessing.Process]]) -> None:
+        loop = asyncio.get_running_loop()
+        for process in workers:
+            if process is None:
+                continue
+            await loop.run_in_executor(None, process.join, 30)
+            if process.is_alive():
+                process.terminate()
+
+    def _supervise(self) -> None:
+        for index, process in enumerate(self.workers):
+            if process is not None and not process.is_alive():
+                logger.error(f"توقفت العملية {index} (رمز الخروج {process.exitcode})، جاري إعادة تشغيلها")
+                self.start_worker(index)
+
+    async def run(self) -> None:
+        self._stopping = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, self._stopping.set)
+
+        for index in range(self.shards):
+            self.start_worker(index)
+
+        bot = ExtBot(
+            BOT_TOKEN,
+            base_url=BOT_API_BASE_URL,
+            base_file_url=BOT_API_FILE_URL,
+            get_updates_request=HTTPXRequest(read_timeout=POLL_TIMEOUT + 5),
+        )
+        await bot.initialize()
+        relay = asyncio.create_task(self._relay())
+        receiver = asyncio.create_task(self._serve_webhook(bot) if SHARD_WEBHOOK_URL else self._poll(bot))
+        logger.info(f"توزيع التحديثات على {self.shards} عمليات")
+
+        ticks = 0
+        try:
+            while not self._stopping.is_set():
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), timeout=1)
+                except asyncio.TimeoutError:
+                    pass
+                self._supervise()
+                ticks += 1
+                if RECORD_UPDATES and ticks % RECORDING_FLUSH_INTERVAL == 0:
+                    await flush_recordings()
+        finally:
+            receiver.cancel()
+            await asyncio.gather(receiver, return_exceptions=True)
+
+            # إيقاف العمليات بعد معالجة ما وصلها من تحديثات، والعملية الأساسية أخيرًا
+            # حتى تصلها آخر إحصائيات باقي العمليات قبل أن تحفظها
+            for inbox in self.inboxes[1:]:
+                inbox.put(None)
+            await self._join_workers(self.workers[1:])
+            self.outbox.put(_STOP_PRIMARY)
+            await self._join_workers(self.workers[:1])
+
+            self.outbox.put(None)
+            await relay
+            flush_recordings_sync()
+            await bot.shutdown()
+            logger.info(f"التحديثات الموزعة لكل عملية: {self.routed}")
+
+
+def run_sharded(shards: int) -> None:
+    """
+    تشغيل البوت موزعًا على عدة عمليات
+
+    Args:
+        shards: عدد العمليات العاملة
+    """
+    asyncio.run(ShardRouter(shards).run())
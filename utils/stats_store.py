@@ -0,0 +1,313 @@
+"""
+وحدة تخزين إحصائيات البوت
+تحفظ العدادات في حلقات ثابتة الحجم لكل دقيقة (آخر يوم) ولكل ساعة (آخر أسبوع)
+مبنية على مصفوفات array، وتُجمَّع الدقائق في الساعات دوريًا في الخلفية، ثم تُحفظ على القرص
+حتى لا تضيع الإحصائيات عند إعادة التشغيل
+
+حساب نوافذ الساعة واليوم والأسبوع يقرأ عددًا ثابتًا من الخانات ولا يمر على الأحداث الخام
+"""
+
+import asyncio
+import json
+import os
+import time
+from array import array
+from typing import Any, Callable, Dict, List, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+# ملف حفظ الإحصائيات
+STATS_FILE = "data/bot_statistics.json"
+
+# العدادات المتاحة (الترتيب يحدد موقع كل عداد داخل المصفوفات)
+COUNTERS = (
+    "messages_received",
+    "songs_played",
+    "searches_performed",
+    "downloads_completed",
+    "commands_used",
+    "groups_joined",
+    "users_warned",
+    "users_banned",
+    "broadcasts_sent",
+)
+_COUNTER_INDEX = {name: i for i, name in enumerate(COUNTERS)}
+
+# عدد الخانات: دقيقة لكل خانة لمدة يوم، وساعة لكل خانة لمدة أسبوع
+MINUTE_SLOTS = 1440
+HOUR_SLOTS = 168
+
+# القيم مخزنة بشكل مسطح: موقع العداد i في الخانة s هو i * عدد_الخانات + s
+_minute_counts = array("q", [0]) * (len(COUNTERS) * MINUTE_SLOTS)
+_hour_counts = array("q", [0]) * (len(COUNTERS) * HOUR_SLOTS)
+
+# رقم الدقيقة/الساعة (منذ 1970) الذي تنتمي إليه كل خانة حاليًا، -1 للخانة الفارغة
+_minute_stamps = array("q", [-1]) * MINUTE_SLOTS
+_hour_stamps = array("q", [-1]) * HOUR_SLOTS
+
+# الإجماليات منذ أول تشغيل
+_totals = array("q", [0]) * len(COUNTERS)
+
+# أول دقيقة لم تُجمَّع بعد في خانات الساعات (تُحدد عند التحميل)
+_rolled_until: Optional[int] = None
+
+# دوال تُستدعى مع كل حدث باسم العداد والزيادة ورقم الدقيقة (تستخدمها العمليات الموزعة لمشاركة الإحصائيات)
+_event_listeners: List[Callable[[str, int, int], None]] = []
+
+
+def _claim_minute(minute: int) -> int:
+    """
+    تجهيز خانة الدقيقة (تصفيرها إذا كانت تحمل دقيقة قديمة) وإعادة رقمها
+    """
+    slot = minute % MINUTE_SLOTS
+    if _minute_stamps[slot] != minute:
+        for i in range(len(COUNTERS)):
+            _minute_counts[i * MINUTE_SLOTS + slot] = 0
+        _minute_stamps[slot] = minute
+    return slot
+
+
+def _claim_hour(hour: int) -> int:
+    """
+    تجهيز خانة الساعة (تصفيرها إذا كانت تحمل ساعة قديمة) وإعادة رقمها
+    """
+    slot = hour % HOUR_SLOTS
+    if _hour_stamps[slot] != hour:
+        for i in range(len(COUNTERS)):
+            _hour_counts[i * HOUR_SLOTS + slot] = 0
+        _hour_stamps[slot] = hour
+    return slot
+
+
+def add_event_listener(listener: Callable[[str, int, int], None]) -> None:
+    """
+    تسجيل دالة تُستدعى مع كل حدث يسجله record_event
+    """
+    _event_listeners.append(listener)
+
+
+def record_event(name: str, count: int = 1, now: Optional[float] = None, notify: bool = True) -> None:
+    """
+    زيادة عداد في خانة الدقيقة الحالية
+
+    Args:
+        name: اسم العداد (من COUNTERS)
+        count: مقدار الزيادة
+        now: الوقت الحالي (للاختبار)
+        notify: إبلاغ الدوال المسجلة (يُعطل عند تطبيق أحداث واردة من عملية أخرى)
+    """
+    index = _COUNTER_INDEX.get(name)
+    if index is None:
+        logger.warning(f"عداد غير معروف: {name}")
+        return
+
+    minute = int((now or time.time()) // 60)
+    if minute < _rolled_until:
+        # حدث متأخر (مثل دفعة من عملية أخرى) لدقيقة جُمّعت بالفعل: rollup لن يعود إليها،
+        # فيُضاف إلى خانة ساعته مباشرة (إلا إذا خرجت الساعة من حلقة الأسبوع)
+        hour = minute // 60
+        if _hour_stamps[hour % HOUR_SLOTS] <= hour:
+            _hour_counts[index * HOUR_SLOTS + _claim_hour(hour)] += count
+    # خانة الدقيقة تبقى لحساب آخر ساعة (ما لم تكن الخانة لدقيقة أحدث)
+    if _minute_stamps[minute % MINUTE_SLOTS] <= minute:
+        _minute_counts[index * MINUTE_SLOTS + _claim_minute(minute)] += count
+    _totals[index] += count
+
+    if notify:
+        for listener in _event_listeners:
+            listener(name, count, minute)
+
+
+def rollup(now: Optional[float] = None) -> int:
+    """
+    تجميع الدقائق المكتملة في خانات الساعات
+
+    Args:
+        now: الوقت الحالي (للاختبار)
+
+    Returns:
+        عدد الدقائق التي تم تجميعها
+    """
+    global _rolled_until
+
+    current = int((now or time.time()) // 60)
+    rolled = 0
+    for minute in range(max(_rolled_until, current - MINUTE_SLOTS + 1), current):
+        slot = minute % MINUTE_SLOTS
+        if _minute_stamps[slot] != minute:
+            continue
+        hour_slot = _claim_hour(minute // 60)
+        for i in range(len(COUNTERS)):
+            _hour_counts[i * HOUR_SLOTS + hour_slot] += _minute_counts[i * MINUTE_SLOTS + slot]
+        rolled += 1
+
+    _rolled_until = max(_rolled_until, current)
+    return rolled
+
+
+def _minutes_sum(index: int, start: int, end: int) -> int:
+    """
+    مجموع عداد في الدقائق من start إلى end (شاملة)
+    """
+    total = 0
+    base = index * MINUTE_SLOTS
+    for minute in range(max(start, end - MINUTE_SLOTS + 1), end + 1):
+        slot = minute % MINUTE_SLOTS
+        if _minute_stamps[slot] == minute:
+            total += _minute_counts[base + slot]
+    return total
+
+
+def _hours_sum(index: int, start: int, end: int) -> int:
+    """
+    مجموع عداد في الساعات من start إلى end (شاملة)
+    """
+    total = 0
+    base = index * HOUR_SLOTS
+    for hour in range(max(start, end - HOUR_SLOTS + 1), end + 1):
+        slot = hour % HOUR_SLOTS
+        if _hour_stamps[slot] == hour:
+            total += _hour_counts[base + slot]
+    return total
+
+
+def _window(index: int, hours: int, now: float, offset: int = 0) -> int:
+    """
+    مجموع عداد خلال آخر عدد من الساعات، بعد إزاحة اختيارية بالساعات للخلف
+    """
+    current_minute = int(now // 60)
+    current_hour = current_minute // 60 - offset
+    total = _hours_sum(index, current_hour - hours + 1, current_hour)
+    if offset == 0:
+        # الدقائق التي لم تُجمَّع بعد في خانات الساعات
+        total += _minutes_sum(index, _rolled_until, current_minute)
+    return total
+
+
+def get_summary(now: Optional[float] = None) -> Dict[str, Dict[str, Any]]:
+    """
+    ملخص كل عداد: الإجمالي، وآخر ساعة ويوم وأسبوع، ونسبة التغير بين آخر يوم واليوم الذي قبله
+
+    Args:
+        now: الوقت الحالي (للاختبار)
+
+    Returns:
+        قاموس من اسم العداد إلى قيمه
+    """
+    now = now or time.time()
+    current_minute = int(now // 60)
+    summary = {}
+
+    for name, index in _COUNTER_INDEX.items():
+        day = _window(index, 24, now)
+        previous_day = _window(index, 24, now, offset=24)
+        trend = None
+        if previous_day:
+            trend = round((day - previous_day) * 100 / previous_day)
+
+        summary[name] = {
+            "total": _totals[index],
+            "hour": _minutes_sum(index, current_minute - 59, current_minute),
+            "day": day,
+            "week": _window(index, HOUR_SLOTS, now),
+            "trend": trend,
+        }
+
+    return summary
+
+
+def load_stats() -> None:
+    """
+    تحميل الإحصائيات المحفوظة من الملف
+    """
+    global _rolled_until
+
+    try:
+        if not os.path.exists(STATS_FILE):
+            return
+
+        with open(STATS_FILE, "r", encoding="utf-8") as file:
+            data = json.load(file)
+
+        if data.get("minute_slots") != MINUTE_SLOTS or data.get("hour_slots") != HOUR_SLOTS:
+            logger.warning("تغير حجم خانات الإحصائيات، سيتم تحميل الإجماليات فقط")
+            data = {"counters": data.get("counters", []), "totals": data.get("totals", [])}
+
+        _minute_stamps[:] = array("q", data.get("minute_stamps", _minute_stamps))
+        _hour_stamps[:] = array("q", data.get("hour_stamps", _hour_stamps))
+
+        # ربط العدادات بالاسم حتى تبقى الملفات القديمة صالحة بعد إضافة عدادات جديدة
+        for saved_index, name in enumerate(data.get("counters", [])):
+            index = _COUNTER_INDEX.get(name)
+            if index is None:
+                continue
+            _totals[index] = data["totals"][saved_index]
+            if "minute_counts" in data:
+                start = saved_index * MINUTE_SLOTS
+                _minute_counts[index * MINUTE_SLOTS:(index + 1) * MINUTE_SLOTS] = array(
+                    "q", data["minute_counts"][start:start + MINUTE_SLOTS]
+                )
+                start = saved_index * HOUR_SLOTS
+                _hour_counts[index * HOUR_SLOTS:(index + 1) * HOUR_SLOTS] = array(
+                    "q", data["hour_counts"][start:start + HOUR_SLOTS]
+                )
+
+        _rolled_until = data.get("rolled_until")
+    except Exception as e:
+        logger.error(f"خطأ في تحميل إحصائيات البوت: {e}")
+    finally:
+        if _rolled_until is None:
+            _rolled_until = int(time.time() // 60)
+
+
+def _snapshot() -> Dict[str, Any]:
+    """
+    نسخة من الحالة الحالية قابلة للحفظ
+    """
+    return {
+        "counters": list(COUNTERS),
+        "minute_slots": MINUTE_SLOTS,
+        "hour_slots": HOUR_SLOTS,
+        "totals": _totals.tolist(),
+        "minute_counts": _minute_counts.tolist(),
+        "minute_stamps": _minute_stamps.tolist(),
+        "hour_counts": _hour_counts.tolist(),
+        "hour_stamps": _hour_stamps.tolist(),
+        "rolled_until": _rolled_until,
+    }
+
+
+def _write_stats(snapshot: Dict[str, Any]) -> None:
+    """
+    كتابة الإحصائيات بشكل ذري
+    """
+    os.makedirs(os.path.dirname(STATS_FILE), exist_ok=True)
+    temp_path = f"{STATS_FILE}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as file:
+        json.dump(snapshot, file, separators=(",", ":"))
+    os.replace(temp_path, STATS_FILE)
+
+
+def save_stats_sync() -> None:
+    """
+    حفظ الإحصائيات مباشرة (عند إيقاف البوت)
+    """
+    try:
+        _write_stats(_snapshot())
+    except Exception as e:
+        logger.error(f"خطأ في حفظ إحصائيات البوت: {e}")
+
+
+async def save_stats() -> None:
+    """
+    حفظ الإحصائيات دون حجب حلقة الأحداث
+    """
+    try:
+        await asyncio.get_running_loop().run_in_executor(None, _write_stats, _snapshot())
+    except Exception as e:
+        logger.error(f"خطأ في حفظ إحصائيات البوت: {e}")
+
+
+# تحميل الإحصائيات عند استيراد الوحدة
+load_stats()
@@ -0,0 +1,279 @@
+"""
+وحدة تحويل الملفات الصوتية باستخدام ffmpeg
+تختار معدل البت بناءً على مدة المقطع حتى لا يتجاوز الملف الناتج الحد المسموح (وتعيد التحويل
+بمعدل أقل إذا تجاوزه رغم ذلك، كما يحدث عندما تكون المدة غير معروفة)،
+وتنفذ التحويل في مجموعة محدودة من العمليات بعيدًا عن حلقة الأحداث
+"""
+
+import asyncio
+import hashlib
+import os
+import shutil
+import subprocess
+import json
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+import logging
+
+from config import (
+    MAX_DOWNLOAD_SIZE,
+    SUPPORTED_FORMATS,
+    DEFAULT_MUSIC_FORMAT,
+    TRANSCODE_WORKERS,
+    TRANSCODE_MIN_BITRATE,
+    TRANSCODE_MAX_BITRATE,
+)
+
+logger = logging.getLogger(__name__)
+
+# مجلد تخزين النسخ المحولة
+TRANSCODE_CACHE_DIR = "data/cache/transcoded"
+
+# التأكد من وجود المجلد
+os.makedirs(TRANSCODE_CACHE_DIR, exist_ok=True)
+
+# معدلات البت القياسية (kbps) التي نختار منها
+BITRATE_LADDER = [32, 48, 64, 96, 128, 160, 192, 256, 320]
+
+# نسبة احتياطية لرؤوس الحاوية والبيانات الوصفية
+CONTAINER_OVERHEAD = 0.95
+
+# خيارات الترميز لكل صيغة مدعومة
+FORMAT_CODECS: Dict[str, List[str]] = {
+    "mp3": ["-c:a", "libmp3lame"],
+    "ogg": ["-c:a", "libopus"],
+    "m4a": ["-c:a", "aac", "-movflags", "+faststart"],
+}
+
+# مجموعة العمليات (تُنشأ عند أول استخدام)
+_pool: Optional[ProcessPoolExecutor] = None
+
+# عمليات التحويل الجارية حاليًا، حتى لا يُنتج نفس الإصدار مرتين في وقت واحد
+_in_flight: Dict[str, asyncio.Future] = {}
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    """
+    الحصول على مجموعة العمليات المشتركة وإنشاؤها عند الحاجة
+    """
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=TRANSCODE_WORKERS)
+    return _pool
+
+
+def shutdown_transcoder() -> None:
+    """
+    إيقاف مجموعة العمليات عند إيقاف البوت
+    """
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def choose_bitrate(duration: float, max_size: int = MAX_DOWNLOAD_SIZE) -> Optional[int]:
+    """
+    اختيار أعلى معدل بت قياسي يجعل الملف الناتج ضمن الحجم المسموح
+
+    Args:
+        duration: مدة المقطع بالثواني (0 إذا كانت غير معروفة)
+        max_size: الحجم الأقصى للملف بالبايت
+
+    Returns:
+        معدل البت بالـ kbps، أو None إذا كان المقطع أطول من أن يتسع حتى بأقل معدل
+    """
+    if not duration or duration <= 0:
+        # المدة غير معروفة: نستخدم معدلًا متوسطًا ونتحقق من الحجم بعد التحويل
+        return min(128, TRANSCODE_MAX_BITRATE)
+
+    budget_kbps = (max_size * 8 * CONTAINER_OVERHEAD) / duration / 1000
+
+    best = None
+    for bitrate in BITRATE_LADDER:
+        if TRANSCODE_MIN_BITRATE <= bitrate <= TRANSCODE_MAX_BITRATE and bitrate <= budget_kbps:
+            best = bitrate
+
+    return best
+
+
+def lower_bitrate(bitrate: int, size: int, max_size: int = MAX_DOWNLOAD_SIZE) -> Optional[int]:
+    """
+    معدل البت التالي بعد أن تجاوز ملف ناتج الحجم المسموح: أعلى معدل قياسي أقل من السابق
+    يتناسب معه الحجم المقاس مع الحجم المسموح
+
+    Args:
+        bitrate: معدل البت الذي أنتج الملف الكبير
+        size: حجم الملف الناتج بالبايت
+        max_size: الحجم الأقصى للملف بالبايت
+
+    Returns:
+        معدل البت بالـ kbps، أو None إذا لم يبق معدل أقل ضمن الحدود
+    """
+    target = bitrate * max_size * CONTAINER_OVERHEAD / size
+    candidates = [
+        rate for rate in BITRATE_LADDER
+        if TRANSCODE_MIN_BITRATE <= rate < bitrate and rate <= target
+    ]
+    return candidates[-1] if candidates else None
+
+
+def _source_key(source_path: str) -> str:
+    """
+    مفتاح يميز الملف المصدر (المسار + الحجم + وقت التعديل) دون قراءة محتواه
+    """
+    stat = os.stat(source_path)
+    raw = f"{os.path.abspath(source_path)}:{stat.st_size}:{stat.st_mtime_ns}"
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:20]
+
+
+def get_variant_path(source_path: str, fmt: str, bitrate: int) -> str:
+    """
+    مسار النسخة المحولة في الذاكرة المؤقتة لكل (مصدر، صيغة، معدل بت)
+    """
+    return os.path.join(TRANSCODE_CACHE_DIR, f"{_source_key(source_path)}_{bitrate}k.{fmt}")
+
+
+def _probe_duration(source_path: str) -> float:
+    """
+    قراءة مدة الملف باستخدام ffprobe (تعمل داخل عملية منفصلة)
+    """
+    try:
+        result = subprocess.run(
+            [
+                "ffprobe", "-v", "error",
+                "-show_entries", "format=duration",
+                "-of", "json", source_path,
+            ],
+            capture_output=True, timeout=30, check=True,
+        )
+        data = json.loads(result.stdout or b"{}")
+        return float(data.get("format", {}).get("duration", 0) or 0)
+    except Exception:
+        return 0.0
+
+
+def _run_ffmpeg(source_path: str, output_path: str, fmt: str, bitrate: int) -> Tuple[bool, str]:
+    """
+    تنفيذ ffmpeg لتحويل ملف واحد (تعمل داخل عملية منفصلة)
+
+    Returns:
+        Tuple من (نجاح العملية، رسالة الخطأ إن وجدت)
+    """
+    temp_path = f"{output_path}.part"
+    command = [
+        "ffmpeg", "-y", "-hide_banner", "-loglevel", "error",
+        "-i", source_path,
+        "-vn", "-map_metadata", "0",
+        *FORMAT_CODECS[fmt],
+        "-b:a", f"{bitrate}k",
+        "-f", "ipod" if fmt == "m4a" else fmt,
+        temp_path,
+    ]
+    try:
+        subprocess.run(command, capture_output=True, timeout=600, check=True)
+        os.replace(temp_path, output_path)
+        return True, ""
+    except subprocess.CalledProcessError as e:
+        error = (e.stderr or b"").decode("utf-8", "replace").strip()[-300:]
+        return False, error or f"ffmpeg exited with code {e.returncode}"
+    except Exception as e:
+        return False, str(e)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+async def _transcode_once(source_path: str, output_path: str, fmt: str, bitrate: int) -> Tuple[bool, str]:
+    """
+    تنفيذ التحويل مرة واحدة فقط لكل نسخة حتى مع الطلبات المتزامنة
+    """
+    existing = _in_flight.get(output_path)
+    if existing is not None:
+        return await asyncio.shield(existing)
+
+    loop = asyncio.get_running_loop()
+    future = loop.run_in_executor(_get_pool(), _run_ffmpeg, source_path, output_path, fmt, bitrate)
+    _in_flight[output_path] = future
+    try:
+        return await asyncio.shield(future)
+    finally:
+        if future.done():
+            _in_flight.pop(output_path, None)
+        else:
+            future.add_done_callback(lambda _: _in_flight.pop(output_path, None))
+
+
+async def transcode_audio(
+    source_path: str,
+    duration: float = 0,
+    fmt: str = DEFAULT_MUSIC_FORMAT,
+) -> Tuple[bool, str]:
+    """
+    تحويل ملف صوتي إلى الصيغة المطلوبة بمعدل بت يناسب الحجم المسموح
+
+    Args:
+        source_path: مسار الملف المصدر
+        duration: مدة المقطع بالثواني إن كانت معروفة
+        fmt: الصيغة المطلوبة (إحدى SUPPORTED_FORMATS)
+
+    Returns:
+        Tuple من (نجاح العملية، مسار الملف الناتج أو رسالة الخطأ)
+    """
+    if fmt not in SUPPORTED_FORMATS or fmt not in FORMAT_CODECS:
+        return False, f"الصيغة {fmt} غير مدعومة"
+
+    if not shutil.which("ffmpeg"):
+        return False, "أداة ffmpeg غير مثبتة على الخادم"
+
+    if not os.path.exists(source_path):
+        return False, "الملف المصدر غير موجود"
+
+    loop = asyncio.get_running_loop()
+    if not duration:
+        duration = await loop.run_in_executor(_get_pool(), _probe_duration, source_path)
+
+    bitrate = choose_bitrate(duration)
+    if bitrate is None:
+        return False, "المقطع طويل جدًا ولا يمكن إرساله ضمن الحجم المسموح"
+
+    while True:
+        output_path = get_variant_path(source_path, fmt, bitrate)
+        if os.path.exists(output_path):
+            return True, output_path
+
+        logger.info(f"تحويل {source_path} إلى {fmt} بمعدل {bitrate}kbps")
+        success, error = await _transcode_once(source_path, output_path, fmt, bitrate)
+        if not success:
+            logger.error(f"فشل تحويل الملف {source_path}: {error}")
+            return False, "فشل تحويل الملف الصوتي"
+
+        size = os.path.getsize(output_path)
+        if size <= MAX_DOWNLOAD_SIZE:
+            return True, output_path
+
+        # النسخ المحفوظة كلها ضمن الحجم المسموح، فتُحذف هذه ويُعاد التحويل بمعدل أقل
+        os.remove(output_path)
+        smaller = lower_bitrate(bitrate, size, MAX_DOWNLOAD_SIZE)
+        if smaller is None:
+            return False, "الملف الناتج ما زال أكبر من الحجم المسموح"
+        logger.info(f"الملف الناتج بمعدل {bitrate}kbps أكبر من الحجم المسموح، إعادة التحويل بمعدل {smaller}kbps")
+        bitrate = smaller
+
+
+async def ensure_sendable(source_path: str, duration: float = 0) -> Tuple[bool, str]:
+    """
+    التأكد من أن الملف بصيغة مدعومة وضمن الحجم المسموح، وتحويله عند الحاجة فقط
+
+    Args:
+        source_path: مسار الملف
+        duration: مدة المقطع بالثواني إن كانت معروفة
+
+    Returns:
+        Tuple من (نجاح العملية، مسار الملف الجاهز للإرسال أو رسالة الخطأ)
+    """
+    extension = os.path.splitext(source_path)[1].lstrip(".").lower()
+    if extension in SUPPORTED_FORMATS and os.path.getsize(source_path) <= MAX_DOWNLOAD_SIZE:
+        return True, source_path
+
+    return await transcode_audio(source_path, duration)
@@ -0,0 +1,147 @@
+"""
+وحدة تسجيل التحديثات الواردة
+تحفظ كل تحديث بصيغة JSON (كما أرسله Telegram) مع وقت وصوله في ملف JSONL مضغوط يوميًا،
+بعد إخفاء الأسماء وأرقام الهواتف والمواقع وأي نص يشبه رمز بوت أو بريدًا إلكترونيًا،
+ليمكن إعادة تشغيلها لاحقًا عبر tools/replay.py
+"""
+
+import asyncio
+import gzip
+import hashlib
+import json
+import os
+import re
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List
+import logging
+
+from telegram import Update
+from telegram.ext import ContextTypes
+
+logger = logging.getLogger(__name__)
+
+# مجلد ملفات التسجيل
+RECORDINGS_DIR = "data/recordings"
+
+# الحقول التي تحتوي بيانات شخصية وتُستبدل بأسماء مستعارة ثابتة داخل نفس التشغيل
+_PII_FIELDS = {"first_name", "last_name", "username", "phone_number", "bio", "email", "vcard"}
+
+# الحقول التي تُحذف قيمتها بالكامل
+_DROPPED_FIELDS = {"location", "contact"}
+
+# رموز البوتات والبريد الإلكتروني وأرقام الهواتف داخل النصوص
+_TOKEN_PATTERN = re.compile(r"\b\d{6,12}:[A-Za-z0-9_-]{30,}\b")
+_EMAIL_PATTERN = re.compile(r"[\w.+-]+@[\w-]+\.[\w.-]+")
+_PHONE_PATTERN = re.compile(r"\+?\d[\d\s-]{8,}\d")
+
+# ملح عشوائي لكل تشغيل حتى لا يمكن استرجاع الأسماء من الأسماء المستعارة
+_SALT = os.urandom(16)
+
+# التحديثات التي لم تُكتب على القرص بعد
+_pending_lines: List[str] = []
+
+
+def _pseudonym(value: str) -> str:
+    return "anon_" + hashlib.sha256(_SALT + value.encode("utf-8")).hexdigest()[:10]
+
+
+def _redact_text(text: str) -> str:
+    text = _TOKEN_PATTERN.sub("<token>", text)
+    text = _EMAIL_PATTERN.sub("<email>", text)
+    return _PHONE_PATTERN.sub("<phone>", text)
+
+
+def redact(value: Any) -> Any:
+    """
+    إخفاء البيانات الشخصية من تحديث بصيغة JSON
+
+    Args:
+        value: التحديث أو جزء منه
+
+    Returns:
+        نسخة بعد الإخفاء
+    """
+    if isinstance(value, dict):
+        result = {}
+        for key, item in value.items():
+            if key in _DROPPED_FIELDS:
+                continue
+            if key in _PII_FIELDS and isinstance(item, str):
+                result[key] = _pseudonym(item)
+            else:
+                result[key] = redact(item)
+        return result
+    if isinstance(value, list):
+        return [redact(item) for item in value]
+    if isinstance(value, str):
+        return _redact_text(value)
+    return value
+
+
+def recording_path(now: float = None) -> str:
+    """
+    مسار ملف التسجيل لليوم الحالي (بتوقيت UTC)
+    """
+    day = datetime.fromtimestamp(now or time.time(), tz=timezone.utc).strftime("%Y%m%d")
+    return os.path.join(RECORDINGS_DIR, f"updates-{day}.jsonl.gz")
+
+
+def record_raw_update(raw: Dict[str, Any]) -> None:
+    """
+    تسجيل تحديث بصيغة JSON كما وصل من Telegram (تستخدمها العملية الأمامية عند توزيع التحديثات)
+    """
+    try:
+        record = {"t": round(time.time(), 3), "update": redact(raw)}
+        _pending_lines.append(json.dumps(record, ensure_ascii=False))
+    except Exception as e:
+        logger.error(f"خطأ في تسجيل التحديث: {e}")
+
+
+async def record_update(update: object, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    معالج يسجل كل تحديث وارد (يُضاف في مجموعة منفصلة قبل باقي المعالجات)
+    """
+    if isinstance(update, Update):
+        record_raw_update(update.to_dict())
+
+
+def _write_lines(path: str, lines: List[str]) -> None:
+    """
+    إلحاق الأسطر بالملف المضغوط (كل إلحاق يضيف جزءًا gzip جديدًا ويبقى الملف قابلًا للقراءة)
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with gzip.open(path, "at", encoding="utf-8") as file:
+        file.write("\n".join(lines) + "\n")
+
+
+def _take_pending() -> List[str]:
+    lines = _pending_lines[:]
+    del _pending_lines[:len(lines)]
+    return lines
+
+
+async def flush_recordings() -> None:
+    """
+    كتابة التحديثات المسجلة على القرص دون حجب حلقة الأحداث
+    """
+    lines = _take_pending()
+    if not lines:
+        return
+    try:
+        await asyncio.get_running_loop().run_in_executor(None, _write_lines, recording_path(), lines)
+    except Exception as e:
+        logger.error(f"خطأ في حفظ التحديثات المسجلة: {e}")
+
+
+def flush_recordings_sync() -> None:
+    """
+    كتابة التحديثات المسجلة مباشرة (عند إيقاف البوت)
+    """
+    lines = _take_pending()
+    if not lines:
+        return
+    try:
+        _write_lines(recording_path(), lines)
+    except Exception as e:
+        logger.error(f"خطأ في حفظ التحديثات المسجلة: {e}")